@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Anki Collection Reader
+Exports notes straight from an Anki collection database (collection.anki2 or an
+.apkg package) instead of driving the Anki GUI card by card
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+
+# The question marker scanner is shared with tools/format_aws_questions.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from marker_scanner import first_question
+
+# Anki separates note fields with the unit separator character
+FIELD_SEPARATOR = '\x1f'
+
+# Collection files inside an .apkg, newest first. collection.anki21b is zstd
+# compressed and needs Anki itself to read, so it is only used for the error message.
+APKG_COLLECTIONS = ['collection.anki21', 'collection.anki2']
+
+_BLOCK_TAG_RE = re.compile(r'<\s*(?:br|/div|/p|/li|/tr|hr)\b[^>]*>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+_MEDIA_RE = re.compile(r'\[sound:[^\]]*\]')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n+')
+
+
+def strip_html(text):
+    """
+    Convert an Anki field to plain text: block-level tags become line breaks,
+    other tags and [sound:] references are dropped and entities are decoded
+    """
+    text = _BLOCK_TAG_RE.sub('\n', text)
+    text = _TAG_RE.sub('', text)
+    text = _MEDIA_RE.sub('', text)
+    text = html.unescape(text).replace('\xa0', ' ')
+    lines = [line.strip() for line in text.split('\n')]
+    return _BLANK_LINES_RE.sub('\n', '\n'.join(lines)).strip()
+
+
+def trim_to_markers(content):
+    """
+    Cut content down to the span from the first question type marker to the
+    end of the "正确答案: X;" line, matching what the GUI extractors save.
+    Returns the content unchanged when the markers are missing
+    """
+    span = first_question(content)
+    return span.text(content) if span else content
+
+
+@contextmanager
+def open_collection(path):
+    """
+    Open a collection read-only. Accepts a collection.anki2/.anki21 file or an
+    .apkg package, which is unpacked to a temporary directory first
+    """
+    if not zipfile.is_zipfile(path):
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    with zipfile.ZipFile(path) as package, tempfile.TemporaryDirectory() as tmp_dir:
+        names = set(package.namelist())
+        member = next((name for name in APKG_COLLECTIONS if name in names), None)
+        if member is None:
+            if 'collection.anki21b' in names:
+                raise ValueError(f"{path} uses the compressed collection.anki21b format; "
+                                 "re-export it from Anki with 'Support older Anki versions' checked")
+            raise ValueError(f"No Anki collection found in {path}")
+        package.extract(member, tmp_dir)
+        conn = sqlite3.connect(os.path.join(tmp_dir, member))
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def load_note_types(conn):
+    """
+    Return {note type id: {'name': ..., 'fields': [...]}} for both the legacy
+    schema (JSON in col.models) and the newer notetypes/fields tables
+    """
+    if _has_table(conn, 'notetypes') and _has_table(conn, 'fields'):
+        note_types = {mid: {'name': name, 'fields': []}
+                      for mid, name in conn.execute("SELECT id, name FROM notetypes")}
+        for mid, name in conn.execute("SELECT ntid, name FROM fields ORDER BY ntid, ord"):
+            if mid in note_types:
+                note_types[mid]['fields'].append(name)
+        return note_types
+
+    row = conn.execute("SELECT models FROM col").fetchone()
+    models = json.loads(row[0]) if row and row[0] else {}
+    return {int(mid): {'name': model.get('name', ''),
+                       'fields': [field['name'] for field in sorted(model.get('flds', []), key=lambda f: f['ord'])]}
+            for mid, model in models.items()}
+
+
+def load_decks(conn):
+    """Return {deck id: deck name} for both schema versions"""
+    if _has_table(conn, 'decks'):
+        return {did: name.replace(FIELD_SEPARATOR, '::') for did, name in conn.execute("SELECT id, name FROM decks")}
+    row = conn.execute("SELECT decks FROM col").fetchone()
+    decks = json.loads(row[0]) if row and row[0] else {}
+    return {int(did): deck.get('name', '') for did, deck in decks.items()}
+
+
+def iter_notes(conn, deck=None):
+    """
+    Stream notes with a single query, yielding one dict per note:
+    id, guid, deck, note_type, tags, fields (name -> plain text) and content
+    (the question text trimmed to the usual markers)
+
+    deck limits the export to one deck and its sub-decks
+    """
+    note_types = load_note_types(conn)
+    decks = load_decks(conn)
+
+    query = ("SELECT n.id, n.guid, n.mid, n.tags, n.flds, MIN(c.did) FROM notes n "
+             "JOIN cards c ON c.nid = n.id")
+    params = ()
+    if deck:
+        deck_ids = [did for did, name in decks.items() if name == deck or name.startswith(deck + '::')]
+        if not deck_ids:
+            print(f"[WARNING] Deck not found: {deck}")
+            return
+        query += f" WHERE c.did IN ({','.join('?' * len(deck_ids))})"
+        params = tuple(deck_ids)
+    query += " GROUP BY n.id ORDER BY n.id"
+
+    for note_id, guid, mid, tags, flds, did in conn.execute(query, params):
+        values = [strip_html(value) for value in flds.split(FIELD_SEPARATOR)]
+        names = note_types.get(mid, {}).get('fields') or []
+        names = names + [f"Field {i + 1}" for i in range(len(names), len(values))]
+        # Prefer the field that holds the answer (the back side), otherwise use all fields
+        answer_field = next((v for v in reversed(values) if '正确答案' in v), None)
+        content = trim_to_markers(answer_field if answer_field is not None else '\n'.join(v for v in values if v))
+        yield {
+            'id': note_id,
+            'guid': guid,
+            'deck': decks.get(did, ''),
+            'note_type': note_types.get(mid, {}).get('name', ''),
+            'tags': tags.split(),
+            'fields': dict(zip(names, values)),
+            'content': content,
+        }
+
+
+def write_extraction(notes, f):
+    """Write notes in the same layout as extract_anki_content_advanced.py"""
+    f.write("Anki Question Extraction\n")
+    f.write(f"Extracted on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    f.write("=" * 80 + "\n\n")
+    count = 0
+    for count, note in enumerate(notes, 1):
+        f.write(f"【Question {count}】\n")
+        f.write(note['content'])
+        f.write("\n\n" + "-" * 60 + "\n\n")
+    f.write(f"\n\n{'=' * 80}\nEXTRACTION SUMMARY\n{'=' * 80}\n"
+            f"Total Questions Exported: {count}\n{'=' * 80}\n")
+    return count
+
+
+def write_jsonl(notes, f):
+    """Write one JSON object per note"""
+    count = 0
+    for count, note in enumerate(notes, 1):
+        f.write(json.dumps(note, ensure_ascii=False) + '\n')
+    return count
+
+
+def export_collection(collection_path, output_file, fmt='txt', deck=None):
+    """
+    Export every note of a collection to output_file
+
+    Returns the number of exported notes
+    """
+    with open_collection(collection_path) as conn, open(output_file, 'w', encoding='utf-8') as f:
+        notes = iter_notes(conn, deck)
+        return write_jsonl(notes, f) if fmt == 'jsonl' else write_extraction(notes, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export questions directly from an Anki collection or .apkg')
+    parser.add_argument('collection', help='Path to collection.anki2 or an .apkg file')
+    parser.add_argument('-o', '--output', help='Output file (default: anki_export_<timestamp>.txt/.jsonl next to this script)')
+    parser.add_argument('--format', choices=['txt', 'jsonl'], default='txt',
+                        help='txt matches the GUI extractor output, jsonl keeps every field')
+    parser.add_argument('--deck', help='Only export this deck and its sub-decks')
+    args = parser.parse_args()
+
+    output_file = args.output
+    if not output_file:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   f"anki_export_{timestamp}.{args.format}")
+
+    start_time = time.perf_counter()
+    count = export_collection(args.collection, output_file, args.format, args.deck)
+    elapsed = time.perf_counter() - start_time
+    print(f"[INFO] Exported {count} notes in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} notes/s)")
+    print(f"[INFO] Output saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (sqlite3.Error, ValueError, OSError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
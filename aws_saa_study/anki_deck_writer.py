@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Anki Deck Writer
+Builds an .apkg straight from parsed question records (format_aws_questions.py
+output) instead of importing a text file through the Anki GUI. Re-running it on an
+existing package updates notes in place by GUID, so review history is kept
+"""
+
+import argparse
+import base64
+import hashlib
+import html
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+
+from anki_collection_reader import APKG_COLLECTIONS, FIELD_SEPARATOR
+
+# format_aws_questions is shared with the tools directory (added to sys.path by the reader)
+from format_aws_questions import question_key, read_formatted_questions
+
+# Legacy collection schema, as written by "Support older Anki versions" exports
+SCHEMA_VERSION = 11
+
+SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_csum on notes (csum);
+CREATE INDEX ix_cards_nid on cards (nid);
+"""
+
+DEFAULT_DECK = 'AWS SAA-C03'
+NOTE_TYPE = 'AWS SAA Question'
+NOTE_FIELDS = ['Front', 'Answer', 'Explanation']
+DEFAULT_TAGS = ['aws', 'saa']
+REVIEW_TAG = 'needs_review'
+
+DEFAULT_CONF = {
+    'activeDecks': [1], 'curDeck': 1, 'newSpread': 0, 'collapseTime': 1200, 'timeLim': 0,
+    'estTimes': True, 'dueCounts': True, 'curModel': None, 'nextPos': 1, 'sortType': 'noteFld',
+    'sortBackwards': False, 'addToCur': True,
+}
+DEFAULT_DCONF = {'1': {
+    'id': 1, 'name': 'Default', 'mod': 0, 'usn': 0, 'maxTaken': 60, 'autoplay': True, 'timer': 0,
+    'replayq': True, 'dyn': False,
+    'new': {'delays': [1, 10], 'ints': [1, 4, 7], 'initialFactor': 2500, 'order': 1, 'perDay': 20,
+            'bury': True, 'separate': True},
+    'rev': {'perDay': 200, 'ease4': 1.3, 'fuzz': 0.05, 'maxIvl': 36500, 'ivlFct': 1, 'bury': True,
+            'minSpace': 1},
+    'lapse': {'delays': [10], 'mult': 0, 'minInt': 1, 'leechFails': 8, 'leechAction': 0},
+}}
+CARD_CSS = '.card { font-family: arial; font-size: 18px; text-align: left; color: black; background-color: white; }'
+
+
+def checksum(text):
+    """Anki's duplicate-check checksum: the first 8 hex digits of the SHA-1 of the sort field"""
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def stable_id(name):
+    """Deck and note type ids derived from their names, so every export lands in the same ones"""
+    return int(hashlib.sha1(name.encode('utf-8')).hexdigest()[:12], 16) % (1 << 40) + (1 << 40)
+
+
+def note_guid(record):
+    """
+    GUID from the question itself (type, stem and options), so a later export with a
+    corrected answer or a new explanation updates the same note instead of adding one
+    """
+    return base64.b64encode(bytes.fromhex(question_key(record))[:9]).decode('ascii')
+
+
+def note_fields(record):
+    """
+    Front, Answer and Explanation fields. The front holds the type marker, the stem and one
+    option per line, the answer the "答案: X;" marker, so the card reads from the first marker
+    to the answer marker like the existing decks and the GUI extractors and the collection
+    reader handle these notes like any other. The question is stored only once (the back
+    template shows it through {{FrontSide}}), which keeps large decks small
+
+    Returns (fields, sort field text)
+    """
+    question = '\n'.join([f"{record['type']}：{record['question']}", *record['options']])
+    # Escape once and turn every line into a <div>, as the Anki editor stores them
+    front = '<div>' + html.escape(question, quote=False).replace('\n', '</div><div>') + '</div>'
+    answer = f"答案: {record['answer']};"
+    return [front, answer, html.escape(record.get('explanation') or '', quote=False)], question
+
+
+def note_tags(record):
+    tags = DEFAULT_TAGS + [tag.strip().replace(' ', '_') for tag in record.get('tags') or [] if tag.strip()]
+    if record.get('review'):
+        tags.append(REVIEW_TAG)  # the formatter could not read options or key for certain
+    return ' ' + ' '.join(dict.fromkeys(tags)) + ' '
+
+
+def _note_type(model_id, deck_id, now):
+    field = {'font': 'Arial', 'size': 18, 'rtl': False, 'sticky': False, 'media': []}
+    return {
+        'id': model_id, 'name': NOTE_TYPE, 'type': 0, 'mod': now, 'usn': -1, 'sortf': 0, 'did': deck_id,
+        'vers': [], 'tags': [], 'css': CARD_CSS, 'latexPre': '', 'latexPost': '', 'req': [[0, 'all', [0]]],
+        'flds': [dict(field, name=name, ord=i) for i, name in enumerate(NOTE_FIELDS)],
+        'tmpls': [{'name': 'Card 1', 'ord': 0, 'did': None, 'bqfmt': '', 'bafmt': '', 'qfmt': '{{Front}}',
+                   'afmt': '{{FrontSide}}<hr id=answer>{{Answer}}<br>{{Explanation}}'}],
+    }
+
+
+def _deck(deck_id, name, now):
+    return {
+        'id': deck_id, 'name': name, 'mod': now, 'usn': -1, 'desc': '', 'dyn': 0, 'conf': 1, 'collapsed': False,
+        'browserCollapsed': False, 'extendNew': 10, 'extendRev': 50,
+        'newToday': [0, 0], 'revToday': [0, 0], 'lrnToday': [0, 0], 'timeToday': [0, 0],
+    }
+
+
+def _create_collection(conn, now):
+    conn.executescript(SCHEMA)
+    decks = {'1': _deck(1, 'Default', now)}
+    conn.execute("INSERT INTO col VALUES (1, ?, ?, ?, ?, 0, 0, 0, ?, '{}', ?, ?, '{}')",
+                 (now, now * 1000, now * 1000, SCHEMA_VERSION, json.dumps(DEFAULT_CONF), json.dumps(decks),
+                  json.dumps(DEFAULT_DCONF)))
+
+
+def write_notes(conn, records, deck_name=DEFAULT_DECK):
+    """
+    Insert or update one note (and card) per record inside a single transaction
+
+    Notes are matched by GUID: unchanged notes are skipped, changed ones get new fields
+    and tags (their cards and review history stay), new ones are appended to the new
+    card queue. Notes missing from records are left alone
+
+    Returns counts of added, updated and unchanged notes
+    """
+    now = int(time.time())
+    model_id, deck_id = stable_id(NOTE_TYPE), stable_id(deck_name)
+    models_json, decks_json = conn.execute("SELECT models, decks FROM col").fetchone()
+    models, decks = json.loads(models_json or '{}'), json.loads(decks_json or '{}')
+    models.setdefault(str(model_id), _note_type(model_id, deck_id, now))
+    decks.setdefault(str(deck_id), _deck(deck_id, deck_name, now))
+
+    existing = {guid: (note_id, flds, tags) for note_id, guid, flds, tags in
+                conn.execute("SELECT id, guid, flds, tags FROM notes WHERE mid = ?", (model_id,))}
+    next_id = max(now * 1000, (conn.execute("SELECT MAX(id) FROM notes").fetchone()[0] or 0) + 1,
+                  (conn.execute("SELECT MAX(id) FROM cards").fetchone()[0] or 0) + 1)
+    next_due = (conn.execute("SELECT MAX(due) FROM cards WHERE type = 0").fetchone()[0] or 0) + 1
+
+    # Everything that does not depend on the database is computed up front
+    new_notes, new_cards, updates = [], [], []
+    unchanged = 0
+    seen = set()
+    for record in records:
+        guid = note_guid(record)
+        if guid in seen:  # the same question twice in one export
+            continue
+        seen.add(guid)
+        fields, sort_field = note_fields(record)
+        flds, tags = FIELD_SEPARATOR.join(fields), note_tags(record)
+        if guid in existing:
+            note_id, old_flds, old_tags = existing[guid]
+            if old_flds == flds and old_tags == tags:
+                unchanged += 1
+            else:
+                updates.append((flds, sort_field, checksum(sort_field), tags, now, note_id))
+            continue
+        new_notes.append((next_id, guid, model_id, now, -1, tags, flds, sort_field, checksum(sort_field), 0, ''))
+        new_cards.append((next_id, next_id, deck_id, 0, now, -1, 0, 0, next_due, 0, 0, 0, 0, 0, 0, 0, 0, ''))
+        next_id += 1
+        next_due += 1
+
+    with conn:  # one transaction for the whole deck
+        conn.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", new_notes)
+        conn.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", new_cards)
+        conn.executemany("UPDATE notes SET flds = ?, sfld = ?, csum = ?, tags = ?, mod = ?, usn = -1 WHERE id = ?",
+                         updates)
+        conn.execute("UPDATE col SET mod = ?, models = ?, decks = ?", (now * 1000, json.dumps(models),
+                                                                       json.dumps(decks)))
+    return {'added': len(new_notes), 'updated': len(updates), 'unchanged': unchanged}
+
+
+def write_apkg(path, records, deck_name=DEFAULT_DECK, update=True):
+    """
+    Write records to an .apkg package. When path already exists and update is True its
+    collection is updated in place by GUID, otherwise a new package is created
+
+    Returns the counts from write_notes
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = os.path.join(tmp_dir, 'collection.anki2')
+        if update and os.path.exists(path):
+            with zipfile.ZipFile(path) as package:
+                names = set(package.namelist())
+                member = next((name for name in APKG_COLLECTIONS if name in names), None)
+                if member is None:
+                    raise ValueError(f"No legacy Anki collection found in {path}; re-export it from Anki with "
+                                     "'Support older Anki versions' checked, or pass --rebuild")
+                with package.open(member) as src, open(collection, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+        conn = sqlite3.connect(collection)
+        try:
+            # A scratch copy that is zipped afterwards, so there is nothing to protect against crashes
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            if not os.path.getsize(collection):
+                _create_collection(conn, int(time.time()))
+            stats = write_notes(conn, records, deck_name)
+        finally:
+            conn.close()
+
+        tmp_path = path + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as package:
+            package.write(collection, 'collection.anki2')
+            package.writestr('media', '{}')
+        os.replace(tmp_path, path)
+    return stats
+
+
+def load_enrichments(path):
+    """
+    Explanations and tags from tools/enrich_questions.py output, keyed by question_key.
+    Question numbers change whenever the formatted file is regenerated, so rows without
+    a key (older enrichment runs) are skipped
+    """
+    enrichments = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+                enrichments[str(item['key'])] = item
+            except (ValueError, KeyError, TypeError):
+                continue
+    return enrichments
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update an Anki .apkg from formatted questions')
+    parser.add_argument('output', help='.apkg to create, or to update by GUID if it already exists')
+    parser.add_argument('--input', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'temp',
+                                                        'Formatted_AWS_Questions.txt'),
+                        help='Formatted question file from tools/format_aws_questions.py')
+    parser.add_argument('--enriched', help='JSONL from tools/enrich_questions.py to add explanations and tags')
+    parser.add_argument('--deck', default=DEFAULT_DECK, help=f'Deck name (default: {DEFAULT_DECK})')
+    parser.add_argument('--rebuild', action='store_true', help='Overwrite the output instead of updating it')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    records = read_formatted_questions(args.input)
+    if args.enriched:
+        enrichments = load_enrichments(args.enriched)
+        for record in records:
+            extra = enrichments.get(question_key(record), {})
+            record['explanation'] = extra.get('explanation')
+            record['tags'] = extra.get('tags')
+    stats = write_apkg(args.output, records, args.deck, update=not args.rebuild)
+    elapsed = time.perf_counter() - start_time
+    print(f"[INFO] {stats['added']} added, {stats['updated']} updated, {stats['unchanged']} unchanged "
+          f"in {elapsed:.2f}s")
+    print(f"[INFO] Deck saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (sqlite3.Error, ValueError, OSError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
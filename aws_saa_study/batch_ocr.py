@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Batch OCR
+Turns a directory of question screenshots into an extraction file offline:
+every image is binarized like the live OCR path, run through Tesseract on a
+process pool (one process per core) and the recognized text goes through the
+shared question marker scanner. Results are cached by image hash, so re-running
+over a growing archive only OCRs the new screenshots
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from PIL import Image
+import pytesseract
+
+# The question marker scanner is shared with tools/format_aws_questions.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from marker_scanner import scan_questions
+from anki_collection_reader import write_extraction
+from button_locator import binarize
+from extraction_pipeline import content_hash, write_retry_file
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(SCRIPT_DIR, '.ocr_cache.jsonl')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+# Full-page text: automatic page segmentation keeps the lines in reading order
+# (the button search uses --psm 11, which scatters words)
+TEXT_OCR_CONFIG = r'--oem 3 --psm 3 -l chi_sim+eng'
+
+
+def find_images(directory):
+    """All screenshots under directory, in a stable order"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def image_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def ocr_image(path, config=TEXT_OCR_CONFIG):
+    """Binarize one screenshot and return its text (runs in a worker process)"""
+    with Image.open(path) as image:
+        binary = binarize(image.convert('RGB'))
+    return pytesseract.image_to_string(binary, config=config)
+
+
+def _init_worker():
+    # Tesseract spreads one image over every core via OpenMP; with one image per
+    # process that only adds contention, so keep each call single-threaded
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+class OcrCache:
+    """
+    Append-only JSONL file of OCR results keyed by image hash and Tesseract config.
+    Results are written as soon as they arrive, so an interrupted run keeps its work
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted run
+                    self.entries[(entry['hash'], entry['config'])] = entry['text']
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    def get(self, digest, config):
+        return self.entries.get((digest, config))
+
+    def put(self, digest, config, text):
+        self.entries[(digest, config)] = text
+        if self._file:
+            self._file.write(json.dumps({'hash': digest, 'config': config, 'text': text}, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def ocr_images(paths, workers=None, cache=None, config=TEXT_OCR_CONFIG, ocr=ocr_image):
+    """
+    OCR every image, in order. Cached images are skipped; the rest are spread
+    over `workers` processes (default: one per core)
+
+    ocr must be a picklable top-level callable(path, config) -> text
+    Returns ({path: text}, stats)
+    """
+    workers = workers or os.cpu_count() or 1
+    texts = {}
+    pending = []
+    for path in paths:
+        digest = image_hash(path)
+        text = cache.get(digest, config) if cache else None
+        if text is None:
+            pending.append((path, digest))
+        else:
+            texts[path] = text
+
+    start = time.perf_counter()
+    if pending:
+        todo = [path for path, _ in pending]
+        # Several images per task keeps the pickling overhead small while still
+        # leaving enough tasks to even out slow images across the workers
+        chunksize = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for (path, digest), text in zip(pending, pool.map(ocr, todo, [config] * len(todo), chunksize=chunksize)):
+                texts[path] = text
+                if cache:
+                    cache.put(digest, config, text)
+    elapsed = time.perf_counter() - start
+
+    stats = {'images': len(paths), 'cached': len(paths) - len(pending), 'ocr': len(pending),
+             'workers': workers, 'ocr_seconds': round(elapsed, 2),
+             'images_per_sec': round(len(pending) / elapsed, 2) if pending and elapsed else None}
+    return {path: texts[path] for path in paths}, stats
+
+
+def extract_questions(texts):
+    """
+    Run the marker scanner over OCR text. Returns (questions, retries) where
+    questions are unique question texts in image order and retries are
+    (image name, reason, text) entries for images that need a manual look
+    """
+    questions, retries, seen = [], [], set()
+    for path, text in texts.items():
+        name = os.path.basename(path)
+        spans = list(scan_questions(text))
+        if not spans:
+            retries.append((name, 'no markers found', text))
+            continue
+        for span in spans:
+            content = span.text(text)
+            if span.ambiguous:
+                retries.append((name, 'answer marker ambiguous', content))
+                continue
+            digest = content_hash(content)
+            if digest not in seen:
+                seen.add(digest)
+                questions.append(content)
+    return questions, retries
+
+
+def benchmark(paths, max_workers=None, config=TEXT_OCR_CONFIG, ocr=ocr_image):
+    """Uncached OCR throughput at 1, 2, 4, ... workers up to max_workers"""
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+
+    results = []
+    for workers in counts:
+        _, stats = ocr_images(paths, workers, None, config, ocr)
+        results.append({'workers': workers, 'seconds': stats['ocr_seconds'], 'images_per_sec': stats['images_per_sec']})
+    base = results[0]['images_per_sec']
+    for result in results:
+        result['speedup'] = round(result['images_per_sec'] / base, 2) if base else None
+    return {'images': len(paths), 'runs': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR a directory of question screenshots into an extraction file')
+    parser.add_argument('directory', help='Directory of screenshots (searched recursively)')
+    parser.add_argument('-o', '--output', help='Output file (default: anki_ocr_<timestamp>.txt next to this script)')
+    parser.add_argument('--workers', type=int, help='OCR processes (default: one per core)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='OCR result cache file')
+    parser.add_argument('--no-cache', action='store_true', help='OCR every image again')
+    parser.add_argument('--bench', action='store_true', help='Measure uncached throughput for 1..N workers instead')
+    args = parser.parse_args()
+
+    paths = find_images(args.directory)
+    if not paths:
+        print(f"[ERROR] No images found in {args.directory}")
+        sys.exit(1)
+
+    if args.bench:
+        print(json.dumps(benchmark(paths, args.workers), indent=2))
+        return
+
+    cache = None if args.no_cache else OcrCache(args.cache)
+    try:
+        texts, stats = ocr_images(paths, args.workers, cache)
+    finally:
+        if cache:
+            cache.close()
+    print(f"[INFO] {stats['images']} images: {stats['cached']} cached, {stats['ocr']} OCR'd "
+          f"with {stats['workers']} workers in {stats['ocr_seconds']}s"
+          + (f" ({stats['images_per_sec']} images/s)" if stats['images_per_sec'] else ""))
+
+    questions, retries = extract_questions(texts)
+    output_file = args.output or os.path.join(
+        SCRIPT_DIR, f"anki_ocr_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        write_extraction(({'content': question} for question in questions), f)
+    print(f"[INFO] Extracted {len(questions)} questions to {output_file}")
+
+    if retries:
+        retry_file = os.path.splitext(output_file)[0] + '_retry.txt'
+        write_retry_file(retry_file, retries)
+        print(f"[INFO] {len(retries)} images/spans need review, saved to {retry_file}")
+
+
+if __name__ == "__main__":
+    main()
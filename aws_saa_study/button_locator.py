@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Button Locator
+Finds Anki buttons ("显示答案", "重来") with one full-screen OCR pass, then caches
+their bounding boxes and re-finds them with OpenCV template matching inside a
+small region of interest. Full OCR only runs again when matching confidence drops
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import pytesseract
+
+# Tesseract settings used by the extractors
+OCR_CONFIG = r'--oem 3 --psm 11 -l chi_sim+eng'
+# Pixels added around a cached box when searching for it again
+DEFAULT_MARGIN = 60
+# Pixels of context kept around the OCR box when cutting the template
+TEMPLATE_PADDING = 4
+# Minimum normalized correlation for a template match to be trusted
+DEFAULT_THRESHOLD = 0.8
+
+
+def to_gray(image):
+    """Convert a PIL image or an RGB numpy array to a grayscale numpy array"""
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return array
+    return cv2.cvtColor(array[:, :, :3], cv2.COLOR_RGB2GRAY)
+
+
+def binarize(image):
+    """Grayscale plus a fixed threshold, the preprocessing used before every OCR pass"""
+    _, binary = cv2.threshold(to_gray(image), 128, 255, cv2.THRESH_BINARY)
+    return binary
+
+
+def ocr_find_text(image, target_text):
+    """
+    Run Tesseract over a whole image and return the (x, y, w, h) box of the
+    first word containing target_text, or None
+    """
+    binary = binarize(image)
+    text_data = pytesseract.image_to_data(binary, config=OCR_CONFIG, output_type=pytesseract.Output.DICT)
+    for i, text in enumerate(text_data['text']):
+        if target_text in text:
+            return (text_data['left'][i], text_data['top'][i], text_data['width'][i], text_data['height'][i])
+    return None
+
+
+class ButtonLocator:
+    """
+    Caches button positions found by OCR and re-finds them by template matching
+
+    gui must provide screenshot(region=None) returning a PIL image (pyautogui by
+    default); ocr_find(image, text) returns a box or None and defaults to Tesseract
+    """
+
+    def __init__(self, gui=None, ocr_find=ocr_find_text, margin=DEFAULT_MARGIN, threshold=DEFAULT_THRESHOLD):
+        if gui is None:
+            import pyautogui as gui
+        self.gui = gui
+        self.ocr_find = ocr_find
+        self.margin = margin
+        self.threshold = threshold
+        self.cache = {}  # text -> {'box': (x, y, w, h), 'template': gray array}
+        self.stats = {'template_hits': 0, 'ocr_runs': 0, 'misses': 0}
+
+    def _screen_size(self):
+        size = getattr(self.gui, 'size', None)
+        return size() if callable(size) else None
+
+    def _match_cached(self, text):
+        """Template-match a cached button within its region of interest"""
+        entry = self.cache[text]
+        x, y, w, h = entry['box']
+        template = entry['template']
+        th, tw = template.shape
+        left, top = max(0, x - self.margin), max(0, y - self.margin)
+        right, bottom = x + w + self.margin, y + h + self.margin
+        screen = self._screen_size()
+        if screen:
+            right, bottom = min(right, screen[0]), min(bottom, screen[1])
+        if right - left < tw or bottom - top < th:
+            return None
+
+        roi = to_gray(self.gui.screenshot(region=(left, top, right - left, bottom - top)))
+        if roi.shape[0] < th or roi.shape[1] < tw:
+            return None
+        result = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, location = cv2.minMaxLoc(result)
+        if score < self.threshold:
+            print(f"[DEBUG] Template match for {text} dropped to {score:.2f}, falling back to OCR")
+            return None
+        # The template includes padding; keep the cached box in sync if the button moved
+        entry['box'] = (left + location[0] + (x - entry['template_origin'][0]),
+                        top + location[1] + (y - entry['template_origin'][1]), w, h)
+        entry['template_origin'] = (left + location[0], top + location[1])
+        return entry['box']
+
+    def _ocr_and_cache(self, text):
+        """Run full-screen OCR and cache the button box plus a template cut from it"""
+        self.stats['ocr_runs'] += 1
+        screenshot = self.gui.screenshot()
+        box = self.ocr_find(screenshot, text)
+        if not box:
+            return None
+        gray = to_gray(screenshot)
+        x, y, w, h = box
+        tx, ty = max(0, x - TEMPLATE_PADDING), max(0, y - TEMPLATE_PADDING)
+        template = gray[ty:y + h + TEMPLATE_PADDING, tx:x + w + TEMPLATE_PADDING].copy()
+        self.cache[text] = {'box': box, 'template': template, 'template_origin': (tx, ty)}
+        return box
+
+    def locate(self, text):
+        """Return the screen coordinates of the button center, or None if it cannot be found"""
+        box = self._match_cached(text) if text in self.cache else None
+        if box:
+            self.stats['template_hits'] += 1
+        else:
+            box = self._ocr_and_cache(text)
+        if not box:
+            self.stats['misses'] += 1
+            self.cache.pop(text, None)
+            return None
+        x, y, w, h = box
+        return (x + w // 2, y + h // 2)
+
+    def invalidate(self, text=None):
+        """Forget one cached button, or all of them (e.g. after the window moved)"""
+        if text is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(text, None)
+
+
+class ImageScreen:
+    """Replays a recorded screenshot as if it were the screen (used by the benchmark)"""
+
+    def __init__(self, image):
+        self.image = image
+
+    def size(self):
+        return self.image.size
+
+    def screenshot(self, region=None):
+        if region is None:
+            return self.image
+        left, top, width, height = region
+        return self.image.crop((left, top, left + width, top + height))
+
+
+def benchmark(screenshot_dir, texts, repeat=5):
+    """
+    Compare per-lookup latency of full-screen OCR against cached template
+    matching on recorded screenshots
+    """
+    from PIL import Image
+
+    paths = sorted(glob.glob(os.path.join(screenshot_dir, '*.png')))
+    if not paths:
+        raise ValueError(f"No .png screenshots found in {screenshot_dir}")
+    results = {}
+    for text in texts:
+        ocr_times, match_times, found, matched = [], [], 0, 0
+        for path in paths:
+            screen = ImageScreen(Image.open(path).convert('RGB'))
+
+            start = time.perf_counter()
+            box = ocr_find_text(screen.screenshot(), text)
+            ocr_times.append(time.perf_counter() - start)
+            if not box:
+                continue
+            found += 1
+
+            locator = ButtonLocator(gui=screen, ocr_find=lambda image, t, box=box: box)
+            locator.locate(text)  # seeds the cache from the OCR result
+            for _ in range(repeat):
+                start = time.perf_counter()
+                position = locator.locate(text)
+                match_times.append(time.perf_counter() - start)
+            matched += locator.stats['template_hits'] == repeat and position is not None
+
+        results[text] = {
+            'screenshots': len(paths),
+            'found_by_ocr': found,
+            'matched_by_template': matched,
+            'ocr_ms': round(sum(ocr_times) / len(ocr_times) * 1000, 2),
+            'template_ms': round(sum(match_times) / len(match_times) * 1000, 3) if match_times else None,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OCR vs cached template matching on recorded screenshots')
+    parser.add_argument('screenshots', help='Directory of .png screenshots of the Anki window')
+    parser.add_argument('--text', action='append', help='Button text to look for (default: 显示答案 and 重来)')
+    parser.add_argument('--repeat', type=int, default=5, help='Template lookups per screenshot (default: 5)')
+    args = parser.parse_args()
+
+    results = benchmark(args.screenshots, args.text or ["显示答案", "重来"], args.repeat)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
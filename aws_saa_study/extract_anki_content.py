@@ -12,6 +12,13 @@ import os
 import sys
 from datetime import datetime
 
+# The question marker scanner is shared with tools/format_aws_questions.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from marker_scanner import first_question
+from extraction_pipeline import content_hash
+from extraction_session import (SCRIPT_DIR, Checkpoint, ExhaustionDetector, SeenIndex,
+                                parse_session_arguments, run_limit)
+
 # Configure pyautogui settings
 pyautogui.FAILSAFE = True  # Move mouse to top-left corner to stop
 pyautogui.PAUSE = 0.5  # Pause between commands
@@ -89,6 +96,11 @@ def find_text_and_select_to_end(start_text, end_text):
 def extract_content_simple():
     """
     Simplified extraction method using keyboard shortcuts
+
+    Returns (content, marked). marked is True when content is the marker span
+    (question type marker through "正确答案: X;"), the same text the advanced
+    extractor hashes into the shared seen index; otherwise content is the whole
+    clipboard
     """
     # Select all text in the window
     pyautogui.hotkey('ctrl', 'a')
@@ -101,29 +113,29 @@ def extract_content_simple():
     # Get clipboard content
     content = pyperclip.paste()
     
-    # Extract relevant portion
-    if "单选题" in content or "多选题" in content:
-        start_marker = "单选题" if "单选题" in content else "多选题"
-        start_idx = content.find(start_marker)
-        
-        # Find the end marker (正确答案: followed by answers)
-        import re
-        end_pattern = r"正确答案[：:]\s*[A-Z,\s]+[;；]"
-        end_match = re.search(end_pattern, content[start_idx:])
-        
-        if start_idx != -1 and end_match:
-            end_idx = start_idx + end_match.end()
-            extracted = content[start_idx:end_idx]
-            print(f"[DEBUG] Extracted {len(extracted)} characters")
-            return extracted
+    # Extract relevant portion (question type marker through "正确答案: X;")
+    span = first_question(content) if content else None
+    if span and not span.ambiguous:
+        extracted = span.text(content)
+        print(f"[DEBUG] Extracted {len(extracted)} characters")
+        return extracted, True
     
     print("[WARNING] Could not find expected content markers")
-    return content
+    return content, False
 
 def main():
     """
     Main automation loop
     """
+    args = parse_session_arguments("Extract questions from the Anki GUI (basic version)",
+                                   checkpoint=os.path.join(SCRIPT_DIR, '.anki_checkpoint_basic.json'))
+    limit = run_limit(args)
+    total = str(limit) if limit else "?"
+    checkpoint = Checkpoint(args.checkpoint)
+    resumed = checkpoint.load() if args.resume else None
+    if args.resume and not resumed:
+        print("[INFO] No unfinished session to resume, starting a new one")
+    
     print("=" * 50)
     print("Anki Content Extractor")
     print("=" * 50)
@@ -136,22 +148,39 @@ def main():
         print(f"[INFO] Starting in {i}...")
         time.sleep(1)
     
-    # Output file setup
-    output_dir = os.path.dirname(os.path.abspath(__file__))
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f"anki_content_{timestamp}.txt")
+    # Output file setup (or reopen the one from the interrupted session)
+    if resumed:
+        output_file = resumed['output_file']
+        start_item, written = resumed['attempted'], resumed['written']
+    else:
+        output_dir = os.path.dirname(os.path.abspath(__file__))
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"anki_content_{timestamp}.txt")
+        start_item, written = 0, 0
+        checkpoint.start(output_file)
+    seen = SeenIndex(None if args.no_seen_index else args.seen_index)
+    detector = ExhaustionDetector(args.patience)
     
     print(f"[INFO] Output file: {output_file}")
     
     successful_extractions = 0
     failed_extractions = 0
+    duplicate_extractions = 0
+    finished = False
+    i = start_item
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(f"Anki Content Extraction - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 80 + "\n\n")
+    with open(output_file, 'a' if resumed else 'w', encoding='utf-8') as f:
+        if resumed:
+            f.write(f"Resumed on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        else:
+            f.write(f"Anki Content Extraction - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("=" * 80 + "\n\n")
         
-        for i in range(100):
-            print(f"\n[INFO] Processing item {i+1}/100...")
+        while True:
+            if limit and i >= limit:
+                finished = True
+                break
+            print(f"\n[INFO] Processing item {i+1}/{total}...")
             
             try:
                 # Step 1: Click "显示答案" button
@@ -164,14 +193,27 @@ def main():
                 
                 # Step 2: Extract content
                 print("[DEBUG] Extracting content...")
-                content = extract_content_simple()
+                content, marked = extract_content_simple()
+                
+                if content and detector.observe(content):
+                    print(f"[INFO] Last {args.patience} items were all repeats, deck exhausted")
+                    finished = True
+                    break
                 
-                if content and len(content) > 10:  # Basic validation
+                # Only marker spans go through the seen index: it is shared with the advanced
+                # extractor, which hashes the same span, so a whole-clipboard hash would never match
+                if content and marked and content_hash(content) in seen:
+                    duplicate_extractions += 1
+                    print(f"[INFO] Item {i+1} was already exported, skipping")
+                elif content and len(content) > 10:  # Basic validation
                     # Step 3: Save to file
-                    f.write(f"Question {i+1}:\n")
+                    written += 1
+                    f.write(f"Question {written}:\n")
                     f.write(content)
                     f.write("\n\n" + "-" * 40 + "\n\n")
                     f.flush()  # Ensure data is written
+                    if marked:
+                        seen.add(content_hash(content))
                     successful_extractions += 1
                     print(f"[SUCCESS] Extracted content for item {i+1}")
                 else:
@@ -189,6 +231,9 @@ def main():
                     pyautogui.hotkey('ctrl', 'r')  # Refresh/reset
                     time.sleep(1)
                 
+            except (KeyboardInterrupt, pyautogui.FailSafeException):
+                print("\n[INFO] Stopped by user, continue later with --resume")
+                break
             except Exception as e:
                 print(f"[ERROR] Failed to process item {i+1}: {str(e)}")
                 failed_extractions += 1
@@ -199,18 +244,25 @@ def main():
             
             # Small delay between iterations
             time.sleep(0.5)
+            i += 1
+            checkpoint.update(attempted=i, written=written)
+        
+        seen.close()
+        checkpoint.update(attempted=i, written=written, finished=finished)
+        attempts = successful_extractions + failed_extractions + duplicate_extractions
         
         # Write summary
         f.write("\n\n" + "=" * 80 + "\n")
         f.write(f"Extraction Summary:\n")
-        f.write(f"Total attempts: 100\n")
+        f.write(f"Total attempts: {attempts}\n")
         f.write(f"Successful: {successful_extractions}\n")
         f.write(f"Failed: {failed_extractions}\n")
-        f.write(f"Success rate: {successful_extractions}%\n")
+        f.write(f"Already exported: {duplicate_extractions}\n")
+        f.write(f"Success rate: {(successful_extractions / attempts * 100 if attempts else 0):.1f}%\n")
     
     print("\n" + "=" * 50)
-    print(f"[INFO] Extraction completed!")
-    print(f"[INFO] Successful extractions: {successful_extractions}/100")
+    print(f"[INFO] Extraction {'completed' if finished else 'paused (continue with --resume)'}!")
+    print(f"[INFO] Successful extractions: {successful_extractions}/{attempts}")
     print(f"[INFO] Output saved to: {output_file}")
     print("=" * 50)
 
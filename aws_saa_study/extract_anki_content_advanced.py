@@ -11,13 +11,20 @@ import time
 import os
 import sys
 from datetime import datetime
-import re
+
+# The question marker scanner is shared with tools/format_aws_questions.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from marker_scanner import first_question
+from wait_engine import WaitEngine
+from extraction_pipeline import ExtractionPipeline, PipelineStopped, write_retry_file
+from extraction_session import Checkpoint, ExhaustionDetector, SeenIndex, parse_session_arguments, run_limit
 
 try:
     import pytesseract
     from PIL import Image
     import cv2
     import numpy as np
+    from button_locator import ButtonLocator, ocr_find_text
     OCR_AVAILABLE = True
 except ImportError:
     OCR_AVAILABLE = False
@@ -25,7 +32,15 @@ except ImportError:
 
 # Configure pyautogui settings
 pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.3
+pyautogui.PAUSE = 0.02  # Waits are driven by WaitEngine instead of a fixed pause
+
+# Timeouts (seconds) for each UI step; the steps usually finish far sooner
+SHOW_ANSWER_TIMEOUT = 3.0
+COPY_TIMEOUT = 2.0
+AGAIN_TIMEOUT = 3.0
+
+# Caches button boxes after the first OCR pass and re-finds them by template matching
+LOCATOR = ButtonLocator(gui=pyautogui) if OCR_AVAILABLE else None
 
 def take_screenshot_and_find_text(target_text, region=None):
     """
@@ -42,35 +57,20 @@ def take_screenshot_and_find_text(target_text, region=None):
         else:
             screenshot = pyautogui.screenshot()
         
-        # Convert to numpy array for OpenCV
-        screenshot_np = np.array(screenshot)
-        screenshot_cv = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2BGR)
-        
-        # Preprocess for better OCR
-        gray = cv2.cvtColor(screenshot_cv, cv2.COLOR_BGR2GRAY)
-        _, binary = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY)
-        
         # Use Tesseract OCR with Chinese language support
-        custom_config = r'--oem 3 --psm 11 -l chi_sim+eng'
-        text_data = pytesseract.image_to_data(binary, config=custom_config, output_type=pytesseract.Output.DICT)
-        
-        # Find the target text
-        for i, text in enumerate(text_data['text']):
-            if target_text in text:
-                x = text_data['left'][i]
-                y = text_data['top'][i]
-                w = text_data['width'][i]
-                h = text_data['height'][i]
-                
-                # Return center coordinates
-                center_x = x + w // 2
-                center_y = y + h // 2
-                
-                if region:
-                    center_x += region[0]
-                    center_y += region[1]
-                
-                return (center_x, center_y)
+        box = ocr_find_text(screenshot, target_text)
+        if box:
+            x, y, w, h = box
+            
+            # Return center coordinates
+            center_x = x + w // 2
+            center_y = y + h // 2
+            
+            if region:
+                center_x += region[0]
+                center_y += region[1]
+            
+            return (center_x, center_y)
                 
     except Exception as e:
         print(f"[ERROR] OCR failed: {str(e)}")
@@ -84,9 +84,13 @@ def click_button_by_position(button_text, use_ocr=True):
     """
     print(f"[DEBUG] Attempting to click button: {button_text}")
     
-    # Try OCR method first
+    # Try OCR method first (cached template match, full OCR only when needed)
     if use_ocr and OCR_AVAILABLE:
-        coords = take_screenshot_and_find_text(button_text)
+        try:
+            coords = LOCATOR.locate(button_text)
+        except Exception as e:
+            print(f"[ERROR] Button lookup failed: {str(e)}")
+            coords = None
         if coords:
             pyautogui.click(coords[0], coords[1])
             print(f"[DEBUG] Clicked {button_text} at {coords}")
@@ -98,8 +102,7 @@ def click_button_by_position(button_text, use_ocr=True):
         shortcuts = ['space', 'enter', 's']
         for shortcut in shortcuts:
             pyautogui.press(shortcut)
-            time.sleep(0.5)
-            # Check if answer is displayed (content changed)
+            # The caller waits for the answer to be displayed (screen change)
             return True
             
     elif button_text == "重来":
@@ -107,79 +110,58 @@ def click_button_by_position(button_text, use_ocr=True):
         shortcuts = ['1', 'r', 'a']
         for shortcut in shortcuts:
             pyautogui.press(shortcut)
-            time.sleep(0.5)
             return True
     
     return False
 
-def extract_content_with_markers():
-    """
-    Extract content between specific markers
-    """
-    # Select all and copy
+def select_all_and_copy():
     pyautogui.hotkey('ctrl', 'a')
-    time.sleep(0.3)
     pyautogui.hotkey('ctrl', 'c')
+
+def capture_window_text(engine=None):
+    """
+    Select all and copy, waiting until the clipboard actually changes
+    """
+    if engine:
+        return engine.copy_and_wait(select_all_and_copy, timeout=COPY_TIMEOUT, step='copy')
+    select_all_and_copy()
     time.sleep(0.3)
+    return pyperclip.paste()
+
+def extract_content_with_markers(engine=None):
+    """
+    Extract content between specific markers
+    """
+    return find_marked_content(capture_window_text(engine))[0]
+
+def find_marked_content(content):
+    """
+    Cut captured text down to the span between the question type marker and
+    the correct answer marker
+    Returns (extracted text or None, ambiguous) where ambiguous means only the
+    loose "正确答案" line fallback matched
+    """
+    span = first_question(content) if content else None
+    if span is None:
+        if content:
+            print("[WARNING] No question markers found")
+        return None, False
     
-    # Get clipboard content
-    content = pyperclip.paste()
-    
-    if not content:
-        return None
-    
-    # Look for question type markers
-    question_types = ["单选题", "多选题"]
-    start_idx = -1
-    question_type = None
-    
-    for qtype in question_types:
-        idx = content.find(qtype)
-        if idx != -1 and (start_idx == -1 or idx < start_idx):
-            start_idx = idx
-            question_type = qtype
-    
-    if start_idx == -1:
-        print("[WARNING] No question type marker found")
-        return None
-    
-    # Find end marker - correct answer pattern
-    # Matches patterns like "正确答案: A,B;" or "正确答案：C；"
-    end_patterns = [
-        r"正确答案[：:]\s*[A-Z](,[A-Z])*[;；]",
-        r"正确答案[：:]\s*[A-Z]\s*[;；]",
-        r"答案[：:]\s*[A-Z](,[A-Z])*[;；]"
-    ]
-    
-    end_idx = -1
-    for pattern in end_patterns:
-        match = re.search(pattern, content[start_idx:])
-        if match:
-            end_idx = start_idx + match.end()
-            break
-    
-    if end_idx == -1:
-        # Fallback: look for any line containing 正确答案
-        alt_idx = content.find("正确答案", start_idx)
-        if alt_idx != -1:
-            # Find the end of that line
-            newline_idx = content.find('\n', alt_idx)
-            if newline_idx != -1:
-                end_idx = newline_idx
-            else:
-                end_idx = len(content)
-    
-    if end_idx > start_idx:
-        extracted = content[start_idx:end_idx].strip()
-        print(f"[DEBUG] Extracted {question_type}: {len(extracted)} characters")
-        return extracted
-    
-    return None
+    extracted = span.text(content)
+    print(f"[DEBUG] Extracted {span.type}: {len(extracted)} characters")
+    return extracted, span.ambiguous
 
 def main():
     """
     Main automation loop with improved error handling
     """
+    args = parse_session_arguments("Extract questions from the Anki GUI")
+    limit = run_limit(args)
+    checkpoint = Checkpoint(args.checkpoint)
+    resumed = checkpoint.load() if args.resume else None
+    if args.resume and not resumed:
+        print("[WARNING] No unfinished session to resume, starting a new one")
+    
     print("=" * 60)
     print("Advanced Anki Content Extractor")
     print("=" * 60)
@@ -193,78 +175,112 @@ def main():
         print(f"[INFO] Starting in {i}...")
         time.sleep(1)
     
-    # Setup output file
-    output_dir = os.path.dirname(os.path.abspath(__file__))
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f"anki_extracted_{timestamp}.txt")
+    # Setup output file (or reopen the one from the interrupted session)
+    if resumed:
+        output_file = resumed['output_file']
+        start_attempt, start_number = resumed['attempted'], resumed['written']
+    else:
+        output_dir = os.path.dirname(os.path.abspath(__file__))
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"anki_extracted_{timestamp}.txt")
+        start_attempt, start_number = 0, 0
+        checkpoint.start(output_file)
+    total = str(limit) if limit else "?"
+    seen = SeenIndex(None if args.no_seen_index else args.seen_index)
+    detector = ExhaustionDetector(args.patience)
     
     print(f"[INFO] Output file: {output_file}")
+    print(f"[INFO] Cards: {limit or 'until exhausted'}, already exported in earlier runs: {len(seen)}")
+    if resumed:
+        print(f"[INFO] Resuming after {start_attempt} cards ({start_number} written)")
     print("=" * 60)
     
-    successful = 0
-    failed = 0
+    engine = WaitEngine(gui=pyautogui, clipboard=pyperclip)
+    
+    def show_answer():
+        if not click_button_by_position("显示答案", use_ocr=OCR_AVAILABLE):
+            print("[WARNING] Could not click 显示答案, trying space key...")
+            pyautogui.press('space')
+    
+    def again():
+        if not click_button_by_position("重来", use_ocr=OCR_AVAILABLE):
+            print("[WARNING] Could not click 重来, trying number key 1...")
+            pyautogui.press('1')  # Anki often uses 1 for "Again"
     
     # Open file with UTF-8 encoding
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(f"Anki Question Extraction\n")
-        f.write(f"Extracted on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 80 + "\n\n")
+    with open(output_file, 'a' if resumed else 'w', encoding='utf-8') as f:
+        if resumed:
+            f.write(f"Resumed on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        else:
+            f.write(f"Anki Question Extraction\n")
+            f.write(f"Extracted on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("=" * 80 + "\n\n")
+        
+        # Extraction, dedup and buffered writes run on a background worker
+        pipeline = ExtractionPipeline(f, find_marked_content, seen=seen, start_number=start_number).start()
+        attempted = 0
+        finished = False
+        i = start_attempt
         
-        for i in range(100):
-            print(f"\n[PROGRESS] Processing question {i+1}/100...")
+        while True:
+            if limit and i >= limit:
+                finished = True
+                break
+            print(f"\n[PROGRESS] Processing question {i+1}/{total}...")
             
             try:
-                # Step 1: Click "显示答案"
-                if click_button_by_position("显示答案", use_ocr=OCR_AVAILABLE):
-                    time.sleep(1)  # Wait for answer to display
-                else:
-                    print("[WARNING] Could not click 显示答案, trying space key...")
-                    pyautogui.press('space')
-                    time.sleep(1)
+                # Step 1: Click "显示答案" and wait for the answer to display
+                if not engine.act_and_wait_for_screen(show_answer, timeout=SHOW_ANSWER_TIMEOUT, step='show_answer'):
+                    print("[WARNING] Screen did not change after 显示答案")
                 
-                # Step 2: Extract content
-                content = extract_content_with_markers()
+                # Step 2: Capture raw text; the worker extracts and writes it
+                capture_start = time.perf_counter()
+                raw = capture_window_text(engine)
+                pipeline.submit(i + 1, raw, time.perf_counter() - capture_start)
+                attempted += 1
+                print(f"[CAPTURED] Question {i+1}: {len(raw or '')} characters")
+                if raw and detector.observe(raw):
+                    print(f"\n[INFO] Last {args.patience} cards were all repeats, deck exhausted")
+                    finished = True
+                    break
                 
-                if content:
-                    # Write to file
-                    f.write(f"【Question {i+1}】\n")
-                    f.write(content)
-                    f.write("\n\n" + "-" * 60 + "\n\n")
-                    f.flush()
-                    
-                    successful += 1
-                    print(f"[SUCCESS] Extracted question {i+1}")
-                    
-                    # Show preview of extracted content
-                    preview = content[:100] + "..." if len(content) > 100 else content
-                    print(f"[PREVIEW] {preview}")
-                else:
-                    failed += 1
-                    print(f"[FAILED] No content extracted for question {i+1}")
-                
-                # Step 3: Click "重来"
-                if click_button_by_position("重来", use_ocr=OCR_AVAILABLE):
-                    time.sleep(0.5)
-                else:
-                    print("[WARNING] Could not click 重来, trying number key 1...")
-                    pyautogui.press('1')  # Anki often uses 1 for "Again"
-                    time.sleep(0.5)
+                # Step 3: Click "重来" and wait for the next card
+                if not engine.act_and_wait_for_screen(again, timeout=AGAIN_TIMEOUT, step='again'):
+                    print("[WARNING] Screen did not change after 重来")
                 
             except pyautogui.FailSafeException:
                 print("\n[INFO] User stopped the script (mouse in corner)")
                 break
+            except KeyboardInterrupt:
+                # Stop capturing but still let the worker write what it has
+                print("\n[INFO] Script interrupted by user")
+                break
+            except PipelineStopped as e:
+                # Nothing more can be written; close() below raises the worker's error
+                print(f"\n[ERROR] {e}")
+                break
             except Exception as e:
                 print(f"[ERROR] Failed on question {i+1}: {str(e)}")
-                failed += 1
+                pipeline.retries.append((i + 1, f"error: {e}", None))
                 
                 # Try to recover
                 pyautogui.press('escape')
                 time.sleep(0.5)
             
+            i += 1
+            checkpoint.update(attempted=i, written=pipeline.flushed)
+            
             # Progress indicator every 10 questions
-            if (i + 1) % 10 == 0:
-                print(f"\n[MILESTONE] Completed {i+1}/100 questions")
-                print(f"[STATS] Success: {successful}, Failed: {failed}")
+            if i % 10 == 0:
+                print(f"\n[MILESTONE] Completed {i}/{total} questions")
+                print(pipeline.report())
+                print(engine.recorder.report())
+        
+        pipeline.close()
+        seen.close()
+        checkpoint.update(attempted=i, written=pipeline.flushed, finished=finished)
+        successful = pipeline.written
+        failed = len(pipeline.retries)
         
         # Write summary
         summary = f"""
@@ -272,16 +288,27 @@ def main():
 {'=' * 80}
 EXTRACTION SUMMARY
 {'=' * 80}
-Total Questions Attempted: {successful + failed}
+{'Session Finished' if finished else 'Session Paused (continue with --resume)'}
+Total Questions Attempted: {attempted}
 Successfully Extracted: {successful}
-Failed Extractions: {failed}
-Success Rate: {(successful/(successful+failed)*100 if (successful+failed)>0 else 0):.1f}%
+Duplicates Skipped: {pipeline.duplicates}
+Failed / Needs Retry: {failed}
+Success Rate: {(successful/attempted*100 if attempted>0 else 0):.1f}%
+{'=' * 80}
+Step Latency:
+{engine.recorder.report()}
+Stage Throughput:
+{pipeline.report()}
 {'=' * 80}
 """
         f.write(summary)
         print(summary)
     
     print(f"\n[COMPLETE] Results saved to: {output_file}")
+    if pipeline.retries:
+        retry_file = output_file.replace('.txt', '_retry.txt')
+        write_retry_file(retry_file, pipeline.retries)
+        print(f"[INFO] {len(pipeline.retries)} captures saved for review to: {retry_file}")
     
     # Update scratchpad
     update_scratchpad(successful, failed)
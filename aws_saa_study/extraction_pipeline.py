@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extraction Pipeline
+Producer/consumer stage for the Anki extractors: the UI thread only captures raw
+clipboard text, while a background worker does marker extraction, dedup and
+batched buffered writes
+"""
+
+import hashlib
+import queue
+import threading
+import time
+
+# Sentinel that tells the worker to drain and stop
+_STOP = object()
+# How long submit waits on a full queue before checking that the worker is still alive
+PUT_TIMEOUT = 0.5
+
+
+class PipelineStopped(RuntimeError):
+    """Raised by submit when the worker thread is no longer running (its exception is the cause)"""
+
+
+class StageStats:
+    """Item count and busy time of one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, seconds, items=1):
+        self.items += items
+        self.seconds += seconds
+
+    def __str__(self):
+        rate = self.items / self.seconds if self.seconds else 0.0
+        avg_ms = self.seconds / self.items * 1000 if self.items else 0.0
+        return f"{self.name}: {self.items} items, {self.seconds:.2f}s busy, {avg_ms:.1f}ms/item, {rate:.1f} items/s"
+
+
+def content_hash(text):
+    """Whitespace-insensitive hash used to detect duplicate cards"""
+    return hashlib.sha1(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def format_record(number, content):
+    """One card in the extraction file layout"""
+    return f"【Question {number}】\n{content}\n\n" + "-" * 60 + "\n\n"
+
+
+class ExtractionPipeline:
+    """
+    Background worker that turns raw captures into extraction records
+
+    extract(raw) must return (content, ambiguous). Captures where content is None
+    or ambiguous is True are kept in `retries` (with the raw text) instead of
+    being written. Writes are buffered and flushed every `batch_size` records or
+    `flush_interval` seconds, whichever comes first
+    """
+
+    def __init__(self, output, extract, batch_size=20, flush_interval=2.0, max_queue=100, seen=None,
+                 start_number=0):
+        """
+        output: writable text file object
+        extract: callable(raw) -> (content or None, ambiguous)
+        seen: optional set-like of content hashes that should be treated as
+            duplicates; hashes are added to it only after their record is flushed,
+            so a persistent index never gets ahead of the output file
+        start_number: number of records already in the output (when resuming)
+        """
+        self.output = output
+        self.extract = extract
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.seen = seen if seen is not None else set()
+        self._pending_hashes = set()  # hashes of records not flushed yet
+        self.retries = []  # [(capture index, reason, raw text)]
+        self.number = start_number  # last record number used in the output
+        self.flushed = start_number  # records safely written to the output
+        self.written = 0
+        self.duplicates = 0
+        self.stats = {name: StageStats(name) for name in ('capture', 'extract', 'write')}
+        self._thread = threading.Thread(target=self._run, name='extraction-writer', daemon=True)
+        self._error = None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, index, raw, capture_seconds=0.0):
+        """Hand a raw capture to the worker (called from the UI thread)"""
+        self.stats['capture'].add(capture_seconds)
+        self._put((index, raw))
+
+    def close(self):
+        """Drain the queue, flush the last batch and stop the worker"""
+        try:
+            self._put(_STOP)
+        except PipelineStopped:
+            pass  # the worker already exited, its error is raised below
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+    def _put(self, item):
+        """
+        Queue an item without blocking forever: a full queue is only drained by the
+        worker, so if it died the put is abandoned and PipelineStopped is raised
+        """
+        while True:
+            if self._error is not None:
+                raise PipelineStopped(f"Extraction worker failed: {self._error}") from self._error
+            if not self._thread.is_alive():
+                raise PipelineStopped("Extraction worker is not running")
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        pending = []
+        last_flush = time.perf_counter()
+        try:
+            while True:
+                timeout = max(0.0, self.flush_interval - (time.perf_counter() - last_flush))
+                try:
+                    item = self.queue.get(timeout=timeout if pending else None)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    break
+                if item is not None:
+                    record = self._process(*item)
+                    if record:
+                        pending.append(record)
+                if pending and (len(pending) >= self.batch_size or
+                                time.perf_counter() - last_flush >= self.flush_interval):
+                    self._flush(pending)
+                    pending = []
+                    last_flush = time.perf_counter()
+            if pending:
+                self._flush(pending)
+        except Exception as e:
+            self._error = e
+
+    def _process(self, index, raw):
+        start = time.perf_counter()
+        content, ambiguous = self.extract(raw) if raw else (None, False)
+        self.stats['extract'].add(time.perf_counter() - start)
+
+        if content is None:
+            self.retries.append((index, 'no markers found' if raw else 'empty capture', raw))
+            print(f"[FAILED] No content extracted for capture {index}")
+            return None
+        if ambiguous:
+            self.retries.append((index, 'answer marker ambiguous', raw))
+            print(f"[RETRY] Capture {index} needs review (answer marker ambiguous)")
+            return None
+
+        digest = content_hash(content)
+        if digest in self.seen or digest in self._pending_hashes:
+            self.duplicates += 1
+            print(f"[SKIP] Capture {index} is a duplicate")
+            return None
+        self._pending_hashes.add(digest)
+        self.written += 1
+        self.number += 1
+        return digest, format_record(self.number, content)
+
+    def _flush(self, records):
+        start = time.perf_counter()
+        self.output.write(''.join(text for _, text in records))
+        self.output.flush()
+        for digest, _ in records:
+            self.seen.add(digest)
+            self._pending_hashes.discard(digest)
+        self.flushed += len(records)
+        self.stats['write'].add(time.perf_counter() - start, len(records))
+
+    def report(self):
+        """Per-stage throughput report"""
+        lines = [f"[STATS] {stage}" for stage in self.stats.values()]
+        lines.append(f"[STATS] written={self.written} duplicates={self.duplicates} retries={len(self.retries)}")
+        return '\n'.join(lines)
+
+
+def write_retry_file(path, retries):
+    """Save failed or ambiguous captures with their raw text for manual review"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for index, reason, raw in retries:
+            f.write(f"【Capture {index}】 {reason}\n{raw or ''}\n\n" + "-" * 60 + "\n\n")
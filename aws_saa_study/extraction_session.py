@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extraction Session
+Run length, resume and cross-run dedup shared by both Anki extractors
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+from extraction_pipeline import content_hash
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEEN_INDEX = os.path.join(SCRIPT_DIR, '.anki_seen_hashes')
+DEFAULT_CHECKPOINT = os.path.join(SCRIPT_DIR, '.anki_checkpoint.json')
+DEFAULT_COUNT = 100
+DEFAULT_PATIENCE = 10
+
+
+def add_session_arguments(parser, checkpoint=DEFAULT_CHECKPOINT):
+    """Add the shared run-length / resume / dedup options to an argparse parser"""
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT,
+                        help=f'Cards to process (default: {DEFAULT_COUNT}); 0 means run until exhausted')
+    parser.add_argument('--until-exhausted', action='store_true',
+                        help='Keep going until cards start repeating (same as --count 0)')
+    parser.add_argument('--patience', type=int, default=DEFAULT_PATIENCE,
+                        help=f'Consecutive repeated cards that mean the deck is exhausted (default: {DEFAULT_PATIENCE})')
+    parser.add_argument('--resume', action='store_true', help='Continue the last unfinished session')
+    parser.add_argument('--checkpoint', default=checkpoint, help='Session checkpoint file used by --resume')
+    parser.add_argument('--seen-index', default=DEFAULT_SEEN_INDEX,
+                        help='File of content hashes already exported; those cards are skipped')
+    parser.add_argument('--no-seen-index', action='store_true', help='Do not skip cards exported in earlier runs')
+    return parser
+
+
+def parse_session_arguments(description, checkpoint=DEFAULT_CHECKPOINT):
+    return add_session_arguments(argparse.ArgumentParser(description=description), checkpoint).parse_args()
+
+
+class SeenIndex:
+    """
+    Append-only file of content hashes exported in earlier runs.
+    Supports `in` and add() so it can stand in for a set
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.hashes = {line.strip() for line in f if line.strip()}
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    def __contains__(self, digest):
+        return digest in self.hashes
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, digest):
+        if digest in self.hashes:
+            return
+        self.hashes.add(digest)
+        if self._file:
+            self._file.write(digest + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class ExhaustionDetector:
+    """
+    Detects that the review cycle has wrapped around: once `patience`
+    consecutive captures were already captured earlier in this session,
+    every card has been seen
+    """
+
+    def __init__(self, patience=DEFAULT_PATIENCE):
+        self.patience = patience
+        self.seen = set()
+        self.streak = 0
+
+    def observe(self, text):
+        """Record a capture; returns True when the deck looks exhausted"""
+        digest = content_hash(text or '')
+        if digest in self.seen:
+            self.streak += 1
+        else:
+            self.seen.add(digest)
+            self.streak = 0
+        return self.streak >= self.patience
+
+
+class Checkpoint:
+    """
+    Small JSON file recording the current session so an interrupted run can resume:
+    output file, cards attempted, records written and whether the run finished
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT):
+        self.path = path
+        self.state = {}
+
+    def load(self):
+        """Return the last unfinished session, or None"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('finished') or not os.path.exists(state.get('output_file', '')):
+            return None
+        self.state = state
+        return state
+
+    def start(self, output_file, attempted=0, written=0):
+        self.state = {'output_file': output_file, 'attempted': attempted, 'written': written,
+                      'finished': False, 'updated': None}
+        self.save()
+
+    def update(self, **values):
+        self.state.update(values)
+        self.save()
+
+    def save(self):
+        self.state['updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)  # never leave a half-written checkpoint
+
+
+def run_limit(args):
+    """Number of cards to attempt, or None to run until exhausted"""
+    return None if args.until_exhausted or args.count <= 0 else args.count
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Anki Fixture Generator
+Builds a small Anki collection (legacy schema 11, as written by "Support older
+Anki versions" exports) so the collection reader can be exercised without Anki
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+
+from anki_deck_writer import FIELD_SEPARATOR, SCHEMA, SCHEMA_VERSION, checksum
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'temp',
+                              'AWS Certified Solutions Architect - Associate SAA-C03.txt')
+
+
+def load_source_notes(path):
+    """Read (front, back) pairs from an Anki plain-text export"""
+    notes = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            front, _, back = line.rstrip('\n').partition('\t')
+            notes.append((front, back))
+    return notes
+
+
+def to_html(text):
+    """Wrap plain text the way the Anki editor stores it, so HTML stripping is exercised"""
+    escaped = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return '<div>' + escaped.replace('   ', '</div><div>').replace('  ', '&nbsp; ') + '</div>'
+
+
+def build_collection(path, pairs, deck_name='AWS SAA-C03'):
+    """Write a collection.anki2 file containing one Basic note (and card) per pair"""
+    if os.path.exists(path):
+        os.remove(path)
+    now = int(time.time())
+    model_id, deck_id = 1342697561419, 1
+    models = {str(model_id): {
+        'id': model_id, 'name': 'Basic', 'type': 0, 'mod': now, 'usn': -1, 'sortf': 0, 'did': deck_id,
+        'flds': [{'name': 'Front', 'ord': 0}, {'name': 'Back', 'ord': 1}],
+        'tmpls': [{'name': 'Card 1', 'ord': 0, 'qfmt': '{{Front}}',
+                   'afmt': '{{FrontSide}}<hr id=answer>{{Back}}'}],
+    }}
+    decks = {str(deck_id): {'id': deck_id, 'name': deck_name, 'mod': now, 'usn': -1}}
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO col VALUES (1, ?, ?, ?, ?, 0, 0, 0, '{}', ?, ?, '{}', '{}')",
+                     (now, now * 1000, now * 1000, SCHEMA_VERSION, json.dumps(models), json.dumps(decks)))
+        base_id = now * 1000
+        notes, cards = [], []
+        for i, (front, back) in enumerate(pairs):
+            note_id = base_id + i
+            fields = [to_html(front), to_html(back)]
+            notes.append((note_id, f"fixture{i}", model_id, now, -1, ' aws saa ', FIELD_SEPARATOR.join(fields),
+                          front[:64], checksum(front), 0, ''))
+            cards.append((note_id, note_id, deck_id, 0, now, -1, 0, 0, i, 0, 0, 0, 0, 0, 0, 0, 0, ''))
+        conn.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", notes)
+        conn.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", cards)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def build_apkg(path, pairs, deck_name='AWS SAA-C03'):
+    """Write an .apkg package holding a collection.anki2 and an empty media map"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = os.path.join(tmp_dir, 'collection.anki2')
+        build_collection(collection, pairs, deck_name)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.write(collection, 'collection.anki2')
+            package.writestr('media', '{}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate an Anki collection fixture from the text export')
+    parser.add_argument('output', help='Output path; .apkg creates a package, anything else a bare collection')
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help='Anki plain-text export to build notes from')
+    parser.add_argument('--count', type=int, help='Number of notes (source notes are repeated as needed)')
+    args = parser.parse_args()
+
+    pairs = load_source_notes(args.source)
+    if not pairs:
+        print(f"[ERROR] No notes found in {args.source}")
+        sys.exit(1)
+    count = args.count or len(pairs)
+    pairs = [pairs[i % len(pairs)] for i in range(count)]
+
+    if args.output.endswith('.apkg'):
+        build_apkg(args.output, pairs)
+    else:
+        build_collection(args.output, pairs)
+    print(f"[INFO] Wrote {count} notes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
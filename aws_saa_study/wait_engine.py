@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Wait Engine
+Replaces fixed sleeps in the Anki GUI automation with polling for a state change
+(clipboard content hash or a downscaled screen-region checksum), and records
+per-step latency histograms
+"""
+
+import hashlib
+import math
+import time
+
+# Histogram bucket upper bounds in milliseconds
+HISTOGRAM_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class WaitTimeout(Exception):
+    """Raised by WaitEngine.wait_for_change when the state does not change in time"""
+
+
+class LatencyRecorder:
+    """
+    Collects step durations and summarizes them as bucketed histograms
+    """
+
+    def __init__(self, buckets_ms=None):
+        self.buckets_ms = buckets_ms or HISTOGRAM_BUCKETS_MS
+        self.samples = {}
+        self.timeouts = {}
+
+    def record(self, step, seconds, timed_out=False):
+        self.samples.setdefault(step, []).append(seconds)
+        if timed_out:
+            self.timeouts[step] = self.timeouts.get(step, 0) + 1
+
+    def histogram(self, step):
+        """Return [(label, count), ...] for one step"""
+        counts = [0] * (len(self.buckets_ms) + 1)
+        for seconds in self.samples.get(step, []):
+            ms = seconds * 1000
+            index = next((i for i, bound in enumerate(self.buckets_ms) if ms <= bound), len(self.buckets_ms))
+            counts[index] += 1
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return list(zip(labels, counts))
+
+    def summary(self, step):
+        """Return count, mean, p50, p95 and max in milliseconds for one step"""
+        values = sorted(self.samples.get(step, []))
+        if not values:
+            return {'count': 0}
+
+        def percentile(p):
+            return values[min(len(values) - 1, math.ceil(p * len(values)) - 1)] * 1000
+
+        return {
+            'count': len(values),
+            'mean_ms': round(sum(values) / len(values) * 1000, 1),
+            'p50_ms': round(percentile(0.50), 1),
+            'p95_ms': round(percentile(0.95), 1),
+            'max_ms': round(values[-1] * 1000, 1),
+            'timeouts': self.timeouts.get(step, 0),
+        }
+
+    def report(self):
+        """Format a text report of every recorded step"""
+        lines = []
+        for step in self.samples:
+            stats = self.summary(step)
+            lines.append(f"[STATS] {step}: n={stats['count']} mean={stats['mean_ms']}ms p50={stats['p50_ms']}ms "
+                         f"p95={stats['p95_ms']}ms max={stats['max_ms']}ms timeouts={stats['timeouts']}")
+            bars = '  '.join(f"{label}:{count}" for label, count in self.histogram(step) if count)
+            lines.append(f"        {bars}")
+        return '\n'.join(lines)
+
+
+class WaitEngine:
+    """
+    Polls a probe until its value differs from a baseline
+
+    The GUI, clipboard, clock and sleep functions are injectable so the engine
+    can run against fakes without a display
+    """
+
+    def __init__(self, gui=None, clipboard=None, clock=time.monotonic, sleep=time.sleep,
+                 min_interval=0.01, max_interval=0.2, backoff=1.5, recorder=None):
+        """
+        gui: object with screenshot(region=...) (pyautogui by default)
+        clipboard: object with copy() and paste() (pyperclip by default)
+        min_interval / max_interval: polling interval bounds in seconds; the
+            interval starts small and grows by backoff while nothing changes
+        """
+        if gui is None:
+            import pyautogui as gui
+        if clipboard is None:
+            import pyperclip as clipboard
+        self.gui = gui
+        self.clipboard = clipboard
+        self.clock = clock
+        self.sleep = sleep
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.recorder = recorder or LatencyRecorder()
+
+    # ----- probes -----
+
+    def clipboard_hash(self):
+        """Hash of the current clipboard text"""
+        return hashlib.md5((self.clipboard.paste() or '').encode('utf-8')).hexdigest()
+
+    def screen_checksum(self, region=None, scale=8):
+        """
+        Checksum of a screen region downscaled by `scale` in each direction,
+        cheap enough to poll every few milliseconds
+        """
+        screenshot = self.gui.screenshot(region=region) if region else self.gui.screenshot()
+        if scale > 1 and hasattr(screenshot, 'reduce'):
+            screenshot = screenshot.convert('L').reduce(scale)
+        data = screenshot.tobytes() if hasattr(screenshot, 'tobytes') else bytes(screenshot)
+        return hashlib.md5(data).hexdigest()
+
+    # ----- waiting -----
+
+    def wait_for_change(self, probe, baseline, timeout=3.0, step=None, raise_on_timeout=False, stable_polls=1):
+        """
+        Poll probe() until it returns something other than baseline
+
+        With stable_polls > 1 the new value must also come back unchanged that many
+        polls in a row, so a screen that is still redrawing is not taken as settled.
+
+        Returns the new value, or None on timeout (WaitTimeout is raised instead
+        when raise_on_timeout is set). The elapsed time is recorded under `step`
+        """
+        start = self.clock()
+        interval = self.min_interval
+        last, streak = baseline, 0
+        while True:
+            value = probe()
+            elapsed = self.clock() - start
+            if value != baseline:
+                if value == last:
+                    streak += 1
+                else:
+                    last, streak = value, 1
+                    interval = self.min_interval  # poll quickly while the new value settles
+                if streak >= stable_polls:
+                    if step:
+                        self.recorder.record(step, elapsed)
+                    return value
+            else:
+                last, streak = baseline, 0
+            if elapsed >= timeout:
+                if step:
+                    self.recorder.record(step, elapsed, timed_out=True)
+                if raise_on_timeout:
+                    raise WaitTimeout(f"{step or 'wait'} did not change within {timeout}s")
+                return None
+            self.sleep(min(interval, max(0.0, timeout - elapsed)))
+            interval = min(self.max_interval, interval * self.backoff)
+
+    def act_and_wait_for_screen(self, action, region=None, timeout=3.0, step=None, stable_polls=1):
+        """Run action() and wait until the screen region changes. Returns True if it changed"""
+        baseline = self.screen_checksum(region)
+        action()
+        return self.wait_for_change(lambda: self.screen_checksum(region), baseline, timeout, step,
+                                    stable_polls=stable_polls) is not None
+
+    def copy_and_wait(self, copy_action, timeout=2.0, step='copy'):
+        """
+        Clear the clipboard, run copy_action() and wait until new text arrives.
+        Returns the clipboard text, or None if nothing was copied in time
+        """
+        self.clipboard.copy('')
+        empty = self.clipboard_hash()
+        copy_action()
+        if self.wait_for_change(self.clipboard_hash, empty, timeout, step) is None:
+            return None
+        return self.clipboard.paste()
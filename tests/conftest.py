@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The scripts import their siblings by bare name, as they do when run from their own directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('tools', os.path.join('tools', 'bench'), 'aws_saa_study'):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,49 @@
+import json
+import os
+import re
+
+import pytest
+
+from anki_collection_reader import export_collection, iter_notes, open_collection
+from make_anki_fixture import build_apkg, build_collection, load_source_notes
+
+SOURCE = os.path.join(os.path.dirname(__file__), 'fixtures', 'saa_c03_notes.txt')
+
+
+def plain(text):
+    """What the reader should give back for a field the fixture wrote with to_html()."""
+    lines = [line.strip() for line in text.split('   ')]
+    return re.sub(r'\n\s*\n+', '\n', '\n'.join(lines)).strip()
+
+
+@pytest.fixture
+def pairs():
+    return load_source_notes(SOURCE) + [('单选题：Which tier fits <archives> & backups?  Keep  spacing', 'B')]
+
+
+@pytest.mark.parametrize('name', ['collection.anki2', 'deck.apkg'])
+def test_fixture_notes_read_back(tmp_path, pairs, name):
+    path = str(tmp_path / name)
+    (build_apkg if name.endswith('.apkg') else build_collection)(path, pairs)
+
+    with open_collection(path) as conn:
+        notes = list(iter_notes(conn))
+    assert len(notes) == len(pairs) == 4
+    for i, (note, (front, back)) in enumerate(zip(notes, pairs)):
+        assert note['guid'] == f"fixture{i}"
+        assert note['deck'] == 'AWS SAA-C03' and note['note_type'] == 'Basic'
+        assert note['tags'] == ['aws', 'saa']
+        assert note['fields'] == {'Front': plain(front), 'Back': plain(back)}
+    assert notes[3]['fields']['Front'] == '单选题：Which tier fits <archives> & backups?  Keep  spacing'
+    # Content is the back side cut to the question type marker and the answer line
+    assert notes[0]['content'].startswith('单选题：') and re.search(r'正确答案：\s*$', notes[0]['content'])
+
+
+def test_export_jsonl_and_deck_filter(tmp_path, pairs):
+    path = str(tmp_path / 'deck.apkg')
+    build_apkg(path, pairs)
+    output = tmp_path / 'notes.jsonl'
+    assert export_collection(path, str(output), fmt='jsonl') == 4
+    rows = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [row['guid'] for row in rows] == [f"fixture{i}" for i in range(4)]
+    assert export_collection(path, str(tmp_path / 'none.txt'), deck='Other deck') == 0
@@ -0,0 +1,85 @@
+import sqlite3
+import zipfile
+
+from anki_collection_reader import iter_notes, open_collection
+from anki_deck_writer import load_enrichments, note_guid, write_apkg
+
+
+def make_record(number, stem, answer='A'):
+    return {'number': number, 'type': '单选题', 'question': stem,
+            'options': ['Amazon S3', 'Amazon EBS', 'Amazon EFS'], 'answer': answer}
+
+
+def read_notes(path):
+    with open_collection(path) as conn:
+        return list(iter_notes(conn))
+
+
+def read_cards(path):
+    with open_collection(path) as conn:
+        return {guid: row for guid, *row in conn.execute(
+            "SELECT n.guid, c.id, c.type, c.queue, c.due, c.ivl, c.factor, c.reps, c.lapses "
+            "FROM cards c JOIN notes n ON n.id = c.nid")}
+
+
+def test_round_trip_through_reader(tmp_path):
+    path = str(tmp_path / 'deck.apkg')
+    records = [make_record(1, 'Which service stores objects?'),
+               make_record(2, 'Which service is block storage?', 'B')]
+    records[0]['explanation'] = 'S3 is object storage.'
+    records[0]['tags'] = ['S3', 'storage class']
+    records[1]['review'] = 'option boundaries guessed'
+
+    assert write_apkg(path, records) == {'added': 2, 'updated': 0, 'unchanged': 0}
+
+    notes = read_notes(path)
+    assert [note['guid'] for note in notes] == [note_guid(r) for r in records]
+    first = notes[0]
+    assert first['deck'] == 'AWS SAA-C03'
+    assert first['fields']['Front'] == '单选题：Which service stores objects?\nAmazon S3\nAmazon EBS\nAmazon EFS'
+    assert first['fields']['Answer'] == '答案: A;'
+    assert first['fields']['Explanation'] == 'S3 is object storage.'
+    assert first['tags'] == ['aws', 'saa', 'S3', 'storage_class']
+    assert notes[1]['fields']['Answer'] == '答案: B;'
+    assert notes[1]['tags'] == ['aws', 'saa', 'needs_review']
+
+
+def test_update_by_guid_keeps_scheduling(tmp_path):
+    path = str(tmp_path / 'deck.apkg')
+    records = [make_record(1, 'Which service stores objects?'),
+               make_record(2, 'Which service is block storage?', 'B')]
+    write_apkg(path, records)
+
+    # Pretend the first card has been reviewed in Anki
+    collection = tmp_path / 'collection.anki2'
+    with zipfile.ZipFile(path) as package:
+        collection.write_bytes(package.read('collection.anki2'))
+    conn = sqlite3.connect(str(collection))
+    with conn:
+        conn.execute("UPDATE cards SET type = 2, queue = 2, due = 400, ivl = 12, factor = 2350, reps = 5, lapses = 1 "
+                     "WHERE nid = (SELECT id FROM notes WHERE guid = ?)", (note_guid(records[0]),))
+    conn.close()
+    with zipfile.ZipFile(path, 'w') as package:
+        package.write(collection, 'collection.anki2')
+    before = read_cards(path)
+
+    # Corrected answer, renumbered records and one new question
+    changed = [make_record(1, 'Which service is block storage?', 'B'),
+               make_record(2, 'Which service stores objects?', 'C'),
+               make_record(3, 'Which service is a shared file system?', 'C')]
+    assert write_apkg(path, changed) == {'added': 1, 'updated': 1, 'unchanged': 1}
+
+    after = read_cards(path)
+    assert len(after) == 3
+    for guid, card in before.items():
+        assert after[guid] == card
+    notes = {note['guid']: note for note in read_notes(path)}
+    assert notes[note_guid(changed[1])]['fields']['Answer'] == '答案: C;'
+
+
+def test_enrichments_join_by_question_key(tmp_path):
+    enriched = tmp_path / 'enriched.jsonl'
+    enriched.write_text('{"key": "abc", "number": 7, "explanation": "x", "tags": []}\n'
+                        '{"number": 8, "explanation": "no key"}\n'
+                        '{"key": "def", "num', encoding='utf-8')
+    assert list(load_enrichments(str(enriched))) == ['abc']
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from corpus_store import CorpusStore
+
+URLS = [f"https://docs.aws.amazon.com/guide/{i}" for i in range(5)]
+
+
+def make_store(path, **options):
+    return CorpusStore(str(path), codec='zlib', **options)
+
+
+def fill(store):
+    for i, url in enumerate(URLS):
+        store.add(url, f"text {i} " * 50, html=f"<p>{i}</p>", fetched_at=1000.0 + i)
+
+
+def texts(store):
+    return {record['url']: record['text'] for record in store.iter_records()}
+
+
+def test_half_written_frame_is_truncated_before_appending(tmp_path):
+    with make_store(tmp_path) as store:
+        fill(store)
+        segment = store._segment_path(store.segment_ids()[-1])
+    with open(segment, 'ab') as f:
+        f.write(b'\x40\x00\x00\x00partial')  # crashed after writing part of a frame, before the index
+
+    with make_store(tmp_path) as store:
+        assert len(list(store.iter_records(latest_only=False))) == 5
+        store.add('https://docs.aws.amazon.com/guide/new', 'new text')
+        assert store.get('https://docs.aws.amazon.com/guide/new')['text'] == 'new text'
+        # Frames stay contiguous, so a sequential scan reaches the new record
+        assert len(list(store.iter_records(latest_only=False))) == 6
+        assert len(store.segment_ids()) == 1
+
+
+def test_half_written_index_line_does_not_swallow_the_next_entry(tmp_path):
+    with make_store(tmp_path) as store:
+        fill(store)
+    with open(tmp_path / 'index.jsonl', 'a', encoding='utf-8') as f:
+        f.write('{"url": "https://docs.aws.amazon.com/guide/lost", "seg')
+
+    with make_store(tmp_path) as store:
+        store.add('https://docs.aws.amazon.com/guide/new', 'new text')
+    with make_store(tmp_path) as store:
+        assert 'https://docs.aws.amazon.com/guide/new' in store and len(store) == 6
+
+
+def test_overwrite_and_delete_markers_survive_reopen(tmp_path):
+    with make_store(tmp_path) as store:
+        fill(store)
+        store.add(URLS[1], 'updated text', fetched_at=2000.0)
+        assert store.delete(URLS[2]) and not store.delete(URLS[2])
+    with make_store(tmp_path) as store:
+        assert URLS[2] not in store and store.get(URLS[2]) is None
+        assert store.get(URLS[1])['text'] == 'updated text'
+        assert list(texts(store)) == [URLS[0], URLS[3], URLS[4], URLS[1]]  # write order
+        assert len(list(store.iter_records(latest_only=False))) == 6
+
+
+def test_compact_drops_old_records_and_reopens(tmp_path):
+    with make_store(tmp_path, max_segment_bytes=400) as store:
+        fill(store)
+        store.add(URLS[1], 'updated text')
+        store.delete(URLS[2])
+        before = texts(store)
+        result = store.compact()
+        assert result['records'] == 4 and result['segments_before'] > 1
+        assert result['bytes_after'] < result['bytes_before']
+        assert texts(store) == before
+        assert len(list(store.iter_records(latest_only=False))) == 4
+    assert not os.path.exists(tmp_path / 'index.jsonl.tmp')
+
+    with make_store(tmp_path) as store:
+        assert texts(store) == before
+        store.add(URLS[2], 'added again')
+        assert store.get(URLS[2])['text'] == 'added again'
+    with make_store(tmp_path) as store:
+        assert len(store) == 5 and store.get(URLS[0])['text'] == before[URLS[0]]
+
+
+def test_failed_compact_rolls_back(tmp_path, monkeypatch):
+    with make_store(tmp_path, max_segment_bytes=400) as store:
+        fill(store)
+        store.delete(URLS[0])
+        before, segments = texts(store), store.segment_ids()
+        write = store._write
+        calls = []
+
+        def failing_write(record):
+            calls.append(record['url'])
+            if len(calls) == 3:
+                raise OSError('disk full')
+            return write(record)
+
+        monkeypatch.setattr(store, '_write', failing_write)
+        with pytest.raises(OSError):
+            store.compact()
+        monkeypatch.undo()
+
+        assert store.segment_ids() == segments  # the new segments are removed
+        assert not os.path.exists(tmp_path / 'index.jsonl.tmp')
+        assert texts(store) == before and URLS[0] not in store
+        store.add(URLS[0], 'written after the rollback')
+        assert store.compact()['records'] == 5
+
+    with make_store(tmp_path) as store:
+        assert store.get(URLS[0])['text'] == 'written after the rollback' and len(store) == 5
@@ -0,0 +1,89 @@
+import json
+import re
+
+import pytest
+
+from enrich_questions import run_pipeline
+from format_aws_questions import question_key, render_questions
+from stub_services import StubLLMServer
+
+QUESTIONS = [
+    {'type': '单选题', 'question': 'Which service stores objects?',
+     'options': ['Amazon S3', 'Amazon EBS', 'Amazon EFS'], 'answer': 'A'},
+    {'type': '单选题', 'question': 'Which service is block storage?',
+     'options': ['Amazon S3', 'Amazon EBS', 'Amazon EFS'], 'answer': 'B'},
+    {'type': '单选题', 'question': 'Which storage class fits archives retrieved once a year?',
+     'options': ['S3 Standard', 'S3 Glacier Deep Archive', 'S3 One Zone-IA'], 'answer': 'B'},
+]
+
+
+class Model:
+    """Answers every question in the prompt, except that the first prompt about archives gets prose."""
+
+    def __init__(self):
+        self.prompts = []
+        self.malformed = 1
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        if 'archives' in prompt and self.malformed:
+            self.malformed -= 1
+            return 'Sorry, here are my thoughts [on archives] without any JSON.'
+        numbers = re.findall(r'^Question (\d+):', prompt, re.MULTILINE)
+        return '```json\n' + json.dumps([{'number': int(n), 'explanation': f'Because of {n}.', 'tags': ['S3']}
+                                         for n in numbers]) + '\n```'
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = Model()
+    with StubLLMServer(reply=model) as server:
+        monkeypatch.setenv('LOCAL_LLM_BASE_URL', server.base_url)
+        yield model
+
+
+def read_output(path):
+    rows = []
+    for line in path.read_text(encoding='utf-8').splitlines():
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            continue
+    return rows
+
+
+def test_resumes_from_key_checkpoint_and_retries_malformed_reply(tmp_path, model):
+    formatted = tmp_path / 'questions.txt'
+    formatted.write_text(render_questions(QUESTIONS), encoding='utf-8')
+    output = tmp_path / 'enriched.jsonl'
+    done = {'key': question_key(QUESTIONS[0]), 'number': 1, 'explanation': 'Done before.', 'tags': []}
+    output.write_text(json.dumps(done) + '\n{"key": "half-writ', encoding='utf-8')  # crashed mid-line
+
+    run = dict(provider='local', model='stub', workers=1, max_per_prompt=1, retries=0)
+    stats = run_pipeline(str(formatted), str(output), **run)
+    assert stats['skipped'] == 1 and stats['requested'] == 2
+    assert stats['written'] == 1 and stats['failed'] == 1  # the malformed reply is not written
+    assert not any('Which service stores objects?' in prompt for prompt in model.prompts)
+
+    # Numbers change when the file is regenerated; the checkpoint is keyed by content
+    formatted.write_text(render_questions(QUESTIONS[::-1]), encoding='utf-8')
+    model.prompts.clear()
+    stats = run_pipeline(str(formatted), str(output), **run)
+    assert stats['skipped'] == 2 and stats['written'] == 1 and stats['failed'] == 0
+    assert len(model.prompts) == 1 and 'archives' in model.prompts[0]
+
+    rows = read_output(output)  # the half-written line stays on its own line and is skipped
+    assert [row['key'] for row in rows] == [question_key(q) for q in QUESTIONS]
+    assert rows[-1]['number'] == 1 and rows[-1]['explanation'] == 'Because of 1.'
+
+
+def test_malformed_reply_is_retried_for_missing_questions(tmp_path, model):
+    formatted = tmp_path / 'questions.txt'
+    formatted.write_text(render_questions(QUESTIONS), encoding='utf-8')
+    output = tmp_path / 'enriched.jsonl'
+
+    stats = run_pipeline(str(formatted), str(output), provider='local', model='stub', workers=1, retries=1)
+    assert stats == dict(stats, requested=3, written=3, failed=0, prompts=1)
+    assert len(model.prompts) == 2
+    assert re.findall(r'^Question (\d+):', model.prompts[1], re.MULTILINE) == ['1', '2', '3']
+    assert {row['key'] for row in read_output(output)} == {question_key(q) for q in QUESTIONS}
@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+from extraction_pipeline import ExtractionPipeline, PipelineStopped
+
+
+def test_writes_records_and_skips_duplicates():
+    output = io.StringIO()
+    pipeline = ExtractionPipeline(output, lambda raw: (raw.strip(), False)).start()
+    for index, raw in enumerate(['单选题：A 正确答案: A;', '单选题：A  正确答案: A;', '单选题：B 正确答案: B;'], 1):
+        pipeline.submit(index, raw)
+    pipeline.close()
+    assert pipeline.written == 2 and pipeline.duplicates == 1
+    assert output.getvalue().count('【Question') == 2
+
+
+def test_submit_raises_when_the_worker_died():
+    def extract(raw):
+        raise ValueError('broken extractor')
+
+    pipeline = ExtractionPipeline(io.StringIO(), extract, max_queue=1).start()
+    with pytest.raises(PipelineStopped) as excinfo:
+        for index in range(10):  # the queue fills up once the worker is gone
+            pipeline.submit(index, 'raw')
+    assert isinstance(excinfo.value.__cause__, ValueError)
+    with pytest.raises(ValueError):
+        pipeline.close()
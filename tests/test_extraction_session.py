@@ -0,0 +1,64 @@
+import json
+
+from extraction_pipeline import content_hash
+from extraction_session import Checkpoint, ExhaustionDetector, SeenIndex
+
+
+def test_seen_index_persists_across_runs(tmp_path):
+    path = str(tmp_path / '.anki_seen_hashes')
+    index = SeenIndex(path)
+    index.add(content_hash('单选题：Which service stores objects? 正确答案: A;'))
+    index.add(content_hash('单选题：Which service stores objects? 正确答案: A;'))  # written once
+    index.add(content_hash('多选题：Pick two. 正确答案: A,C;'))
+    index.close()
+
+    reopened = SeenIndex(path)
+    assert len(reopened) == 2
+    assert content_hash('单选题：Which service   stores objects?\n正确答案: A;') in reopened  # whitespace-insensitive
+    assert content_hash('单选题：Another question 正确答案: B;') not in reopened
+    reopened.close()
+    assert len((tmp_path / '.anki_seen_hashes').read_text(encoding='utf-8').splitlines()) == 2
+
+
+def test_seen_index_without_path_is_in_memory_only(tmp_path):
+    index = SeenIndex(None)
+    index.add('abc')
+    assert 'abc' in index and len(index) == 1
+    index.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_exhaustion_needs_patience_consecutive_repeats():
+    detector = ExhaustionDetector(patience=3)
+    cards = ['card 1', 'card 2', 'card 3']
+    assert not any(detector.observe(card) for card in cards)
+    assert not detector.observe('card 1') and not detector.observe('card 2')
+    assert not detector.observe('card 4')  # a new card resets the streak
+    assert not detector.observe('card 1') and not detector.observe('card 2')
+    assert detector.observe('card 3')
+
+
+def test_checkpoint_resumes_only_unfinished_sessions_with_output(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    output = tmp_path / 'anki_content.txt'
+    output.write_text('Question 1:\n...', encoding='utf-8')
+
+    checkpoint = Checkpoint(path)
+    checkpoint.start(str(output))
+    checkpoint.update(attempted=12, written=9)
+    assert not (tmp_path / 'checkpoint.json.tmp').exists()
+
+    state = Checkpoint(path).load()
+    assert (state['output_file'], state['attempted'], state['written'], state['finished']) == (str(output), 12, 9, False)
+
+    checkpoint.update(finished=True)
+    assert Checkpoint(path).load() is None
+
+    checkpoint.update(finished=False)
+    output.unlink()  # the output the session was writing is gone
+    assert Checkpoint(path).load() is None
+    assert json.loads((tmp_path / 'checkpoint.json').read_text(encoding='utf-8'))['updated']
+
+
+def test_missing_checkpoint_loads_none(tmp_path):
+    assert Checkpoint(str(tmp_path / 'none.json')).load() is None
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from format_aws_questions import (parse_anki_export, parse_anki_record, read_formatted_questions,
+                                  render_questions)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+LABELS = os.path.join(os.path.dirname(__file__), os.pardir, 'tools', 'fixtures', 'aws_option_labels.json')
+
+# Raw notes Q5, Q6 and Q8 of the SAA-C03 export (#html:false): options run together in one line
+Q5, Q6, Q8 = 'A company is hosting a web', 'A company uses NFS', 'A company is migrating a distributed'
+
+
+@pytest.fixture(scope='module')
+def plain_records():
+    with open(os.path.join(FIXTURES, 'saa_c03_notes.txt'), encoding='utf-8') as f:
+        return {record['question'][:36]: record for record in parse_anki_export(f.read())}
+
+
+def labelled(prefix):
+    with open(LABELS, encoding='utf-8') as f:
+        return next(label for label in json.load(f) if label['question'].startswith(prefix))
+
+
+def find(records, prefix):
+    return next(record for key, record in records.items() if key.startswith(prefix))
+
+
+def test_plain_note_with_unpunctuated_options_is_split_exactly(plain_records):
+    record, label = find(plain_records, Q5), labelled(Q5)
+    assert record['options'] == label['options']
+    assert record['question'] == label['question']
+    assert record['answer'] == 'C' and record['review'] is None
+
+
+@pytest.mark.parametrize('prefix', [Q6, Q8])
+def test_plain_note_with_multi_sentence_options_is_flagged(plain_records, prefix):
+    # Four options of several sentences each cannot be told apart from the text alone
+    record = find(plain_records, prefix)
+    assert len(record['options']) == 4
+    assert record['review'] == 'option boundaries guessed'
+    assert record['answer'] == labelled(prefix)['answer']
+
+
+@pytest.mark.parametrize('prefix', [Q5, Q6, Q8])
+def test_html_note_reads_options_from_field_blocks(prefix):
+    label = labelled(prefix)
+    front = '单选题：<div>' + label['question'] + '</div>' + ''.join(
+        f'<div>{option.replace("&", "&amp;")}</div>' for option in label['options']) + label['answer']
+    record = parse_anki_export('#separator:tab\n#html:true\n' + front + '\t' + front + '\n')[0]
+    assert record['question'] == label['question']
+    assert record['options'] == label['options']
+    assert record['answer'] == label['answer'] and record['review'] is None
+
+
+def test_disputed_answer_key_is_kept_and_flagged():
+    line = ('单选题：Which service stores objects? <br>Amazon S3<br>Amazon EBS<br>Amazon EFS<br>Amazon FSx'
+            'D,,,B\tunused')
+    record = parse_anki_record(line, html_fields=True)
+    assert record['answer'] == 'D,B'
+    assert record['review'] == 'answer key D,B does not match the number of answers asked for'
+
+
+def test_review_survives_render_and_read(tmp_path, plain_records):
+    records = [find(plain_records, Q5), find(plain_records, Q6)]
+    path = tmp_path / 'formatted.txt'
+    path.write_text(render_questions(records), encoding='utf-8')
+    read = read_formatted_questions(str(path))
+    assert [r['review'] for r in read] == [None, 'option boundaries guessed']
+    assert [r['options'] for r in read] == [r['options'] for r in records]
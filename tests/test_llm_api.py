@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from anthropic import Anthropic
+from openai import OpenAI
+
+from llm_api import ANTHROPIC_MAX_CACHE_BREAKPOINTS, ChatSession, query_llm
+from stub_services import PREFIX_CACHE_MIN_TOKENS, StubLLMServer
+
+PROMPT = 'Which storage class fits infrequently accessed data?'
+FOLLOW_UP = 'And for archives retrieved once a year?'
+# 6个系统前缀块，合计超过桩服务模拟缓存的下限（按4个字符1个token）
+GUIDE = [f"Guide part {i}: " + 'Prefer managed services. ' * 50 for i in range(6)]
+
+
+@pytest.fixture
+def server():
+    with StubLLMServer(reply='stub answer') as stub:
+        yield stub
+
+
+def count_prompt(request, prompt):
+    return json.dumps(request, ensure_ascii=False).count(prompt)
+
+
+def test_openai_format_sends_prompt_once(server):
+    client = OpenAI(base_url=server.base_url, api_key='not-needed')
+    assert query_llm(PROMPT, client, model='stub', provider='local', system='guide') == 'stub answer'
+    request = server.last_request
+    assert count_prompt(request, PROMPT) == 1
+    assert [message['role'] for message in request['messages']] == ['system', 'user']
+
+
+def test_openai_format_chat_session_history(server):
+    session = ChatSession(provider='local', model='stub',
+                          client=OpenAI(base_url=server.base_url, api_key='not-needed'))
+    session.send(PROMPT)
+    assert session.send(FOLLOW_UP) == 'stub answer'
+    request = server.last_request
+    assert count_prompt(request, PROMPT) == 1
+    assert count_prompt(request, FOLLOW_UP) == 1
+    assert [message['role'] for message in request['messages']] == ['user', 'assistant', 'user']
+
+
+def test_anthropic_sends_prompt_once(server):
+    client = Anthropic(base_url=server.anthropic_base_url, api_key='not-needed')
+    assert query_llm(PROMPT, client, model='stub', provider='anthropic', system='guide') == 'stub answer'
+    request = server.last_request
+    assert count_prompt(request, PROMPT) == 1
+    assert request['system'][-1]['cache_control'] == {'type': 'ephemeral'}
+
+
+def test_anthropic_chat_session_history(server):
+    session = ChatSession(provider='anthropic', model='stub',
+                          client=Anthropic(base_url=server.anthropic_base_url, api_key='not-needed'))
+    session.send(PROMPT)
+    session.send(FOLLOW_UP)
+    request = server.last_request
+    assert count_prompt(request, PROMPT) == 1
+    assert count_prompt(request, FOLLOW_UP) == 1
+    assert [message['role'] for message in request['messages']] == ['user', 'assistant', 'user']
+    # 缓存断点在最后一轮历史上
+    assert request['messages'][1]['content'][-1]['cache_control'] == {'type': 'ephemeral'}
+
+
+def breakpoints(request):
+    blocks = request['system'] + [block for message in request['messages'] for block in message['content']]
+    return [block for block in blocks if block.get('cache_control')]
+
+
+def test_anthropic_cache_breakpoints_on_long_system_prefix(server):
+    assert len(''.join(GUIDE)) // 4 >= PREFIX_CACHE_MIN_TOKENS
+    client = Anthropic(base_url=server.anthropic_base_url, api_key='not-needed')
+    first, second = {}, {}
+    query_llm(PROMPT, client, model='stub', provider='anthropic', system=GUIDE, usage=first)
+    request = server.last_request
+    assert breakpoints(request) == request['system'][-ANTHROPIC_MAX_CACHE_BREAKPOINTS:]
+
+    query_llm(FOLLOW_UP, client, model='stub', provider='anthropic', system=GUIDE, usage=second)
+    prefix_tokens = len(''.join(GUIDE)) // 4
+    assert first['cache_write_tokens'] == prefix_tokens and first['cached_tokens'] == 0
+    assert second['cached_tokens'] == prefix_tokens and second['cache_write_tokens'] == 0
+    assert second['input_tokens'] > second['cached_tokens']  # 用量中的输入包含缓存部分
+
+
+def test_anthropic_chat_session_keeps_within_breakpoint_limit(server):
+    session = ChatSession(provider='anthropic', model='stub', system=GUIDE,
+                          client=Anthropic(base_url=server.anthropic_base_url, api_key='not-needed'))
+    session.send(PROMPT)
+    usage = {}
+    session.send(FOLLOW_UP, usage=usage)
+    request = server.last_request
+    marked = breakpoints(request)
+    assert len(marked) == ANTHROPIC_MAX_CACHE_BREAKPOINTS
+    # 历史占用一个断点，其余在系统前缀的最后几块上
+    assert request['messages'][-2]['content'][-1] in marked
+    assert marked[:-1] == request['system'][-(ANTHROPIC_MAX_CACHE_BREAKPOINTS - 1):]
+    assert 'cache_control' not in request['system'][0]
+    assert usage['cached_tokens'] == len(''.join(GUIDE)) // 4
+    assert session.usage['cache_write_tokens'] == usage['cached_tokens']
+
+
+class FakeGenAI:
+    """替代google.generativeai模块：记录每次generate_content收到的内容。"""
+
+    def __init__(self):
+        self.calls = []
+
+    def GenerativeModel(self, model_name, generation_config=None, system_instruction=None):
+        calls = self.calls
+
+        class Model:
+            def generate_content(self, contents):
+                calls.append({'system_instruction': system_instruction, 'contents': contents})
+                return SimpleNamespace(text='stub answer', usage_metadata=None)
+
+        model = Model()
+        model.model_name = model_name
+        return model
+
+
+def test_gemini_sends_prompt_once():
+    genai = FakeGenAI()
+    assert query_llm(PROMPT, genai, model='stub', provider='gemini', system='guide') == 'stub answer'
+    call = genai.calls[-1]
+    assert call['system_instruction'] == 'guide'
+    assert call['contents'] == [{'role': 'user', 'parts': [PROMPT]}]
+
+
+def test_gemini_chat_session_history():
+    genai = FakeGenAI()
+    session = ChatSession(provider='gemini', model='stub', client=genai)
+    session.send(PROMPT)
+    session.send(FOLLOW_UP)
+    assert genai.calls[-1]['contents'] == [
+        {'role': 'user', 'parts': [PROMPT]},
+        {'role': 'model', 'parts': ['stub answer']},
+        {'role': 'user', 'parts': [FOLLOW_UP]},
+    ]
+
+
+class SlowClient:
+    """OpenAI格式的假客户端：每次请求等待delay秒；fail_first为True时第一次请求抛出异常。"""
+
+    def __init__(self, base_url, reply, delay=0.2, fail_first=False):
+        self.base_url = base_url
+        self.reply = reply
+        self.delay = delay
+        self.fail_first = fail_first
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail_first and self.calls == 1:
+            raise ConnectionError('upstream failed')
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))], usage=None)
+
+
+def run_concurrently(*calls):
+    results = [None] * len(calls)
+
+    def run(i):
+        results[i] = calls[i]()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(calls))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)  # 让第一个调用先成为leader
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_requests_to_different_clients_are_not_coalesced():
+    first = SlowClient('http://first/v1', 'first answer')
+    second = SlowClient('http://second/v1', 'second answer')
+    results = run_concurrently(lambda: query_llm(PROMPT, first, model='stub', provider='local'),
+                               lambda: query_llm(PROMPT, second, model='stub', provider='local'))
+    assert results == ['first answer', 'second answer']
+
+
+def test_waiter_retries_when_the_shared_request_failed():
+    client = SlowClient('http://flaky/v1', 'second try', fail_first=True)
+    results = run_concurrently(lambda: query_llm(PROMPT, client, model='stub', provider='local'),
+                               lambda: query_llm(PROMPT, client, model='stub', provider='local'))
+    assert results == [None, 'second try']
+    assert client.calls == 2
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from anthropic import Anthropic
+from openai import OpenAI
+
+from llm_batch import fetch, load_job, load_requests, poll, submit, write_results
+from stub_services import STUB_ERROR_MARKER, StubLLMServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    with StubLLMServer(reply='stub answer') as stub:
+        yield stub
+
+
+@pytest.fixture
+def requests(tmp_path):
+    path = tmp_path / 'questions.jsonl'
+    lines = [{'id': 'q-7', 'prompt': 'Which storage class fits archives?'},
+             {'prompt': f'{STUB_ERROR_MARKER}: this request fails'},
+             {'id': 'q-9', 'prompt': 'Which service is block storage?', 'system': 'Answer briefly.'}]
+    path.write_text(''.join(json.dumps(line) + '\n' for line in lines), encoding='utf-8')
+    return load_requests(str(path))
+
+
+def client_for(provider, server):
+    if provider == 'anthropic':
+        return Anthropic(base_url=server.anthropic_base_url, api_key='not-needed')
+    return OpenAI(base_url=server.base_url, api_key='not-needed')
+
+
+@pytest.mark.parametrize('provider', ['local', 'anthropic'])
+def test_submit_poll_fetch_maps_results_to_input_ids(server, requests, tmp_path, provider):
+    client = client_for(provider, server)
+    job = submit(client, provider, requests, model='stub', job_dir=str(tmp_path / 'batches'))
+    assert job['ids'] == {'req-0': 'q-7', 'req-1': '2', 'req-2': 'q-9'}
+
+    job = load_job(job['path'])  # poll and fetch run later from the job file alone
+    status = poll(client, job, wait=True, interval=0.01, timeout=10)
+    assert status['done']
+
+    rows = fetch(client, job)
+    assert [row['id'] for row in rows] == ['q-7', '2', 'q-9']
+    assert [row['response'] for row in rows] == ['stub answer', None, 'stub answer']
+    assert rows[1]['error'] and rows[1]['usage'] is None
+    assert rows[0]['error'] is None and rows[0]['usage']['output_tokens'] > 0
+
+    output = tmp_path / 'answers.jsonl'
+    write_results(rows, str(output))
+    assert [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()] == rows
+
+
+def test_missing_result_is_reported_as_error(server, requests, tmp_path):
+    client = client_for('local', server)
+    job = submit(client, 'local', requests, model='stub', job_dir=str(tmp_path))
+    poll(client, job, wait=True, interval=0.01, timeout=10)
+    job['ids']['req-3'] = 'q-lost'  # a request the provider never answered
+
+    rows = fetch(client, job)
+    assert rows[-1] == {'id': 'q-lost', 'response': None, 'error': {'type': 'missing_result'}, 'usage': None}
+
+
+def test_fetch_before_batch_ends_raises(requests, tmp_path):
+    with StubLLMServer(batch_delay=60) as slow:
+        client = client_for('anthropic', slow)
+        job = submit(client, 'anthropic', requests, model='stub', job_dir=str(tmp_path))
+        assert not poll(client, job)['done']
+        with pytest.raises(RuntimeError, match='still'):
+            fetch(client, job)
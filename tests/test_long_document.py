@@ -0,0 +1,83 @@
+import hashlib
+
+from long_document import ResponseCache, answer_over_document
+
+TASK = 'List every storage service mentioned.'
+TOPICS = ['S3', 'EBS', 'EFS', 'FSx', 'Glacier', 'Storage Gateway', 'Snowball', 'DataSync']
+
+
+def make_document():
+    return '\n\n'.join(f"Section {i}: Amazon {TOPICS[i % len(TOPICS)]} notes. " + f"Detail {i} of the guide. " * 12
+                       for i in range(40))
+
+
+class Model:
+    """Replies with a fixed-length digest of the prompt, so notes and merge groups keep their sizes."""
+
+    def __init__(self, fail=None):
+        self.prompts = []
+        self.fail = fail
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        if self.fail and self.fail in prompt:
+            return None
+        if prompt.startswith('Below are notes extracted, in order, from consecutive parts of a long document. Using'):
+            return 'final answer'
+        return 'note ' + hashlib.sha256(prompt.encode('utf-8')).hexdigest() * 10  # about 160 tokens
+
+    def map_prompts(self):
+        return [prompt for prompt in self.prompts if prompt.startswith('You are reading one part')]
+
+
+def run(document, model, cache, stats=None):
+    stats = {} if stats is None else stats
+    return answer_over_document(TASK, document, model, namespace='stub/model', chunk_tokens=400, concurrency=2,
+                                cache=cache, stats=stats), stats
+
+
+def test_edit_requeries_only_that_chunk_and_its_reduce_path(tmp_path):
+    path = str(tmp_path / 'cache.jsonl')
+    document = make_document()
+    cache = ResponseCache(path)
+    answer, stats = run(document, Model(), cache)
+    cache.close()
+    assert answer == 'final answer'
+    assert stats['chunks'] > 4 and stats['reduce_levels'] >= 2
+
+    edited = document.replace('Section 17: Amazon EBS', 'Section 17: Amazon EBS io2 volumes')
+    model = Model()
+    cache = ResponseCache(path)  # reopened from disk
+    answer, stats = run(edited, model, cache)
+    cache.close()
+    assert answer == 'final answer'
+    assert [('io2 volumes' in prompt) for prompt in model.map_prompts()] == [True]
+    # One merge per level on the path from the changed note to the root, then the final prompt
+    assert stats['requests'] == 1 + stats['reduce_levels']
+    assert stats['cache_hits'] > stats['chunks'] - 1  # unchanged chunks and the merges that did not see the edit
+
+
+def test_failed_chunk_returns_none_and_rerun_fills_the_gap(tmp_path):
+    path = str(tmp_path / 'cache.jsonl')
+    document = make_document()
+    cache = ResponseCache(path)
+    answer, stats = run(document, Model(fail='Section 9:'), cache)
+    cache.close()
+    assert answer is None
+    assert stats['failures'] == 1 and stats['reduce_levels'] == 0  # no merging over a missing part
+
+    model = Model()
+    cache = ResponseCache(path)
+    answer, stats = run(document, model, cache)
+    cache.close()
+    assert answer == 'final answer'
+    assert [('Section 9:' in prompt) for prompt in model.map_prompts()] == [True]
+    assert stats['cache_hits'] == stats['chunks'] - 1 and stats['failures'] == 0
+
+
+def test_failed_merge_returns_none(tmp_path):
+    model = Model(fail='--- Notes from part 1 ---')
+    answer, stats = run(make_document(), model, None)
+    assert answer is None and stats['failures'] >= 1
+    assert not any(prompt.startswith('Below are notes extracted, in order, from consecutive parts of a long '
+                                     'document. Using') for prompt in model.prompts)
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from quiz_engine import (DAY_SECONDS, INITIAL_EASE, QuestionStore, ReviewScheduler, next_questions,
+                         normalize_answer)
+
+NOW = time.time()
+
+
+def make_store(single=3, multiple=100):
+    records = [{'number': i + 1, 'type': '单选题', 'question': f'Which Amazon S3 feature fits case {i}?',
+                'options': ['Versioning', 'Replication', 'Lifecycle'], 'answer': 'A'} for i in range(single)]
+    records += [{'number': single + i + 1, 'type': '多选题',
+                 'question': f'Which two AWS Lambda settings fit case {i}? (Choose two.)',
+                 'options': ['Memory', 'Timeout', 'Layers', 'Runtime', 'Role'], 'answer': 'C, a'}
+                for i in range(multiple)]
+    return QuestionStore.from_records(records)
+
+
+def test_check_answer_ignores_order_case_and_separators():
+    store = make_store()
+    assert store.check_answer(4, 'c,A') and store.check_answer(4, 'A C')
+    assert not store.check_answer(4, 'A') and not store.check_answer(1, 'B')
+    assert normalize_answer('D,,,B') == 'B,D'
+    with pytest.raises(KeyError):
+        store.check_answer(999, 'A')
+
+
+def test_due_questions_matching_filter_are_not_starved():
+    store = make_store()
+    scheduler = ReviewScheduler(':memory:')
+    # 100 non-matching questions fall due before the 3 matching ones
+    for question in store.questions[3:]:
+        scheduler.record(question.key, False, now=NOW - 3 * DAY_SECONDS)
+    for question in store.questions[:3]:
+        scheduler.record(question.key, False, now=NOW - 2 * DAY_SECONDS)
+
+    picked = next_questions(store, scheduler, 2, type='单选题')
+    assert [q.number for q in picked] == [1, 2]
+    assert len(scheduler.due(limit=5)) == 5
+
+
+def test_fresh_questions_fill_up_after_due_ones():
+    store = make_store(single=5, multiple=0)
+    scheduler = ReviewScheduler(':memory:')
+    scheduler.record(store.get(2).key, False, now=NOW - 2 * DAY_SECONDS)  # due
+    scheduler.record(store.get(3).key, True, now=NOW)  # seen, not due yet
+
+    picked = next_questions(store, scheduler, 4, type='单选题')
+    assert picked[0].number == 2
+    assert sorted(q.number for q in picked[1:]) == [1, 4, 5]
+
+
+def test_sm2_schedule_persists_by_question_key(tmp_path):
+    db = str(tmp_path / 'reviews.db')
+    store = make_store()
+    key = store.get(1).key
+    with ReviewScheduler(db) as scheduler:
+        intervals = [scheduler.record(key, True, now=NOW)['interval_days'] for _ in range(3)]
+    assert intervals == [1.0, 6.0, 15.0]
+
+    # The question file was regenerated: numbering changed, the key did not
+    renumbered = QuestionStore.from_records(
+        [dict(q.to_dict(), number=q.number + 50, answer='A') for q in store.questions[:3]])
+    with ReviewScheduler(db) as scheduler:
+        state = scheduler.record(renumbered.get(51).key, False, now=NOW)
+        assert (state['repetitions'], state['interval_days'], state['correct'], state['wrong']) == (0, 1.0, 3, 1)
+        assert state['ease'] == pytest.approx(INITIAL_EASE - 0.54)
+        assert scheduler.due(now=NOW + DAY_SECONDS) == [key]
+        assert scheduler.due(now=NOW + DAY_SECONDS - 1) == []
@@ -0,0 +1,63 @@
+import asyncio
+import importlib
+import io
+import json
+import sys
+
+
+def test_package_modules_alias_bare_modules():
+    bare = importlib.import_module('single_flight')
+    packaged = importlib.import_module('tools.single_flight')
+    assert packaged is bare
+    assert bare.__spec__.name == 'single_flight'
+
+
+def test_bare_import_after_package_import_is_the_same_module():
+    packaged = importlib.import_module('tools.marker_scanner')
+    assert importlib.import_module('marker_scanner') is packaged
+
+
+class FakeRuntime:
+    def get_stats(self):
+        return {'pages': 0}
+
+    async def query(self, prompt, provider=None):
+        if prompt == 'fail':
+            raise RuntimeError('upstream failed')
+        return f"answer to {prompt}"
+
+
+def serve(lines):
+    from agent_runtime import serve_stdio
+
+    stdout = io.StringIO()
+    before = sys.stdout
+    asyncio.run(serve_stdio(FakeRuntime(), io.StringIO(''.join(json.dumps(line) + '\n' if not isinstance(line, str)
+                                                                else line for line in lines)), stdout))
+    assert sys.stdout is before  # restored, not left pointing at the protocol stream
+    return {response['id']: response for response in map(json.loads, stdout.getvalue().splitlines())}
+
+
+def test_notifications_never_get_a_response():
+    responses = serve([
+        {'jsonrpc': '2.0', 'method': 'query', 'params': {'prompt': 'fail'}},  # fails
+        {'jsonrpc': '2.0', 'method': 'query', 'params': {'wrong': 1}},  # invalid params
+        {'jsonrpc': '2.0', 'method': 'missing'},  # unknown method
+        {'jsonrpc': '2.0', 'method': 'query', 'params': {'prompt': 'ok'}},  # succeeds
+        {'jsonrpc': '2.0', 'id': 1, 'method': 'get_stats'},
+    ])
+    assert list(responses) == [1]
+
+
+def test_requests_get_results_and_errors():
+    responses = serve([
+        {'jsonrpc': '2.0', 'id': 1, 'method': 'query', 'params': ['S3?']},
+        {'jsonrpc': '2.0', 'id': 2, 'method': 'query', 'params': {'prompt': 'fail'}},
+        {'jsonrpc': '2.0', 'id': 3, 'method': 'query', 'params': {'wrong': 1}},
+        {'jsonrpc': '2.0', 'id': 4, 'method': 'missing'},
+        'not json\n',
+        {'jsonrpc': '2.0', 'id': 5, 'method': 'shutdown'},
+    ])
+    assert responses[1]['result'] == 'answer to S3?'
+    assert [responses[i]['error']['code'] for i in (2, 3, 4, None)] == [-32000, -32602, -32601, -32700]
+    assert responses[5]['result'] == 'bye'
@@ -0,0 +1,96 @@
+import json
+
+import translate_docs
+from translate_docs import (DEFAULT_TM_DB, REPO_ROOT, TranslationMemory, parse_response, seed_memory,
+                           split_blocks, translate_documents)
+
+
+def test_longer_fence_is_not_closed_by_inner_fence():
+    text = ("说明\n\n"
+            "````markdown\n"
+            "```python\n"
+            "print('hi')\n"
+            "```\n"
+            "````\n"
+            "后续段落\n")
+    blocks = split_blocks(text)
+    assert ''.join(block['text'] for block in blocks) == text
+    assert [block['kind'] for block in blocks] == ['text', 'blank', 'code', 'text']
+    assert blocks[2]['text'].startswith('````markdown') and blocks[2]['text'].endswith('````\n')
+
+
+def test_fence_closes_only_with_the_same_character():
+    text = "~~~\n```\n还是代码\n~~~~\n正文\n"
+    blocks = split_blocks(text)
+    assert [block['kind'] for block in blocks] == ['code', 'text']
+    assert blocks[1]['text'] == '正文\n'
+
+
+def test_parse_response_ignores_brackets_around_the_array():
+    response = ('Here are the translations [2 segments]:\n'
+                '```json\n[{"id": 0, "translation": "Hello"}, {"id": 1, "translation": "[draft] World"}]\n```\n'
+                'Note: see [1].')
+    assert parse_response(response, ['你好', '世界']) == {'你好': 'Hello', '世界': '[draft] World'}
+
+
+def test_default_memory_is_under_the_repository():
+    assert DEFAULT_TM_DB.startswith(REPO_ROOT)
+
+
+SOURCE = ("# 部署指南\n"
+          "\n"
+          "第一段：创建存储桶。\n"
+          "\n"
+          "```python\n"
+          "# 上传文件\n"
+          "s3.upload_file('a.txt', 'bucket', 'a.txt')\n"
+          "```\n"
+          "\n"
+          "第二段：配置生命周期规则。\n"
+          "\n"
+          "~~~bash\n"
+          "aws s3 ls  # 列出存储桶\t\n"
+          "~~~\n"
+          "\n"
+          "第三段：开启版本控制。\n")
+TARGET = ("# Deployment guide\n"
+          "\n"
+          "Paragraph one: create the bucket.\n"
+          "\n"
+          "```python\n"
+          "# Upload the file\n"
+          "s3.upload_file('a.txt', 'bucket', 'a.txt')\n"
+          "```\n"
+          "\n"
+          "Paragraph two: configure lifecycle rules.\n"
+          "\n"
+          "~~~bash\n"
+          "aws s3 ls  # 列出存储桶\t\n"
+          "~~~\n"
+          "\n"
+          "Paragraph three: enable versioning.\n")
+
+
+def test_edited_paragraph_is_the_only_segment_sent(tmp_path, monkeypatch):
+    sent = []
+
+    def fake_query_llm(prompt, client, model=None, provider=None, system=None, usage=None):
+        items = json.loads(prompt)
+        sent.extend(item['text'] for item in items)
+        return json.dumps([{'id': item['id'], 'translation': f"EN {item['text']}"} for item in items])
+
+    monkeypatch.setattr(translate_docs, 'query_llm', fake_query_llm)
+    monkeypatch.setattr(translate_docs, 'create_llm_client', lambda provider: object())
+    source, output = tmp_path / 'guide.md', tmp_path / 'guide.en.md'
+    source.write_text(SOURCE.replace('生命周期规则', '生命周期规则和过期时间'), encoding='utf-8')
+
+    with TranslationMemory(str(tmp_path / 'tm.db')) as tm:
+        assert seed_memory(tm, SOURCE, TARGET) == 5  # 4 text blocks and the translated python block
+        stats = translate_documents([(str(source), str(output))], tm, provider='openai', workers=1)
+
+    assert sent == ['第二段：配置生命周期规则和过期时间。']
+    assert stats['reused'] == 3 and stats['translated'] == 1 and stats['failed'] == 0
+    # The untranslated bash block comes back byte for byte (trailing tab included), the python block as seeded
+    assert "~~~bash\naws s3 ls  # 列出存储桶\t\n~~~\n" in output.read_text(encoding='utf-8')
+    assert output.read_bytes().decode('utf-8') == TARGET.replace(
+        'Paragraph two: configure lifecycle rules.', 'EN 第二段：配置生命周期规则和过期时间。')
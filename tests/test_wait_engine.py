@@ -0,0 +1,109 @@
+import pytest
+
+from wait_engine import WaitEngine, WaitTimeout
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the engine sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeScreen:
+    """screenshot() returns the next frame each poll, repeating the last one"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.shots = 0
+
+    def screenshot(self, region=None):
+        frame = self.frames[min(self.shots, len(self.frames) - 1)]
+        self.shots += 1
+        return frame
+
+
+class FakeClipboard:
+    """paste() returns the copied text once `delay` polls have passed since the copy action"""
+
+    def __init__(self, text, delay):
+        self.content = ''
+        self.text = text
+        self.delay = delay
+        self.copied = False
+
+    def copy(self, text):
+        self.content = text
+
+    def paste(self):
+        if self.copied:
+            if self.delay <= 0:
+                self.content = self.text
+            self.delay -= 1
+        return self.content
+
+
+def make_engine(screen=None, clipboard=None):
+    clock = FakeClock()
+    engine = WaitEngine(gui=screen or FakeScreen([b'']), clipboard=clipboard or FakeClipboard('', 0),
+                        clock=clock, sleep=clock.sleep, min_interval=0.01, max_interval=0.2)
+    return engine, clock
+
+
+def test_copy_and_wait_returns_new_clipboard_text():
+    clipboard = FakeClipboard('单选题：question 正确答案: A;', delay=3)
+    engine, clock = make_engine(clipboard=clipboard)
+
+    def copy_action():
+        clipboard.copied = True
+
+    assert engine.copy_and_wait(copy_action) == '单选题：question 正确答案: A;'
+    assert len(clock.sleeps) == 3
+    assert engine.recorder.summary('copy')['count'] == 1
+    assert engine.recorder.summary('copy')['timeouts'] == 0
+
+
+def test_act_and_wait_for_screen_detects_change():
+    screen = FakeScreen([b'question', b'question', b'answer'])
+    engine, clock = make_engine(screen=screen)
+    assert engine.act_and_wait_for_screen(lambda: None, step='show_answer')
+    # Baseline, one unchanged poll, then the change
+    assert screen.shots == 3
+    assert clock.now == pytest.approx(0.01)
+
+
+def test_timeout_returns_none_and_is_recorded():
+    engine, clock = make_engine()
+    assert engine.wait_for_change(lambda: 'same', 'same', timeout=1.0, step='again') is None
+    assert clock.now == pytest.approx(1.0)
+    assert max(clock.sleeps) <= 0.2  # the interval backs off but stays bounded
+    assert engine.recorder.summary('again')['timeouts'] == 1
+
+
+def test_timeout_raises_when_requested():
+    engine, _ = make_engine()
+    with pytest.raises(WaitTimeout):
+        engine.wait_for_change(lambda: 'same', 'same', timeout=0.5, raise_on_timeout=True)
+
+
+def test_stable_polls_waits_for_the_value_to_settle():
+    values = iter(['loading', 'partial', 'partial', 'done', 'done', 'done'])
+    engine, clock = make_engine()
+    assert engine.wait_for_change(lambda: next(values), 'loading', stable_polls=3) == 'done'
+    # A value that flips back to the baseline resets the streak
+    values = iter(['new', 'old', 'new', 'new'])
+    assert engine.wait_for_change(lambda: next(values), 'old', stable_polls=2) == 'new'
+
+
+def test_stable_polls_times_out_while_still_changing():
+    counter = iter(range(1000))
+    engine, _ = make_engine()
+    assert engine.wait_for_change(lambda: next(counter), -1, timeout=0.5, stable_polls=2) is None
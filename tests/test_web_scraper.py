@@ -0,0 +1,169 @@
+import asyncio
+from urllib.parse import urlparse
+
+import pytest
+
+pytest.importorskip('playwright')
+
+from web_scraper import AdaptiveLimiter, PageScheduler  # noqa: E402
+
+
+class FakeBrowser:
+    """Stands in for a Playwright browser: pages take `delay(url)` seconds and fail when `fails(url)`."""
+
+    def __init__(self, delay=lambda url: 0.01, fails=lambda url: False):
+        self.delay = delay
+        self.fails = fails
+        self.contexts = []
+        self.open_pages = 0
+        self.peak_pages = 0
+        self.host_pages = {}
+        self.peak_host_pages = {}
+
+    async def new_context(self):
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = 0
+        self.open_pages = 0
+        self.closed = False
+        self.closed_with_open_pages = False
+
+    async def new_page(self):
+        assert not self.closed
+        self.pages += 1
+        return FakePage(self)
+
+    async def close(self):
+        self.closed_with_open_pages = self.open_pages > 0
+        self.closed = True
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.host = None
+
+    async def goto(self, url):
+        browser = self.context.browser
+        self.url, self.host = url, urlparse(url).netloc
+        self.context.open_pages += 1
+        browser.open_pages += 1
+        browser.peak_pages = max(browser.peak_pages, browser.open_pages)
+        browser.host_pages[self.host] = browser.host_pages.get(self.host, 0) + 1
+        browser.peak_host_pages[self.host] = max(browser.peak_host_pages.get(self.host, 0),
+                                                 browser.host_pages[self.host])
+        await asyncio.sleep(browser.delay(url))
+        if browser.fails(url):
+            raise ConnectionError('connection reset')
+
+    async def wait_for_load_state(self, state):
+        pass
+
+    async def content(self):
+        return f"<html><body>{self.url}</body></html>"
+
+    async def close(self):
+        if self.host is not None:
+            browser = self.context.browser
+            browser.open_pages -= 1
+            browser.host_pages[self.host] -= 1
+            self.context.open_pages -= 1
+
+
+def crawl(browser, urls, **options):
+    async def run():
+        scheduler = PageScheduler(browser, **options)
+
+        async def process(url, html):
+            return (url, html)
+
+        try:
+            return await scheduler.run(urls, process), scheduler.get_stats()
+        finally:
+            await scheduler.close()
+
+    return asyncio.run(run())
+
+
+def urls_for(hosts, per_host):
+    return [f"http://{host}/page/{i}" for i in range(per_host) for host in hosts]
+
+
+def test_global_and_per_host_caps():
+    browser = FakeBrowser()
+    results, stats = crawl(browser, urls_for(['a.test', 'b.test', 'c.test'], 8), max_concurrent=5, per_host=2)
+    assert browser.peak_pages == 5
+    assert max(browser.peak_host_pages.values()) == 2
+    assert stats['pages'] == 24 and stats['errors'] == 0 and stats['peak_in_flight'] == 5
+
+
+def test_results_follow_url_order():
+    urls = urls_for(['a.test', 'b.test'], 6)
+    # Later URLs finish first
+    browser = FakeBrowser(delay=lambda url: 0.05 - 0.004 * urls.index(url))
+    results, _ = crawl(browser, urls, max_concurrent=4, per_host=4)
+    assert [url for url, _ in results] == urls
+    assert all(url in html for url, html in results)
+
+
+def test_failed_page_gives_none_and_backs_off():
+    urls = urls_for(['a.test'], 12)
+    browser = FakeBrowser(fails=lambda url: url.endswith(('/3', '/4', '/5')))
+    results, stats = crawl(browser, urls, max_concurrent=4, per_host=4)
+    assert [html is None for _, html in results] == [i in (3, 4, 5) for i in range(12)]
+    assert stats['errors'] == 3 and stats['limit_decreases'] >= 1 and stats['limit'] < 4
+
+
+def test_contexts_are_recycled_after_their_page_budget():
+    browser = FakeBrowser()
+    _, stats = crawl(browser, urls_for(['a.test', 'b.test'], 10), max_concurrent=3, per_host=3,
+                     pages_per_context=4, contexts=2)
+    assert all(context.pages <= 4 for context in browser.contexts)
+    assert stats['contexts_recycled'] >= 20 // 4 - 2
+    assert all(context.closed for context in browser.contexts)
+    assert not any(context.closed_with_open_pages for context in browser.contexts)
+
+
+def record(limiter, latency, ok, times=1):
+    async def run():
+        for _ in range(times):
+            await limiter.acquire()
+            await limiter.release(latency, ok)
+
+    asyncio.run(run())
+
+
+def test_limiter_halves_on_errors_once_per_latency_period_and_recovers():
+    limiter = AdaptiveLimiter(8, window=10)
+    record(limiter, 1.0, True, times=10)
+    assert limiter.current == 8
+
+    record(limiter, 1.0, False, times=3)  # the second failure crosses the 10% error threshold
+    assert limiter.current == 4 and limiter.decreases == 1  # the third is within the same 1s period
+
+    record(limiter, 1.0, True, times=10)  # no growth until the failures leave the window
+    assert limiter.current == 4 and limiter.decreases == 1
+    record(limiter, 1.0, True, times=20)  # then +1/limit per success, about +1 per round
+    assert 4 < limiter.current < 8
+    record(limiter, 1.0, True, times=40)
+    assert limiter.current == 8
+
+
+def test_limiter_backs_off_when_latency_rises():
+    limiter = AdaptiveLimiter(8, minimum=2)
+    record(limiter, 0.001, True, times=10)
+    record(limiter, 0.05, True, times=5)  # the moving average climbs past twice the baseline
+    assert limiter.decreases >= 1 and limiter.current < 8
+
+
+def test_limiter_never_goes_below_minimum():
+    limiter = AdaptiveLimiter(8, minimum=2)
+    record(limiter, 0.0, True)  # zero latency: every failure may halve the limit
+    record(limiter, 0.0, False, times=10)
+    assert limiter.decreases >= 2 and limiter.current == 2
@@ -0,0 +1,54 @@
+"""
+AIAgentLab工具包。
+
+tools/下的每个模块仍然可以作为独立脚本运行（python tools/llm_api.py ...），它们之间
+按模块名直接互相导入（from llm_api import query_llm）。作为包导入时把本目录加入
+sys.path，并让 tools.xxx 成为模块 xxx 的别名：import tools.llm_api 和 import llm_api
+得到的是同一个模块对象（缓存、单飞请求表等模块级状态只有一份），无论哪个先被导入。
+
+在同一进程内串联搜索、抓取和LLM调用请使用 tools.agent_runtime.AgentRuntime，
+或通过 python -m tools.agent_runtime serve 启动JSON-RPC服务。
+"""
+import importlib
+import importlib.abc
+import importlib.util
+import os
+import sys
+
+_TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+if _TOOLS_DIR not in sys.path:
+    sys.path.insert(0, _TOOLS_DIR)
+
+
+class _AliasLoader(importlib.abc.Loader):
+    """把 tools.xxx 加载为已按模块名 xxx 导入（或此时导入）的同一个模块对象。"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def create_module(self, spec):
+        module = importlib.import_module(self.name)
+        self.spec = module.__spec__  # 导入系统会把__spec__改成tools.xxx的，执行阶段再改回来
+        return module
+
+    def exec_module(self, module):
+        module.__spec__ = self.spec  # 模块已经按模块名执行过，不再执行第二次
+
+    def get_code(self, fullname):
+        # python -m tools.xxx 通过runpy执行模块源码，交给模块本身的加载器读取
+        return importlib.util.find_spec(self.name).loader.get_code(self.name)
+
+
+class _AliasFinder(importlib.abc.MetaPathFinder):
+    """只处理本目录下的顶层模块（tools/xxx.py），其余导入交给默认的查找器。"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        package, _, name = fullname.rpartition('.')
+        location = os.path.join(_TOOLS_DIR, name + '.py')
+        if package != __name__ or not os.path.isfile(location):
+            return None
+        return importlib.util.spec_from_file_location(fullname, location, loader=_AliasLoader(name))
+
+
+if not any(isinstance(finder, _AliasFinder) for finder in sys.meta_path):
+    sys.meta_path.insert(0, _AliasFinder())
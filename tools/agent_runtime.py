@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+在同一个进程、同一个asyncio事件循环中运行搜索、网页抓取和LLM查询。
+
+按子进程串联 search_engine.py -> web_scraper.py -> llm_api.py 时，每一步都要重新启动
+解释器、导入依赖、建立连接（和浏览器），数据还要经过打印文本再解析。AgentRuntime把
+这些资源在整个会话中只创建一次并共享：
+
+- 搜索：每个工作线程复用一个DDGS客户端（及其HTTP连接）
+- 抓取：一个Chromium浏览器，若干浏览器上下文循环使用；HTML解析在共享进程池中进行
+- LLM：每个提供商一个客户端（OpenAI/Anthropic客户端内部维护HTTP连接池）
+- 缓存：相同的搜索、页面和提示只执行一次，并发的相同请求会等待同一个结果
+
+用法：
+    async with AgentRuntime(provider='openai') as runtime:
+        result = await runtime.research('What is S3 Transfer Acceleration?')
+
+命令行：
+    python tools/agent_runtime.py research "问题" [--no-scrape]
+    python tools/agent_runtime.py serve      # JSON-RPC 2.0 over stdio，每行一条消息
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from instrumentation import span, add_profile_arguments, profile_from_args  # 共用的性能埋点
+from single_flight import flight_stats  # 请求合并的计数
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_MAX_PAGES = 3
+DEFAULT_MAX_CHARS_PER_PAGE = 4000
+
+SUMMARY_PROMPT = """Answer the question using the search results and page extracts below.
+Cite the URLs you relied on. If the sources do not answer the question, say so.
+
+Question: {question}
+
+{sources}"""
+
+
+def build_summary_prompt(question: str, results: List[Dict], pages: List[Optional[str]],
+                         max_chars_per_page: int = DEFAULT_MAX_CHARS_PER_PAGE) -> str:
+    """
+    把搜索结果和抓取到的页面文本拼成总结用的提示。
+    pages与results的前len(pages)项一一对应；没有抓取到的页面使用搜索摘要。
+    """
+    blocks = []
+    for i, result in enumerate(results, 1):
+        page = pages[i - 1] if i <= len(pages) else None
+        text = (page or result.get('body', ''))[:max_chars_per_page]
+        blocks.append(f"[{i}] {result.get('title', '')}\nURL: {result.get('href', '')}\n{text}")
+    return SUMMARY_PROMPT.format(question=question, sources='\n\n'.join(blocks))
+
+
+class AgentRuntime:
+    """
+    共享事件循环、连接、浏览器和缓存的工具运行时，作为异步上下文管理器使用。
+
+    Args:
+        provider: 默认的LLM提供商（与llm_api相同的名称）
+        model: 默认模型，None表示使用llm_api中该提供商的默认模型
+        max_concurrent_pages: 同时打开的页面数上限
+        cache_size: 结果缓存的条目数上限（LRU淘汰）
+        max_workers: 执行同步调用（搜索、LLM请求）的线程数
+    """
+
+    def __init__(self, provider: str = 'openai', model: Optional[str] = None, max_concurrent_pages: int = 5,
+                 cache_size: int = DEFAULT_CACHE_SIZE, max_workers: int = 16):
+        self.provider = provider
+        self.model = model
+        self.max_concurrent_pages = max_concurrent_pages
+        self.cache_size = cache_size
+        self.max_workers = max_workers
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'searches': 0, 'pages': 0, 'queries': 0}
+        self._cache: 'OrderedDict[tuple, asyncio.Future]' = OrderedDict()
+        self._threads = None
+        self._processes = None
+        self._thread_state = threading.local()  # 每个工作线程自己的DDGS客户端
+        self._clients: Dict[str, Any] = {}  # 提供商 -> LLM客户端
+        self._clients_lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._browser_lock = None
+        self._contexts = []  # 空闲的浏览器上下文
+        self._page_slots = None
+        self._ddgs_clients = []
+
+    async def __aenter__(self) -> 'AgentRuntime':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix='agent-io')
+        self._browser_lock = asyncio.Lock()
+        self._page_slots = asyncio.Semaphore(self.max_concurrent_pages)
+
+    async def close(self):
+        """关闭浏览器、客户端和线程/进程池。"""
+        for context in self._contexts:
+            await context.close()
+        self._contexts = []
+        if self._browser is not None:
+            await self._browser.close()
+            await self._playwright.stop()
+            self._browser = self._playwright = None
+        for ddgs in self._ddgs_clients:
+            ddgs.__exit__(None, None, None)
+        self._ddgs_clients = []
+        for client in self._clients.values():
+            close = getattr(client, 'close', None)
+            if callable(close):
+                close()
+        self._clients = {}
+        if self._processes is not None:
+            self._processes.shutdown()
+            self._processes = None
+        if self._threads is not None:
+            self._threads.shutdown()
+            self._threads = None
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    async def _cached(self, key: tuple, factory):
+        """
+        以key缓存factory()的结果。并发的相同请求共享同一个Future；
+        失败或结果为None（如LLM请求出错）的条目不会留在缓存中。
+        """
+        future = self._cache.get(key)
+        if future is not None:
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+        else:
+            self.stats['cache_misses'] += 1
+            future = asyncio.ensure_future(factory())
+            self._cache[key] = future
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+            def forget_failures(done, key=key):
+                if self._cache.get(key) is done and (done.cancelled() or done.exception() is not None
+                                                     or done.result() is None):
+                    del self._cache[key]
+            future.add_done_callback(forget_failures)
+        # shield：一个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(future)
+
+    def _in_thread(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._threads, fn, *args)
+
+    # ------------------------------------------------------------------
+    # 搜索
+    # ------------------------------------------------------------------
+
+    def _thread_ddgs(self):
+        """当前工作线程的DDGS客户端，首次使用时创建，之后复用其连接。"""
+        ddgs = getattr(self._thread_state, 'ddgs', None)
+        if ddgs is None:
+            import search_engine  # 延迟导入：只用LLM时不需要duckduckgo_search
+            ddgs = search_engine.DDGS().__enter__()
+            self._thread_state.ddgs = ddgs
+            self._ddgs_clients.append(ddgs)
+        return ddgs
+
+    async def search(self, query: str, max_results: int = 10) -> List[Dict]:
+        """DuckDuckGo搜索，返回与search_engine.search_with_retry相同的结果列表。"""
+        def run():
+            from search_engine import search_with_retry
+            self.stats['searches'] += 1
+            return search_with_retry(query, max_results, ddgs=self._thread_ddgs())
+        return await self._cached(('search', query, max_results), lambda: self._in_thread(run))
+
+    # ------------------------------------------------------------------
+    # 抓取
+    # ------------------------------------------------------------------
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            if self._browser is None:
+                from playwright.async_api import async_playwright  # 延迟导入：不抓取网页时不需要playwright
+                with span('launch_browser'):
+                    self._playwright = await async_playwright().start()
+                    self._browser = await self._playwright.chromium.launch()
+        return self._browser
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor()
+        return self._processes
+
+    async def scrape_page(self, url: str) -> Optional[str]:
+        """抓取一个页面并提取文本，失败时返回None（与web_scraper相同）。"""
+        async def run():
+            from web_scraper import fetch_page, parse_html
+            browser = await self._get_browser()
+            async with self._page_slots:
+                context = self._contexts.pop() if self._contexts else await browser.new_context()
+                try:
+                    html = await fetch_page(url, context)
+                finally:
+                    self._contexts.append(context)
+            self.stats['pages'] += 1
+            if html is None:
+                return None
+            with span('parse', url=url):
+                return await asyncio.get_running_loop().run_in_executor(self._get_process_pool(), parse_html, html)
+        return await self._cached(('scrape', url), run)
+
+    async def scrape(self, urls: List[str]) -> List[Optional[str]]:
+        """并发抓取多个页面，结果顺序与urls一致。"""
+        return list(await asyncio.gather(*(self.scrape_page(url) for url in urls)))
+
+    # ------------------------------------------------------------------
+    # LLM
+    # ------------------------------------------------------------------
+
+    def _get_client(self, provider: str):
+        with self._clients_lock:
+            if provider not in self._clients:
+                from llm_api import create_llm_client
+                with span('create_client', provider=provider):
+                    self._clients[provider] = create_llm_client(provider)
+            return self._clients[provider]
+
+    async def query(self, prompt: str, provider: Optional[str] = None, model: Optional[str] = None) -> Optional[str]:
+        """查询LLM，失败时返回None（与llm_api.query_llm相同）。"""
+        provider = provider or self.provider
+        model = model or self.model
+
+        def run():
+            from llm_api import query_llm
+            self.stats['queries'] += 1
+            return query_llm(prompt, self._get_client(provider), model=model, provider=provider)
+        return await self._cached(('query', provider, model, prompt), lambda: self._in_thread(run))
+
+    # ------------------------------------------------------------------
+    # 组合
+    # ------------------------------------------------------------------
+
+    async def research(self, question: str, max_results: int = 5, max_pages: int = DEFAULT_MAX_PAGES,
+                       scrape: bool = True, max_chars_per_page: int = DEFAULT_MAX_CHARS_PER_PAGE) -> Dict:
+        """
+        搜索 -> 并发抓取前max_pages个结果 -> 让LLM基于这些材料回答问题。
+        scrape为False时只使用搜索摘要。
+        """
+        with span('research', question=question):
+            results = await self.search(question, max_results)
+            urls = [result['href'] for result in results if result.get('href')][:max_pages]
+            pages = await self.scrape(urls) if scrape and urls else []
+            answer = await self.query(build_summary_prompt(question, results, pages, max_chars_per_page))
+        return {'question': question, 'answer': answer, 'sources': urls}
+
+    def get_stats(self) -> Dict:
+        # single_flight: 工作线程中query_llm/search_with_retry与其他调用方（含其他进程）合并的计数
+        return dict(self.stats, cache_entries=len(self._cache), single_flight=flight_stats())
+
+
+# ----------------------------------------------------------------------
+# JSON-RPC 2.0 over stdio
+# ----------------------------------------------------------------------
+
+RPC_METHODS = ('search', 'scrape', 'scrape_page', 'query', 'research', 'get_stats')
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+def _rpc_error(request_id, code: int, message: str) -> Dict:
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+async def handle_rpc(runtime: AgentRuntime, line: str) -> Optional[Dict]:
+    """
+    处理一条JSON-RPC请求，返回响应。通知（没有id的请求）返回None，出错时也不回复（JSON-RPC 2.0）；
+    无法解析或不是合法请求的消息无法判断是否为通知，返回id为null的错误。
+    """
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return _rpc_error(None, PARSE_ERROR, f"Parse error: {e}")
+    if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+        return _rpc_error(None, INVALID_REQUEST, 'Invalid request')
+
+    request_id = request.get('id')
+    notification = 'id' not in request
+
+    def error(code: int, message: str) -> Optional[Dict]:
+        return None if notification else _rpc_error(request_id, code, message)
+
+    method = request['method']
+    params = request.get('params', {})
+    if method == 'ping':
+        result = 'pong'
+    elif method not in RPC_METHODS:
+        return error(METHOD_NOT_FOUND, f"Method not found: {method}")
+    else:
+        fn = getattr(runtime, method)
+        try:
+            bound = inspect.signature(fn).bind(*params) if isinstance(params, list) else \
+                inspect.signature(fn).bind(**params)
+        except TypeError as e:
+            return error(INVALID_PARAMS, f"Invalid params: {e}")
+        try:
+            result = fn(*bound.args, **bound.kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            print(f"ERROR: {method} failed: {e}", file=sys.stderr)
+            return error(SERVER_ERROR, f"{type(e).__name__}: {e}")
+    if notification:
+        return None
+    return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+
+async def serve_stdio(runtime: AgentRuntime, stdin=None, stdout=None):
+    """
+    从stdin逐行读取JSON-RPC请求并并发处理，响应逐行写到stdout（顺序可能与请求不同，以id对应）。
+    收到 shutdown 请求或stdin关闭后，等待进行中的请求完成再退出。
+
+    各工具会向stdout打印调试信息，服务期间把sys.stdout指向stderr，避免破坏协议输出。
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    saved_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    loop = asyncio.get_running_loop()
+    write_lock = asyncio.Lock()
+    pending = set()
+    shutdown = None
+
+    async def respond(line):
+        response = await handle_rpc(runtime, line)
+        if response is not None:
+            async with write_lock:
+                stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+                stdout.flush()
+
+    print("DEBUG: Agent runtime listening on stdio (JSON-RPC 2.0, one message per line)", file=sys.stderr)
+    try:
+        while True:
+            # 在线程中阻塞读取stdin，Windows和Unix上行为一致
+            line = await loop.run_in_executor(None, stdin.readline)
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                message = None
+            if isinstance(message, dict) and message.get('method') == 'shutdown':
+                shutdown = message
+                break
+            task = asyncio.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        if shutdown is not None and 'id' in shutdown:  # 进行中的请求都已响应后再确认关闭
+            stdout.write(json.dumps({'jsonrpc': '2.0', 'id': shutdown['id'], 'result': 'bye'}) + '\n')
+            stdout.flush()
+    finally:
+        sys.stdout = saved_stdout  # 恢复调用前的sys.stdout，而不是协议输出用的stdout参数
+
+
+async def _run_command(args):
+    async with AgentRuntime(args.provider, args.model, args.max_concurrent) as runtime:
+        if args.command == 'serve':
+            await serve_stdio(runtime)
+        else:
+            result = await runtime.research(args.question, args.max_results, args.max_pages, not args.no_scrape)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+            print(f"DEBUG: {runtime.get_stats()}", file=sys.stderr)
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='在同一进程中运行搜索、抓取和LLM查询')
+    parser.add_argument('--provider', default='openai',
+                        choices=['openai', 'anthropic', 'gemini', 'local', 'deepseek', 'azure', 'siliconflow'],
+                        help='默认的LLM提供商 (默认: openai)')
+    parser.add_argument('--model', help='默认模型 (默认值取决于提供商)')
+    parser.add_argument('--max-concurrent', type=int, default=5, help='同时抓取的页面数 (默认: 5)')
+    add_profile_arguments(parser)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('serve', help='以JSON-RPC 2.0 over stdio方式提供服务')
+    research = commands.add_parser('research', help='搜索、抓取并总结一个问题')
+    research.add_argument('question', help='要研究的问题')
+    research.add_argument('--max-results', type=int, default=5, help='搜索结果数量 (默认: 5)')
+    research.add_argument('--max-pages', type=int, default=DEFAULT_MAX_PAGES,
+                          help=f'抓取的页面数量 (默认: {DEFAULT_MAX_PAGES})')
+    research.add_argument('--no-scrape', action='store_true', help='只用搜索摘要，不抓取网页')
+    args = parser.parse_args()
+
+    with profile_from_args(args, 'agent_runtime'):
+        asyncio.run(_run_command(args))
+
+
+if __name__ == '__main__':
+    main()
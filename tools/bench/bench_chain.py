@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+搜索 -> 抓取 -> 总结 链路的基准：按.cursorrules中的方式逐个启动子进程
+（search_engine.py、web_scraper.py、llm_api.py）与在AgentRuntime中同一进程内运行对比。
+
+两种方式使用相同的本地替身服务（假搜索后端、合成网页服务、桩LLM服务）和相同的提示，
+因此差异只来自进程启动、导入、建立连接和文本传递的开销。
+
+    python tools/bench/bench_chain.py --chains 5
+    python tools/bench/bench_chain.py --no-scrape      # 没有安装playwright时只测搜索和总结
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.dirname(BENCH_DIR)
+REPO_ROOT = os.path.dirname(TOOLS_DIR)
+for path in (BENCH_DIR, TOOLS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from stub_services import FakeSearchBackend, StubLLMServer, StubPageServer  # noqa: E402
+from agent_runtime import AgentRuntime, build_summary_prompt  # noqa: E402
+
+# 在子进程中运行search_engine.main()，但把DDGS换成假搜索后端
+SEARCH_SHIM = """
+import sys
+sys.path[:0] = {paths!r}
+import search_engine
+from stub_services import FakeSearchBackend
+FakeSearchBackend.latency = {latency!r}
+FakeSearchBackend.base_url = {base_url!r}
+search_engine.DDGS = FakeSearchBackend
+sys.argv = ['search_engine.py', {query!r}, '--max-results', '{max_results}']
+search_engine.main()
+"""
+
+
+def parse_search_output(text: str) -> List[Dict]:
+    """把search_engine.py打印的结果解析回字典列表。"""
+    results = []
+    for line in text.splitlines():
+        if line.startswith('=== Result'):
+            results.append({})
+        elif results and ': ' in line:
+            key, _, value = line.partition(': ')
+            field = {'URL': 'href', 'Title': 'title', 'Snippet': 'body'}.get(key)
+            if field:
+                results[-1][field] = value
+    return results
+
+
+def parse_scraper_output(text: str, urls: List[str]) -> List[str]:
+    """把web_scraper.py打印的 "=== Content from <url> ===" 分段解析回页面文本。"""
+    pages = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith('=== Content from ') and line.endswith(' ==='):
+            current = line[len('=== Content from '):-4]
+            pages[current] = []
+        elif line == '=' * 80:
+            current = None
+        elif current is not None:
+            pages[current].append(line)
+    return ['\n'.join(pages.get(url, [])) or None for url in urls]
+
+
+def _run(command: List[str], env: Dict) -> str:
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True, encoding='utf-8')
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(command[:3])} failed: {completed.stderr.strip()[-500:]}")
+    return completed.stdout
+
+
+def subprocess_chain(question: str, options, env: Dict) -> Dict:
+    """一条链路，每一步一个子进程。返回各步耗时（秒）。"""
+    timings = {}
+    start_time = time.perf_counter()
+    code = SEARCH_SHIM.format(paths=[BENCH_DIR, TOOLS_DIR], latency=options.search_latency,
+                              base_url=options.page_base_url, query=question, max_results=options.max_results)
+    results = parse_search_output(_run([sys.executable, '-c', code], env))
+    timings['search'] = time.perf_counter() - start_time
+
+    urls = [result['href'] for result in results if result.get('href')][:options.max_pages]
+    pages = []
+    if options.scrape and urls:
+        step_start = time.perf_counter()
+        pages = parse_scraper_output(_run([sys.executable, os.path.join(TOOLS_DIR, 'web_scraper.py')] + urls, env), urls)
+        timings['scrape'] = time.perf_counter() - step_start
+
+    step_start = time.perf_counter()
+    prompt = build_summary_prompt(question, results, pages)
+    answer = _run([sys.executable, os.path.join(TOOLS_DIR, 'llm_api.py'), '--prompt', prompt, '--provider', 'local'],
+                  env).strip()
+    timings['summarize'] = time.perf_counter() - step_start
+    timings['total'] = time.perf_counter() - start_time
+    timings['answer_chars'] = len(answer)
+    return timings
+
+
+def import_tools(scrape: bool) -> float:
+    """导入运行时用到的工具模块，返回耗时（秒）。这是每个会话只付一次的启动开销。"""
+    start_time = time.perf_counter()
+    import llm_api  # noqa: F401
+    import search_engine  # noqa: F401
+    if scrape:
+        import web_scraper  # noqa: F401
+    return time.perf_counter() - start_time
+
+
+async def runtime_chains(questions: List[str], options, concurrent: bool, startup: float) -> Dict:
+    """在一个AgentRuntime中运行所有链路，总耗时加上导入工具模块的启动开销startup。"""
+    import search_engine
+    FakeSearchBackend.latency = options.search_latency
+    FakeSearchBackend.base_url = options.page_base_url
+    search_engine.DDGS = FakeSearchBackend
+
+    start_time = time.perf_counter()
+    latencies = []
+
+    async with AgentRuntime(provider='local', max_concurrent_pages=options.max_pages) as runtime:
+        async def one(question):
+            chain_start = time.perf_counter()
+            result = await runtime.research(question, options.max_results, options.max_pages, options.scrape)
+            latencies.append(time.perf_counter() - chain_start)
+            return result
+
+        if concurrent:
+            results = await asyncio.gather(*(one(question) for question in questions))
+        else:
+            results = [await one(question) for question in questions]
+        stats = runtime.get_stats()
+    total = time.perf_counter() - start_time + startup
+    if any(result['answer'] is None for result in results):
+        raise RuntimeError('A runtime chain returned no answer')
+    return {'total_s': round(total, 3), 'chains_per_sec': round(len(questions) / total, 2),
+            'mean_chain_ms': round(sum(latencies) / len(latencies) * 1000, 1), 'runtime_stats': stats}
+
+
+def run_benchmark(options) -> Dict:
+    questions = [f"How does AWS service {i} handle cross-region replication?" for i in range(options.chains)]
+    with StubLLMServer(latency=options.llm_latency) as llm, StubPageServer() as pages:
+        os.environ['LOCAL_LLM_BASE_URL'] = llm.base_url
+        options.page_base_url = pages.base_url
+        env = dict(os.environ)
+
+        start_time = time.perf_counter()
+        chains = [subprocess_chain(question, options, env) for question in questions]
+        subprocess_total = time.perf_counter() - start_time
+        steps = {step: round(sum(chain[step] for chain in chains) / len(chains) * 1000, 1)
+                 for step in ('search', 'scrape', 'summarize') if step in chains[0]}
+
+        # 两次运行在同一进程中，模块只会真正导入一次，因此单独测量导入耗时并计入两者
+        startup = import_tools(options.scrape)
+        sequential = asyncio.run(runtime_chains(questions, options, False, startup))
+        concurrent = asyncio.run(runtime_chains(questions, options, True, startup))
+
+    return {
+        'chains': options.chains,
+        'scrape': options.scrape,
+        'llm_latency_ms': options.llm_latency * 1000,
+        'search_latency_ms': options.search_latency * 1000,
+        'subprocess': {'total_s': round(subprocess_total, 3),
+                       'chains_per_sec': round(options.chains / subprocess_total, 2),
+                       'mean_chain_ms': round(subprocess_total / options.chains * 1000, 1),
+                       'mean_step_ms': steps},
+        'runtime_startup_s': round(startup, 3),
+        'runtime_sequential': sequential,
+        'runtime_concurrent': concurrent,
+        'speedup_sequential': round(subprocess_total / sequential['total_s'], 2),
+        'speedup_concurrent': round(subprocess_total / concurrent['total_s'], 2),
+    }
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='对比子进程串联与AgentRuntime运行 搜索->抓取->总结 链路')
+    parser.add_argument('--chains', type=int, default=5, help='链路数（每条一个不同的问题）(默认: 5)')
+    parser.add_argument('--max-results', type=int, default=5, help='每次搜索的结果数 (默认: 5)')
+    parser.add_argument('--max-pages', type=int, default=3, help='每条链路抓取的页面数 (默认: 3)')
+    parser.add_argument('--no-scrape', dest='scrape', action='store_false', help='跳过抓取步骤')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='桩LLM服务的响应延迟秒数 (默认: 0.2)')
+    parser.add_argument('--search-latency', type=float, default=0.1, help='假搜索后端的延迟秒数 (默认: 0.1)')
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+基准测试的输入数据。
+
+录制数据直接使用仓库中的真实文件（Anki文本导出、GUI抓取样本）；合成数据按固定随机种子
+生成，同一scale下每次运行完全相同，保证与基线的比较有意义。
+"""
+
+import os
+import random
+import sys
+from typing import List
+
+# 仓库根目录（本文件位于tools/bench/下）
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ANKI_EXPORT = os.path.join(REPO_ROOT, 'temp', 'AWS Certified Solutions Architect - Associate SAA-C03.txt')
+CAPTURE_SAMPLE = os.path.join(REPO_ROOT, 'aws_saa_study', 'anki_extracted_20250624_152811.txt')
+
+_WORDS = ('amazon', 'instance', 'bucket', 'replication', 'latency', 'region', 'policy', 'cluster',
+          'throughput', 'snapshot', 'gateway', 'endpoint', 'encryption', 'subnet', 'queue', 'lambda')
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def make_html_page(paragraphs: int, seed: int = 0) -> str:
+    """
+    生成一个结构接近真实文档页的HTML：导航链接、嵌套的section/列表/表格、
+    内联script和style，以及页内锚点和javascript链接（parse_html应过滤掉这些）。
+    """
+    rng = random.Random(seed)
+    parts = ['<!DOCTYPE html><html><head><title>Synthetic page</title>',
+             '<style>body { font-family: sans-serif; }</style>',
+             '<script>var tracker = function() { return 1; };</script></head><body>',
+             '<nav>' + ''.join(f'<a href="/docs/page{i}.html">Page {i}</a>' for i in range(10)) + '</nav>']
+    for i in range(paragraphs):
+        parts.append(f'<section><h2>Section {i}</h2>')
+        parts.append(f'<p>{_sentence(rng, 25)} <a href="https://example.com/ref/{seed}/{i}">reference {i}</a> '
+                     f'{_sentence(rng, 15)}</p>')
+        if i % 3 == 0:
+            parts.append('<ul>' + ''.join(f'<li>{_sentence(rng, 6)}</li>' for _ in range(5)) + '</ul>')
+        if i % 5 == 0:
+            rows = ''.join(f'<tr><td>{_sentence(rng, 3)}</td><td>{rng.randint(1, 1000)}</td></tr>' for _ in range(4))
+            parts.append(f'<table>{rows}</table>')
+        if i % 7 == 0:
+            parts.append('<p><a href="#top">Back to top</a> <a href="javascript:void(0)">Share</a></p>')
+        parts.append('</section>')
+    parts.append('<footer><script>window.analytics = {};</script>Copyright</footer></body></html>')
+    return ''.join(parts)
+
+
+def make_html_pages(scale: int = 1) -> List[str]:
+    """小、中、大三种页面各若干个，总量随scale线性增长。"""
+    sizes = [5, 40, 200]
+    return [make_html_page(sizes[i % len(sizes)], seed=i) for i in range(6 * scale)]
+
+
+def _read(path: str) -> str:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Recorded fixture not found: {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def scaled_anki_export(scale: int = 1) -> str:
+    """把真实的Anki文本导出中的记录重复scale次（保留文件头的注释行）。"""
+    lines = _read(ANKI_EXPORT).splitlines(keepends=True)
+    header = [line for line in lines if line.startswith('#')]
+    records = [line for line in lines if not line.startswith('#') and line.strip()]
+    return ''.join(header + records * scale)
+
+
+def scaled_capture(scale: int = 1) -> str:
+    """GUI抓取样本重复scale次，用于标记扫描。"""
+    return _read(CAPTURE_SAMPLE) * scale
+
+
+def card_captures(scale: int = 1) -> List[str]:
+    """把抓取样本切成单张卡片的剪贴板内容（与GUI每次复制到的文本相同的形式）。"""
+    sample = _read(CAPTURE_SAMPLE)
+    cards = [card.strip() for card in sample.split('-' * 60) if '【Question' in card]
+    return cards * scale
+
+
+def build_anki_collection(path: str, notes: int) -> int:
+    """用make_anki_fixture生成一个包含notes条笔记的collection文件，返回笔记数。"""
+    sys.path.insert(0, os.path.join(REPO_ROOT, 'aws_saa_study'))
+    from make_anki_fixture import build_collection, load_source_notes
+
+    pairs = load_source_notes(ANKI_EXPORT)
+    build_collection(path, [pairs[i % len(pairs)] for i in range(notes)])
+    return notes
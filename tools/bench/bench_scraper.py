@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+web_scraper.process_urls 的抓取调度基准：在本地合成站点上抓取大量URL，
+对比原来的"每个URL一个任务、一次gather全部"方式(gather)与PageScheduler(scheduler)的
+峰值内存(RSS，包含浏览器子进程)和每秒页面数。
+
+合成站点由若干个StubPageServer组成（每个端口算一个主机），并发请求超过--capacity后
+响应延迟按比例变长，用来观察AIMD上限的调整。
+
+    python tools/bench/bench_scraper.py --pages 1000 --hosts 4
+    python tools/bench/bench_scraper.py --modes scheduler --pages-per-context 20
+
+需要安装playwright及Chromium（playwright install chromium）。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.dirname(BENCH_DIR)
+for path in (BENCH_DIR, TOOLS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+MODES = ('gather', 'scheduler')
+
+
+class RssSampler:
+    """
+    在后台线程中定期采样当前进程及所有子进程（浏览器进程）的RSS之和，记录最大值。
+
+    需要psutil；没有安装时peak_mb返回None，由调用方退回到resource模块的单进程峰值。
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            total = 0
+            for process in [self._process] + self._process.children(recursive=True):
+                try:
+                    total += process.memory_info().rss
+                except Exception:  # 子进程可能在采样期间退出
+                    pass
+            self.peak = max(self.peak, total)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> 'RssSampler':
+        if self._process is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._process is not None:
+            self._thread.join()
+
+    @property
+    def peak_mb(self) -> Optional[float]:
+        return round(self.peak / 2**20, 1) if self._process is not None else None
+
+
+def fallback_peak_rss_mb() -> Dict:
+    """没有psutil时：本进程和已退出子进程中最大单个进程的峰值RSS(MB)。"""
+    import resource
+    scale = 2**20 if sys.platform == 'darwin' else 2**10  # macOS单位为字节，Linux为KB
+    return {'self_peak_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+            'largest_child_peak_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)}
+
+
+async def gather_all(urls: List[str], max_concurrent: int) -> List[str]:
+    """原来的process_urls：每个URL一个fetch_page任务，一次gather，全部抓完后再用Pool解析。"""
+    from multiprocessing import Pool
+    from playwright.async_api import async_playwright
+    from web_scraper import fetch_page, parse_html
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        contexts = [await browser.new_context() for _ in range(min(len(urls), max_concurrent))]
+        try:
+            html_contents = await asyncio.gather(*(fetch_page(url, contexts[i % len(contexts)])
+                                                   for i, url in enumerate(urls)))
+            with Pool() as pool:
+                return pool.map(parse_html, html_contents)
+        finally:
+            for context in contexts:
+                await context.close()
+            await browser.close()
+
+
+def run_child(mode: str, urls: List[str], options) -> Dict:
+    """在当前进程中按mode抓取一遍，返回耗时、吞吐量和峰值内存。"""
+    import logging
+    import web_scraper
+    web_scraper.logger.setLevel(logging.WARNING)  # 每个页面两行INFO日志会拖慢大批量抓取
+
+    stats = {}
+    with RssSampler() as sampler:
+        start_time = time.perf_counter()
+        if mode == 'gather':
+            results = asyncio.run(gather_all(urls, options.max_concurrent))
+        else:
+            results = asyncio.run(web_scraper.process_urls(urls, options.max_concurrent, options.per_host,
+                                                           options.pages_per_context, stats=stats))
+        elapsed = time.perf_counter() - start_time
+
+    result = {
+        'mode': mode,
+        'pages': len(urls),
+        'failed': sum(1 for text in results if not text),
+        'total_s': round(elapsed, 3),
+        'pages_per_sec': round(len(urls) / elapsed, 1),
+        'peak_rss_mb': sampler.peak_mb,
+    }
+    if sampler.peak_mb is None:
+        result.update(fallback_peak_rss_mb())
+    if stats:
+        result['scheduler'] = stats
+    return result
+
+
+def run_mode(mode: str, urls: List[str], options) -> Dict:
+    """在独立子进程中运行一个mode，避免两次运行共享浏览器进程和内存峰值。"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', mode,
+               '--max-concurrent', str(options.max_concurrent), '--per-host', str(options.per_host),
+               '--pages-per-context', str(options.pages_per_context)]
+    completed = subprocess.run(command, input=json.dumps(urls), capture_output=True, text=True, encoding='utf-8')
+    if completed.returncode != 0:
+        return {'mode': mode, 'error': completed.stderr.strip()[-500:]}
+    return json.loads(completed.stdout)
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    from web_scraper import DEFAULT_PAGES_PER_CONTEXT, DEFAULT_PER_HOST
+
+    parser = argparse.ArgumentParser(description='在本地合成站点上对比抓取调度方式的峰值内存和吞吐量')
+    parser.add_argument('--pages', type=int, default=1000, help='抓取的URL数量 (默认: 1000)')
+    parser.add_argument('--hosts', type=int, default=4, help='合成站点的主机（端口）数 (默认: 4)')
+    parser.add_argument('--paragraphs', type=int, default=40, help='每个页面的段落数 (默认: 40)')
+    parser.add_argument('--latency', type=float, default=0.05, help='页面的基础响应延迟秒数 (默认: 0.05)')
+    parser.add_argument('--capacity', type=int, default=8,
+                        help='每个主机并发超过多少后延迟按比例增加 (默认: 8)')
+    parser.add_argument('--max-concurrent', type=int, default=16, help='最大并发页面数 (默认: 16)')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST,
+                        help=f'每个主机的并发上限 (默认: {DEFAULT_PER_HOST})')
+    parser.add_argument('--pages-per-context', type=int, default=DEFAULT_PAGES_PER_CONTEXT,
+                        help=f'每个上下文处理多少页面后重建 (默认: {DEFAULT_PAGES_PER_CONTEXT})')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='要运行的调度方式')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)  # 内部使用：从stdin读取URL列表并运行
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, json.load(sys.stdin), args)))
+        return
+
+    from stub_services import StubPageServer
+    servers = [StubPageServer(paragraphs=args.paragraphs, latency=args.latency, capacity=args.capacity).start()
+               for _ in range(args.hosts)]
+    try:
+        urls = [f"{servers[i % len(servers)].base_url}/docs/page{i}.html" for i in range(args.pages)]
+        results = []
+        for mode in args.modes:
+            result = run_mode(mode, urls, args)
+            print(f"DEBUG: {mode}: {result}", file=sys.stderr)
+            results.append(result)
+    finally:
+        for server in servers:
+            server.stop()
+
+    print(json.dumps({'pages': args.pages, 'hosts': args.hosts, 'latency_ms': args.latency * 1000,
+                      'capacity': args.capacity, 'results': results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+跨工具的统一基准测试。
+
+每个用例在独立的子进程中运行，测量吞吐量、单次调用延迟的百分位数和峰值内存(RSS)；
+另外单独测量导入对应模块的启动时间。结果保存为JSON，并可与保存的基线比较，
+任何指标变差超过阈值即视为性能回退（退出码为1）。
+
+    python tools/bench/run_bench.py                     # 运行全部用例并与基线比较
+    python tools/bench/run_bench.py --save-baseline     # 把本次结果保存为新基线
+    python tools/bench/run_bench.py --cases parse_html,query_llm --scale 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.dirname(BENCH_DIR)
+REPO_ROOT = os.path.dirname(TOOLS_DIR)
+AWS_DIR = os.path.join(REPO_ROOT, 'aws_saa_study')
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_THRESHOLD = 0.10
+
+# 各指标的"好"方向：1表示越大越好，-1表示越小越好
+METRIC_DIRECTIONS = {
+    'throughput': 1,
+    'mb_per_sec': 1,
+    'p50_ms': -1,
+    'p90_ms': -1,
+    'p99_ms': -1,
+    'peak_rss_mb': -1,
+    'startup_ms': -1,
+}
+
+for path in (BENCH_DIR, TOOLS_DIR, AWS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# 用例注册表：名称 -> (被测模块名, 用例函数)
+CASES: Dict[str, tuple] = {}
+
+
+def bench_case(name: str, module: str):
+    """注册一个基准用例。module是被测模块，用于测量启动（导入）时间。"""
+    def register(fn):
+        CASES[name] = (module, fn)
+        return fn
+    return register
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """最近秩法求百分位数，sorted_values必须已排序。"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def measure(call: Callable, inputs: Sequence, repeat: int = 3, units_per_call: float = 1,
+            unit: str = 'calls', warmup: bool = True) -> Dict:
+    """
+    对每个输入调用call，重复repeat轮，统计每次调用的延迟和整体吞吐量。
+
+    Args:
+        call: 被测函数，接收一个输入
+        inputs: 输入列表
+        repeat: 轮数
+        units_per_call: 每次调用处理的工作量（如一次处理的题目数），用于计算吞吐量
+        unit: 吞吐量的单位名称
+        warmup: 是否先用第一个输入预热一次（填充缓存、完成惰性导入）
+    """
+    if warmup and inputs:
+        call(inputs[0])
+    latencies = []
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            call_start = time.perf_counter()
+            call(item)
+            latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start_time
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'unit': f"{unit}/s",
+        'throughput': round(len(latencies) * units_per_call / elapsed, 2) if elapsed else None,
+        'mean_ms': round(elapsed / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存(MB)。Unix使用resource模块，Windows需要安装psutil。"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位是KB，macOS上是字节
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+# ---------------------------------------------------------------------------
+# 基准用例
+# ---------------------------------------------------------------------------
+
+@bench_case('parse_html', 'web_scraper')
+def bench_parse_html(options) -> Dict:
+    """web_scraper.parse_html 解析合成的文档页面。"""
+    from web_scraper import parse_html
+    from bench_fixtures import make_html_pages
+
+    pages = make_html_pages(options.scale)
+    result = measure(parse_html, pages, options.repeat, unit='pages')
+    total_bytes = sum(len(page.encode('utf-8')) for page in pages)
+    result['mb_per_sec'] = round(total_bytes * result['throughput'] / len(pages) / 1e6, 2)
+    result['input'] = f"{len(pages)} pages, {total_bytes / 1e6:.2f} MB"
+    return result
+
+
+@bench_case('format_questions', 'format_aws_questions')
+def bench_format_questions(options) -> Dict:
+    """format_aws_questions.format_questions 格式化按scale放大的Anki导出文件（读、解析、写全流程）。"""
+    from format_aws_questions import format_questions
+    from bench_fixtures import scaled_anki_export
+
+    content = scaled_anki_export(options.scale)
+    records = sum(1 for line in content.splitlines() if line.strip() and not line.startswith('#'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = os.path.join(tmp_dir, 'export.txt')
+        output_file = os.path.join(tmp_dir, 'formatted.txt')
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        result = measure(lambda path: format_questions(path, output_file), [input_file], options.repeat,
+                         units_per_call=records, unit='records')
+    result['mb_per_sec'] = round(len(content.encode('utf-8')) * result['throughput'] / records / 1e6, 2)
+    result['input'] = f"{records} records"
+    return result
+
+
+@bench_case('marker_scanner', 'marker_scanner')
+def bench_marker_scanner(options) -> Dict:
+    """marker_scanner.scan_questions 扫描放大后的GUI抓取文本中的全部题目。"""
+    from marker_scanner import scan_questions
+    from bench_fixtures import scaled_capture
+
+    text = scaled_capture(20 * options.scale)
+    questions = sum(1 for _ in scan_questions(text))
+    result = measure(lambda t: list(scan_questions(t)), [text], options.repeat * 5,
+                     units_per_call=questions, unit='questions')
+    result['mb_per_sec'] = round(len(text.encode('utf-8')) * result['throughput'] / questions / 1e6, 2)
+    result['input'] = f"{questions} questions"
+    return result
+
+
+@bench_case('query_llm', 'llm_api')
+def bench_query_llm(options) -> Dict:
+    """llm_api.query_llm 通过local提供商请求本地桩服务，测量客户端和HTTP往返的开销。"""
+    from stub_services import StubLLMServer
+
+    with StubLLMServer(latency=options.llm_latency) as server:
+        os.environ['LOCAL_LLM_BASE_URL'] = server.base_url
+        from llm_api import create_llm_client, query_llm
+
+        client = create_llm_client('local')
+        prompts = [f"Question {i}: which AWS service stores objects?" for i in range(20 * options.scale)]
+        result = measure(lambda prompt: query_llm(prompt, client, provider='local'), prompts, options.repeat,
+                         unit='requests')
+        result['input'] = f"{len(prompts)} prompts, stub latency {options.llm_latency * 1000:g} ms"
+    return result
+
+
+@bench_case('search', 'search_engine')
+def bench_search(options) -> Dict:
+    """search_engine.search_with_retry 使用假搜索后端（替换DDGS），测量结果处理的开销。"""
+    import search_engine
+    from stub_services import FakeSearchBackend
+
+    FakeSearchBackend.latency = options.search_latency
+    search_engine.DDGS = FakeSearchBackend
+    queries = [f"aws saa question {i}" for i in range(50 * options.scale)]
+    result = measure(lambda query: search_engine.search_with_retry(query, max_results=10), queries,
+                     options.repeat, unit='queries')
+    result['input'] = f"{len(queries)} queries, backend latency {options.search_latency * 1000:g} ms"
+    return result
+
+
+@bench_case('anki_collection', 'anki_collection_reader')
+def bench_anki_collection(options) -> Dict:
+    """anki_collection_reader.export_collection 导出生成的collection文件。"""
+    from anki_collection_reader import export_collection
+    from bench_fixtures import build_anki_collection
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = os.path.join(tmp_dir, 'collection.anki2')
+        notes = build_anki_collection(collection, 2000 * options.scale)
+        output_file = os.path.join(tmp_dir, 'export.txt')
+        result = measure(lambda path: export_collection(path, output_file), [collection], options.repeat,
+                         units_per_call=notes, unit='notes')
+    result['input'] = f"{notes} notes"
+    return result
+
+
+@bench_case('anki_pipeline', 'extraction_pipeline')
+def bench_anki_pipeline(options) -> Dict:
+    """extraction_pipeline.ExtractionPipeline 处理剪贴板抓取内容（标记提取、去重、批量写入）。"""
+    from extraction_pipeline import ExtractionPipeline
+    from marker_scanner import extract_marked
+    from bench_fixtures import card_captures
+
+    captures = card_captures(20 * options.scale)
+
+    def run(batch):
+        pipeline = ExtractionPipeline(io.StringIO(), extract_marked).start()
+        for index, raw in enumerate(batch, 1):
+            pipeline.submit(index, raw)
+        pipeline.close()
+
+    result = measure(run, [captures], options.repeat, units_per_call=len(captures), unit='captures')
+    result['input'] = f"{len(captures)} captures"
+    return result
+
+
+# ---------------------------------------------------------------------------
+# 运行、保存与比较
+# ---------------------------------------------------------------------------
+
+def measure_startup(module: str, repeat: int = 3) -> Optional[float]:
+    """在新的解释器中导入module所需的时间（毫秒，取最快一次），导入失败返回None。"""
+    code = ('import sys; sys.path[:0] = ' + repr([BENCH_DIR, TOOLS_DIR, AWS_DIR]) + f'; import {module}')
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            return None
+        timings.append(time.perf_counter() - start_time)
+    return round(min(timings) * 1000, 1)
+
+
+def run_child(name: str, options) -> Dict:
+    """子进程入口：运行单个用例，被测代码的输出都转到stderr，stdout只输出一行JSON结果。"""
+    module, fn = CASES[name]
+    with contextlib.redirect_stdout(sys.stderr):
+        result = fn(options)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_case(name: str, options) -> Dict:
+    """在独立子进程中运行一个用例，使峰值内存只反映该工具本身。"""
+    module, _ = CASES[name]
+    command = [sys.executable, os.path.abspath(__file__), '--child', name, '--scale', str(options.scale),
+               '--repeat', str(options.repeat), '--llm-latency', str(options.llm_latency),
+               '--search-latency', str(options.search_latency)]
+    completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, encoding='utf-8')
+    if options.verbose and completed.stderr:
+        print(completed.stderr, file=sys.stderr)
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ['unknown error'])[-1]
+        status = 'skipped' if 'ModuleNotFoundError' in error else 'error'
+        return {'status': status, 'error': error}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['status'] = 'ok'
+    result['startup_ms'] = measure_startup(module)
+    return result
+
+
+def run_suite(names: List[str], options) -> Dict:
+    results = {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': options.scale,
+        'repeat': options.repeat,
+        'cases': {},
+    }
+    for name in names:
+        print(f"DEBUG: Running {name}...", file=sys.stderr)
+        result = run_case(name, options)
+        results['cases'][name] = result
+        if result['status'] == 'ok':
+            print(f"DEBUG: {name}: {result['throughput']} {result['unit']}, p50 {result['p50_ms']} ms, "
+                  f"p99 {result['p99_ms']} ms, peak RSS {result['peak_rss_mb']} MB, "
+                  f"startup {result['startup_ms']} ms", file=sys.stderr)
+        else:
+            print(f"DEBUG: {name} {result['status']}: {result['error']}", file=sys.stderr)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    逐项比较本次结果与基线，返回每个可比较指标的变化。
+
+    change为相对变化（正数表示变好），低于 -threshold 的标记为回退。
+    规模不同的结果没有可比性，此时直接报错。
+    """
+    if baseline.get('scale') != results.get('scale'):
+        raise ValueError(f"Baseline was recorded at scale {baseline.get('scale')}, "
+                         f"current run uses scale {results.get('scale')}")
+    rows = []
+    for name, current in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if not previous or current.get('status') != 'ok' or previous.get('status') != 'ok':
+            continue
+        for metric, direction in METRIC_DIRECTIONS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            rows.append({'case': name, 'metric': metric, 'baseline': old, 'current': new,
+                         'change': round(change, 4), 'regression': change < -threshold})
+    return rows
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    lines = [f"{'case':<18} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        lines.append(f"{row['case']:<18} {row['metric']:<12} {row['baseline']:>12g} {row['current']:>12g} "
+                     f"{row['change']:>+8.1%}{flag}")
+    return '\n'.join(lines)
+
+
+def save_json(data: Dict, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='运行工具基准测试，保存结果并与基线比较')
+    parser.add_argument('--cases', help=f"逗号分隔的用例名 (默认全部: {','.join(CASES)})")
+    parser.add_argument('--list', action='store_true', help='列出所有用例')
+    parser.add_argument('--scale', type=int, default=1, help='输入规模倍数 (默认: 1)')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的测量轮数 (默认: 3)')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='桩LLM服务每次请求的延迟秒数 (默认: 0)')
+    parser.add_argument('--search-latency', type=float, default=0.0, help='假搜索后端每次请求的延迟秒数 (默认: 0)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'结果文件 (默认: {DEFAULT_OUTPUT})')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f'基线文件 (默认: {DEFAULT_BASELINE})')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'指标变差超过该比例即视为回退 (默认: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--verbose', action='store_true', help='显示被测工具的输出')
+    parser.add_argument('--child', help=argparse.SUPPRESS)  # 内部使用：在子进程中运行单个用例
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args)))
+        return
+
+    if args.list:
+        for name, (module, fn) in CASES.items():
+            print(f"{name:<18} {fn.__doc__.strip()}")
+        return
+
+    names = args.cases.split(',') if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+
+    results = run_suite(names, args)
+    save_json(results, args.output)
+    print(f"DEBUG: Results saved to {args.output}", file=sys.stderr)
+
+    if args.save_baseline:
+        save_json(results, args.baseline)
+        print(f"DEBUG: Baseline saved to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"DEBUG: No baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.threshold)
+    print(format_comparison(rows))
+    regressions = [row for row in rows if row['regression']]
+    if regressions:
+        print(f"\n{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
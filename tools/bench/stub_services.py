@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+基准测试用的本地替身服务：不依赖网络和API Key，延迟可控，结果可复现。
+
+- StubLLMServer: 兼容OpenAI Chat Completions接口的HTTP服务，配合 LOCAL_LLM_BASE_URL 使用，
+  也模拟OpenAI Batch API和Anthropic Message Batches
+- FakeSearchBackend: 与 duckduckgo_search.DDGS 接口相同的假搜索后端
+- StubPageServer: 提供合成网页的本地站点，可模拟随并发增加的响应延迟
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Union
+from urllib.parse import urlsplit
+
+
+# 模拟提供商的前缀缓存：达到这个token数的前缀才会被缓存（与OpenAI、Anthropic的下限相同）
+PREFIX_CACHE_MIN_TOKENS = 1024
+# 批处理中包含这个标记的请求返回错误，用来验证错误结果的映射
+STUB_ERROR_MARKER = 'STUB_ERROR'
+
+
+def _text_of(content) -> str:
+    """消息content可能是字符串或内容块列表，取出其中的文本。"""
+    if isinstance(content, str):
+        return content
+    return ''.join(part.get('text', '') for part in content or [])
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    """
+    处理 POST /v1/chat/completions（OpenAI格式）和 POST /v1/messages（Anthropic格式），
+    按固定延迟返回一段确定的回复。
+
+    批处理接口：/v1/files、/v1/batches（OpenAI Batch API）和 /v1/messages/batches
+    （Anthropic Message Batches）。批次创建batch_delay秒后第一次被查询时一次性处理完成，
+    请求内容中包含STUB_ERROR_MARKER的请求返回错误结果。
+
+    两种格式都模拟提供商的前缀缓存，token数按4个字符1个token估算：
+    OpenAI格式自动缓存system消息组成的前缀（按128 token取整）；Anthropic格式缓存
+    system中最后一个带cache_control的块及之前的内容。同一前缀第二次出现时计为缓存命中。
+    """
+
+    protocol_version = 'HTTP/1.1'  # 保持连接，避免每个请求都重新建立TCP连接
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写出，不关闭Nagle会引入约40ms的延迟确认等待
+
+    def log_message(self, format, *args):
+        pass  # 基准测试时不输出访问日志
+
+    def _cached_prefix(self, prefix: str) -> bool:
+        """记录一个可缓存的前缀，返回它之前是否已经出现过。"""
+        with self.server.lock:
+            seen = prefix in self.server.prefixes
+            self.server.prefixes.add(prefix)
+        return seen
+
+    def _send_json(self, body, status: int = 200):
+        self._send(json.dumps(body).encode('utf-8'), 'application/json', status)
+
+    def _send(self, data: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _next_number(self) -> int:
+        with self.server.lock:
+            self.server.requests += 1
+            return self.server.requests
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length)
+        path = urlsplit(self.path).path.rstrip('/')
+        if path.endswith('/files'):
+            return self._send_json(self._upload_file(data))
+        request = json.loads(data or b'{}')
+        if path.endswith('/messages/batches'):
+            return self._send_json(self._create_batch('anthropic', request.get('requests', [])))
+        if path.endswith('/batches'):
+            return self._send_json(self._create_batch('openai', request))
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        number = self._next_number()
+        self.server.last_request = request  # 供检查实际发送给上游的内容
+        if path.endswith('/messages'):
+            body = self._anthropic_reply(request, number)
+        else:
+            body = self._openai_reply(request, number)
+        self._send_json(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        parts = path.split('/')
+        if '/files/' in path and path.endswith('/content'):  # /v1/files/{id}/content
+            content = self.server.files.get(parts[-2])
+            if content is None:
+                return self._send_json({'error': {'message': 'file not found'}}, 404)
+            return self._send(content, 'application/octet-stream')
+        if '/messages/batches/' in path and path.endswith('/results'):  # /v1/messages/batches/{id}/results
+            batch = self._finish_batch(parts[-2])
+            if batch is None or batch['results'] is None:
+                return self._send_json({'error': {'message': 'results not available'}}, 404)
+            return self._send(batch['results'], 'application/binary')
+        if '/batches/' in path:  # /v1/batches/{id} 或 /v1/messages/batches/{id}
+            batch = self._finish_batch(parts[-1])
+            if batch is None:
+                return self._send_json({'error': {'message': 'batch not found'}}, 404)
+            return self._send_json(self._batch_object(batch))
+        self._send_json({'error': {'message': f"unknown path {path}"}}, 404)
+
+    # ---- 批处理接口 ----
+
+    def _upload_file(self, data: bytes) -> dict:
+        """POST /v1/files：解析multipart表单，保存file字段的内容。"""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+        message = BytesParser(policy=policy.default).parsebytes(header + data)
+        content = b''
+        for part in message.iter_parts():
+            if part.get_param('name', header='content-disposition') == 'file':
+                content = part.get_payload(decode=True)
+        with self.server.lock:
+            file_id = f"file-stub{len(self.server.files) + 1}"
+            self.server.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': 'batch.jsonl', 'purpose': 'batch', 'status': 'processed'}
+
+    def _create_batch(self, kind: str, request) -> dict:
+        """创建批次，批次在batch_delay秒后第一次被查询时处理完成。"""
+        with self.server.lock:
+            prefix = 'msgbatch_stub' if kind == 'anthropic' else 'batch_stub'
+            batch_id = f"{prefix}{len(self.server.batches) + 1}"
+            batch = {'id': batch_id, 'kind': kind, 'request': request, 'created': time.time(),
+                     'ended': None, 'counts': None, 'results': None, 'output_file_id': None, 'error_file_id': None}
+            self.server.batches[batch_id] = batch
+        return self._batch_object(batch)
+
+    def _finish_batch(self, batch_id: str) -> Optional[dict]:
+        with self.server.lock:
+            batch = self.server.batches.get(batch_id)
+            if batch is None or batch['ended'] or time.time() - batch['created'] < self.server.batch_delay:
+                return batch
+            batch['ended'] = time.time()
+        if batch['kind'] == 'anthropic':
+            self._run_anthropic_batch(batch)
+        else:
+            self._run_openai_batch(batch)
+        return batch
+
+    def _run_openai_batch(self, batch: dict):
+        content = self.server.files.get(batch['request'].get('input_file_id'), b'')
+        output, errors = [], []
+        for line in content.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            number = self._next_number()
+            if STUB_ERROR_MARKER in json.dumps(entry['body'], ensure_ascii=False):
+                errors.append({'id': f"batch_req_{number}", 'custom_id': entry['custom_id'],
+                               'response': {'status_code': 400, 'request_id': f"req_{number}",
+                                            'body': {'error': {'message': 'stub error', 'type': 'invalid_request_error'}}},
+                               'error': None})
+            else:
+                output.append({'id': f"batch_req_{number}", 'custom_id': entry['custom_id'],
+                               'response': {'status_code': 200, 'request_id': f"req_{number}",
+                                            'body': self._openai_reply(entry['body'], number)},
+                               'error': None})
+        with self.server.lock:
+            for field, lines in (('output_file_id', output), ('error_file_id', errors)):
+                if lines:
+                    file_id = f"file-stub{len(self.server.files) + 1}"
+                    self.server.files[file_id] = ''.join(json.dumps(line) + '\n' for line in lines).encode('utf-8')
+                    batch[field] = file_id
+            batch['counts'] = {'total': len(output) + len(errors), 'completed': len(output), 'failed': len(errors)}
+
+    def _run_anthropic_batch(self, batch: dict):
+        lines, succeeded, errored = [], 0, 0
+        for entry in batch['request']:
+            number = self._next_number()
+            if STUB_ERROR_MARKER in json.dumps(entry['params'], ensure_ascii=False):
+                errored += 1
+                result = {'type': 'errored', 'error': {'type': 'error', 'error': {
+                    'type': 'invalid_request_error', 'message': 'stub error'}}}
+            else:
+                succeeded += 1
+                result = {'type': 'succeeded', 'message': self._anthropic_reply(entry['params'], number)}
+            lines.append(json.dumps({'custom_id': entry['custom_id'], 'result': result}) + '\n')
+        batch['results'] = ''.join(lines).encode('utf-8')
+        batch['counts'] = {'processing': 0, 'succeeded': succeeded, 'errored': errored, 'canceled': 0, 'expired': 0}
+
+    def _batch_object(self, batch: dict) -> dict:
+        created = int(batch['created'])
+        ended = int(batch['ended']) if batch['ended'] else None
+        if batch['kind'] == 'anthropic':
+            def iso(timestamp):
+                return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+            host, port = self.server.server_address[:2]
+            counts = batch['counts'] or {'processing': len(batch['request']), 'succeeded': 0, 'errored': 0,
+                                         'canceled': 0, 'expired': 0}
+            return {'id': batch['id'], 'type': 'message_batch',
+                    'processing_status': 'ended' if ended else 'in_progress', 'request_counts': counts,
+                    'created_at': iso(created), 'ended_at': iso(ended),
+                    'expires_at': iso(created + timedelta(days=1).total_seconds()),
+                    'archived_at': None, 'cancel_initiated_at': None,
+                    'results_url': f"http://{host}:{port}/v1/messages/batches/{batch['id']}/results" if ended else None}
+        request = batch['request']
+        return {'id': batch['id'], 'object': 'batch', 'endpoint': request.get('endpoint'), 'errors': None,
+                'input_file_id': request.get('input_file_id'), 'completion_window': request.get('completion_window'),
+                'status': 'completed' if ended else 'in_progress',
+                'output_file_id': batch['output_file_id'], 'error_file_id': batch['error_file_id'],
+                'created_at': created, 'completed_at': ended,
+                'request_counts': batch['counts'] or {'total': 0, 'completed': 0, 'failed': 0},
+                'metadata': request.get('metadata')}
+
+    def _reply(self, prompt: str) -> str:
+        """回复内容：reply为函数时按请求文本生成，否则为固定文本或默认的确定回复。"""
+        if callable(self.server.reply):
+            return self.server.reply(prompt)
+        return self.server.reply or f"stub reply to {len(prompt)} characters"
+
+    def _openai_reply(self, request: dict, number: int) -> dict:
+        messages = request.get('messages', [])
+        prompt = ''.join(_text_of(message.get('content')) for message in messages)
+        prefix = ''.join(_text_of(message.get('content')) for message in messages if message.get('role') == 'system')
+        cached = 0
+        if len(prefix) // 4 >= PREFIX_CACHE_MIN_TOKENS and self._cached_prefix(prefix):
+            cached = len(prefix) // 4 // 128 * 128
+        reply = self._reply(prompt)
+        return {
+            'id': f"stub-{number}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': reply}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(reply) // 4,
+                      'total_tokens': (len(prompt) + len(reply)) // 4,
+                      'prompt_tokens_details': {'cached_tokens': cached}},
+        }
+
+    def _anthropic_reply(self, request: dict, number: int) -> dict:
+        system = request.get('system') or []
+        if isinstance(system, str):
+            system = [{'type': 'text', 'text': system}]
+        marked = [i for i, block in enumerate(system) if block.get('cache_control')]
+        split = marked[-1] + 1 if marked else 0  # 最后一个缓存断点之后的内容不缓存
+        prefix = ''.join(block.get('text', '') for block in system[:split])
+        rest = ''.join(block.get('text', '') for block in system[split:])
+        rest += ''.join(_text_of(message.get('content')) for message in request.get('messages', []))
+        if len(prefix) // 4 < PREFIX_CACHE_MIN_TOKENS:  # 前缀太短，按普通输入计费
+            prefix, rest = '', prefix + rest
+        read = written = 0
+        if prefix:
+            if self._cached_prefix(prefix):
+                read = len(prefix) // 4
+            else:
+                written = len(prefix) // 4
+        reply = self._reply(prefix + rest)
+        return {
+            'id': f"msg_stub{number}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': request.get('model', 'stub'),
+            'content': [{'type': 'text', 'text': reply}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {'input_tokens': len(rest) // 4, 'output_tokens': len(reply) // 4,
+                      'cache_read_input_tokens': read, 'cache_creation_input_tokens': written},
+        }
+
+
+class _StubServer:
+    """
+    在后台线程中运行的本地HTTP服务的公共部分：创建服务、启动/停止线程，可作为上下文管理器使用。
+    子类传入请求处理类，并把各自的配置挂在self.httpd上供处理类读取。
+    """
+
+    poll_interval = 0.05  # serve_forever检查停止请求的间隔，stop()最多等待这么久
+
+    def __init__(self, handler, host: str = '127.0.0.1', port: int = 0, name: str = 'stub-server'):
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(self.poll_interval,), name=name,
+                                        daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubLLMServer(_StubServer):
+    """
+    在后台线程中运行的OpenAI兼容桩服务，可作为上下文管理器使用：
+
+        with StubLLMServer(latency=0.05) as server:
+            os.environ['LOCAL_LLM_BASE_URL'] = server.base_url
+            os.environ['ANTHROPIC_BASE_URL'] = server.anthropic_base_url  # Anthropic格式
+    """
+
+    def __init__(self, latency: float = 0.0, reply: Union[str, Callable[[str], str]] = '',
+                 host: str = '127.0.0.1', port: int = 0, batch_delay: float = 0.0):
+        super().__init__(_ChatHandler, host, port, name='stub-llm')
+        self.httpd.latency = latency
+        self.httpd.batch_delay = batch_delay  # 批次创建后多少秒完成
+        self.httpd.files = {}  # 文件ID -> 内容（批处理的输入、输出和错误文件）
+        self.httpd.batches = {}  # 批次ID -> 批次状态
+        self.httpd.reply = reply  # 固定回复，或由请求文本（system和各条消息拼接）生成回复的函数
+        self.httpd.requests = 0
+        self.httpd.last_request = None
+        self.httpd.prefixes = set()  # 模拟前缀缓存中已有的前缀
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.address}/v1"
+
+    @property
+    def anthropic_base_url(self) -> str:
+        """Anthropic SDK的base_url（SDK自己会加上 /v1/messages）。"""
+        return self.address
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    @property
+    def last_request(self) -> Optional[dict]:
+        """最近一次对话请求的JSON内容。"""
+        return self.httpd.last_request
+
+
+class FakeSearchBackend:
+    """
+    替代 duckduckgo_search.DDGS：支持with语句和 text(query, max_results)，
+    按查询内容生成确定的结果，并可模拟每次请求的网络延迟。
+    """
+
+    latency = 0.0  # 类属性，方便在替换DDGS类之前统一设置
+    base_url = 'https://example.com'  # 结果链接的前缀，可指向本地页面服务以便继续抓取
+
+    def __enter__(self) -> 'FakeSearchBackend':
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def text(self, query: str, max_results: int = 10) -> Iterator[Dict[str, str]]:
+        if self.latency:
+            time.sleep(self.latency)
+        slug = '-'.join(query.lower().split())[:40]
+        for i in range(max_results):
+            yield {
+                'title': f"{query} - result {i + 1}",
+                'href': f"{self.base_url}/{slug}/{i + 1}",
+                'body': f"Synthetic snippet {i + 1} for '{query}'. " * 3,
+            }
+
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    """按路径生成确定的合成HTML页面（同一路径每次返回相同内容）。"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        from bench_fixtures import make_html_page
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            in_flight = server.in_flight
+        try:
+            if server.latency:  # 并发请求超过capacity后延迟按比例增加，模拟过载的网站
+                time.sleep(server.latency * max(1.0, in_flight / server.capacity))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        body = make_html_page(self.server.paragraphs, seed=sum(self.path.encode('utf-8'))).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubPageServer(_StubServer):
+    """在本地提供合成网页的HTTP服务，供抓取基准使用（与FakeSearchBackend.base_url配合）。"""
+
+    def __init__(self, paragraphs: int = 40, latency: float = 0.0, capacity: int = 8,
+                 host: str = '127.0.0.1', port: int = 0):
+        super().__init__(_PageHandler, host, port, name='stub-pages')
+        self.httpd.paragraphs = paragraphs
+        self.httpd.latency = latency
+        self.httpd.capacity = max(1, capacity)
+        self.httpd.in_flight = 0
+
+    @property
+    def base_url(self) -> str:
+        return self.address
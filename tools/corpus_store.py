@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+抓取结果的语料库：只追加写入的压缩段文件 + 独立的偏移索引。
+
+web_scraper.py 的结果（URL、抓取时间、HTML哈希、提取的文本）写入这里后，建索引和LLM
+处理可以直接读取，不必重新抓取。
+
+目录结构：
+    <store>/segments/000001.seg   段文件：8字节文件头，之后是若干帧 [4字节长度][压缩后的JSON记录]
+    <store>/index.jsonl           每行一条索引：url -> (段号, 偏移, 长度)，后写入的覆盖先写入的
+
+每条记录单独压缩，按URL查找时只需一次seek和一次解压；顺序遍历时用mmap读取段文件。
+安装了zstandard时使用zstd压缩，否则使用标准库的zlib(deflate)；每个段文件在文件头中
+记录自己的压缩方式，两种段可以混合存在。同一时间只应有一个进程写入。
+"""
+
+import argparse  # 导入用于解析命令行参数的库
+import hashlib  # 导入哈希库，用于计算HTML内容的哈希
+import json  # 导入JSON库，用于序列化记录和索引
+import mmap  # 导入内存映射库，用于顺序遍历段文件
+import os  # 导入操作系统相关功能库
+import struct  # 导入struct库，用于读写帧长度和文件头
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import time  # 导入时间库，用于记录抓取时间
+import zlib  # 导入zlib库，作为没有zstandard时的压缩方式
+from typing import Dict, Iterator, List, Optional  # 从typing库导入类型提示
+
+try:
+    import zstandard  # 可选依赖：压缩率和解压速度都优于zlib
+except ImportError:
+    zstandard = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 默认的语料库目录，已在.gitignore中忽略
+DEFAULT_CORPUS_DIR = os.path.join(REPO_ROOT, '.corpus')
+# 单个段文件超过这个大小后写入新的段文件
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 2**20
+
+SEGMENT_MAGIC = b'CSEG'  # 段文件头的前4字节
+SEGMENT_VERSION = 1
+CODECS = {'zlib': 0, 'zstd': 1}  # 压缩方式 -> 文件头中的编号
+_HEADER = struct.Struct('<4sBB2x')  # 魔数、版本、压缩方式、2字节保留
+_FRAME = struct.Struct('<I')  # 每帧前的压缩数据长度
+
+
+def default_codec() -> str:
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def html_hash(html: str) -> str:
+    """HTML内容的sha256，用于判断页面是否变化。"""
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+class _Codec:
+    """一种压缩方式的压缩/解压函数。zstd的压缩器和解压器可以复用，避免每条记录重新创建。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        if name == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("This corpus segment is zstd-compressed; install it with: pip install zstandard")
+            self.compress = zstandard.ZstdCompressor(level=6).compress
+            self.decompress = zstandard.ZstdDecompressor().decompress
+        elif name == 'zlib':
+            self.compress = lambda data: zlib.compress(data, 6)
+            self.decompress = zlib.decompress
+        else:
+            raise ValueError(f"Unknown codec: {name}")
+
+
+class CorpusStore:
+    """
+    抓取结果的只追加存储。
+
+        with CorpusStore() as store:
+            store.add(url, text, html=html)
+            record = store.get(url)          # O(1)，返回最新的一条记录
+            for record in store.iter_records():
+                ...
+
+    Args:
+        path: 语料库目录，不存在时自动创建
+        codec: 新段文件的压缩方式（'zstd' 或 'zlib'），默认有zstandard时用zstd
+        max_segment_bytes: 单个段文件的大小上限
+    """
+
+    def __init__(self, path: str = DEFAULT_CORPUS_DIR, codec: Optional[str] = None,
+                 max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES):
+        self.path = path
+        self.segment_dir = os.path.join(path, 'segments')
+        self.index_path = os.path.join(path, 'index.jsonl')
+        self.codec = _Codec(codec or default_codec())
+        self.max_segment_bytes = max_segment_bytes
+        self.index: Dict[str, Dict] = {}  # url -> 最新的索引项
+        self._codecs: Dict[int, _Codec] = {}  # 段号 -> 该段的压缩方式
+        self._segment = None  # 当前追加写入的段文件对象
+        self._segment_id = 0
+        self._resume = True  # 第一次写入时是否尝试续写最后一个段
+        self._index_file = None
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._load_index()
+
+    # ---- 索引 ----
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:  # 写到一半中断的最后一行
+                    continue
+                if entry.get('deleted'):
+                    self.index.pop(entry['url'], None)
+                else:
+                    self.index[entry['url']] = entry
+
+    def _append_index(self, entry: Dict):
+        if self._index_file is None:
+            self._index_file = open(self.index_path, 'a', encoding='utf-8')
+            if self._index_file.tell() and not self._ends_with_newline():
+                self._index_file.write('\n')  # 上次中断留下的半行单独成行，加载时跳过，不会与新索引项拼在一起
+        self._index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._index_file.flush()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.index_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    # ---- 段文件 ----
+
+    def segment_ids(self) -> List[int]:
+        """按写入顺序排列的段号。"""
+        return sorted(int(name[:-4]) for name in os.listdir(self.segment_dir) if name.endswith('.seg'))
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.segment_dir, f"{segment_id:06d}.seg")
+
+    def _segment_codec(self, segment_id: int) -> _Codec:
+        if segment_id not in self._codecs:
+            with open(self._segment_path(segment_id), 'rb') as f:
+                magic, version, codec_id = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+                raise ValueError(f"Not a corpus segment: {self._segment_path(segment_id)}")
+            name = next(name for name, number in CODECS.items() if number == codec_id)
+            self._codecs[segment_id] = self.codec if name == self.codec.name else _Codec(name)
+        return self._codecs[segment_id]
+
+    def _writer(self, size: int):
+        """返回可以写入size字节的段文件：续写当前段，放不下时新建一个段。"""
+        if self._segment is None and self._resume:
+            self._resume = False
+            self._resume_last_segment()
+        if self._segment is not None:
+            if self._segment.tell() + size <= self.max_segment_bytes:
+                return self._segment
+            self._segment.close()
+        self._segment_id = max(self.segment_ids(), default=0) + 1
+        self._segment = open(self._segment_path(self._segment_id), 'wb')
+        self._segment.write(_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, CODECS[self.codec.name]))
+        self._codecs[self._segment_id] = self.codec
+        return self._segment
+
+    def _resume_last_segment(self):
+        """打开后第一次写入时，如果最后一个段的压缩方式相同就接着写。"""
+        ids = self.segment_ids()
+        if not ids or self._segment_codec(ids[-1]) is not self.codec:
+            return
+        last = ids[-1]
+        # 截掉上次中断时写了一半、没有进入索引的帧，保证顺序遍历时帧是连续的
+        end = max((entry['offset'] + entry['length'] for entry in self.index.values()
+                   if entry['segment'] == last), default=_HEADER.size)
+        self._segment = open(self._segment_path(last), 'r+b')
+        self._segment.truncate(end)
+        self._segment.seek(end)
+        self._segment_id = last
+
+    # ---- 写入 ----
+
+    def add(self, url: str, text: str, html: Optional[str] = None, html_sha256: Optional[str] = None,
+            fetched_at: Optional[float] = None) -> Dict:
+        """
+        追加一条记录并返回其索引项。同一URL再次写入时，新记录覆盖旧记录（旧记录在compact时清除）。
+
+        Args:
+            url: 页面URL
+            text: 提取的文本（web_scraper.parse_html的结果）
+            html: 原始HTML，只用于计算哈希，不保存
+            html_sha256: 已计算好的HTML哈希，与html二选一
+            fetched_at: 抓取时间（Unix时间戳），默认为当前时间
+        """
+        record = {
+            'url': url,
+            'fetched_at': fetched_at if fetched_at is not None else time.time(),
+            'html_hash': html_sha256 or (html_hash(html) if html is not None else None),
+            'text': text,
+        }
+        return self._write(record)
+
+    def _write(self, record: Dict) -> Dict:
+        payload = self.codec.compress(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+        segment = self._writer(_FRAME.size + len(payload))
+        offset = segment.tell()
+        segment.write(_FRAME.pack(len(payload)) + payload)
+        segment.flush()  # 先写数据再写索引，索引中出现的记录一定完整
+        entry = {'url': record['url'], 'segment': self._segment_id, 'offset': offset,
+                 'length': _FRAME.size + len(payload), 'fetched_at': record['fetched_at'],
+                 'html_hash': record['html_hash']}
+        self._append_index(entry)
+        self.index[record['url']] = entry
+        return entry
+
+    def delete(self, url: str) -> bool:
+        """删除一个URL的记录（写入删除标记，数据在compact时清除）。"""
+        if url not in self.index:
+            return False
+        self._append_index({'url': url, 'deleted': True})
+        del self.index[url]
+        return True
+
+    # ---- 读取 ----
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def urls(self) -> List[str]:
+        return list(self.index)
+
+    def get(self, url: str) -> Optional[Dict]:
+        """按URL读取最新的记录，不存在时返回None。"""
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        if self._segment is not None:
+            self._segment.flush()
+        with open(self._segment_path(entry['segment']), 'rb') as f:
+            f.seek(entry['offset'] + _FRAME.size)
+            payload = f.read(entry['length'] - _FRAME.size)
+        return json.loads(self._segment_codec(entry['segment']).decompress(payload))
+
+    def iter_records(self, latest_only: bool = True) -> Iterator[Dict]:
+        """
+        按写入顺序遍历所有段文件中的记录（mmap读取，不逐条seek）。
+
+        Args:
+            latest_only: 只返回每个URL当前有效的那条记录，跳过被覆盖或删除的旧记录
+        """
+        live = self._live_offsets() if latest_only else None
+        for _, _, record in self._scan(self.segment_ids(), live):
+            yield record
+
+    def _live_offsets(self) -> Dict[int, set]:
+        """段号 -> 索引中有效记录的偏移集合，用于遍历时不解压就跳过旧记录。"""
+        live: Dict[int, set] = {}
+        for entry in self.index.values():
+            live.setdefault(entry['segment'], set()).add(entry['offset'])
+        return live
+
+    def _scan(self, segment_ids: List[int], live: Optional[Dict[int, set]] = None):
+        """逐帧遍历段文件，产出 (段号, 偏移, 记录)；给定live时只解压其中的帧。"""
+        if self._segment is not None:
+            self._segment.flush()
+        for segment_id in segment_ids:
+            wanted = live.get(segment_id) if live is not None else None
+            if live is not None and not wanted:
+                continue
+            codec = self._segment_codec(segment_id)
+            with open(self._segment_path(segment_id), 'rb') as f:
+                if os.fstat(f.fileno()).st_size <= _HEADER.size:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    offset = _HEADER.size
+                    while offset + _FRAME.size <= len(data):
+                        (length,) = _FRAME.unpack_from(data, offset)
+                        end = offset + _FRAME.size + length
+                        if end > len(data):  # 写到一半中断的最后一帧
+                            break
+                        if wanted is None or offset in wanted:
+                            yield segment_id, offset, json.loads(codec.decompress(data[offset + _FRAME.size:end]))
+                        offset = end
+
+    # ---- 维护 ----
+
+    def compact(self) -> Dict:
+        """
+        把所有有效记录重写到新的段文件中，清除被覆盖和删除的旧记录，并重写索引。
+
+        新索引先写到临时文件再原子替换，中途中断时旧索引和旧段文件仍然有效。
+        """
+        self.close()
+        old_ids = self.segment_ids()
+        old_bytes = sum(os.path.getsize(self._segment_path(i)) for i in old_ids)
+        live = self._live_offsets()
+
+        index_tmp = self.index_path + '.tmp'
+        self.index = {}
+        self._resume = False  # 不续写旧段，有效记录全部写入新段
+        self._index_file = open(index_tmp, 'w', encoding='utf-8')
+        try:
+            for _, _, record in self._scan(old_ids, live):
+                self._write(record)
+        except BaseException:
+            # 丢弃写了一半的新段和临时索引，恢复到压缩前的状态
+            self.close()
+            for segment_id in self.segment_ids():
+                if segment_id not in old_ids:
+                    os.remove(self._segment_path(segment_id))
+            os.remove(index_tmp)
+            self.index = {}
+            self._load_index()
+            raise
+        self.close()
+        os.replace(index_tmp, self.index_path)
+        for segment_id in old_ids:
+            os.remove(self._segment_path(segment_id))
+            self._codecs.pop(segment_id, None)
+
+        new_ids = self.segment_ids()
+        return {'records': len(self.index), 'segments_before': len(old_ids), 'segments_after': len(new_ids),
+                'bytes_before': old_bytes,
+                'bytes_after': sum(os.path.getsize(self._segment_path(i)) for i in new_ids)}
+
+    def stats(self) -> Dict:
+        ids = self.segment_ids()
+        return {'path': self.path, 'records': len(self.index), 'segments': len(ids),
+                'bytes': sum(os.path.getsize(self._segment_path(i)) for i in ids),
+                'codec': self.codec.name}
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        self._resume = True
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    def __enter__(self) -> 'CorpusStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='查看、导出和压缩web_scraper的抓取语料库')
+    parser.add_argument('--store', default=DEFAULT_CORPUS_DIR, help=f'语料库目录 (默认: {DEFAULT_CORPUS_DIR})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='显示记录数、段文件数和占用空间')
+    get = commands.add_parser('get', help='按URL输出一条记录的文本')
+    get.add_argument('url', help='页面URL')
+    commands.add_parser('list', help='列出所有URL及抓取时间')
+    export = commands.add_parser('export', help='按写入顺序导出为JSONL（每行一条记录），供建索引或LLM处理')
+    export.add_argument('-o', '--output', help='输出文件路径 (默认: 标准输出)')
+    commands.add_parser('compact', help='清除被覆盖和删除的旧记录，重写段文件和索引')
+    args = parser.parse_args()
+
+    with CorpusStore(args.store) as store:
+        if args.command == 'stats':
+            print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+        elif args.command == 'get':
+            record = store.get(args.url)
+            if record is None:
+                print(f"ERROR: {args.url} is not in the corpus", file=sys.stderr)
+                sys.exit(1)
+            print(record['text'])
+        elif args.command == 'list':
+            for url, entry in store.index.items():
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['fetched_at']))}  {url}")
+        elif args.command == 'export':
+            out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+            try:
+                count = 0
+                for record in store.iter_records():
+                    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+            finally:
+                if args.output:
+                    out.close()
+            print(f"DEBUG: Exported {count} records", file=sys.stderr)
+        elif args.command == 'compact':
+            start_time = time.time()
+            result = store.compact()
+            print(f"DEBUG: Compacted in {time.time() - start_time:.2f}s: {result}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+import argparse  # 导入用于解析命令行参数的库
+import json  # 导入JSON库，用于构造提示、解析回复和写入结果
+import os  # 导入操作系统相关功能库
+import re  # 导入正则表达式库，用于估算token数
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import time  # 导入时间库，用于统计耗时和重试等待
+from concurrent.futures import ThreadPoolExecutor, as_completed  # 导入线程池，用于并发请求
+from typing import Dict, Iterable, Iterator, List, Optional, Set  # 从typing库导入类型提示
+
+from format_aws_questions import question_key, read_formatted_questions  # 复用题库文件的解析函数和题目的稳定键
+from llm_api import create_llm_client, query_llm  # 复用LLM客户端和单次查询函数
+
+# 默认的题库文件和结果文件（相对于仓库根目录）
+DEFAULT_INPUT = os.path.join('temp', 'Formatted_AWS_Questions.txt')
+DEFAULT_OUTPUT = os.path.join('temp', 'enriched_questions.jsonl')
+# 每个提示的默认token预算（只计算题目部分，不含固定说明）
+DEFAULT_TOKEN_BUDGET = 3000
+# 每个提示最多包含的题目数，避免单次回复过长被截断
+DEFAULT_MAX_PER_PROMPT = 8
+
+# 发送给模型的固定说明，要求按题号返回JSON数组
+PROMPT_HEADER = """You are an AWS Certified Solutions Architect instructor.
+For each question below, explain why the given answer is correct and why the other options are not,
+and assign 2-5 short topic tags (for example "S3", "VPC", "cost optimization").
+
+Reply with ONLY a JSON array, one object per question, in this exact form:
+[{"number": <question number>, "explanation": "<explanation>", "tags": ["<tag>", ...]}]
+
+"""
+
+# 解析回复中的JSON（模型有时会用```json代码块包裹，或在数组前后附带说明文字）
+_JSON_DECODER = json.JSONDecoder()
+# 匹配CJK字符，用于估算token数
+_CJK_RE = re.compile(r'[぀-ヿ㐀-鿿가-힯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数：英文约每4个字符一个token，CJK字符约每个字符一个token。
+    只用于打包提示，不需要精确。
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def format_question(question: Dict) -> str:
+    """把一道题格式化为提示中的文本块。"""
+    lines = [f"Question {question['number']}:", question['question']]
+    lines.extend(f"{chr(ord('A') + i)}. {option}" for i, option in enumerate(question['options']))
+    lines.append(f"Answer: {question['answer']}")
+    return '\n'.join(lines)
+
+
+def pack_batches(questions: Iterable[Dict], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_per_prompt: int = DEFAULT_MAX_PER_PROMPT) -> Iterator[List[Dict]]:
+    """
+    按顺序把题目打包成批次，每批题目文本的估算token数不超过token_budget。
+    单道题超过预算时单独成批。
+
+    Args:
+        questions (Iterable[Dict]): 题目流
+        token_budget (int): 每个提示的token预算
+        max_per_prompt (int): 每个提示最多包含的题目数
+
+    Yields:
+        List[Dict]: 一个批次的题目
+    """
+    batch: List[Dict] = []
+    used = 0
+    for question in questions:
+        cost = estimate_tokens(format_question(question))
+        if batch and (used + cost > token_budget or len(batch) >= max_per_prompt):
+            yield batch
+            batch, used = [], 0
+        batch.append(question)
+        used += cost
+    if batch:
+        yield batch
+
+
+def build_prompt(batch: List[Dict]) -> str:
+    """为一个批次构造完整的提示。"""
+    return PROMPT_HEADER + '\n\n'.join(format_question(q) for q in batch)
+
+
+def extract_json_array(text: str) -> Optional[list]:
+    """
+    返回文本中第一个能完整解析的JSON数组，没有时返回None。
+    从每个"["开始尝试raw_decode，数组前后说明文字中的方括号不会影响解析。
+    """
+    start = text.find('[')
+    while start != -1:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            value = None
+        if isinstance(value, list):
+            return value
+        start = text.find('[', start + 1)
+    return None
+
+
+def parse_response(response: Optional[str], batch: List[Dict]) -> List[Dict]:
+    """
+    从模型回复中解析出本批次各题的结果，忽略不属于本批次或格式不完整的条目。
+
+    Args:
+        response (str): 模型回复
+        batch (List[Dict]): 本批次的题目
+
+    Returns:
+        List[Dict]: 结果列表，每项包含 key、number、explanation、tags
+    """
+    if not response:
+        return []
+    items = extract_json_array(response)
+    if items is None:
+        return []
+
+    # 提示中用题号标识题目，结果中再换成与题号无关的稳定键
+    keys = {q['number']: q['key'] for q in batch}
+    wanted = set(keys)
+    results = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get('number'))
+        except (TypeError, ValueError):
+            continue
+        if number not in wanted or not item.get('explanation'):
+            continue
+        wanted.discard(number)  # 同一题只保留第一条结果
+        tags = item.get('tags') or []
+        results.append({
+            'key': keys[number],
+            'number': number,
+            'explanation': str(item['explanation']).strip(),
+            'tags': [str(tag) for tag in tags] if isinstance(tags, list) else [str(tags)],
+        })
+    return results
+
+
+def load_checkpoint(output_file: str) -> Set[str]:
+    """
+    读取已有的结果文件，返回已完成题目的稳定键（见question_key）。
+    题号在重新生成题库文件后会变化，因此不使用；没有key的旧结果行视为未完成。
+    最后一行可能因崩溃而不完整，解析失败的行直接跳过。
+    """
+    done: Set[str] = set()
+    if not os.path.exists(output_file):
+        return done
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)['key']))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return done
+
+
+def ensure_trailing_newline(output_file: str):
+    """崩溃可能留下没有换行符的半行，续写前补上换行，避免与下一条结果拼在同一行。"""
+    if not os.path.exists(output_file) or not os.path.getsize(output_file):
+        return
+    with open(output_file, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+
+
+def enrich_batch(batch: List[Dict], client, provider: str, model: Optional[str], retries: int = 2) -> List[Dict]:
+    """
+    请求模型处理一个批次；回复无法解析或缺少部分题目时，对缺少的题目重试。
+
+    Returns:
+        List[Dict]: 成功解析的结果，可能少于批次中的题目数
+    """
+    results: List[Dict] = []
+    pending = batch
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(2 ** (attempt - 1))  # 简单的指数退避
+        parsed = parse_response(query_llm(build_prompt(pending), client, model=model, provider=provider), pending)
+        results.extend(parsed)
+        finished = {r['key'] for r in parsed}
+        pending = [q for q in pending if q['key'] not in finished]
+        if not pending:
+            break
+    return results
+
+
+def run_pipeline(input_file: str, output_file: str, provider: str = 'openai', model: Optional[str] = None,
+                 workers: int = 4, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_per_prompt: int = DEFAULT_MAX_PER_PROMPT, limit: Optional[int] = None,
+                 retries: int = 2) -> Dict:
+    """
+    批量为题库生成解析和标签。
+
+    已写入output_file的题目（按question_key匹配，与题号无关）会被跳过；每个批次完成后
+    立即追加并刷新到磁盘，因此中途崩溃或重新生成题库文件后再运行只会处理剩余的题目。
+
+    Args:
+        input_file (str): format_aws_questions生成的题库文件
+        output_file (str): JSONL结果文件，同时作为断点记录
+        provider (str): LLM提供商
+        model (str, optional): 模型名称
+        workers (int): 并发请求数
+        token_budget (int): 每个提示的token预算
+        max_per_prompt (int): 每个提示最多包含的题目数
+        limit (int, optional): 本次最多处理的题目数
+        retries (int): 每个批次的重试次数
+
+    Returns:
+        Dict: 统计信息
+    """
+    start_time = time.perf_counter()
+    done = load_checkpoint(output_file)
+    todo = []
+    skipped = 0
+    queued: Set[str] = set()
+    for question in read_formatted_questions(input_file):
+        question['key'] = question_key(question)
+        if question['key'] in done:
+            skipped += 1
+        elif question['key'] not in queued:  # 题库中重复的题目只请求一次
+            queued.add(question['key'])
+            todo.append(question)
+    if limit is not None:
+        todo = todo[:limit]
+    batches = list(pack_batches(todo, token_budget, max_per_prompt))
+    print(f"DEBUG: {skipped} questions already enriched, {len(todo)} to go in {len(batches)} prompts",
+          file=sys.stderr)
+
+    stats = {'skipped': skipped, 'requested': len(todo), 'written': 0, 'failed': 0, 'prompts': len(batches)}
+    if not batches:
+        return stats
+
+    client = create_llm_client(provider)  # 所有线程共用一个客户端
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    ensure_trailing_newline(output_file)
+    with open(output_file, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(enrich_batch, batch, client, provider, model, retries): batch for batch in batches}
+        # 只在主线程中写文件，无需加锁
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"ERROR: Batch starting at question {batch[0]['number']} failed: {e}", file=sys.stderr)
+                results = []
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            os.fsync(out.fileno())  # 确保断点落盘
+            stats['written'] += len(results)
+            stats['failed'] += len(batch) - len(results)
+            print(f"DEBUG: Progress {stats['written'] + stats['failed']}/{len(todo)}", file=sys.stderr)
+
+    stats['seconds'] = round(time.perf_counter() - start_time, 2)
+    return stats
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='批量为题库中的题目生成解析和标签')
+    parser.add_argument('--input', default=DEFAULT_INPUT, help=f'题库文件 (默认: {DEFAULT_INPUT})')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'JSONL结果文件，也用作断点 (默认: {DEFAULT_OUTPUT})')
+    parser.add_argument('--provider', choices=['openai', 'anthropic', 'gemini', 'local', 'deepseek', 'azure', 'siliconflow'],
+                        default='openai', help='要使用的API提供商')
+    parser.add_argument('--model', type=str, help='要使用的模型 (默认值取决于提供商)')
+    parser.add_argument('--workers', type=int, default=4, help='并发请求数 (默认: 4)')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f'每个提示的题目token预算 (默认: {DEFAULT_TOKEN_BUDGET})')
+    parser.add_argument('--max-per-prompt', type=int, default=DEFAULT_MAX_PER_PROMPT,
+                        help=f'每个提示最多包含的题目数 (默认: {DEFAULT_MAX_PER_PROMPT})')
+    parser.add_argument('--limit', type=int, help='本次最多处理的题目数')
+    parser.add_argument('--retries', type=int, default=2, help='每个批次的重试次数 (默认: 2)')
+    args = parser.parse_args()
+
+    stats = run_pipeline(args.input, args.output, provider=args.provider, model=args.model,
+                         workers=args.workers, token_budget=args.token_budget,
+                         max_per_prompt=args.max_per_prompt, limit=args.limit, retries=args.retries)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    # 支持从仓库根目录或tools目录运行
+    if os.path.basename(os.getcwd()) == 'tools':
+        os.chdir('..')
+    main()
@@ -1,12 +1,550 @@
 import re
 import os
+import sys
+import json
+import html
+import hashlib
+import time
+import argparse
+import itertools
+from math import comb
+
+from instrumentation import add_profile_arguments, profile_from_args, span
+from marker_scanner import TYPE_PREFIX_RE as _TYPE_PREFIX_RE, scan_questions
+
+SEPARATOR = "=" * 80
+
+# Anki export layout: "#separator:tab" header lines, then one note per line with two fields.
+# The front field is "<type>：<stem><options><answer>" with the stem and options glued together;
+# the back field repeats them as "<type>： <stem>   <options> <answer>      正确答案： ... 正确率：...".
+# Exported with "Include HTML" ("#html:true") the fields keep their <div>/<br> blocks, one per option.
+_ANSWER_RE = re.compile(r'([A-Z](?:,+[A-Z])*)\s*$')
+_FIELD_GAP_RE = re.compile(r'\s{3,}')
+_CHOOSE_RE = re.compile(r'\(Choose (two|three|four)\b', re.IGNORECASE)
+_CHOOSE_COUNTS = {'two': 5, 'three': 6, 'four': 7}
+_CHOOSE_ANSWERS = {'two': 2, 'three': 3, 'four': 4}
+DEFAULT_OPTION_COUNT = 4
+
+# Option text is split into sentence units; option boundaries are always unit boundaries.
+# Options that lost their final period are glued to the next one with a plain space
+# ("...all the documents Configure the ..."), so an imperative verb after a lowercase word
+# also starts a new unit.
+_SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“(])')
+_GLUED_BREAK_RE = re.compile(
+    r'(?<=[a-z0-9)])\s+(?=(?:Add|Attach|Configure|Copy|Create|Deploy|Enable|Implement|Install|Launch|'
+    r'Migrate|Modify|Move|Provision|Publish|Purchase|Replace|Return|Set|Share|Subscribe|Turn|'
+    r'Update|Upload|Use|Write)\b)')
+# When no option ends with a period, every option boundary is a plain space before the verb
+# that starts the next option, and periods only occur inside options.
+_UNPUNCTUATED_BREAK_RE = re.compile(
+    r'(?<=[A-Za-z0-9)])\s+(?=(?:Add|Apply|Assign|Attach|Build|Change|Configure|Convert|Copy|Create|Define|'
+    r'Deploy|Edit|Enable|Establish|Generate|Grant|Host|Implement|Increase|Install|Launch|Migrate|Modify|Mount|'
+    r'Move|Place|Provision|Publish|Purchase|Reduce|Register|Remove|Replace|Restrict|Return|Route|Run|Schedule|'
+    r'Send|Set|Share|Specify|Store|Stream|Subscribe|Tag|Turn|Update|Upload|Use|Write)\b)')
+_SENTENCE_END_RE = re.compile(r'[.!?]["”)]?\s*$')
+_BLOCK_TAG_RE = re.compile(r'<\s*(?:br|/div|/p|/li|/tr|hr)\b[^>]*>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# Sentences starting with these words continue the previous step of the same option.
+_FOLLOW_UP_WORDS = frozenset((
+    'then', 'when', 'after', 'also', 'finally', 'next', 'ensure', 'attach', 'point', 'associate',
+    'connect', 'share', 'subscribe', 'restore', 'return', 'transfer', 'integrate'))
+
+# Segmentation weights, tuned against the tuning split of tools/fixtures/aws_option_labels.json;
+# --bench reports accuracy on the held-out split only.
+BALANCE_WEIGHT = 2.0
+FOLLOW_UP_PENALTY = 1.0
+ALIGN_WEIGHT = 0.5
+ALIGN_SIMILARITY = 0.5
+TAIL_WEIGHT = 0.5
+# One in this many labeled questions is held out from tuning
+HOLDOUT_MODULUS = 3
+# Above this many candidate segmentations fall back to a DP over the per-option terms only.
+MAX_EXHAUSTIVE_SEGMENTATIONS = 500
+
+
+def split_stem(front, back):
+    """
+    Splits the option block from the question stem.
+
+    The back field separates the stem from the options with a run of 3+ spaces, but stems
+    may contain such runs themselves. The right one is the run after which the front field,
+    where the stem and options are glued together, continues without whitespace.
+    Returns (stem, options_text), or None if no such run exists.
+    """
+    stem = None
+    for gap in _FIELD_GAP_RE.finditer(back):
+        candidate = back[:gap.start()].strip()
+        if front.startswith(candidate) and len(front) > len(candidate) and not front[len(candidate)].isspace():
+            stem = candidate
+    if stem is None:
+        # Whitespace differs between the two fields; fall back to the last gap in the back field.
+        gaps = list(_FIELD_GAP_RE.finditer(back))
+        if not gaps:
+            return None
+        return back[:gaps[-1].start()].strip(), back[gaps[-1].end():].strip()
+    return stem, front[len(stem):].strip()
+
+
+def html_field_text(field):
+    """
+    Plain text of a field from an "Include HTML" export: block-level tags become line breaks,
+    other tags are dropped and entities decoded (as anki_collection_reader.strip_html does).
+    """
+    if len(field) > 1 and field[0] == field[-1] == '"':  # fields with quotes are exported CSV-quoted
+        field = field[1:-1].replace('""', '"')
+    text = _TAG_RE.sub('', _BLOCK_TAG_RE.sub('\n', field))
+    return html.unescape(text).replace('\xa0', ' ')
+
+
+def parse_anki_record(line, segmenter=None, html_fields=False):
+    """
+    Parses one exported note into a question record:
+    {'type', 'question', 'options', 'answer', 'review'}. Returns None for lines that are not
+    questions.
+
+    With html_fields the options are read from the field's line structure (one block per
+    option). Otherwise `segmenter(options_text, count)`, defaulting to segment_options, splits
+    the option block and says whether the split is certain. `review` is None, or the reasons
+    the record needs checking by hand: option boundaries that had to be guessed, or an answer
+    key that does not give the number of answers the question asks for.
+    """
+    fields = line.split('\t')
+    if len(fields) < 2:
+        return None
+    front, back = fields[0], fields[1]
+    if html_fields:
+        front, back = html_field_text(front), html_field_text(back)
+    type_match = _TYPE_PREFIX_RE.match(front)
+    if not type_match:
+        return None
+    question_type = type_match.group(1)
+    front = front[type_match.end():]
+
+    answer_match = _ANSWER_RE.search(front)
+    if not answer_match:
+        return None
+    front = front[:answer_match.start()]
+    answer = answer_key(answer_match.group(1))
+
+    lines = [line.strip() for line in front.splitlines() if line.strip()]
+    count = expected_option_count(' '.join(lines))
+    if len(lines) > count:
+        # The field keeps one block per option: the last `count` lines are the options
+        question = ' '.join(lines[:-count])
+        return make_record(question_type, question, lines[-count:], answer, verified=True)
+    front = ' '.join(lines)
+    back = _TYPE_PREFIX_RE.sub('', back).split('正确答案')[0]
+    back = _ANSWER_RE.sub('', back.rstrip())
+
+    parts = split_stem(front, back)
+    if parts is None:
+        return None
+    question, options_text = parts
+
+    count = expected_option_count(question)
+    options, verified = (segmenter or segment_options)(options_text, count) if options_text else ([], False)
+    return make_record(question_type, question, options, answer, verified)
+
+
+def make_record(question_type, question, options, answer, verified):
+    """Builds a question record, noting in `review` what could not be read for certain."""
+    reasons = []
+    if not verified:
+        reasons.append('option boundaries guessed')
+    if len(answer.split(',')) != expected_answer_count(question):
+        reasons.append(f"answer key {answer} does not match the number of answers asked for")
+    return {
+        'type': question_type,
+        'question': question,
+        'options': options,
+        'answer': answer,
+        'review': '; '.join(reasons) or None,
+    }
+
+
+def expected_option_count(question):
+    """Single-answer questions have four options; "(Choose two/three)" ones have 5/6."""
+    match = _CHOOSE_RE.search(question)
+    return _CHOOSE_COUNTS[match.group(1).lower()] if match else DEFAULT_OPTION_COUNT
+
+
+def expected_answer_count(question):
+    """"(Choose two/three)" questions have that many answers, all others one."""
+    match = _CHOOSE_RE.search(question)
+    return _CHOOSE_ANSWERS[match.group(1).lower()] if match else 1
+
+
+def answer_key(raw):
+    """
+    Normalizes an answer marker to "A" or "A,C". A disputed key such as "D,,,B" keeps every
+    letter ("D,B"); make_record flags it when the count does not fit the question.
+    """
+    return ','.join(dict.fromkeys(re.findall(r'[A-Z]', raw)))
+
+
+def split_option_units(options_text):
+    """Splits the option block into sentence units that option boundaries can fall between."""
+    cuts = {}
+    for regex in (_SENTENCE_BREAK_RE, _GLUED_BREAK_RE):
+        for match in regex.finditer(options_text):
+            cuts[match.start()] = match.end()
+    units = []
+    pos = 0
+    for start in sorted(cuts):
+        units.append(options_text[pos:start])
+        pos = cuts[start]
+    units.append(options_text[pos:])
+    return [unit.strip() for unit in units if unit.strip()]
+
+
+def split_on_leading_word(options_text):
+    """
+    Fallback for option lists without any punctuation, e.g.
+    "S3 Standard S3 Intelligent-Tiering S3 One Zone-IA": split wherever the first
+    word of the block repeats outside parentheses.
+    """
+    words = options_text.split()
+    units = [[]]
+    depth = 0
+    for word in words:
+        if units[-1] and depth == 0 and word == words[0]:
+            units.append([])
+        units[-1].append(word)
+        depth += word.count('(') - word.count(')')
+    return [' '.join(unit) for unit in units]
+
+
+def split_on_capitals(unit):
+    """
+    Last-resort split for short noun-phrase options such as
+    "Read replicas Manual snapshots Automated backups": a capitalised word or a number
+    following a word that ends in lowercase, a digit or ")" may start a new option.
+    """
+    words = unit.split()
+    pieces = [[]]
+    depth = 0
+    for word in words:
+        previous = pieces[-1][-1] if pieces[-1] else ''
+        if previous and depth == 0 and re.match(r'[A-Z0-9]', word) and re.search(r'[a-z0-9)]$', previous):
+            pieces.append([])
+        pieces[-1].append(word)
+        depth += word.count('(') - word.count(')')
+    return [' '.join(piece) for piece in pieces]
+
+
+def _prefix_match(a, b, n=4):
+    """Fraction of the first n words two token lists share."""
+    shared = 0
+    for x, y in zip(a[:n], b[:n]):
+        if x != y:
+            break
+        shared += 1
+    return shared / n
+
+
+def split_unpunctuated_options(options_text, count):
+    """
+    Splits an option block whose options have no final period: the exporter glued them with a
+    plain space, so each break before an option verb that does not follow punctuation is a
+    boundary. Returns the options if that gives exactly `count` of them, otherwise None.
+    """
+    if _SENTENCE_END_RE.search(options_text):
+        return None
+    options = [option.strip() for option in _UNPUNCTUATED_BREAK_RE.split(options_text)]
+    return options if len(options) == count and all(options) else None
+
+
+def segment_options(options_text, count):
+    """
+    Splits an option block into `count` options. Returns (options, verified).
+
+    The split is verified when the text itself fixes the boundaries: options without a final
+    period (see split_unpunctuated_options), or exactly `count` sentence units. Otherwise the
+    sentence units are grouped by the best guess below and the record is flagged for review;
+    the plain-text export does not say where a multi-sentence option ends.
+
+    Segmentations are scored favouring options of similar length, options that do not start
+    with a follow-up step ("Attach the ...", "Then ..."), near-duplicate sentences sitting at
+    the same position in their options, and options that end the same way as another option.
+    A DP over the per-option (length and follow-up) terms gives a first answer; the search
+    over the full score then only visits segmentations that could still beat it, and is
+    skipped for large blocks.
+    """
+    options = split_unpunctuated_options(options_text, count)
+    if options:
+        return options, True
+    units = split_option_units(options_text)
+    if len(units) == 1:
+        units = split_on_leading_word(options_text)
+    if len(units) < count:
+        units = [piece for unit in units for piece in split_on_capitals(unit)]
+    n = len(units)
+    if n <= count:
+        return units, n == count
+
+    tokens = [_WORD_RE.findall(unit.lower()) for unit in units]
+    prefix = [0]
+    for unit in units:
+        prefix.append(prefix[-1] + len(unit))
+    mean = prefix[-1] / count
+    start_score = [0.0] + [-FOLLOW_UP_PENALTY if t and t[0] in _FOLLOW_UP_WORDS else 0.0 for t in tokens[1:]]
+    # option_score[s][e]: per-option terms for an option made of units s..e-1 (only e > s is used)
+    option_score = []
+    for s in range(n):
+        base, offset = start_score[s], prefix[s] + mean
+        option_score.append([0.0] * (s + 1) + [base - BALANCE_WEIGHT * ((prefix[e] - offset) / mean) ** 2
+                                               for e in range(s + 1, n + 1)])
+
+    if comb(n - 1, count - 1) <= MAX_EXHAUSTIVE_SEGMENTATIONS:
+        starts = _segment_exhaustive(n, count, tokens, option_score)
+    else:
+        starts = _segment_dp(n, count, option_score, _best_completions(n, count, option_score))
+    ends = starts[1:] + (n,)
+    return [' '.join(units[s:e]) for s, e in zip(starts, ends)], False
+
+
+def _best_completions(n, count, option_score, bonus=None):
+    """
+    rest[m][i]: best per-option score for splitting units i..n-1 into m options (None if
+    impossible). `bonus[e]`, if given, is added for every option ending before unit e.
+    """
+    rest = [[None] * (n + 1) for _ in range(count + 1)]
+    rest[0][n] = 0.0
+    for m in range(1, count + 1):
+        # Best score of the units from j on, plus the bonus of the option ending before j
+        previous = [None if value is None else value + (bonus[j] if bonus else 0.0)
+                    for j, value in enumerate(rest[m - 1])]
+        for i in range(n - m, -1, -1):
+            row = option_score[i]
+            best = None
+            for j in range(i + 1, n - m + 2):
+                if previous[j] is not None and (best is None or row[j] + previous[j] > best):
+                    best = row[j] + previous[j]
+            rest[m][i] = best
+    return rest
+
+
+def _segment_dp(n, count, option_score, rest, bonus=None):
+    """Best option start indices when the score is a sum of per-option terms (see _best_completions)."""
+    starts = []
+    i = 0
+    for m in range(count, 0, -1):
+        starts.append(i)
+        i = max((j for j in range(i + 1, n - m + 2) if rest[m - 1][j] is not None),
+                key=lambda j: option_score[starts[-1]][j] + rest[m - 1][j] + (bonus[j] if bonus else 0.0))
+    return tuple(starts)
+
+
+def _segment_exhaustive(n, count, tokens, option_score):
+    """
+    Best option start indices under the full score, including cross-option terms.
+
+    A branch and bound search seeded with a DP result: a partial segmentation is only
+    extended while its score, plus the best the remaining units could add (per-option terms,
+    each option's best possible tail match and every still open alignment pair counted as a
+    match), can beat the best full segmentation found so far. When the DP result is clear-cut
+    nothing else is visited.
+    """
+    word_sets = [set(t) for t in tokens]
+    sizes = [len(words) for words in word_sets]
+    # partners[b]: earlier units a whose sentence is a near-duplicate of unit b
+    partners = [[] for _ in range(n)]
+    for b in range(1, n):
+        words, size = word_sets[b], sizes[b]
+        # |a & b| <= the smaller size and |a | b| >= the larger one, so very different sizes never match
+        low, high = ALIGN_SIMILARITY * size, size / ALIGN_SIMILARITY
+        for a in range(b):
+            if not low <= sizes[a] <= high:
+                continue
+            shared = len(word_sets[a] & words)
+            if shared >= ALIGN_SIMILARITY * max(1, sizes[a] + size - shared):
+                partners[b].append(a)
+    # open_pairs[j]: alignment pairs not yet decided once units 0..j-1 are placed
+    open_pairs = [0] * (n + 1)
+    for j in range(n - 1, -1, -1):
+        open_pairs[j] = open_pairs[j + 1] + len(partners[j])
+
+    # tail_match[a][b]: how much option-final units a and b end alike; only units that share
+    # their last word can match at all
+    by_last_word = {}
+    for u, t in enumerate(tokens):
+        if t:
+            by_last_word.setdefault(t[-1], []).append(u)
+    tail_match = [[0.0] * n for _ in range(n)]
+    # tail_best[e]: the largest tail bonus an option ending before unit e can get
+    tail_best = [0.0] * (n + 1)
+    for group in by_last_word.values():
+        for a, b in itertools.combinations(group, 2):
+            match = TAIL_WEIGHT * _prefix_match(tokens[a][:-5:-1], tokens[b][:-5:-1])
+            tail_match[a][b] = tail_match[b][a] = match
+            tail_best[a + 1] = max(tail_best[a + 1], match)
+            tail_best[b + 1] = max(tail_best[b + 1], match)
+
+    def tail_score(ends):
+        return sum(max(tail_match[e - 1][o - 1] for o in ends if o != e) for e in ends if tail_best[e])
+
+    def align_gain(u, start, offset):
+        # Alignment terms decided by placing unit u in an option starting at `start`
+        gain = 0.0
+        for a in partners[u]:
+            if a < start:
+                gain += ALIGN_WEIGHT if offset[a] == u - start else -ALIGN_WEIGHT
+        return gain
+
+    def exact_score(starts):
+        offset = [0] * n
+        ends = starts[1:] + (n,)
+        score = tail_score(ends)
+        for s, e in zip(starts, ends):
+            score += option_score[s][e]
+            for u in range(s, e):
+                offset[u] = u - s
+                score += align_gain(u, s, offset)
+        return score
+
+    # The DP over per-option terms plus each option's best tail bonus both seeds the search
+    # and bounds what the remaining units can add
+    optimistic = _best_completions(n, count, option_score, tail_best)
+    best_starts = _segment_dp(n, count, option_score, optimistic, tail_best)
+    best_score = exact_score(best_starts)
+    offset = [0] * n
+
+    def search(starts, i, m, base, bonus):
+        # starts: options placed so far; units i..n-1 remain for m more options. base holds
+        # the exact per-option and decided alignment terms, bonus the placed options' tail_best
+        nonlocal best_starts, best_score
+        starts.append(i)
+        gain = 0.0
+        for j in range(i + 1, n - m + 2):
+            offset[j - 1] = j - 1 - i
+            if partners[j - 1]:
+                gain += align_gain(j - 1, i, offset)
+            if optimistic[m - 1][j] is None:
+                continue
+            value = base + option_score[i][j] + gain
+            if m == 1:
+                if value + bonus + tail_best[n] > best_score:
+                    score = value + tail_score(starts[1:] + [n])
+                    if score > best_score:
+                        best_starts, best_score = tuple(starts), score
+            elif value + bonus + tail_best[j] + optimistic[m - 1][j] + ALIGN_WEIGHT * open_pairs[j] > best_score:
+                search(starts, j, m - 1, value, bonus + tail_best[j])
+        starts.pop()
+
+    if optimistic[count][0] + ALIGN_WEIGHT * open_pairs[0] > best_score:
+        search([], 0, count, 0.0, 0.0)
+    return best_starts
+
+
+def parse_anki_export(content, segmenter=None):
+    """Parses a whole Anki text export into a list of question records."""
+    records = []
+    html_fields = False
+    for line in content.splitlines():
+        if line.startswith('#'):
+            html_fields = html_fields or line.strip().lower() == '#html:true'
+            continue
+        if not line.strip():
+            continue
+        record = parse_anki_record(line, segmenter, html_fields)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def parse_extracted_questions(content):
+    """
+    Parses capture files written by the aws_saa_study extractors (anki_extracted_*.txt).
+    There every option is on its own line, so the last N lines of a question are its options.
+    Captures whose answer marker is ambiguous are skipped.
+    """
+    records = []
+    for question_span in scan_questions(content):
+        if question_span.ambiguous:
+            continue
+        body = _TYPE_PREFIX_RE.sub('', question_span.text(content))
+        body = body[:body.rfind('答案')].removesuffix('正确')
+        lines = [line.strip() for line in body.splitlines() if line.strip()]
+        count = expected_option_count(' '.join(lines))
+        if len(lines) <= count:
+            continue
+        question = ' '.join(lines[:-count])
+        records.append(make_record(question_span.type, question, lines[-count:], answer_key(question_span.answer),
+                                   verified=True))
+    return records
+
+
+def question_key(record):
+    """
+    Stable id of a question: the SHA-256 (hex) of its type, stem and options. Question numbers
+    shift whenever the formatted file is regenerated, so anything stored per question
+    (enrichments, review state, deck notes) is keyed by this instead.
+    """
+    text = '\x1f'.join([record['type'], record['question'], *record['options']])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def invalid_answer(record):
+    """True if the answer key points at an option letter that was not parsed."""
+    return any(ord(letter) - ord('A') >= len(record['options']) for letter in record['answer'].split(','))
+
+
+def render_questions(records):
+    """Renders question records into the numbered plain-text layout."""
+    lines = []
+    for number, record in enumerate(records, 1):
+        lines.append(f"Question {number} ({record['type']})")
+        lines.append(record['question'])
+        lines.append("")
+        lines.append("Options:")
+        for i, option in enumerate(record['options']):
+            lines.append(f"{chr(ord('A') + i)}. {option}")
+        lines.append("")
+        lines.append(f"Answer: {record['answer']}")
+        if record.get('review'):
+            lines.append(f"Review: {record['review']}")
+        lines.append("")
+        lines.append(SEPARATOR)
+        lines.append("")
+    return '\n'.join(lines)
+
+
+def read_formatted_questions(path):
+    """
+    Reads a file written by format_questions() back into question records.
+    Also accepts older output that contains literal "\\n" sequences.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().replace('\\n', '\n')
+
+    records = []
+    for block in re.split(r'^={80}\s*$', content, flags=re.MULTILINE):
+        header = re.search(r'^Question (\d+) \((单选题|多选题)\)\s*$', block, re.MULTILINE)
+        answer = re.search(r'^Answer:\s*(\S+)\s*$', block, re.MULTILINE)
+        review = re.search(r'^Review:\s*(.+?)\s*$', block, re.MULTILINE)
+        if not header or not answer:
+            continue
+        body = block[header.end():answer.start()]
+        question, _, options_text = body.partition('Options:')
+        options = re.findall(r'^[A-Z]\. (.*)$', options_text, re.MULTILINE)
+        records.append({
+            'number': int(header.group(1)),
+            'type': header.group(2),
+            'question': question.strip().lstrip('：').strip(),
+            'options': options,
+            'answer': answer.group(1),
+            'review': review.group(1) if review else None,
+        })
+    return records
+
 
 def format_questions(input_file, output_file):
     """
     Parses and formats AWS practice questions from a text file.
     """
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
+        with span('read', file=input_file), open(input_file, 'r', encoding='utf-8') as f:
             content = f.read()
     except FileNotFoundError:
         print(f"Error: Input file not found at {input_file}")
@@ -15,72 +553,126 @@ def format_questions(input_file, output_file):
         print(f"Error reading file: {e}")
         return
 
-    # Split by question type, keeping the delimiter
-    question_blocks = re.split(r'(单选题|多选题)', content)
-    
-    formatted_lines = []
-    question_counter = 1
-    
-    # The first element is text before the first delimiter, which we can probably ignore.
-    # The rest are pairs of (delimiter, question_text).
-    for i in range(1, len(question_blocks), 2):
-        question_type = question_blocks[i].strip()
-        raw_text = question_blocks[i+1]
-
-        # Clean the text by removing the noisy metadata part and any repeated question text.
-        # The metadata seems to follow the answer.
-        main_part = re.split(r'正确率', raw_text)[0]
-
-        # Extract the answer which is at the end of the main_part
-        answer_match = re.search(r'\s*([A-Z](?:,[A-Z])*)\s*$', main_part)
-        
-        if not answer_match:
-            continue
-
-        answer = answer_match.group(1)
-        text_without_answer = main_part[:answer_match.start()].strip()
-
-        # Extract the question, which usually ends with '?' or ':'
-        question_match = re.search(r'^(.*?[:?])\s*', text_without_answer, re.DOTALL)
-        
-        if not question_match:
-            # As a fallback, take the first sentence.
-            parts = text_without_answer.split('.')
-            question = parts[0] + '.'
-            options_text = '.'.join(parts[1:]).strip()
-        else:
-            question = question_match.group(1).strip()
-            options_text = text_without_answer[question_match.end():].strip()
-
-        # Build the formatted output
-        formatted_lines.append(f"Question {question_counter} ({question_type})")
-        formatted_lines.append(question)
-        formatted_lines.append("\\nOptions:")
-        
-        # Split options text into sentences and format them as a list
-        sentences = re.split(r'(?<=[.?!])\\s+', options_text)
-        for sentence in sentences:
-            if sentence.strip():
-                formatted_lines.append(f"- {sentence.strip()}")
-
-        formatted_lines.append(f"\\nAnswer: {answer}")
-        formatted_lines.append("\\n" + "="*80 + "\\n")
-        
-        question_counter += 1
+    # GUI capture files mark each question with 【Question N】; everything else is an Anki export
+    with span('parse') as parse_span:
+        records = parse_extracted_questions(content) if '【Question' in content else parse_anki_export(content)
+        parse_span.set(records=len(records))
+    invalid = sum(1 for record in records if invalid_answer(record))
+    if invalid:
+        print(f"Warning: {invalid} questions have an answer outside their parsed options")
+    review = sum(1 for record in records if record['review'])
+    if review:
+        print(f"Warning: {review} questions are marked 'Review:' (guessed option boundaries or a disputed "
+              f"answer key); export the deck with HTML included to read the options exactly")
 
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\\n'.join(formatted_lines))
-        print(f"Processing complete. Formatted file saved to: {output_file}")
+        with span('write', file=output_file), open(output_file, 'w', encoding='utf-8') as f:
+            f.write(render_questions(records))
+        print(f"Processing complete. {len(records)} questions saved to: {output_file}")
     except Exception as e:
         print(f"Error writing to output file: {e}")
 
+
+def _normalize(text):
+    return ' '.join(text.split())
+
+
+def _legacy_segment(options_text, count):
+    """The previous engine: one option per sentence, never flagged."""
+    return [s.strip() for s in re.split(r'(?<=[.?!])\s+', options_text) if s.strip()], True
+
+
+def _guessed(record):
+    return 'option boundaries guessed' in (record['review'] or '')
+
+
+def is_holdout_label(label):
+    """Every third labeled question (by a hash of its stem) is held out from weight tuning."""
+    digest = hashlib.sha1(_normalize(label['question']).encode('utf-8')).hexdigest()
+    return int(digest, 16) % HOLDOUT_MODULUS == 0
+
+
+def benchmark(input_file, labels_file, repeat=3):
+    """
+    Reports parse accuracy against a labeled sample and parse throughput.
+
+    The labels file is a JSON list of {'question', 'options', 'answer'} entries whose option
+    boundaries are known; questions are matched to the export by their stem. Accuracy is
+    measured on the held-out labels only (see is_holdout_label), since the segmentation
+    weights were tuned on the others. `wrong_unflagged` counts held-out questions whose options
+    are wrong without the record being marked for review; it should stay at 0.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    with open(labels_file, 'r', encoding='utf-8') as f:
+        labels = [label for label in json.load(f) if is_holdout_label(label)]
+
+    results = {}
+    for name, segmenter in (('legacy', _legacy_segment), ('current', segment_options)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            records = parse_anki_export(content, segmenter)
+            timings.append(time.perf_counter() - start)
+
+        by_question = {_normalize(r['question']): r for r in records}
+        exact = count_ok = matched = wrong_unflagged = 0
+        for label in labels:
+            record = by_question.get(_normalize(label['question']))
+            if record is None:
+                continue
+            matched += 1
+            count_ok += len(record['options']) == len(label['options'])
+            correct = [_normalize(o) for o in record['options']] == [_normalize(o) for o in label['options']]
+            exact += correct
+            wrong_unflagged += not correct and not _guessed(record)
+
+        best = min(timings)
+        results[name] = {
+            'records': len(records),
+            'holdout': matched,
+            'exact_options': exact / matched if matched else 0.0,
+            'option_count': count_ok / matched if matched else 0.0,
+            'wrong_unflagged': wrong_unflagged,
+            'verified': sum(1 for r in records if not _guessed(r)) / len(records) if records else 0.0,
+            'invalid_answers': sum(1 for r in records if invalid_answer(r)),
+            'records_per_sec': len(records) / best if best else 0.0,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Format the exported AWS SAA question bank')
+    parser.add_argument('--input', default=os.path.join('temp', 'AWS Certified Solutions Architect - Associate SAA-C03.txt'),
+                        help='Anki text export (or an extractor capture file) to parse')
+    parser.add_argument('--output', default=os.path.join('temp', 'Formatted_AWS_Questions.txt'),
+                        help='Where to write the formatted questions')
+    parser.add_argument('--bench', action='store_true',
+                        help='Report accuracy against the labeled sample and records/sec instead of writing output')
+    parser.add_argument('--labels', default=os.path.join('tools', 'fixtures', 'aws_option_labels.json'),
+                        help='Labeled sample used by --bench')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions for --bench')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.bench:
+        results = benchmark(args.input, args.labels, args.repeat)
+        for name, stats in results.items():
+            print(f"[{name}] records={stats['records']} holdout={stats['holdout']} "
+                  f"exact_options={stats['exact_options']:.1%} option_count={stats['option_count']:.1%} "
+                  f"wrong_unflagged={stats['wrong_unflagged']} verified={stats['verified']:.1%} "
+                  f"invalid_answers={stats['invalid_answers']} records/sec={stats['records_per_sec']:.0f}")
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    with profile_from_args(args, 'format_aws_questions'):
+        format_questions(args.input, args.output)
+
+
 if __name__ == '__main__':
     # Ensure the script can be run from the workspace root
     # or the tools directory
     if os.path.basename(os.getcwd()) == 'tools':
         os.chdir('..')
-
-    input_path = os.path.join('aws_saa_study', 'AWS Certified Solutions Architect - Associate SAA-C03.txt')
-    output_path = os.path.join('aws_saa_study', 'Formatted_AWS_Questions.txt')
-    format_questions(input_path, output_path) 
\ No newline at end of file
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+各工具共用的性能埋点：在fetch、parse、query、write等阶段周围记录耗时区间(span)，
+输出可以直接用 chrome://tracing 或 https://ui.perfetto.dev 打开的Chrome Trace JSON。
+
+未启用时 span() 只做一次全局变量判断并返回一个共享的空上下文管理器，一次with
+不到1微秒，而埋点都包在毫秒级的阶段外层，因此可以常驻在代码中。通过各工具的 --profile 参数启用，还可以附加
+cProfile（--profile-cpu）和 tracemalloc（--profile-memory）。
+"""
+
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Optional
+
+# 默认的trace输出目录（temp/下的生成文件）
+DEFAULT_TRACE_DIR = os.path.join('temp', 'traces')
+
+# 当前生效的Tracer；为None时所有埋点都是空操作
+_TRACER = None
+
+
+class _NullSpan:
+    """未启用时使用的空上下文管理器，全局只有一个实例。"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """一个计时区间，退出时作为Chrome Trace的完整事件("ph": "X")记录下来。"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.add_span(self.name, self.start, end, self.args)
+        return False
+
+    def set(self, **args):
+        """在区间内补充参数，例如请求完成后才知道的响应长度。"""
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    收集span事件并导出为Chrome Trace格式。
+
+    同一线程内的span按嵌套关系显示在同一行；asyncio任务中的span按任务分行显示，
+    这样并发的fetch不会互相重叠成一团。
+    """
+
+    def __init__(self, memory: bool = False):
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = []
+        self.lanes: Dict[int, str] = {}  # 行号 -> 显示名称（线程名或任务名）
+        self.memory = memory
+        self._lock = threading.Lock()
+
+    def _lane(self) -> int:
+        """当前span所在的行：asyncio任务内用任务id，否则用线程id。"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:  # 当前线程没有运行中的事件循环
+            task = None
+        if task is not None:
+            lane, label = id(task), f"task {task.get_name()}"
+        else:
+            lane, label = threading.get_ident(), threading.current_thread().name
+        if lane not in self.lanes:
+            self.lanes[lane] = label
+        return lane
+
+    def span(self, name: str, args: Dict) -> _Span:
+        return _Span(self, name, args)
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, args: Dict):
+        event = {'name': name, 'ph': 'X', 'pid': self.pid, 'tid': self._lane(),
+                 'ts': (start_ns - self.origin) / 1000, 'dur': (end_ns - start_ns) / 1000}
+        if args:
+            event['args'] = {key: value if isinstance(value, (int, float, bool, type(None))) else str(value)
+                             for key, value in args.items()}
+        memory_event = None
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            memory_event = {'name': 'memory', 'ph': 'C', 'pid': self.pid, 'tid': 0,
+                            'ts': event['ts'] + event['dur'],
+                            'args': {'current_mb': round(current / 2**20, 3), 'peak_mb': round(peak / 2**20, 3)}}
+        with self._lock:
+            self.events.append(event)
+            if memory_event:
+                self.events.append(memory_event)
+
+    def to_chrome_trace(self, metadata: Optional[Dict] = None) -> Dict:
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': lane, 'args': {'name': label}}
+                 for lane, label in self.lanes.items()]
+        return {'traceEvents': names + self.events, 'displayTimeUnit': 'ms', 'otherData': metadata or {}}
+
+    def summary(self) -> Dict[str, Dict]:
+        """按span名称汇总调用次数和总耗时（毫秒），用于在终端快速查看。"""
+        totals: Dict[str, Dict] = {}
+        for event in self.events:
+            if event['ph'] != 'X':
+                continue
+            entry = totals.setdefault(event['name'], {'count': 0, 'total_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += event['dur'] / 1000
+        return totals
+
+
+def span(name: str, **args):
+    """
+    计时区间，用法： with span('fetch', url=url): ...
+
+    未启用时返回共享的空上下文管理器，不创建span对象。
+    """
+    if _TRACER is None:
+        return _NULL_SPAN
+    return _TRACER.span(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """装饰器版本的span，name默认为函数名。支持普通函数和async函数。"""
+    def decorate(fn):
+        label = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _TRACER is None:
+                    return await fn(*args, **kwargs)
+                with _TRACER.span(label, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _TRACER is None:
+                return fn(*args, **kwargs)
+            with _TRACER.span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def is_enabled() -> bool:
+    return _TRACER is not None
+
+
+def default_trace_path(tool: str) -> str:
+    return os.path.join(DEFAULT_TRACE_DIR, f"{tool}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+
+@contextmanager
+def profile_session(tool: str, trace_file: Optional[str] = None, cpu: bool = False, memory: bool = False,
+                    top: int = 20):
+    """
+    在with块内启用埋点，结束时写出trace文件并在stderr打印各阶段汇总。
+
+    Args:
+        tool: 工具名，用于默认文件名和trace元数据
+        trace_file: trace输出路径，默认 temp/traces/<tool>_<时间>.json
+        cpu: 同时用cProfile采样函数级耗时，结果写到trace旁边的.prof文件并打印前top项
+        memory: 同时用tracemalloc跟踪内存，每个span结束时记录一个内存计数器事件，
+                并打印分配最多的top处代码
+    """
+    global _TRACER
+    trace_file = trace_file or default_trace_path(tool)
+    tracer = Tracer(memory=memory)
+    profiler = cProfile.Profile() if cpu else None
+    if memory:
+        tracemalloc.start()
+    previous, _TRACER = _TRACER, tracer
+    if profiler:
+        profiler.enable()
+    try:
+        with tracer.span(tool, {'argv': ' '.join(sys.argv[1:])}):
+            yield tracer
+    finally:
+        if profiler:
+            profiler.disable()
+        _TRACER = previous
+        if memory:  # 在写文件之前取快照，避免把导出trace本身的分配算进去
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        os.makedirs(os.path.dirname(trace_file) or '.', exist_ok=True)
+        with open(trace_file, 'w', encoding='utf-8') as f:
+            json.dump(tracer.to_chrome_trace({'tool': tool, 'created': datetime.now().isoformat()}), f)
+        print(f"DEBUG: Trace written to {trace_file} (open in chrome://tracing or ui.perfetto.dev)",
+              file=sys.stderr)
+        for name, entry in sorted(tracer.summary().items(), key=lambda item: -item[1]['total_ms']):
+            print(f"DEBUG:   {name:<24} {entry['count']:6d} calls {entry['total_ms']:10.1f} ms", file=sys.stderr)
+
+        if profiler:
+            profile_file = os.path.splitext(trace_file)[0] + '.prof'
+            profiler.dump_stats(profile_file)
+            print(f"DEBUG: cProfile stats written to {profile_file}", file=sys.stderr)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(top)
+        if memory:
+            print(f"DEBUG: Peak traced memory {peak / 2**20:.1f} MB; top allocations:", file=sys.stderr)
+            for stat in snapshot.statistics('lineno')[:top]:
+                print(f"DEBUG:   {stat}", file=sys.stderr)
+
+
+def add_profile_arguments(parser):
+    """给工具的命令行加上 --profile / --profile-cpu / --profile-memory 参数。"""
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE_FILE',
+                        help=f'记录各阶段耗时并写出Chrome Trace JSON (默认: {DEFAULT_TRACE_DIR}/<工具>_<时间>.json)')
+    parser.add_argument('--profile-cpu', action='store_true', help='配合--profile，同时运行cProfile')
+    parser.add_argument('--profile-memory', action='store_true', help='配合--profile，同时用tracemalloc跟踪内存')
+    return parser
+
+
+def profile_from_args(args, tool: str):
+    """根据命令行参数返回profile_session，未指定--profile时返回空上下文。"""
+    if args.profile is None and not (args.profile_cpu or args.profile_memory):
+        return nullcontext()
+    return profile_session(tool, args.profile or None, cpu=args.profile_cpu, memory=args.profile_memory)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+import argparse  # 导入用于解析命令行参数的库
+import hashlib  # 导入哈希库，用于判断数据源是否变化
+import json  # 导入JSON库，用于保存索引元数据和文本块
+import os  # 导入操作系统相关功能库
+import re  # 导入正则表达式库，用于按段落切分长小节
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import time  # 导入时间库，用于统计耗时
+import zlib  # 导入zlib库，使用其crc32作为稳定的特征哈希函数
+from typing import Dict, List, Optional  # 从typing库导入类型提示
+
+import numpy as np  # 导入NumPy，用于向量存储和批量相似度计算
+
+from kb_search import REPO_ROOT, expand_sources, split_markdown_sections, tokenize  # 复用全文检索的分词和markdown切分
+
+# 默认的向量索引目录，与全文索引放在一起，已在.gitignore中忽略
+DEFAULT_VECTOR_DIR = os.path.join(REPO_ROOT, '.kb_index', 'vectors')
+# 默认被检索的数据源：knowledge_bank下的所有markdown笔记
+DEFAULT_KB_SOURCES = [os.path.join(REPO_ROOT, 'knowledge_bank', '*.md')]
+# 单个文本块的最大字符数，过长的小节会按段落继续切分
+DEFAULT_MAX_CHUNK_CHARS = 1500
+
+
+def chunk_markdown(path: str, max_chars: int = DEFAULT_MAX_CHUNK_CHARS) -> List[Dict]:
+    """
+    按标题把markdown文件切分为文本块，超过max_chars的小节再按空行分段合并。
+
+    Args:
+        path (str): markdown文件路径
+        max_chars (int): 单个文本块的最大字符数
+
+    Returns:
+        List[Dict]: 文本块列表，每项包含 path、title、text
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    chunks = []
+    rel_path = os.path.relpath(path, REPO_ROOT)
+    for title, body in split_markdown_sections(text):
+        title = title or os.path.basename(path)
+        current = ''  # 当前正在累积的文本块
+        for paragraph in re.split(r'\n\s*\n', body):  # 按空行切分段落
+            if current and len(current) + len(paragraph) + 2 > max_chars:
+                chunks.append({'path': rel_path, 'title': title, 'text': current})
+                current = ''
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            chunks.append({'path': rel_path, 'title': title, 'text': current})
+    return chunks
+
+
+class HashingEmbedder:
+    """
+    无需下载模型的基线向量化器：对词元做特征哈希（hashing trick），
+    使用对数词频并做L2归一化，因此向量点积即为余弦相似度。
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim: int = 2048):
+        """
+        Args:
+            dim (int): 向量维度，越大哈希冲突越少
+        """
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        将一批文本编码为 (len(texts), dim) 的float32矩阵。
+
+        Args:
+            texts (List[str]): 文本列表
+
+        Returns:
+            np.ndarray: 每行一个已归一化的向量
+        """
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[int, float] = {}
+            for token in tokenize(text):
+                h = zlib.crc32(token.encode('utf-8'))
+                index = h % self.dim
+                sign = 1.0 if (h >> 31) & 1 else -1.0  # 用最高位决定符号，抵消哈希冲突带来的偏差
+                counts[index] = counts.get(index, 0.0) + sign
+            if counts:
+                indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                matrix[row, indices] = np.sign(values) * np.log1p(np.abs(values))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)  # 空文本保持为零向量
+        return matrix
+
+
+# 可用的向量化器注册表，新增本地模型时在这里注册即可
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+}
+
+
+def get_embedder(name: str = 'hashing', **kwargs):
+    """根据名称创建向量化器实例。"""
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unsupported embedder: {name}")
+    return EMBEDDERS[name](**kwargs)
+
+
+class VectorIndex:
+    """
+    保存在磁盘上的向量索引。
+
+    目录结构：
+        manifest.json  - 向量化器、维度、数量以及数据源文件的哈希
+        chunks.jsonl   - 每行一个文本块的元数据和原文
+        vectors.f32    - (数量, 维度) 的float32矩阵，通过np.memmap按需映射到内存
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_VECTOR_DIR, embedder=None):
+        """
+        Args:
+            index_dir (str): 索引目录
+            embedder: 向量化器实例，默认使用HashingEmbedder
+        """
+        self.index_dir = index_dir
+        self.embedder = embedder or HashingEmbedder()
+        self.chunks: List[Dict] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _source_state(self, paths: List[str]) -> Dict[str, str]:
+        """计算各数据源文件的内容哈希。"""
+        state = {}
+        for path in paths:
+            with open(path, 'rb') as f:
+                state[os.path.relpath(path, REPO_ROOT)] = hashlib.sha1(f.read()).hexdigest()
+        return state
+
+    def ensure(self, sources: Optional[List[str]] = None, force: bool = False) -> 'VectorIndex':
+        """
+        加载索引；如果数据源、向量化器或维度发生变化则先重建。
+
+        Args:
+            sources (List[str], optional): 数据源路径（可含通配符），默认使用DEFAULT_KB_SOURCES
+            force (bool): 为True时强制重建
+
+        Returns:
+            VectorIndex: 自身，便于链式调用
+        """
+        paths = expand_sources(sources or DEFAULT_KB_SOURCES)
+        state = self._source_state(paths)
+        manifest = None
+        if os.path.exists(self._path('manifest.json')):
+            with open(self._path('manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+        if force or manifest is None or manifest.get('sources') != state \
+                or manifest.get('embedder') != self.embedder.name or manifest.get('dim') != self.embedder.dim:
+            self.build(paths, state)
+        else:
+            self.load(manifest)
+        return self
+
+    def build(self, paths: List[str], state: Dict[str, str]):
+        """切分全部数据源、批量编码并写入磁盘。"""
+        start_time = time.perf_counter()
+        os.makedirs(self.index_dir, exist_ok=True)
+        chunks = [chunk for path in paths for chunk in chunk_markdown(path)]
+        vectors = self.embedder.embed([f"{c['title']}\n{c['text']}" for c in chunks])
+
+        # 先写入临时文件再替换，避免中途失败留下不完整的索引
+        vectors.tofile(self._path('vectors.f32.tmp'))
+        with open(self._path('chunks.jsonl.tmp'), 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+        os.replace(self._path('vectors.f32.tmp'), self._path('vectors.f32'))
+        os.replace(self._path('chunks.jsonl.tmp'), self._path('chunks.jsonl'))
+        manifest = {'embedder': self.embedder.name, 'dim': self.embedder.dim,
+                    'count': len(chunks), 'sources': state}
+        with open(self._path('manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        print(f"DEBUG: Built vector index with {len(chunks)} chunks in "
+              f"{(time.perf_counter() - start_time) * 1000:.1f}ms", file=sys.stderr)
+        self.load(manifest)
+
+    def load(self, manifest: Dict):
+        """从磁盘加载文本块元数据，并以只读方式映射向量矩阵。"""
+        with open(self._path('chunks.jsonl'), 'r', encoding='utf-8') as f:
+            self.chunks = [json.loads(line) for line in f]
+        if manifest['count']:
+            self.vectors = np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r',
+                                     shape=(manifest['count'], manifest['dim']))
+        else:
+            self.vectors = np.zeros((0, manifest['dim']), dtype=np.float32)
+
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+        """
+        批量检索：一次矩阵乘法计算所有查询与所有文本块的相似度。
+
+        Args:
+            queries (List[str]): 查询语句列表
+            top_k (int): 每个查询返回的文本块数量
+
+        Returns:
+            List[List[Dict]]: 与queries一一对应的结果列表，每项为带score字段的文本块
+        """
+        if self.vectors is None:
+            raise RuntimeError("Vector index is not loaded; call ensure() first")
+        if top_k <= 0 or not len(self.chunks):  # top_k<=0时argpartition的k-1会变成负数，直接返回空结果
+            return [[] for _ in queries]
+
+        scores = self.embedder.embed(queries) @ self.vectors.T  # (查询数, 文本块数)
+        k = min(top_k, scores.shape[1])
+        # argpartition只做部分排序，再对选中的k个结果排序，避免对全部文本块排序
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([dict(self.chunks[i], score=float(scores[row, i]))
+                            for i in ordered if scores[row, i] > 0])
+        return results
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """检索单个查询，参数含义同search_batch。"""
+        return self.search_batch([query], top_k)[0]
+
+
+def build_kb_context(query: str, top_k: int = 5, max_chars: int = 6000,
+                     index: Optional[VectorIndex] = None) -> str:
+    """
+    检索与查询最相关的知识库文本块，并拼接为可直接放入提示语的上下文。
+
+    Args:
+        query (str): 查询语句，通常就是发送给LLM的提示
+        top_k (int): 最多使用的文本块数量
+        max_chars (int): 上下文的最大字符数
+        index (VectorIndex, optional): 已加载的索引，默认自动加载或构建
+
+    Returns:
+        str: 上下文文本，没有相关内容时返回空字符串
+    """
+    if top_k <= 0 or max_chars <= 0:
+        return ''
+    index = index or VectorIndex().ensure()
+    parts = []
+    used = 0
+    for chunk in index.search(query, top_k):
+        part = f"[{chunk['path']} - {chunk['title']}]\n{chunk['text']}"
+        if used + len(part) > max_chars:
+            if parts:
+                continue  # 放不下的块跳过，后面更短的块仍可能放得下
+            part = part[:max_chars]  # 最相关的块本身超过预算时截断，而不是返回空上下文
+        parts.append(part)
+        used += len(part)
+    return '\n\n'.join(parts)
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='在knowledge_bank笔记中进行向量检索')
+    parser.add_argument('query', nargs='?', help='查询语句')
+    parser.add_argument('--top-k', type=int, default=5, help='返回的文本块数量 (默认: 5)')
+    parser.add_argument('--index-dir', default=DEFAULT_VECTOR_DIR, help='向量索引目录')
+    parser.add_argument('--source', action='append', help='数据源路径，可重复指定并支持通配符 (默认: knowledge_bank/*.md)')
+    parser.add_argument('--embedder', choices=sorted(EMBEDDERS), default='hashing', help='向量化器 (默认: hashing)')
+    parser.add_argument('--rebuild', action='store_true', help='强制重建向量索引')
+    args = parser.parse_args()
+
+    index = VectorIndex(args.index_dir, get_embedder(args.embedder)).ensure(args.source, force=args.rebuild)
+    if not args.query:
+        return
+
+    start_time = time.perf_counter()
+    results = index.search(args.query, args.top_k)
+    print(f"DEBUG: Found {len(results)} chunks in {(time.perf_counter() - start_time) * 1000:.2f}ms",
+          file=sys.stderr)
+    for i, r in enumerate(results, 1):
+        print(f"\n=== Chunk {i} (score {r['score']:.3f}) ===")
+        print(f"Source: {r['path']}")
+        print(f"Title: {r['title']}")
+        print(r['text'])
+
+
+if __name__ == '__main__':
+    main()
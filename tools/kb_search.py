@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+import argparse  # 导入用于解析命令行参数的库
+import glob  # 导入glob库，用于按通配符查找knowledge_bank下的markdown文件
+import hashlib  # 导入哈希库，用于判断文件内容是否发生变化
+import os  # 导入操作系统相关功能库
+import re  # 导入正则表达式库，用于分词和切分文档
+import sqlite3  # 导入SQLite库，使用其内置的FTS5全文索引和BM25排序
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import time  # 导入时间库，用于统计建索引和查询耗时
+from typing import Dict, Iterator, List, Optional, Tuple  # 从typing库导入类型提示
+
+# 仓库根目录（本文件位于tools/下）
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 默认的索引文件位置，已在.gitignore中忽略
+DEFAULT_INDEX_PATH = os.path.join(REPO_ROOT, '.kb_index', 'kb_search.db')
+# 默认被索引的数据源：格式化后的题库和knowledge_bank下的所有markdown笔记
+DEFAULT_SOURCES = [
+    os.path.join(REPO_ROOT, 'temp', 'Formatted_AWS_Questions.txt'),
+    os.path.join(REPO_ROOT, 'knowledge_bank', '*.md'),
+]
+
+# 英文/数字词元：允许中间出现 . - _ 以保留 "S3"、"gp3"、"x86_64"、"2024-08-01" 这类术语
+_WORD_RE = re.compile(r'[0-9a-z]+(?:[._\-][0-9a-z]+)*')
+# 中日韩统一表意文字（含扩展A区）的连续片段
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+# 同时匹配上面两种片段，保证分词结果保持原文顺序
+_TOKEN_RE = re.compile(_CJK_RE.pattern + '|' + _WORD_RE.pattern)
+# 格式化题库中每道题之间的分隔线
+_QUESTION_SEPARATOR_RE = re.compile(r'^={80}\s*$', re.MULTILINE)
+# markdown标题行
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    """
+    将中英文混合文本切分为词元列表。
+
+    英文和数字按单词切分并转为小写；中文没有空格分词，因此把连续的汉字片段
+    切成相邻二字组（bigram），建索引时额外保留单字，以便单字查询也能命中。
+
+    Args:
+        text (str): 待切分的文本
+        for_query (bool): 是否为查询语句分词。查询时只使用二字组，减少无意义的单字匹配
+
+    Returns:
+        List[str]: 词元列表
+    """
+    tokens = []  # 存放切分结果
+    for match in _TOKEN_RE.finditer(text.lower()):  # 按原文顺序遍历英文单词和汉字片段
+        piece = match.group(0)
+        if not _CJK_RE.match(piece):  # 英文或数字词元直接保留
+            tokens.append(piece)
+            continue
+        if len(piece) == 1:  # 只有一个汉字时无法组成二字组，直接作为单字词元
+            tokens.append(piece)
+            continue
+        for i in range(len(piece) - 1):  # 生成相邻二字组
+            if not for_query:
+                tokens.append(piece[i])  # 建索引时同时保留单字
+            tokens.append(piece[i:i + 2])
+        if not for_query:
+            tokens.append(piece[-1])  # 补上片段的最后一个单字
+    return tokens
+
+
+def split_markdown_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    按标题把markdown文本切分为若干小节，代码块中的 "#" 注释行不会被当作标题。
+
+    Args:
+        text (str): markdown全文
+
+    Returns:
+        List[Tuple[str, str]]: (标题路径, 小节正文) 列表，标题路径形如 "Tools > LLM"
+    """
+    sections = []  # 存放切分结果
+    heading_stack: List[Tuple[int, str]] = []  # 当前所在的各级标题
+    current_lines: List[str] = []  # 当前小节累积的正文行
+    in_code_block = False  # 是否处于 ``` 代码块内部
+
+    def flush():
+        body = '\n'.join(current_lines).strip()
+        if body:  # 只保留有正文的小节
+            title = ' > '.join(title for _, title in heading_stack)
+            sections.append((title, body))
+        current_lines.clear()
+
+    for line in text.splitlines():
+        if line.lstrip().startswith('```'):  # 进入或离开代码块
+            in_code_block = not in_code_block
+        heading = None if in_code_block else _HEADING_RE.match(line)
+        if heading:
+            flush()  # 新标题开始前，先保存上一小节
+            level = len(heading.group(1))
+            while heading_stack and heading_stack[-1][0] >= level:  # 弹出同级及更低级的标题
+                heading_stack.pop()
+            heading_stack.append((level, heading.group(2)))
+        else:
+            current_lines.append(line)
+    flush()  # 保存最后一个小节
+    return sections
+
+
+def iter_documents(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    将一个数据源文件拆分为可检索的文档。
+
+    markdown文件按标题拆分为小节；格式化题库按分隔线拆分为单道题目。
+
+    Args:
+        path (str): 数据源文件路径
+
+    Yields:
+        Tuple[str, str]: (文档标题, 文档正文)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    if path.endswith('.md'):  # markdown笔记
+        for title, body in split_markdown_sections(text):
+            yield title or os.path.basename(path), body
+        return
+
+    # 旧版format_aws_questions.py输出的是字面量 "\n"，这里统一还原为真正的换行
+    text = text.replace('\\n', '\n')
+    for block in _QUESTION_SEPARATOR_RE.split(text):
+        block = block.strip()
+        if not block:
+            continue
+        title, _, body = block.partition('\n')  # 第一行形如 "Question 12 (单选题)"
+        yield title.strip(), body.strip()
+
+
+def expand_sources(patterns: List[str]) -> List[str]:
+    """把包含通配符的数据源列表展开为存在的文件绝对路径列表。"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(os.path.abspath(p) for p in matches if os.path.isfile(p))
+    return paths
+
+
+class KnowledgeIndex:
+    """
+    基于SQLite FTS5的持久化倒排索引，使用BM25对结果排序。
+
+    索引中保存每个数据源文件的修改时间、大小和内容哈希，
+    update() 只会重建发生变化的文件，未变化的文件只需一次 stat 调用。
+    """
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            index_path (str): 索引数据库文件路径，目录不存在时会自动创建
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self.index_path = index_path
+        self.conn = sqlite3.connect(index_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha1 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                file_id INTEGER NOT NULL REFERENCES files(id),
+                title TEXT NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_file_id ON docs(file_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+                title, body, tokenize = 'unicode61 remove_diacritics 0'
+            );
+        """)
+
+    def close(self):
+        """关闭数据库连接。"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, sources: Optional[List[str]] = None, force: bool = False) -> Dict[str, int]:
+        """
+        增量更新索引：新增或内容变化的文件会被重建，已不存在的文件会被删除。
+
+        Args:
+            sources (List[str], optional): 数据源路径（可含通配符），默认使用DEFAULT_SOURCES
+            force (bool): 为True时忽略修改时间和哈希，重建全部文件
+
+        Returns:
+            Dict[str, int]: 本次更新的统计信息
+        """
+        paths = expand_sources(sources or DEFAULT_SOURCES)
+        stats = {'checked': len(paths), 'reindexed': 0, 'removed': 0, 'documents': 0}
+        known = {row[1]: row for row in self.conn.execute(
+            'SELECT id, path, mtime_ns, size, sha1 FROM files')}
+
+        with self.conn:  # 所有修改放在同一个事务中，失败时整体回滚
+            for path in paths:
+                st = os.stat(path)
+                row = known.pop(path, None)
+                if row and not force and row[2] == st.st_mtime_ns and row[3] == st.st_size:
+                    continue  # 修改时间和大小都未变化，跳过
+
+                with open(path, 'rb') as f:
+                    sha1 = hashlib.sha1(f.read()).hexdigest()
+                if row and not force and row[4] == sha1:  # 只是被touch过，内容未变
+                    self.conn.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?',
+                                      (st.st_mtime_ns, st.st_size, row[0]))
+                    continue
+
+                if row:
+                    self._delete_file(row[0])
+                file_id = self.conn.execute(
+                    'INSERT INTO files (path, mtime_ns, size, sha1) VALUES (?, ?, ?, ?)',
+                    (path, st.st_mtime_ns, st.st_size, sha1)).lastrowid
+                for title, body in iter_documents(path):
+                    doc_id = self.conn.execute(
+                        'INSERT INTO docs (file_id, title, body) VALUES (?, ?, ?)',
+                        (file_id, title, body)).lastrowid
+                    # FTS表中保存的是预先分好词、以空格连接的词元
+                    self.conn.execute(
+                        'INSERT INTO docs_fts (rowid, title, body) VALUES (?, ?, ?)',
+                        (doc_id, ' '.join(tokenize(title)), ' '.join(tokenize(body))))
+                    stats['documents'] += 1
+                stats['reindexed'] += 1
+                print(f"DEBUG: Indexed {path}", file=sys.stderr)
+
+            for row in known.values():  # 剩下的是已被删除或不再属于数据源的文件
+                self._delete_file(row[0])
+                stats['removed'] += 1
+                print(f"DEBUG: Removed {row[1]} from index", file=sys.stderr)
+        return stats
+
+    def _delete_file(self, file_id: int):
+        """从索引中删除一个文件及其全部文档。"""
+        self.conn.execute(
+            'DELETE FROM docs_fts WHERE rowid IN (SELECT id FROM docs WHERE file_id = ?)', (file_id,))
+        self.conn.execute('DELETE FROM docs WHERE file_id = ?', (file_id,))
+        self.conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def search(self, query: str, limit: int = 10, match_any: bool = False) -> List[Dict]:
+        """
+        使用BM25对索引进行检索。
+
+        Args:
+            query (str): 查询语句，中英文均可
+            limit (int): 返回的最大结果数量
+            match_any (bool): 为True时任一词元命中即可，默认要求所有词元都命中
+
+        Returns:
+            List[Dict]: 结果列表，每项包含 path、title、snippet、score
+        """
+        terms = list(dict.fromkeys(tokenize(query, for_query=True)))  # 去重并保持顺序
+        if not terms:
+            return []
+        # 每个词元都加上双引号，避免被FTS5当作运算符（如 AND、NEAR）解析
+        expression = (' OR ' if match_any else ' ').join(
+            '"' + term.replace('"', '""') + '"' for term in terms)
+        rows = self.conn.execute("""
+            SELECT files.path, docs.title, docs.body, bm25(docs_fts, 2.0, 1.0) AS score
+            FROM docs_fts
+            JOIN docs ON docs.id = docs_fts.rowid
+            JOIN files ON files.id = docs.file_id
+            WHERE docs_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        """, (expression, limit)).fetchall()
+        return [{
+            'path': os.path.relpath(path, REPO_ROOT),
+            'title': title,
+            'snippet': make_snippet(body, query),
+            'score': -score,  # FTS5的bm25()越小越相关，这里取反以便阅读
+        } for path, title, body, score in rows]
+
+
+def make_snippet(body: str, query: str, width: int = 160) -> str:
+    """截取正文中第一个命中查询词附近的片段。"""
+    lowered = body.lower()
+    phrase = lowered.find(query.lower())  # 优先定位完整的查询短语
+    positions = [phrase] if phrase != -1 else [lowered.find(word) for word in query.lower().split()]
+    positions = [p for p in positions if p != -1]
+    start = max(min(positions) - width // 4, 0) if positions else 0
+    snippet = ' '.join(body[start:start + width].split())  # 合并换行和多余空白
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if start + width < len(body) else ''
+    return prefix + snippet + suffix
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='在格式化题库和knowledge_bank笔记中进行全文检索')
+    parser.add_argument('query', nargs='?', help='要检索的关键词，中英文均可')
+    parser.add_argument('--limit', type=int, default=10, help='最大结果数量 (默认: 10)')
+    parser.add_argument('--any', action='store_true', help='任一关键词命中即返回 (默认要求全部命中)')
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help='索引文件路径')
+    parser.add_argument('--source', action='append', help='数据源路径，可重复指定并支持通配符 (默认: 题库和knowledge_bank/*.md)')
+    parser.add_argument('--rebuild', action='store_true', help='忽略已有状态，重建全部索引')
+    args = parser.parse_args()
+
+    with KnowledgeIndex(args.index) as index:
+        start_time = time.perf_counter()
+        stats = index.update(args.source, force=args.rebuild)  # 查询前先做增量更新，文件未变化时几乎没有开销
+        print(f"DEBUG: Index update {stats} in {(time.perf_counter() - start_time) * 1000:.1f}ms",
+              file=sys.stderr)
+        if not args.query:
+            return
+
+        start_time = time.perf_counter()
+        results = index.search(args.query, args.limit, match_any=args.any)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        print(f"DEBUG: Found {len(results)} results in {elapsed_ms:.2f}ms", file=sys.stderr)
+
+    for i, r in enumerate(results, 1):
+        print(f"\n=== Result {i} (score {r['score']:.2f}) ===")
+        print(f"Source: {r['path']}")
+        print(f"Title: {r['title']}")
+        print(f"Snippet: {r['snippet']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,8 +10,28 @@ from dotenv import load_dotenv  # 从python-dotenv库导入函数，用于从.en
 from pathlib import Path  # 导入Path对象，用于以面向对象的方式处理文件系统路径
 import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
 import base64  # 导入用于Base64编码和解码的库，主要用于处理图片
+import hashlib  # 导入哈希库，用于区分不同系统前缀下的缓存回复
+import json  # 导入JSON库，用于输出批处理状态
 from typing import Optional, Union, List  # 从typing库导入类型提示，增强代码可读性和健壮性
 import mimetypes  # 导入用于猜测文件MIME类型的库
+from instrumentation import span, add_profile_arguments, profile_from_args  # 导入共用的性能埋点（未启用--profile时几乎没有开销）
+from single_flight import get_flight  # 导入请求合并，同时进行的相同请求只发送一次
+
+# Anthropic接口要求指定最大输出token数，未传入max_tokens时使用这个值
+DEFAULT_ANTHROPIC_MAX_TOKENS = 4096
+# Anthropic每个请求最多允许的cache_control缓存断点数
+ANTHROPIC_MAX_CACHE_BREAKPOINTS = 4
+# ChatSession默认保留的历史token数（含新提示），超过后丢弃最早的轮次
+DEFAULT_CHAT_HISTORY_TOKENS = 16000
+# ChatSession压缩被丢弃轮次时使用的提示
+CHAT_SUMMARY_PROMPT = """Summarize the conversation below so it can replace the original turns as context.
+Keep facts, decisions, names, numbers and open questions; drop pleasantries. Be concise.
+
+Previous summary:
+{summary}
+
+Conversation:
+{transcript}"""
 
 def load_environment():
     """按照预设的优先级顺序从.env系列文件加载环境变量。"""
@@ -119,14 +139,58 @@ def create_llm_client(provider="openai"):
     
     elif provider == "local":  # 如果是本地部署的模型
         return OpenAI(  # 假设本地模型服务也兼容OpenAI的API格式
-            base_url="http://192.168.180.137:8006/v1",  # 指定本地服务的地址
+            base_url=os.getenv('LOCAL_LLM_BASE_URL', "http://192.168.180.137:8006/v1"),  # 指定本地服务的地址，可通过环境变量覆盖（例如指向测试用的桩服务）
             api_key="not-needed"  # 本地服务通常不需要API Key
         )
         
     else:  # 如果提供了不支持的provider名称
         raise ValueError(f"Unsupported provider: {provider}")  # 抛出错误
 
-def query_llm(prompt: str, client=None, model=None, provider="openai", image_path: Optional[str] = None) -> Optional[str]:
+def extract_usage(response, provider: str) -> dict:
+    """
+    从各提供商的响应中取出统一格式的token用量：
+    input_tokens（全部输入，含缓存部分）、cached_tokens（从缓存读取）、
+    cache_write_tokens（本次写入缓存，仅Anthropic）、output_tokens。取不到的字段为0。
+    """
+    usage = {"input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+    if provider == "anthropic":
+        data = getattr(response, "usage", None)
+        if data is not None:
+            cached = getattr(data, "cache_read_input_tokens", 0) or 0
+            written = getattr(data, "cache_creation_input_tokens", 0) or 0
+            # Anthropic的input_tokens不含缓存读写的部分，这里加回去得到全部输入
+            usage.update(input_tokens=(data.input_tokens or 0) + cached + written, cached_tokens=cached,
+                         cache_write_tokens=written, output_tokens=data.output_tokens or 0)
+    elif provider == "gemini":
+        data = getattr(response, "usage_metadata", None)
+        if data is not None:
+            usage.update(input_tokens=getattr(data, "prompt_token_count", 0) or 0,
+                         cached_tokens=getattr(data, "cached_content_token_count", 0) or 0,
+                         output_tokens=getattr(data, "candidates_token_count", 0) or 0)
+    else:
+        data = getattr(response, "usage", None)
+        if data is not None:
+            details = getattr(data, "prompt_tokens_details", None)
+            # OpenAI在prompt_tokens_details.cached_tokens中返回，DeepSeek使用prompt_cache_hit_tokens
+            cached = (getattr(details, "cached_tokens", 0) if details is not None else 0) \
+                or getattr(data, "prompt_cache_hit_tokens", 0) or 0
+            usage.update(input_tokens=data.prompt_tokens or 0, cached_tokens=cached,
+                         output_tokens=data.completion_tokens or 0)
+    return usage
+
+def _report_usage(response, provider: str, usage: dict, query_span):
+    """把本次请求的用量写入调用方传入的字典，并附加到性能埋点的span上。"""
+    try:
+        data = extract_usage(response, provider)
+    except Exception as e:  # 用量只用于统计，解析失败不影响返回结果
+        print(f"Could not read token usage: {e}", file=sys.stderr)
+        return
+    query_span.set(**data)
+    usage.update(data)
+
+def query_llm(prompt: str, client=None, model=None, provider="openai", image_path: Optional[str] = None,
+              max_tokens: Optional[int] = None, system: Optional[Union[str, List[str]]] = None,
+              usage: Optional[dict] = None, history: Optional[List[dict]] = None) -> Optional[str]:
     """
     使用给定的提示语和可选的图片，查询一个大语言模型。
     
@@ -136,12 +200,65 @@ def query_llm(prompt: str, client=None, model=None, provider="openai", image_pat
         model (str, optional): 要使用的具体模型名称
         provider (str): 要使用的API提供商
         image_path (str, optional): 要附加的图片文件的路径
+        max_tokens (int, optional): 最大输出token数，默认使用各提供商的默认值（Anthropic为DEFAULT_ANTHROPIC_MAX_TOKENS）
+        system (str or list, optional): 每次调用都相同的系统提示/上下文前缀（如.cursorrules、参考指南），
+            可以是多个文本块；prompt只放每次变化的部分。前缀放在消息最前面并按提供商的方式标记为可缓存：
+            Anthropic加cache_control，OpenAI兼容接口依靠自动前缀缓存，Gemini作为system_instruction
+        usage (dict, optional): 传入字典时写入本次请求的token用量（见extract_usage）；
+            与同时进行的相同请求合并时，写入共享请求的用量并加上 coalesced=True
+        history (list, optional): 之前的对话轮次 [{"role": "user"/"assistant", "content": str}]，
+            放在当前提示之前发送；多轮对话请使用ChatSession，它会维护并裁剪历史
         
     Returns:
         Optional[str]: 模型的回复内容，如果出错则返回None
+
+    同时进行的相同请求（客户端、提供商、模型、提示、系统前缀、图片和max_tokens都相同）只发送一次，
+    所有调用方共享结果；设置SINGLE_FLIGHT_DIR后跨进程也会合并（见single_flight.py）。
+    共享到的请求失败（返回None）时，等待的调用方会重新请求一次。
+    """
+    image_key = image_path
+    if image_path:  # 图片内容参与请求键，同名但内容不同的图片不会被合并
+        try:
+            with open(image_path, 'rb') as image_file:
+                image_key = hashlib.sha256(image_file.read()).hexdigest()
+        except OSError:
+            pass  # 读取失败时由实际请求报告错误
+    flight = get_flight('query_llm')
+    key = flight.key(_client_identity(client), provider, model, prompt, system, image_key, max_tokens, history)
+
+    def call():
+        call_usage = {}
+        text = _query_llm(prompt, client, model, provider, image_path, max_tokens, system, call_usage, history)
+        return text, call_usage
+
+    (response, call_usage), shared = flight.do(key, call)
+    if response is None and shared:  # 共享的请求失败了（错误只打印在leader那里），重新请求一次
+        (response, call_usage), shared = flight.do(key, call)
+    if usage is not None:
+        usage.update(call_usage)
+        if shared:
+            usage['coalesced'] = True
+    return response
+
+def _client_identity(client) -> Optional[str]:
+    """
+    请求键中区分客户端的部分：指向不同服务（如不同的本地服务地址）的客户端不能共享回复。
+    优先使用base_url，跨进程合并时同一服务的客户端仍然能匹配；没有base_url的客户端（如genai模块）使用对象id。
+    为None时由_query_llm按provider从环境变量创建客户端。
     """
+    if client is None:
+        return None
+    base_url = getattr(client, 'base_url', None)
+    return str(base_url) if base_url else f"{type(client).__name__}:{id(client)}"
+
+def _query_llm(prompt: str, client, model, provider: str, image_path: Optional[str], max_tokens: Optional[int],
+               system: Optional[Union[str, List[str]]], usage: dict,
+               history: Optional[List[dict]] = None) -> Optional[str]:
+    """query_llm的实际实现：向提供商发送一次请求。"""
     if client is None:  # 如果没有传入客户端实例
         client = create_llm_client(provider)  # 则根据provider创建一个新的
+    # 系统前缀统一为文本块列表，去掉空块
+    system_blocks = [block for block in ([system] if isinstance(system, str) else system or []) if block]
     
     try:
         # 如果没有指定模型，则根据提供商设置默认模型
@@ -163,10 +280,16 @@ def query_llm(prompt: str, client=None, model=None, provider="openai", image_pat
         
         # 处理与OpenAI API兼容的提供商
         if provider in ["openai", "local", "deepseek", "azure", "siliconflow"]:
-            messages = [{"role": "user", "content": []}]  # 初始化消息列表，采用OpenAI格式
+            messages = []  # 初始化消息列表，采用OpenAI格式
+            if system_blocks:
+                # 不变的前缀放在最前面的system消息中，提供商会自动缓存重复出现的长前缀（OpenAI为1024 token以上）
+                messages.append({"role": "system", "content": "\n\n".join(system_blocks)})
+            messages.extend({"role": turn["role"], "content": turn["content"]} for turn in history or [])
+            user_message = {"role": "user", "content": []}
+            messages.append(user_message)
             
             # 添加文本内容
-            messages[0]["content"].append({
+            user_message["content"].append({
                 "type": "text",
                 "text": prompt
             })
@@ -176,7 +299,7 @@ def query_llm(prompt: str, client=None, model=None, provider="openai", image_pat
                 if provider == "openai":  # OpenAI的多模态输入格式
                     encoded_image, mime_type = encode_image_file(image_path)  # 编码图片
                     # 重新构造content列表以包含文本和图片
-                    messages[0]["content"] = [
+                    user_message["content"] = [
                         {"type": "text", "text": prompt},
                         {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}}
                     ]
@@ -187,22 +310,36 @@ def query_llm(prompt: str, client=None, model=None, provider="openai", image_pat
                 "messages": messages,
                 "temperature": 0.7,  # temperature控制生成文本的随机性
             }
+            if max_tokens:  # 限制最大输出token数
+                kwargs["max_tokens"] = max_tokens
             
             # 针对特定模型"o1"的特殊参数处理 (如果存在)
             if model == "o1":
                 kwargs["response_format"] = {"type": "text"}
                 kwargs["reasoning_effort"] = "low"
                 del kwargs["temperature"]
+                if max_tokens:  # o1使用max_completion_tokens代替max_tokens
+                    kwargs["max_completion_tokens"] = kwargs.pop("max_tokens")
             
-            response = client.chat.completions.create(**kwargs)  # 发起API请求
+            with span('query', provider=provider, model=model, prompt_chars=len(prompt)) as query_span:  # 记录请求耗时
+                response = client.chat.completions.create(**kwargs)  # 发起API请求
+                _report_usage(response, provider, usage, query_span)  # 记录token用量和缓存命中
             return response.choices[0].message.content  # 返回模型生成的内容
             
         # 处理Anthropic (Claude)
         elif provider == "anthropic":
-            messages = [{"role": "user", "content": []}]  # 初始化消息列表，采用Anthropic格式
+            # 之前的对话轮次在前，当前提示作为最后一条用户消息
+            messages = [{"role": turn["role"], "content": [{"type": "text", "text": turn["content"]}]}
+                        for turn in history or []]
+            breakpoints = ANTHROPIC_MAX_CACHE_BREAKPOINTS
+            if messages:  # 在最后一轮历史上加缓存断点，下一轮时整段历史按缓存读取计费
+                messages[-1]["content"][-1]["cache_control"] = {"type": "ephemeral"}
+                breakpoints -= 1
+            user_message = {"role": "user", "content": []}  # 采用Anthropic格式
+            messages.append(user_message)
             
             # 添加文本内容
-            messages[0]["content"].append({
+            user_message["content"].append({
                 "type": "text",
                 "text": prompt
             })
@@ -210,7 +347,7 @@ def query_llm(prompt: str, client=None, model=None, provider="openai", image_pat
             # 如果提供了图片，则添加图片内容
             if image_path:
                 encoded_image, mime_type = encode_image_file(image_path)  # 编码图片
-                messages[0]["content"].append({  # 添加图片数据块
+                user_message["content"].append({  # 添加图片数据块
                     "type": "image",
                     "source": {
                         "type": "base64",
@@ -219,39 +356,135 @@ def query_llm(prompt: str, client=None, model=None, provider="openai", image_pat
                     }
                 })
             
-            response = client.messages.create(  # 发起API请求
-                model=model,
-                max_tokens=1000,  # 设置最大生成token数
-                messages=messages
-            )
+            kwargs = {
+                "model": model,
+                "max_tokens": max_tokens or DEFAULT_ANTHROPIC_MAX_TOKENS,  # 设置最大生成token数
+                "messages": messages,
+            }
+            if system_blocks:
+                # 给前缀的文本块加上cache_control缓存断点（最多4个，取最后几块，历史已占用一个时少一个），
+                # 之后的请求前缀相同时按缓存读取计费，只有prompt部分按正常输入计费
+                kwargs["system"] = [{"type": "text", "text": block} for block in system_blocks]
+                for block in kwargs["system"][-breakpoints:]:
+                    block["cache_control"] = {"type": "ephemeral"}
+            
+            with span('query', provider=provider, model=model, prompt_chars=len(prompt)) as query_span:  # 记录请求耗时
+                response = client.messages.create(**kwargs)  # 发起API请求
+                _report_usage(response, provider, usage, query_span)  # 记录token用量和缓存命中
             return response.content[0].text  # 返回模型生成的内容
             
         # 处理Google Gemini
         elif provider == "gemini":
-            model = client.GenerativeModel(model)  # 获取具体的生成模型实例
+            # 获取具体的生成模型实例，指定了max_tokens时限制最大输出token数
+            generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
+            # 不变的前缀作为system_instruction传入，支持隐式缓存的模型会自动复用
+            model = client.GenerativeModel(model, generation_config=generation_config,
+                                           system_instruction="\n\n".join(system_blocks) if system_blocks else None)
+            # 之前的对话轮次（Gemini中助手的角色名为model），当前提示只作为最后一条用户消息发送一次
+            contents = [{"role": "model" if turn["role"] == "assistant" else "user", "parts": [turn["content"]]}
+                        for turn in history or []]
+            parts = [prompt]
             if image_path:  # 如果有图片
-                file = genai.upload_file(image_path, mime_type="image/png")  # 上传图片文件
-                chat_session = model.start_chat(  # 开始一个聊天会话，历史消息包含图片和提示
-                    history=[{
-                        "role": "user",
-                        "parts": [file, prompt]
-                    }]
-                )
-            else:  # 如果没有图片
-                chat_session = model.start_chat(  # 开始一个聊天会话，历史消息只包含提示
-                    history=[{
-                        "role": "user",
-                        "parts": [prompt]
-                    }]
-                )
-            response = chat_session.send_message(prompt)  # 发送当前提示并获取回复
+                with span('upload_image', provider=provider):  # 记录图片上传耗时
+                    file = client.upload_file(image_path, mime_type="image/png")  # 上传图片文件
+                parts = [file, prompt]
+            contents.append({"role": "user", "parts": parts})
+            with span('query', provider=provider, model=model.model_name, prompt_chars=len(prompt)) as query_span:  # 记录请求耗时
+                response = model.generate_content(contents)  # 发送对话内容并获取回复
+                _report_usage(response, provider, usage, query_span)  # 记录token用量和缓存命中
             return response.text  # 返回回复中的文本内容
             
     except Exception as e:
         print(f"Error querying LLM: {e}", file=sys.stderr)  # 如果发生任何异常，打印错误信息到标准错误流
         return None  # 返回None表示失败
 
+class ChatSession:
+    """
+    多轮对话：保存对话历史，每轮只需传入新的提示，之前的问答作为历史一起发送。
+
+        session = ChatSession(provider="anthropic", system=[guide])
+        first = session.send("第一个问题")
+        follow_up = session.send("追问")
+
+    客户端只创建一次，在各轮之间复用。系统前缀和历史按提供商的方式标记为可缓存
+    （Anthropic在最后一轮历史上加cache_control断点），后续轮次主要只有新内容按正常输入计费。
+    历史加上新提示超过max_history_tokens时，从最早的轮次开始丢弃；summarize为True时，
+    被丢弃的轮次先由模型压缩成摘要，摘要作为系统前缀的最后一块保留。
+    图片只随发送它的那一轮上传，历史中只保留文本。
+    """
+
+    def __init__(self, provider: str = "openai", model: Optional[str] = None, client=None,
+                 system: Optional[Union[str, List[str]]] = None, max_tokens: Optional[int] = None,
+                 max_history_tokens: int = DEFAULT_CHAT_HISTORY_TOKENS, summarize: bool = False):
+        self.provider = provider
+        self.model = model
+        self.client = client if client is not None else create_llm_client(provider)  # 各轮复用同一个客户端
+        self.system = [system] if isinstance(system, str) else list(system or [])
+        self.max_tokens = max_tokens
+        self.max_history_tokens = max_history_tokens
+        self.summarize = summarize
+        self.history: List[dict] = []  # [{"role": "user"/"assistant", "content": str}]，总是成对出现
+        self.summary: Optional[str] = None  # 被丢弃轮次的摘要
+        self.usage = {"input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}  # 累计用量
+        self._history_tokens: List[int] = []  # 与history一一对应的token数
+
+    def send(self, prompt: str, image_path: Optional[str] = None, usage: Optional[dict] = None) -> Optional[str]:
+        """发送一轮提示并返回回复；请求失败时返回None，历史保持不变。"""
+        self._trim(prompt)
+        call_usage = {}
+        response = query_llm(prompt, self.client, model=self.model, provider=self.provider, image_path=image_path,
+                             max_tokens=self.max_tokens, system=self._system_blocks(), usage=call_usage,
+                             history=list(self.history))
+        for field in self.usage:
+            self.usage[field] += call_usage.get(field, 0)
+        if usage is not None:
+            usage.update(call_usage)
+        if response is None:
+            return None
+        from long_document import count_tokens  # 延迟导入，与长文档模式共用token计数
+        self.history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": response}]
+        self._history_tokens += [count_tokens(prompt), count_tokens(response)]
+        return response
+
+    def reset(self):
+        """清空历史和摘要，保留客户端和系统前缀。"""
+        self.history, self._history_tokens, self.summary = [], [], None
+
+    def _system_blocks(self) -> List[str]:
+        if self.summary:  # 摘要放在不变的系统前缀之后，不影响前缀缓存
+            return self.system + [f"Summary of the earlier conversation:\n{self.summary}"]
+        return self.system
+
+    def _trim(self, prompt: str):
+        """丢弃最早的轮次，直到历史、摘要和新提示不超过max_history_tokens。"""
+        from long_document import count_tokens
+        budget = self.max_history_tokens - count_tokens(prompt) - (count_tokens(self.summary) if self.summary else 0)
+        total = sum(self._history_tokens)
+        drop = 0
+        while total > budget and drop < len(self.history):
+            total -= self._history_tokens[drop] + self._history_tokens[drop + 1]  # 一问一答一起丢弃
+            drop += 2
+        if not drop:
+            return
+        dropped = self.history[:drop]
+        del self.history[:drop]
+        del self._history_tokens[:drop]
+        if self.summarize:
+            self._summarize(dropped)
+
+    def _summarize(self, turns: List[dict]):
+        """把被丢弃的轮次和之前的摘要合并成新的摘要；失败时保留旧摘要。"""
+        transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        summary = query_llm(CHAT_SUMMARY_PROMPT.format(summary=self.summary or "(none)", transcript=transcript),
+                            self.client, model=self.model, provider=self.provider, max_tokens=self.max_tokens)
+        if summary:
+            self.summary = summary.strip()
+        else:
+            print(f"DEBUG: Could not summarize {len(turns)} dropped turns", file=sys.stderr)
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':  # 离线批处理子命令：batch submit/poll/fetch
+        return batch_main(sys.argv[2:])
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='使用提示查询一个大语言模型')
     # 添加'--prompt'参数，必须提供
@@ -262,8 +495,39 @@ def main():
     parser.add_argument('--model', type=str, help='要使用的模型 (默认值取决于提供商)')
     # 添加'--image'参数，用于指定图片路径
     parser.add_argument('--image', type=str, help='要附加到提示的图片文件路径')
+    # 添加'--context-from-kb'标志，只把knowledge_bank中与提示相关的文本块注入提示，而不是整份文件
+    parser.add_argument('--context-from-kb', action='store_true', help='从knowledge_bank检索相关内容并注入提示')
+    # 添加'--kb-top-k'参数，控制注入的文本块数量
+    parser.add_argument('--kb-top-k', type=int, default=5, help='注入的知识库文本块数量 (默认: 5)')
+    # 添加'--max-tokens'参数，控制最大输出token数
+    parser.add_argument('--max-tokens', type=int, help=f'最大输出token数 (默认取决于提供商，Anthropic为{DEFAULT_ANTHROPIC_MAX_TOKENS})')
+    # 添加长文档参数：超过一块的文档按块并发提取再逐层合并(map-reduce)，各次请求的回复会被缓存
+    parser.add_argument('--document', action='append', metavar='FILE',
+                        help='要针对其回答提示的长文档（可重复指定，"-"表示标准输入）')
+    parser.add_argument('--chunk-tokens', type=int, default=8000,
+                        help='长文档每块的token数上限，会按模型上下文窗口裁剪 (默认: 8000)')
+    parser.add_argument('--concurrency', type=int, default=4, help='长文档模式同时发送的请求数 (默认: 4)')
+    parser.add_argument('--no-cache', action='store_true', help='长文档模式不读写回复缓存')
+    # 添加'--system-file'参数，每次都相同的大段上下文作为可缓存的系统前缀发送
+    parser.add_argument('--system-file', action='append', metavar='FILE',
+                        help='作为系统前缀发送的文件（如.cursorrules、参考指南），可重复指定；提供商支持时会被缓存')
+    add_profile_arguments(parser)  # 添加--profile等性能分析参数
     args = parser.parse_args()  # 解析命令行传入的参数
 
+    with profile_from_args(args, 'llm_api'):  # 指定--profile时记录各阶段耗时并写出trace文件
+        run(args)
+
+def run(args):
+    """根据解析好的命令行参数执行一次查询。"""
+    prompt = args.prompt  # 实际发送给模型的提示
+    if args.context_from_kb:  # 如果需要注入知识库上下文
+        from kb_retrieval import build_kb_context  # 延迟导入，未使用该功能时不加载NumPy
+        with span('kb_context', top_k=args.kb_top_k):  # 记录知识库检索耗时
+            context = build_kb_context(args.prompt, top_k=args.kb_top_k)  # 检索最相关的文本块
+        if context:  # 只有检索到相关内容时才注入
+            print(f"Injected {len(context)} characters of knowledge_bank context", file=sys.stderr)
+            prompt = f"Reference material from the knowledge base:\n\n{context}\n\n---\n\n{args.prompt}"
+
     # 如果用户没有通过命令行指定模型，则设置默认模型
     if not args.model:
         if args.provider == 'openai':
@@ -279,13 +543,129 @@ def main():
         elif args.provider == 'azure':
             args.model = os.getenv('AZURE_OPENAI_MODEL_DEPLOYMENT', 'gpt-4o-ms')  # 对于Azure，再次尝试从环境变量获取
 
-    client = create_llm_client(args.provider)  # 根据提供商创建LLM客户端
-    # 调用核心查询函数，传入所有相关参数
-    response = query_llm(args.prompt, client, model=args.model, provider=args.provider, image_path=args.image)
+    system = [read_documents([path]) for path in args.system_file or []]  # 可缓存的系统前缀
+
+    with span('create_client', provider=args.provider):  # 记录创建客户端的耗时
+        client = create_llm_client(args.provider)  # 根据提供商创建LLM客户端
+    if args.document:  # 长文档模式
+        response = query_document(prompt, read_documents(args.document), client, args, system)
+    else:
+        usage = {}  # 接收本次请求的token用量
+        # 调用核心查询函数，传入所有相关参数
+        response = query_llm(prompt, client, model=args.model, provider=args.provider, image_path=args.image,
+                             max_tokens=args.max_tokens, system=system, usage=usage)
+        if usage:
+            print(format_usage(usage), file=sys.stderr)  # 打印token用量和缓存命中情况
     if response:  # 如果成功获取到回复
         print(response)  # 打印回复内容
     else:
         print("Failed to get response from LLM")  # 否则打印失败信息
+        sys.exit(1)  # 以非零状态退出，便于脚本判断失败后重新运行（长文档模式会从缓存补齐失败的部分）
+
+def read_documents(paths: List[str]) -> str:
+    """读取--document指定的文件（"-"为标准输入），多个文件之间用空行分隔。"""
+    texts = []
+    for path in paths:
+        if path == '-':
+            texts.append(sys.stdin.read())
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+    return '\n\n'.join(texts)
+
+def format_usage(usage: dict) -> str:
+    """把extract_usage的结果格式化为一行，包含缓存命中占输入的比例。"""
+    line = f"Usage: {usage['input_tokens']} input tokens"
+    if usage['input_tokens']:
+        line += f" ({usage['cached_tokens']} cached, {usage['cached_tokens'] / usage['input_tokens']:.0%})"
+    if usage['cache_write_tokens']:
+        line += f", {usage['cache_write_tokens']} written to cache"
+    return line + f", {usage['output_tokens']} output tokens"
+
+def query_document(prompt: str, document: str, client, args, system: Optional[List[str]] = None) -> Optional[str]:
+    """针对长文档回答提示：按模型预算切块、并发map、逐层reduce，并缓存每次请求的回复。"""
+    from long_document import ResponseCache, answer_over_document, chunk_budget, count_tokens  # 延迟导入，只在长文档模式使用
+    system_text = '\0'.join(system or [])
+    # 单块token数，不超过模型上下文窗口，并扣除每次都发送的系统前缀
+    budget = chunk_budget(args.provider, args.chunk_tokens, args.max_tokens, count_tokens(system_text))
+    # 不同模型、输出上限和系统前缀下的回复分开缓存
+    namespace = f"{args.provider}/{args.model}/{args.max_tokens}/{hashlib.sha256(system_text.encode('utf-8')).hexdigest()}"
+    cache = None if args.no_cache else ResponseCache()
+    stats = {}
+    try:
+        response = answer_over_document(
+            prompt, document,
+            lambda text: query_llm(text, client, model=args.model, provider=args.provider, max_tokens=args.max_tokens,
+                                   system=system),
+            namespace=namespace, chunk_tokens=budget,
+            concurrency=args.concurrency, cache=cache, stats=stats)
+    finally:
+        if cache:
+            cache.close()
+    print(f"Document: {stats['document_tokens']} tokens in {stats['chunks']} chunks; {stats['requests']} requests, "
+          f"{stats['cache_hits']} cached, {stats['failures']} failed, {stats['reduce_levels']} reduce levels",
+          file=sys.stderr)
+    return response
+
+def batch_main(argv: List[str]):
+    """
+    离线批处理：submit 生成并提交批处理文件，poll 查询（--wait时按退避间隔轮询到结束），
+    fetch 下载结果并按输入顺序写成JSONL。作业信息保存在 temp/batches/ 下的作业文件中。
+    """
+    import llm_batch  # 延迟导入，只在批处理模式下加载
+    parser = argparse.ArgumentParser(prog='llm_api.py batch', description='通过提供商的批处理接口离线运行大量提示')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = commands.add_parser('submit', help='生成批处理文件并提交')
+    submit_parser.add_argument('input', help='输入JSONL，每行 {"id": ..., "prompt": ...}，可选 "system"、"max_tokens"')
+    submit_parser.add_argument('--provider', choices=llm_batch.BATCH_PROVIDERS, default='openai', help='要使用的API提供商')
+    submit_parser.add_argument('--model', type=str, help='要使用的模型 (默认值取决于提供商)')
+    submit_parser.add_argument('--max-tokens', type=int, default=llm_batch.DEFAULT_BATCH_MAX_TOKENS,
+                               help=f'最大输出token数 (默认: {llm_batch.DEFAULT_BATCH_MAX_TOKENS})')
+    submit_parser.add_argument('--system-file', action='append', metavar='FILE',
+                               help='作为系统前缀发送的文件，可重复指定；输入行中的"system"优先')
+    submit_parser.add_argument('--job-dir', default=llm_batch.DEFAULT_JOB_DIR,
+                               help=f'作业文件目录 (默认: {llm_batch.DEFAULT_JOB_DIR})')
+
+    for name, help_text in (('poll', '查询批次状态'), ('fetch', '下载结果并映射回输入id')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('job', help='submit生成的作业文件')
+        command.add_argument('--wait', action='store_true', help='一直轮询到批次结束')
+        command.add_argument('--interval', type=float, default=llm_batch.DEFAULT_POLL_INTERVAL,
+                             help=f'初始轮询间隔秒数，之后每次翻倍 (默认: {llm_batch.DEFAULT_POLL_INTERVAL})')
+        command.add_argument('--max-interval', type=float, default=llm_batch.DEFAULT_MAX_POLL_INTERVAL,
+                             help=f'最大轮询间隔秒数 (默认: {llm_batch.DEFAULT_MAX_POLL_INTERVAL})')
+        command.add_argument('--timeout', type=float, help='等待超过多少秒后放弃')
+        if name == 'fetch':
+            command.add_argument('-o', '--output', help='结果JSONL路径 (默认: 作业文件旁的 .results.jsonl)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'submit':
+        requests = llm_batch.load_requests(args.input)
+        system = '\n\n'.join(read_documents([path]) for path in args.system_file or []) or None
+        job = llm_batch.submit(create_llm_client(args.provider), args.provider, requests, model=args.model,
+                               max_tokens=args.max_tokens, system=system, job_dir=args.job_dir, input_path=args.input)
+        print(f"Submitted {len(requests)} requests as batch {job['batch_id']}", file=sys.stderr)
+        print(job['path'])  # 作业文件路径，供poll/fetch使用
+        return
+
+    job = llm_batch.load_job(args.job)
+    client = create_llm_client(job['provider'])
+    status = llm_batch.poll(client, job, wait=args.wait, interval=args.interval, max_interval=args.max_interval,
+                            timeout=args.timeout)
+    if args.command == 'poll':
+        print(json.dumps(status, ensure_ascii=False))
+        return
+    if not status['done']:
+        print(f"ERROR: Batch {job['batch_id']} is still {status['status']}; use --wait to poll until it ends",
+              file=sys.stderr)
+        sys.exit(1)
+    rows = llm_batch.fetch(client, job)
+    output = args.output or os.path.splitext(args.job)[0] + '.results.jsonl'
+    llm_batch.write_results(rows, output)
+    failed = sum(1 for row in rows if row['error'])
+    print(f"Wrote {len(rows)} results ({failed} failed) to {output}", file=sys.stderr)
+    print(output)
 
 if __name__ == "__main__":
     # 检查脚本是否作为主程序运行
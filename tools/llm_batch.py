@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+离线批量请求：把大量不需要实时回答的提示（如夜间跑几千道题）提交到提供商的批处理接口，
+价格约为同步请求的一半，也不占用同步接口的速率限制。
+
+    python tools/llm_api.py batch submit questions.jsonl --provider openai     # 生成批处理文件并提交
+    python tools/llm_api.py batch poll temp/batches/<job>.json --wait          # 按退避间隔轮询直到完成
+    python tools/llm_api.py batch fetch temp/batches/<job>.json -o answers.jsonl
+
+输入为JSONL，每行 {"id": ..., "prompt": ...}，可选 "system"、"max_tokens"；缺少id时使用行号。
+输出为JSONL，按输入顺序每行 {"id", "response", "error", "usage"}。
+
+支持OpenAI Batch API（openai、azure，以及用于测试的local）和Anthropic Message Batches。
+提交后的作业信息（批次ID、请求编号到输入id的映射）保存在 temp/batches/ 下的作业文件中。
+"""
+
+import json  # 导入JSON库，用于读写JSONL和作业文件
+import os  # 导入操作系统相关功能库
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import tempfile  # 导入临时文件库，用于生成上传的批处理文件
+import time  # 导入时间库，用于轮询间隔
+from datetime import datetime  # 导入日期时间库，用于作业文件名和时间戳
+from typing import Dict, List, Optional  # 从typing库导入类型提示
+
+# 作业文件的默认目录（temp/下的生成文件，已在.gitignore中忽略）
+DEFAULT_JOB_DIR = os.path.join('temp', 'batches')
+# 使用OpenAI Batch API格式的提供商
+OPENAI_BATCH_PROVIDERS = ('openai', 'azure', 'local')
+BATCH_PROVIDERS = OPENAI_BATCH_PROVIDERS + ('anthropic',)
+# 批处理请求的默认最大输出token数
+DEFAULT_BATCH_MAX_TOKENS = 4096
+# 轮询的初始间隔和最大间隔（秒），每次未完成后间隔翻倍
+DEFAULT_POLL_INTERVAL = 30
+DEFAULT_MAX_POLL_INTERVAL = 600
+# OpenAI批处理状态中已经结束的状态
+OPENAI_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def default_batch_model(provider: str) -> str:
+    """各提供商的默认模型，与query_llm的默认值一致。"""
+    if provider == 'openai':
+        return os.getenv('OPENAI_MODEL_DEPLOYMENT', 'gpt-4o')
+    if provider == 'azure':
+        return os.getenv('AZURE_OPENAI_MODEL_DEPLOYMENT', 'gpt-4o-ms')
+    if provider == 'anthropic':
+        return 'claude-3-7-sonnet-20250219'
+    return 'Qwen/Qwen2.5-32B-Instruct-AWQ'
+
+
+def load_requests(path: str) -> List[Dict]:
+    """读取输入JSONL，返回 [{id, prompt, system, max_tokens}]，id缺失时使用行号。"""
+    requests = []
+    seen = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get('prompt'):
+                raise ValueError(f"{path}:{line_number}: missing 'prompt'")
+            record_id = str(record.get('id', line_number))
+            if record_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate id {record_id!r}")
+            seen.add(record_id)
+            requests.append({'id': record_id, 'prompt': record['prompt'], 'system': record.get('system'),
+                             'max_tokens': record.get('max_tokens')})
+    return requests
+
+
+def _custom_id(index: int) -> str:
+    # 批处理接口对custom_id有格式限制（Anthropic只允许字母数字、_、-，最长64），因此用序号，再映射回输入id
+    return f"req-{index}"
+
+
+def build_openai_lines(requests: List[Dict], model: str, max_tokens: int, system: Optional[str],
+                       endpoint: str) -> List[Dict]:
+    """生成OpenAI Batch API输入文件的各行（每行一个chat completions请求）。"""
+    lines = []
+    for index, request in enumerate(requests):
+        messages = []
+        system_text = request['system'] or system
+        if system_text:  # 不变的前缀放在system消息中，批处理内同样可以命中自动前缀缓存
+            messages.append({'role': 'system', 'content': system_text})
+        messages.append({'role': 'user', 'content': request['prompt']})
+        lines.append({'custom_id': _custom_id(index), 'method': 'POST', 'url': endpoint,
+                      'body': {'model': model, 'messages': messages,
+                               'max_tokens': request['max_tokens'] or max_tokens}})
+    return lines
+
+
+def build_anthropic_requests(requests: List[Dict], model: str, max_tokens: int, system: Optional[str]) -> List[Dict]:
+    """生成Anthropic Message Batches的请求列表。"""
+    batch = []
+    for index, request in enumerate(requests):
+        params = {'model': model, 'max_tokens': request['max_tokens'] or max_tokens,
+                  'messages': [{'role': 'user', 'content': request['prompt']}]}
+        system_text = request['system'] or system
+        if system_text:
+            params['system'] = [{'type': 'text', 'text': system_text, 'cache_control': {'type': 'ephemeral'}}]
+        batch.append({'custom_id': _custom_id(index), 'params': params})
+    return batch
+
+
+def submit(client, provider: str, requests: List[Dict], model: Optional[str] = None,
+           max_tokens: int = DEFAULT_BATCH_MAX_TOKENS, system: Optional[str] = None,
+           job_dir: str = DEFAULT_JOB_DIR, input_path: Optional[str] = None) -> Dict:
+    """
+    生成批处理文件并提交，返回作业信息并写入作业文件（job['path']）。
+
+    Args:
+        client: create_llm_client(provider) 创建的客户端
+        provider: 提供商，见BATCH_PROVIDERS
+        requests: load_requests的结果
+        model: 模型名，默认见default_batch_model
+        max_tokens: 输入中未指定max_tokens时的最大输出token数
+        system: 输入中未指定system时使用的系统前缀
+        job_dir: 作业文件目录
+        input_path: 输入文件路径，记录在作业文件中
+    """
+    if provider not in BATCH_PROVIDERS:
+        raise ValueError(f"Batch mode is not supported for provider: {provider}")
+    model = model or default_batch_model(provider)
+
+    if provider == 'anthropic':
+        batch = client.messages.batches.create(requests=build_anthropic_requests(requests, model, max_tokens, system))
+        batch_id, extra = batch.id, {}
+    else:
+        endpoint = '/chat/completions' if provider == 'azure' else '/v1/chat/completions'  # Azure的路径不带/v1
+        lines = build_openai_lines(requests, model, max_tokens, system, endpoint)
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+            batch_path = f.name
+        try:
+            with open(batch_path, 'rb') as f:
+                uploaded = client.files.create(file=f, purpose='batch')  # 上传批处理输入文件
+        finally:
+            os.remove(batch_path)
+        batch = client.batches.create(input_file_id=uploaded.id, endpoint=endpoint, completion_window='24h',
+                                      metadata={'source': 'llm_api batch', 'requests': str(len(lines))})
+        batch_id, extra = batch.id, {'input_file_id': uploaded.id}
+
+    job = {
+        'provider': provider,
+        'batch_id': batch_id,
+        'model': model,
+        'input': input_path,
+        'submitted_at': datetime.now().isoformat(),
+        'ids': {_custom_id(index): request['id'] for index, request in enumerate(requests)},
+        **extra,
+    }
+    os.makedirs(job_dir, exist_ok=True)
+    job['path'] = os.path.join(job_dir, f"{provider}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{batch_id}.json")
+    save_job(job)
+    return job
+
+
+def save_job(job: Dict):
+    with open(job['path'], 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, indent=2)
+
+
+def load_job(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    job['path'] = path
+    return job
+
+
+def get_status(client, job: Dict) -> Dict:
+    """
+    查询批次状态，返回统一格式：
+    {'status': 提供商的原始状态, 'done': 是否已结束, 'counts': 各类请求数}
+    """
+    if job['provider'] == 'anthropic':
+        batch = client.messages.batches.retrieve(job['batch_id'])
+        counts = batch.request_counts
+        return {'status': batch.processing_status, 'done': batch.processing_status == 'ended',
+                'counts': {'processing': counts.processing, 'succeeded': counts.succeeded, 'errored': counts.errored,
+                           'canceled': counts.canceled, 'expired': counts.expired}}
+    batch = client.batches.retrieve(job['batch_id'])
+    counts = batch.request_counts
+    job['output_file_id'] = batch.output_file_id
+    job['error_file_id'] = batch.error_file_id
+    return {'status': batch.status, 'done': batch.status in OPENAI_TERMINAL_STATUSES,
+            'counts': {'total': counts.total, 'completed': counts.completed, 'failed': counts.failed}
+            if counts else {}}
+
+
+def poll(client, job: Dict, wait: bool = False, interval: float = DEFAULT_POLL_INTERVAL,
+         max_interval: float = DEFAULT_MAX_POLL_INTERVAL, timeout: Optional[float] = None) -> Dict:
+    """
+    查询批次状态；wait为True时一直轮询到批次结束，间隔从interval开始每次翻倍，最长max_interval。
+    超过timeout秒仍未结束时抛出TimeoutError。
+    """
+    start_time = time.time()
+    while True:
+        status = get_status(client, job)
+        print(f"DEBUG: Batch {job['batch_id']}: {status['status']} {status['counts']}", file=sys.stderr)
+        if status['done'] or not wait:
+            save_job(job)  # 保存最新的输出文件ID
+            return status
+        if timeout is not None and time.time() - start_time + interval > timeout:
+            raise TimeoutError(f"Batch {job['batch_id']} not finished after {timeout:.0f}s")
+        time.sleep(interval)
+        interval = min(interval * 2, max_interval)
+
+
+def _openai_usage(body: Dict) -> Dict:
+    usage = body.get('usage') or {}
+    details = usage.get('prompt_tokens_details') or {}
+    return {'input_tokens': usage.get('prompt_tokens', 0), 'cached_tokens': details.get('cached_tokens') or 0,
+            'cache_write_tokens': 0, 'output_tokens': usage.get('completion_tokens', 0)}
+
+
+def _read_openai_results(client, file_id: Optional[str]) -> Dict[str, Dict]:
+    """下载OpenAI批处理的输出或错误文件，返回 custom_id -> 结果。"""
+    results = {}
+    if not file_id:
+        return results
+    for line in client.files.content(file_id).text.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        response = entry.get('response') or {}
+        body = response.get('body') or {}
+        if entry.get('error') or response.get('status_code', 200) != 200:
+            error = entry.get('error') or body.get('error') or {'status_code': response.get('status_code')}
+            results[entry['custom_id']] = {'response': None, 'error': error, 'usage': None}
+        else:
+            results[entry['custom_id']] = {'response': body['choices'][0]['message']['content'], 'error': None,
+                                           'usage': _openai_usage(body)}
+    return results
+
+
+def _anthropic_usage(message) -> Dict:
+    usage = message.usage
+    return {'input_tokens': usage.input_tokens, 'cached_tokens': usage.cache_read_input_tokens or 0,
+            'cache_write_tokens': usage.cache_creation_input_tokens or 0, 'output_tokens': usage.output_tokens}
+
+
+def _read_anthropic_results(client, job: Dict) -> Dict[str, Dict]:
+    """读取Anthropic批处理的结果流，返回 custom_id -> 结果。"""
+    results = {}
+    for entry in client.messages.batches.results(job['batch_id']):
+        result = entry.result
+        if result.type == 'succeeded':
+            text = ''.join(block.text for block in result.message.content if block.type == 'text')
+            results[entry.custom_id] = {'response': text, 'error': None,
+                                        'usage': _anthropic_usage(result.message)}
+        else:  # errored / canceled / expired
+            error = result.error.model_dump() if getattr(result, 'error', None) is not None else {'type': result.type}
+            results[entry.custom_id] = {'response': None, 'error': error, 'usage': None}
+    return results
+
+
+def fetch(client, job: Dict) -> List[Dict]:
+    """下载已结束批次的结果，按输入顺序映射回输入id。缺少结果的请求记为错误。"""
+    status = get_status(client, job)
+    if not status['done']:
+        raise RuntimeError(f"Batch {job['batch_id']} is still {status['status']}; poll with --wait first")
+    if job['provider'] == 'anthropic':
+        results = _read_anthropic_results(client, job)
+    else:
+        results = _read_openai_results(client, job.get('output_file_id'))
+        results.update(_read_openai_results(client, job.get('error_file_id')))
+
+    rows = []
+    for custom_id, record_id in job['ids'].items():  # 作业文件中的映射保持输入顺序
+        result = results.get(custom_id, {'response': None, 'error': {'type': 'missing_result'}, 'usage': None})
+        rows.append({'id': record_id, **result})
+    return rows
+
+
+def write_results(rows: List[Dict], path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+长文档的map-reduce查询：超出单次请求预算的文本（parse_html的输出、整份knowledge_bank指南）
+按标题和段落切成若干块，每块并发提取与任务相关的笔记(map)，再把笔记分组逐层合并(reduce)，
+直到得到最终回答。
+
+每次请求的回复按 (提供商, 模型, 完整提示) 缓存在本地JSONL文件中；切块边界由内容决定，
+文档小幅修改后重新运行时，只有内容变化的块（以及依赖它们的合并步骤）会重新请求。
+
+由 llm_api.py --document 调用，也可以直接使用 answer_over_document()。
+"""
+
+import hashlib  # 导入哈希库，用于生成缓存键
+import json  # 导入JSON库，用于读写缓存文件
+import math  # 导入数学库，用于估算token数时取整
+import os  # 导入操作系统相关功能库
+import re  # 导入正则表达式库，用于切分段落和识别标题
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import threading  # 导入线程库，用于保护并发写入缓存
+import zlib  # 导入zlib库，使用其crc32决定内容定义的切块边界
+from concurrent.futures import ThreadPoolExecutor  # 导入线程池，用于并发发送各块的请求
+from typing import Callable, Dict, List, Optional  # 从typing库导入类型提示
+
+from instrumentation import span  # 导入共用的性能埋点
+
+try:
+    import tiktoken  # 可选依赖：精确计算OpenAI模型的token数
+except ImportError:
+    tiktoken = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 默认的回复缓存文件，已在.gitignore中忽略
+DEFAULT_CACHE_PATH = os.path.join(REPO_ROOT, '.llm_cache', 'map_reduce.jsonl')
+# 单个文本块的默认token数；文档不超过一块时直接单次查询
+DEFAULT_CHUNK_TOKENS = 8000
+# 默认同时发送的请求数
+DEFAULT_CONCURRENCY = 4
+# 为提示模板和模型输出预留的token数
+PROMPT_OVERHEAD_TOKENS = 500
+# 各提供商默认模型的上下文窗口（token）
+CONTEXT_WINDOWS = {
+    'openai': 128000,
+    'azure': 128000,
+    'anthropic': 200000,
+    'gemini': 1000000,
+    'deepseek': 64000,
+    'siliconflow': 64000,
+    'local': 32768,
+}
+# map阶段某块与任务无关时模型应回复的标记
+NO_CONTENT = 'NO RELEVANT CONTENT'
+
+MAP_PROMPT = """You are reading one part of a longer document.
+
+Task: {task}
+
+Extract every fact, figure, definition and detail from this part that is relevant to the task, as concise notes. Only use this part; do not try to complete the task yet. If nothing in this part is relevant, reply exactly: {none}
+
+--- Document part ---
+{chunk}"""
+
+MERGE_PROMPT = """Below are notes extracted, in order, from consecutive parts of a long document for this task: {task}
+
+Merge them into one set of concise notes. Keep every relevant fact, remove duplicates and keep the original order. Do not complete the task yet.
+
+{notes}"""
+
+FINAL_PROMPT = """Below are notes extracted, in order, from consecutive parts of a long document. Using only these notes, complete the task.
+
+Task: {task}
+
+{notes}"""
+
+_CJK_RE = re.compile(r'[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]')  # 中日韩文字和全角符号
+_HEADING_RE = re.compile(r'^#{1,6}\s')  # markdown标题行
+_ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本的token数。安装了tiktoken时用o200k_base编码精确计算；否则估算：
+    中日韩文字每字约1个token，其余字符约4个字符1个token（按偏多估计，避免超出预算）。
+    """
+    global _ENCODING
+    if tiktoken is not None:
+        if _ENCODING is None:
+            _ENCODING = tiktoken.get_encoding('o200k_base')
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def chunk_budget(provider: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS, max_tokens: Optional[int] = None,
+                 reserved_tokens: int = 0) -> int:
+    """
+    在模型上下文窗口内能放下的单块token数：不超过chunk_tokens，并为模板、输出和
+    reserved_tokens（例如每次都发送的系统前缀）留出空间。
+    """
+    window = CONTEXT_WINDOWS.get(provider, 32768)
+    return max(256, min(chunk_tokens, window - PROMPT_OVERHEAD_TOKENS - (max_tokens or 4096) - reserved_tokens))
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """把超过max_tokens的段落按行切开，单行仍然过长时按字符数硬切。"""
+    pieces = []
+    for line in text.split('\n'):
+        tokens = count_tokens(line)
+        if tokens <= max_tokens:
+            pieces.append(line)
+            continue
+        step = max(1, len(line) * max_tokens // tokens)  # 按比例估算每段的字符数
+        pieces.extend(line[i:i + step] for i in range(0, len(line), step))
+    return pieces
+
+
+def split_document(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    把文档切成不超过max_tokens的文本块，只在段落（空行）和行之间切开。
+
+    切块边界由内容决定：当前块超过一半预算后，遇到markdown标题或crc32满足条件的段落就切开，
+    而不是一直装满。这样修改某一段只会影响它所在的块，后面的块很快回到与修改前相同的边界，
+    缓存仍然命中。
+    """
+    paragraphs = [block.strip('\n') for block in re.split(r'\n[ \t]*\n', text) if block.strip()]
+    pieces = []  # (文本, token数)
+    for paragraph in paragraphs:
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            pieces.append((paragraph, tokens))
+        else:
+            pieces.extend((line, count_tokens(line)) for line in _split_oversized(paragraph, max_tokens) if line.strip())
+
+    chunks, current, current_tokens = [], [], 0
+    for piece, tokens in pieces:
+        if current:
+            overflow = current_tokens + tokens + 1 > max_tokens
+            boundary = current_tokens >= max_tokens // 2 and (
+                _HEADING_RE.match(piece) or zlib.crc32(piece.encode('utf-8')) % 4 == 0)
+            if overflow or boundary:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens + 1  # 段落之间的空行约1个token
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+class ResponseCache:
+    """
+    按 (命名空间, 提示) 的哈希缓存模型回复的追加写入JSONL文件。
+    回复一到就写入，中断的运行已完成的部分不会丢失。
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 中断时写了一半的最后一行
+                    self.entries[entry['key']] = entry['response']
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    @staticmethod
+    def key(namespace: str, prompt: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.entries.get(key)
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self.entries[key] = response
+            if self._file:
+                self._file.write(json.dumps({'key': key, 'response': response}, ensure_ascii=False) + '\n')
+                self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def _run_prompts(prompts: List[str], query: Callable[[str], Optional[str]], pool: ThreadPoolExecutor,
+                 cache: Optional[ResponseCache], namespace: str, stats: Dict, stage: str) -> List[Optional[str]]:
+    """并发发送一批提示，先查缓存；失败的请求返回None且不写入缓存。"""
+    keys = [ResponseCache.key(namespace, prompt) for prompt in prompts]
+    results = [cache.get(key) if cache else None for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    stats['cache_hits'] += len(prompts) - len(missing)
+    stats['requests'] += len(missing)
+
+    def run(i):
+        with span(stage, chars=len(prompts[i])):
+            response = query(prompts[i])
+        if response and cache:
+            cache.put(keys[i], response)
+        return response
+
+    for i, response in zip(missing, pool.map(run, missing)):
+        results[i] = response
+    stats['failures'] += sum(1 for i in missing if results[i] is None)
+    return results
+
+
+def _format_notes(notes: List[str]) -> str:
+    return '\n\n'.join(f"--- Notes from part {i} ---\n{note}" for i, note in enumerate(notes, 1))
+
+
+def _group_notes(notes: List[str], max_tokens: int) -> List[List[str]]:
+    """把笔记按顺序分组，每组不超过max_tokens；每组至少两条，保证每一轮合并都在减少条数。"""
+    groups, current, current_tokens = [], [], 0
+    for note in notes:
+        tokens = count_tokens(note) + 10
+        if len(current) >= 2 and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(note)
+        current_tokens += tokens
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])  # 最后剩下一条时并入前一组
+    elif current:
+        groups.append(current)
+    return groups
+
+
+def answer_over_document(task: str, document: str, query: Callable[[str], Optional[str]], namespace: str = '',
+                         chunk_tokens: int = DEFAULT_CHUNK_TOKENS, concurrency: int = DEFAULT_CONCURRENCY,
+                         cache: Optional[ResponseCache] = None, stats: Optional[Dict] = None) -> Optional[str]:
+    """
+    对长文档完成任务：文档不超过一块时直接单次查询，否则map-reduce。
+
+    Args:
+        task: 用户的问题或指令
+        document: 长文档全文
+        query: 发送一个提示并返回回复（失败时返回None）的函数，例如绑定了客户端的query_llm
+        namespace: 缓存命名空间，通常为 "提供商/模型"，不同模型的回复不会互相命中
+        chunk_tokens: 每块的token数上限（应已按模型上下文窗口裁剪，见chunk_budget）
+        concurrency: 同时发送的请求数
+        cache: 回复缓存，为None时不缓存
+        stats: 传入字典时写入块数、请求数、缓存命中数和合并层数
+
+    Returns:
+        Optional[str]: 最终回答。任何一块或一组合并失败时返回None（失败数见stats['failures']），
+        不用缺了内容的笔记继续合并；成功的回复已写入缓存，重新运行时只补发失败的请求
+    """
+    stats = stats if stats is not None else {}
+    stats.update({'chunks': 0, 'requests': 0, 'cache_hits': 0, 'failures': 0, 'reduce_levels': 0,
+                  'document_tokens': count_tokens(document)})
+    with span('split', chars=len(document)):
+        chunks = split_document(document, chunk_tokens)
+    stats['chunks'] = len(chunks)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        if len(chunks) <= 1:
+            prompt = f"{document}\n\n---\n\n{task}"
+            return _run_prompts([prompt], query, pool, cache, namespace, stats, 'query_single')[0]
+
+        partials = _run_prompts([MAP_PROMPT.format(task=task, none=NO_CONTENT, chunk=chunk) for chunk in chunks],
+                                query, pool, cache, namespace, stats, 'map')
+        if any(partial is None for partial in partials):
+            print(f"ERROR: {partials.count(None)} of {len(chunks)} parts failed", file=sys.stderr)
+            return None
+        notes = [partial for partial in partials if partial and partial.strip() != NO_CONTENT]
+        if len(notes) < len(chunks):
+            print(f"DEBUG: {len(chunks) - len(notes)} of {len(chunks)} parts had no usable notes", file=sys.stderr)
+        if not notes:
+            notes = [NO_CONTENT]
+
+        # 逐层合并：每组笔记合并成一条，直到所有笔记能放进一次最终请求
+        while True:
+            stats['reduce_levels'] += 1
+            groups = _group_notes(notes, chunk_tokens)
+            if len(groups) == 1:
+                return _run_prompts([FINAL_PROMPT.format(task=task, notes=_format_notes(groups[0]))],
+                                    query, pool, cache, namespace, stats, 'reduce')[0]
+            merged = _run_prompts([MERGE_PROMPT.format(task=task, notes=_format_notes(group)) for group in groups],
+                                  query, pool, cache, namespace, stats, 'reduce')
+            if any(note is None for note in merged):
+                print(f"ERROR: {merged.count(None)} of {len(groups)} merges failed", file=sys.stderr)
+                return None
+            notes = merged
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+Anki文本中题目标记的单遍扫描器。
+
+一道题从题型标记（"单选题"/"多选题"）开始，到答案标记（"正确答案: A,B;"、"答案：C；"）
+结束。如果只有一行不完整的"正确答案"，题目在这一行的行尾结束，并标记为不确定(ambiguous)。
+
+每个标记都包含"选题"或"答案"这两个固定锚点之一。扫描器用str.find（快速的子串查找，
+在中文文本上比正则扫描快得多）依次定位两种锚点，只在命中的位置运行预编译的、
+从该位置开始匹配的正则，因此在大的导出文件中找出所有题目只需遍历一次文本。
+"""
+
+import re  # 导入正则表达式库，用于在锚点处匹配答案标记
+import sys  # 导入系统相关的参数和函数，如此处用于输出基准测试结果
+import time  # 导入时间库，用于基准测试计时
+import json  # 导入JSON库，用于输出扫描结果
+import argparse  # 导入用于解析命令行参数的库
+from typing import Iterator, NamedTuple, Optional, Tuple  # 从typing库导入类型提示
+
+QUESTION_TYPES = ('单选题', '多选题')
+# 字段或行开头的 "<题型>："
+TYPE_PREFIX_RE = re.compile(r'^(单选题|多选题)[：:]\s*')
+
+_TYPE_ANCHOR = '选题'
+_ANSWER_ANCHOR = '答案'
+_TYPE_CHARS = frozenset(qtype[0] for qtype in QUESTION_TYPES)
+# 完整的答案标记中"答案"之后必须跟的内容
+_ANSWER_TAIL_RE = re.compile(r'[：:]\s*([A-Z](?:\s*,+\s*[A-Z])*)\s*[;；]')
+_LETTER_RE = re.compile(r'[A-Z]')
+
+
+class QuestionSpan(NamedTuple):
+    start: int
+    end: int
+    type: str
+    answer: str  # 例如 "A,C"；题目在不完整的"正确答案"行结束时为空
+    ambiguous: bool
+
+    def text(self, source: str) -> str:
+        return source[self.start:self.end].strip()
+
+
+def _line_end(text: str, pos: int) -> int:
+    end = text.find('\n', pos)
+    return len(text) if end == -1 else end
+
+
+def iter_markers(text: str) -> Iterator[Tuple[str, int, int, str]]:
+    """
+    按顺序为文本中的每个标记生成 (kind, start, end, value)：
+    ('type', ..., '单选题')、('answer', ..., 'A,C')，不完整的"正确答案"为 ('loose', ...)。
+    """
+    find = text.find
+    next_type = find(_TYPE_ANCHOR)
+    next_answer = find(_ANSWER_ANCHOR)
+    while next_type != -1 or next_answer != -1:
+        if next_answer == -1 or (next_type != -1 and next_type < next_answer):
+            pos = next_type
+            next_type = find(_TYPE_ANCHOR, pos + 2)
+            if pos > 0 and text[pos - 1] in _TYPE_CHARS:
+                yield 'type', pos - 1, pos + 2, text[pos - 1:pos + 2]
+        else:
+            pos = next_answer
+            next_answer = find(_ANSWER_ANCHOR, pos + 2)
+            start = pos - 2 if text.startswith('正确', pos - 2) else pos
+            tail = _ANSWER_TAIL_RE.match(text, pos + 2)
+            if tail:
+                yield 'answer', start, tail.end(), ','.join(_LETTER_RE.findall(tail.group(1)))
+            elif start != pos:
+                yield 'loose', start, pos + 2, ''
+
+
+def scan_questions(text: str) -> Iterator[QuestionSpan]:
+    """
+    按顺序生成文本中的每道题目。
+
+    未结束的题目中出现新的题型标记时开始新题目；旧题目只有在其中出现过不完整的
+    "正确答案"行时才保留（标记为不确定）。
+    """
+    start = None
+    question_type = None
+    loose_end = None
+    for kind, marker_start, marker_end, value in iter_markers(text):
+        if kind == 'type':
+            if start is not None and loose_end is not None:
+                yield QuestionSpan(start, loose_end, question_type, '', True)
+            start, question_type, loose_end = marker_start, value, None
+        elif start is None:
+            continue
+        elif kind == 'answer':
+            yield QuestionSpan(start, marker_end, question_type, value, False)
+            start, loose_end = None, None
+        elif loose_end is None:
+            loose_end = _line_end(text, marker_end)
+    if start is not None and loose_end is not None:
+        yield QuestionSpan(start, loose_end, question_type, '', True)
+
+
+def first_question(text: str) -> Optional[QuestionSpan]:
+    """
+    返回从第一个题型标记到其后第一个答案标记的范围，找不到时返回None。
+
+    用于逐张卡片的查找：与scan_questions不同，它不再寻找后面的题型标记，
+    找到答案标记就立即返回。
+    """
+    find = text.find
+    pos = find(_TYPE_ANCHOR)
+    while pos != -1 and not (pos > 0 and text[pos - 1] in _TYPE_CHARS):
+        pos = find(_TYPE_ANCHOR, pos + 2)
+    if pos == -1:
+        return None
+    start, question_type = pos - 1, text[pos - 1:pos + 2]
+
+    loose_end = None
+    pos = find(_ANSWER_ANCHOR, start)
+    while pos != -1:
+        tail = _ANSWER_TAIL_RE.match(text, pos + 2)
+        if tail:
+            return QuestionSpan(start, tail.end(), question_type, ','.join(_LETTER_RE.findall(tail.group(1))), False)
+        if loose_end is None and text.startswith('正确', pos - 2):
+            loose_end = _line_end(text, pos + 2)
+        pos = find(_ANSWER_ANCHOR, pos + 2)
+    if loose_end is None:
+        return None
+    return QuestionSpan(start, loose_end, question_type, '', True)
+
+
+def extract_marked(text: str) -> Tuple[Optional[str], bool]:
+    """
+    把捕获的文本截取为其中的第一道题目。
+    返回 (内容或None, 是否不确定)，供Anki提取脚本使用。
+    """
+    span = first_question(text) if text else None
+    if span is None:
+        return None, False
+    return span.text(text), span.ambiguous
+
+
+def _legacy_extract(content):
+    """提取脚本原来的逐卡片查找方式：对每种题型调用find()，再依次尝试最多三个正则。"""
+    start_idx = -1
+    for qtype in QUESTION_TYPES:
+        idx = content.find(qtype)
+        if idx != -1 and (start_idx == -1 or idx < start_idx):
+            start_idx = idx
+    if start_idx == -1:
+        return None, -1
+    end_idx = -1
+    for pattern in (r"正确答案[：:]\s*[A-Z](,[A-Z])*[;；]", r"正确答案[：:]\s*[A-Z]\s*[;；]",
+                    r"答案[：:]\s*[A-Z](,[A-Z])*[;；]"):
+        match = re.search(pattern, content[start_idx:])
+        if match:
+            end_idx = start_idx + match.end()
+            break
+    if end_idx == -1:
+        alt_idx = content.find("正确答案", start_idx)
+        if alt_idx != -1:
+            end_idx = _line_end(content, alt_idx)
+    if end_idx > start_idx:
+        return content[start_idx:end_idx].strip(), end_idx
+    return None, -1
+
+
+def _legacy_scan_all(text):
+    """对剩余文本反复调用原来的查找方式，找出所有题目。"""
+    results = []
+    pos = 0
+    while True:
+        content, end = _legacy_extract(text[pos:])
+        if content is None:
+            return results
+        results.append(content)
+        pos += end
+
+
+def benchmark(sample_file: str, bulk_bytes: int = 500_000, repeat: int = 5) -> dict:
+    """
+    在两种输入上比较原来的查找方式和扫描器：
+    - 逐卡片捕获：样本中的每道题目单独作为一次捕获，与从界面复制的内容相同
+    - 大段文本：把样本重复到约bulk_bytes字节，找出其中所有题目
+    """
+    with open(sample_file, 'r', encoding='utf-8') as f:
+        sample = f.read()
+    cards = [span.text(sample) + '\n\n' + '-' * 60 for span in scan_questions(sample)]
+    if not cards:
+        raise ValueError(f"No questions found in {sample_file}")
+    bulk = (sample * (bulk_bytes // len(sample.encode('utf-8')) + 1))
+
+    def best_of(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    legacy_cards, _ = best_of(lambda: [_legacy_extract(card) for card in cards])
+    scanner_cards, _ = best_of(lambda: [extract_marked(card) for card in cards])
+    legacy_bulk, legacy_found = best_of(lambda: _legacy_scan_all(bulk))
+    scanner_bulk, scanner_found = best_of(lambda: list(scan_questions(bulk)))
+    return {
+        'cards': len(cards),
+        'per_card_us': {'legacy': round(legacy_cards / len(cards) * 1e6, 2),
+                        'scanner': round(scanner_cards / len(cards) * 1e6, 2)},
+        'bulk_bytes': len(bulk.encode('utf-8')),
+        'bulk_questions': {'legacy': len(legacy_found), 'scanner': len(scanner_found)},
+        'bulk_mb_per_sec': {'legacy': round(len(bulk.encode('utf-8')) / legacy_bulk / 1e6, 2),
+                            'scanner': round(len(bulk.encode('utf-8')) / scanner_bulk / 1e6, 2)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='找出Anki文本中的题目范围，或对扫描器进行基准测试')
+    parser.add_argument('file', help='要扫描的文本（例如 anki_extracted_*.txt 捕获文件）')
+    parser.add_argument('--bench', action='store_true', help='与原来的逐卡片查找方式比较')
+    parser.add_argument('--bulk-bytes', type=int, default=500_000, help='--bench 使用的大段文本字节数')
+    args = parser.parse_args()
+
+    if args.bench:
+        json.dump(benchmark(args.file, args.bulk_bytes), sys.stdout, indent=2)
+        print()
+        return
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    for span in scan_questions(text):
+        print(json.dumps({'start': span.start, 'end': span.end, 'type': span.type, 'answer': span.answer,
+                          'ambiguous': span.ambiguous}, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
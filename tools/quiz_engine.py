@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+import argparse  # 导入用于解析命令行参数的库
+import json  # 导入JSON库，用于输出基准测试结果
+import os  # 导入操作系统相关功能库
+import random  # 导入随机数库，用于抽题
+import re  # 导入正则表达式库，用于提取主题关键词和规范化答案
+import sqlite3  # 导入SQLite，用于持久化间隔重复的复习状态
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import time  # 导入时间库，用于复习调度和统计耗时
+from itertools import islice  # 导入islice，用于从到期题目的迭代器中取前几项
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple  # 从typing库导入类型提示
+
+from format_aws_questions import question_key, read_formatted_questions  # 复用题库文件的解析函数和题目的稳定键
+
+# 默认的题库文件和复习状态数据库（相对于仓库根目录）
+DEFAULT_QUESTIONS = os.path.join('temp', 'Formatted_AWS_Questions.txt')
+DEFAULT_REVIEW_DB = os.path.join('temp', 'quiz_reviews.db')
+
+# 匹配题干中的AWS服务名，例如 "Amazon S3 Glacier"、"AWS Lambda"，最多取连续3个首字母大写的词
+_SERVICE_RE = re.compile(r'\b(?:Amazon|AWS)\s+((?:[A-Z0-9][\w-]*)(?:\s+[A-Z0-9][\w-]*){0,2})')
+# 答案中的选项字母
+_ANSWER_LETTER_RE = re.compile(r'[A-Za-z]')
+
+# SM-2算法参数
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+DAY_SECONDS = 86400
+
+
+def extract_topics(text: str) -> Tuple[str, ...]:
+    """
+    从题干中提取主题关键词（小写的服务名）。服务名以缩写开头时同时保留该缩写，
+    这样 "s3 glacier" 和 "s3" 都能作为过滤条件。
+    """
+    topics = set()
+    for match in _SERVICE_RE.finditer(text):
+        name = match.group(1)
+        topics.add(name.lower())
+        first = name.split()[0]
+        if first.isupper() or any(c.isdigit() for c in first):  # 只保留 S3、EC2、RDS 这类缩写
+            topics.add(first.lower())
+    return tuple(sorted(topics))
+
+
+def normalize_answer(answer: str) -> str:
+    """把 "a, c"、"C,A"、"D,,,B" 等写法统一为排序后的 "A,C"。"""
+    return ','.join(sorted(set(_ANSWER_LETTER_RE.findall(answer.upper()))))
+
+
+class QuizQuestion:
+    """一道题目。使用__slots__避免每个实例携带__dict__，十万题时可显著减少内存。"""
+
+    __slots__ = ('number', 'type', 'question', 'options', 'answer', 'topics', 'key')
+
+    def __init__(self, number: int, type: str, question: str, options: Tuple[str, ...], answer: str,
+                 topics: Tuple[str, ...] = (), key: Optional[str] = None):
+        self.number = number
+        self.type = type
+        self.question = question
+        self.options = options
+        self.answer = answer  # 规范化后的答案，例如 "A,C"
+        self.topics = topics
+        # 与题号无关的稳定键（见question_key），复习状态按它保存
+        self.key = key or question_key({'type': type, 'question': question, 'options': options})
+
+    @property
+    def answer_count(self) -> int:
+        """正确选项的数量。"""
+        return self.answer.count(',') + 1 if self.answer else 0
+
+    def to_dict(self) -> Dict:
+        return {'number': self.number, 'key': self.key, 'type': self.type, 'question': self.question,
+                'options': list(self.options), 'answer': self.answer, 'topics': list(self.topics)}
+
+
+class QuestionStore:
+    """
+    题库的内存存储。题目按加载顺序保存在列表中，
+    加载时预先建立 题型 / 正确选项数 / 主题关键词 到题目下标的索引，
+    组合过滤的结果会被缓存，因此抽题只需在候选下标列表上随机取样。
+    """
+
+    def __init__(self, questions: Iterable[QuizQuestion] = ()):
+        self.questions: List[QuizQuestion] = []
+        self.by_number: Dict[int, int] = {}
+        self.by_key: Dict[str, int] = {}
+        self.by_type: Dict[str, List[int]] = {}
+        self.by_answer_count: Dict[int, List[int]] = {}
+        self.by_topic: Dict[str, List[int]] = {}
+        self._filter_cache: Dict[Tuple, List[int]] = {}
+        for question in questions:
+            self.add(question)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'QuestionStore':
+        """从read_formatted_questions()返回的字典列表构建题库。"""
+        return cls(QuizQuestion(r['number'], r['type'], r['question'], tuple(r['options']),
+                                normalize_answer(r['answer']), extract_topics(r['question']))
+                   for r in records)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_QUESTIONS) -> 'QuestionStore':
+        """从format_aws_questions生成的题库文件加载。"""
+        return cls.from_records(read_formatted_questions(path))
+
+    def add(self, question: QuizQuestion):
+        """添加一道题目并更新各项索引。"""
+        index = len(self.questions)
+        self.questions.append(question)
+        self.by_number[question.number] = index
+        self.by_key.setdefault(question.key, index)  # 题库中重复的题目共用第一道的复习状态
+        self.by_type.setdefault(question.type, []).append(index)
+        self.by_answer_count.setdefault(question.answer_count, []).append(index)
+        for topic in question.topics:
+            self.by_topic.setdefault(topic, []).append(index)
+        self._filter_cache.clear()
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def get(self, number: int) -> Optional[QuizQuestion]:
+        """按题号获取题目。"""
+        index = self.by_number.get(number)
+        return None if index is None else self.questions[index]
+
+    def get_by_key(self, key: str) -> Optional[QuizQuestion]:
+        """按稳定键获取题目。"""
+        index = self.by_key.get(key)
+        return None if index is None else self.questions[index]
+
+    def candidates(self, type: Optional[str] = None, answer_count: Optional[int] = None,
+                   topic: Optional[str] = None) -> List[int]:
+        """
+        返回满足全部过滤条件的题目下标列表，结果按过滤条件缓存。
+
+        Args:
+            type (str, optional): 题型，例如 "单选题"
+            answer_count (int, optional): 正确选项数
+            topic (str, optional): 主题关键词，例如 "s3"
+
+        Returns:
+            List[int]: 题目下标列表（升序）
+        """
+        key = (type, answer_count, topic.lower() if topic else None)
+        cached = self._filter_cache.get(key)
+        if cached is not None:
+            return cached
+
+        lists = []
+        if type is not None:
+            lists.append(self.by_type.get(type, []))
+        if answer_count is not None:
+            lists.append(self.by_answer_count.get(answer_count, []))
+        if topic:
+            lists.append(self.by_topic.get(key[2], []))
+
+        if not lists:
+            result = list(range(len(self.questions)))
+        elif len(lists) == 1:
+            result = lists[0]
+        else:
+            lists.sort(key=len)  # 从最短的列表开始求交集
+            common = set(lists[0])
+            for other in lists[1:]:
+                common.intersection_update(other)
+            result = sorted(common)
+        self._filter_cache[key] = result
+        return result
+
+    def sample(self, n: int, type: Optional[str] = None, answer_count: Optional[int] = None,
+               topic: Optional[str] = None, rng: Optional[random.Random] = None) -> List[QuizQuestion]:
+        """
+        随机抽取最多n道满足过滤条件的不重复题目。
+        每抽一题的代价为O(1)，与题库大小无关（过滤结果已缓存）。
+        """
+        pool = self.candidates(type, answer_count, topic)
+        rng = rng or random
+        return [self.questions[i] for i in rng.sample(pool, min(n, len(pool)))]
+
+    def check_answer(self, number: int, given: str) -> bool:
+        """检查作答是否与正确答案完全一致（多选题要求选项集合相同，不区分顺序和大小写）。"""
+        question = self.get(number)
+        if question is None:
+            raise KeyError(f"Unknown question number: {number}")
+        return normalize_answer(given) == question.answer
+
+
+class ReviewScheduler:
+    """
+    基于SM-2算法的间隔重复调度器，复习状态保存在SQLite中。
+    答对按质量4、答错按质量1更新难度系数和复习间隔。
+
+    复习状态按题目的稳定键（question_key）保存：题号在重新生成题库文件后会变化，
+    按题号保存会让复习记录落到别的题目上。旧版按题号保存的reviews表不再读取。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_REVIEW_DB):
+        """
+        Args:
+            db_path (str): SQLite数据库路径，使用 ":memory:" 时不落盘
+        """
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS question_reviews (
+                key TEXT PRIMARY KEY,
+                ease REAL NOT NULL,
+                interval_days REAL NOT NULL,
+                repetitions INTEGER NOT NULL,
+                due REAL NOT NULL,
+                last_reviewed REAL NOT NULL,
+                correct INTEGER NOT NULL DEFAULT 0,
+                wrong INTEGER NOT NULL DEFAULT 0
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS question_reviews_due ON question_reviews (due)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, key: str, correct: bool, now: Optional[float] = None) -> Dict:
+        """
+        记录一次作答并计算下次复习时间。
+
+        Args:
+            key (str): 题目的稳定键（QuizQuestion.key）
+            correct (bool): 是否答对
+            now (float, optional): 当前时间戳，默认为time.time()
+
+        Returns:
+            Dict: 更新后的复习状态
+        """
+        now = time.time() if now is None else now
+        row = self.conn.execute("SELECT ease, interval_days, repetitions, correct, wrong FROM question_reviews "
+                                "WHERE key = ?", (key,)).fetchone()
+        ease, interval, repetitions, n_correct, n_wrong = row or (INITIAL_EASE, 0.0, 0, 0, 0)
+
+        quality = 4 if correct else 1
+        if quality < 3:
+            repetitions = 0
+            interval = 1.0
+        else:
+            repetitions += 1
+            interval = 1.0 if repetitions == 1 else 6.0 if repetitions == 2 else round(interval * ease, 1)
+        ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+        state = {'key': key, 'ease': ease, 'interval_days': interval, 'repetitions': repetitions,
+                 'due': now + interval * DAY_SECONDS, 'last_reviewed': now,
+                 'correct': n_correct + int(correct), 'wrong': n_wrong + int(not correct)}
+        self.conn.execute("INSERT OR REPLACE INTO question_reviews VALUES (:key, :ease, :interval_days, :repetitions, "
+                          ":due, :last_reviewed, :correct, :wrong)", state)
+        self.conn.commit()
+        return state
+
+    def due(self, now: Optional[float] = None, limit: int = 20) -> List[str]:
+        """返回已到期需要复习的题目键，最早到期的在前。"""
+        return list(islice(self.iter_due(now), limit))
+
+    def iter_due(self, now: Optional[float] = None) -> Iterator[str]:
+        """
+        按到期时间逐个返回已到期的题目键（按due索引顺序从SQLite游标中读取，不一次性取出全部）。
+        调用方按过滤条件筛选时可以一直读到凑够题数为止。
+        """
+        now = time.time() if now is None else now
+        for row in self.conn.execute("SELECT key FROM question_reviews WHERE due <= ? ORDER BY due", (now,)):
+            yield row[0]
+
+    def seen(self) -> set:
+        """返回做过的全部题目键。"""
+        return {row[0] for row in self.conn.execute("SELECT key FROM question_reviews")}
+
+
+def next_questions(store: QuestionStore, scheduler: ReviewScheduler, n: int, **filters) -> List[QuizQuestion]:
+    """
+    组合出一轮练习：优先安排已到期的复习题，不足部分用未做过的新题补齐。
+    过滤条件只在内存题库中可用，因此按到期顺序读取复习记录，直到凑够n道满足条件的题目；
+    只取前几条再过滤会让排在后面的匹配题目一直轮不到。
+    """
+    allowed = set(store.candidates(**filters)) if any(v is not None for v in filters.values()) else None
+    picked = []
+    for key in scheduler.iter_due():
+        index = store.by_key.get(key)
+        if index is not None and (allowed is None or index in allowed):
+            picked.append(store.questions[index])
+            if len(picked) == n:
+                return picked
+
+    seen = scheduler.seen()
+    fresh = [q for q in store.sample(n * 2 + len(seen), **filters) if q.key not in seen]
+    return picked + fresh[:n - len(picked)]
+
+
+def run_quiz(store: QuestionStore, scheduler: ReviewScheduler, n: int, **filters):
+    """在终端中进行一轮练习。"""
+    questions = next_questions(store, scheduler, n, **filters)
+    if not questions:
+        print("No questions match the given filters.")
+        return
+    score = 0
+    for i, question in enumerate(questions, 1):
+        print(f"\n[{i}/{len(questions)}] Question {question.number} ({question.type})")
+        print(question.question)
+        for j, option in enumerate(question.options):
+            print(f"  {chr(ord('A') + j)}. {option}")
+        given = input("Your answer: ")
+        correct = store.check_answer(question.number, given)
+        state = scheduler.record(question.key, correct)
+        score += correct
+        print(f"{'Correct' if correct else 'Wrong'}! Answer: {question.answer} "
+              f"(next review in {state['interval_days']:g} days)")
+    print(f"\nScore: {score}/{len(questions)}")
+
+
+def benchmark(path: str = DEFAULT_QUESTIONS, size: int = 100000, samples: int = 10000, n: int = 20) -> Dict:
+    """
+    基准测试：把真实题库复制扩充到size道题，测量建库时间和各种过滤条件下的抽题吞吐量。
+    """
+    records = read_formatted_questions(path)
+    if not records:
+        raise ValueError(f"No questions found in {path}")
+    synthetic = [dict(records[i % len(records)], number=i + 1) for i in range(size)]
+
+    start_time = time.perf_counter()
+    store = QuestionStore.from_records(synthetic)
+    load_seconds = time.perf_counter() - start_time
+
+    rng = random.Random(0)
+    results = {'questions': len(store), 'load_seconds': round(load_seconds, 3), 'sampling': {}}
+    top_topic = max(store.by_topic, key=lambda t: len(store.by_topic[t]))
+    cases = {
+        'unfiltered': {},
+        'type': {'type': '单选题'},
+        'topic': {'topic': top_topic},
+        'answer_count+topic': {'answer_count': 1, 'topic': top_topic},
+    }
+    for name, filters in cases.items():
+        store.sample(n, rng=rng, **filters)  # 预热过滤缓存
+        start_time = time.perf_counter()
+        for _ in range(samples):
+            store.sample(n, rng=rng, **filters)
+        elapsed = time.perf_counter() - start_time
+        results['sampling'][name] = {'pool': len(store.candidates(**filters)),
+                                     'samples_per_sec': round(samples / elapsed)}
+    return results
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='AWS题库练习：随机抽题、判分和间隔重复复习')
+    parser.add_argument('--questions', default=DEFAULT_QUESTIONS, help=f'题库文件 (默认: {DEFAULT_QUESTIONS})')
+    parser.add_argument('--db', default=DEFAULT_REVIEW_DB, help=f'复习状态数据库 (默认: {DEFAULT_REVIEW_DB})')
+    parser.add_argument('-n', '--count', type=int, default=10, help='本轮题目数 (默认: 10)')
+    parser.add_argument('--type', help='只抽取指定题型，例如 单选题')
+    parser.add_argument('--answers', type=int, help='只抽取正确选项数为指定值的题目')
+    parser.add_argument('--topic', help='只抽取题干中提到指定服务的题目，例如 s3、lambda')
+    parser.add_argument('--topics', action='store_true', help='列出题库中最常见的主题关键词')
+    parser.add_argument('--bench', action='store_true', help='运行加载和抽题的基准测试')
+    parser.add_argument('--bench-size', type=int, default=100000, help='基准测试的题库规模 (默认: 100000)')
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(benchmark(args.questions, args.bench_size), ensure_ascii=False, indent=2))
+        return
+
+    store = QuestionStore.load(args.questions)
+    print(f"DEBUG: Loaded {len(store)} questions", file=sys.stderr)
+    if args.topics:
+        for topic, indexes in sorted(store.by_topic.items(), key=lambda item: -len(item[1]))[:40]:
+            print(f"{len(indexes):5d}  {topic}")
+        return
+
+    with ReviewScheduler(args.db) as scheduler:
+        run_quiz(store, scheduler, args.count, type=args.type, answer_count=args.answers, topic=args.topic)
+
+
+if __name__ == '__main__':
+    # 支持从仓库根目录或tools目录运行
+    if os.path.basename(os.getcwd()) == 'tools':
+        os.chdir('..')
+    main()
@@ -4,9 +4,12 @@
 import argparse  # 导入用于解析命令行参数的库
 import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
 import time  # 导入时间库，用于在重试之间添加延迟
+from contextlib import nullcontext  # 复用外部传入的DDGS客户端时不在此处关闭它
 from duckduckgo_search import DDGS  # 从duckduckgo_search库导入DDGS客户端
+from instrumentation import span, add_profile_arguments, profile_from_args  # 导入共用的性能埋点（未启用--profile时几乎没有开销）
+from single_flight import get_flight  # 导入请求合并，同时进行的相同搜索只请求一次
 
-def search_with_retry(query, max_results=10, max_retries=3):
+def search_with_retry(query, max_results=10, max_retries=3, ddgs=None):
     """
     使用DuckDuckGo进行搜索，并返回包含URL和文本摘要的结果。
     此函数包含了重试机制以应对可能的临时网络错误。
@@ -15,16 +18,31 @@ def search_with_retry(query, max_results=10, max_retries=3):
         query (str): 搜索的关键词
         max_results (int): 希望返回的最大结果数量
         max_retries (int): 失败后最大重试次数
+        ddgs (DDGS, optional): 已创建的DDGS客户端。传入时复用其HTTP连接（如agent_runtime），
+            否则每次尝试新建一个
+
+    同时进行的相同搜索（query和max_results相同）只请求一次，所有调用方共享结果；
+    设置SINGLE_FLIGHT_DIR后跨进程也会合并（见single_flight.py）。
     """
+    flight = get_flight('search')
+    results, _ = flight.do(flight.key(query, max_results),
+                           lambda: _search_with_retry(query, max_results, max_retries, ddgs))
+    return results
+
+def _search_with_retry(query, max_results, max_retries, ddgs):
+    """search_with_retry的实际实现：带重试地请求一次DuckDuckGo。"""
     for attempt in range(max_retries):  # 循环进行多次尝试，最多'max_retries'次
         try:
             # 打印调试信息到标准错误流，显示当前正在尝试的查询和次数
             print(f"DEBUG: Searching for query: {query} (attempt {attempt + 1}/{max_retries})", 
                   file=sys.stderr)
             
-            with DDGS() as ddgs:  # 使用上下文管理器创建并自动关闭DDGS客户端实例
+            # 记录每次尝试的请求耗时
+            with span('search', query=query, attempt=attempt + 1) as search_span, \
+                    (nullcontext(ddgs) if ddgs is not None else DDGS()) as client:
                 # 执行文本搜索，并将生成器结果转换为列表
-                results = list(ddgs.text(query, max_results=max_results))
+                results = list(client.text(query, max_results=max_results))
+                search_span.set(results=len(results))
                 
             if not results:  # 如果搜索没有返回任何结果
                 print("DEBUG: No results found", file=sys.stderr)  # 打印调试信息
@@ -45,11 +63,12 @@ def search_with_retry(query, max_results=10, max_retries=3):
 
 def format_results(results):
     """格式化并打印搜索结果。"""
-    for i, r in enumerate(results, 1):  # 遍历搜索结果列表，i从1开始计数
-        print(f"\n=== Result {i} ===")  # 打印每个结果的标题
-        print(f"URL: {r.get('href', 'N/A')}")  # 打印结果的URL，如果不存在则打印'N/A'
-        print(f"Title: {r.get('title', 'N/A')}")  # 打印结果的标题，如果不存在则打印'N/A'
-        print(f"Snippet: {r.get('body', 'N/A')}")  # 打印结果的摘要文本，如果不存在则打印'N/A'
+    with span('format', results=len(results)):  # 记录格式化输出的耗时
+        for i, r in enumerate(results, 1):  # 遍历搜索结果列表，i从1开始计数
+            print(f"\n=== Result {i} ===")  # 打印每个结果的标题
+            print(f"URL: {r.get('href', 'N/A')}")  # 打印结果的URL，如果不存在则打印'N/A'
+            print(f"Title: {r.get('title', 'N/A')}")  # 打印结果的标题，如果不存在则打印'N/A'
+            print(f"Snippet: {r.get('body', 'N/A')}")  # 打印结果的摘要文本，如果不存在则打印'N/A'
 
 def search(query, max_results=10, max_retries=3):
     """
@@ -77,9 +96,11 @@ def main():
                       help="最大结果数量 (默认: 10)")  # 添加可选参数'--max-results'
     parser.add_argument("--max-retries", type=int, default=3,
                       help="最大重试次数 (默认: 3)")  # 添加可选参数'--max-retries'
+    add_profile_arguments(parser)  # 添加--profile等性能分析参数
     
     args = parser.parse_args()  # 解析命令行传入的参数
-    search(args.query, args.max_results, args.max_retries)  # 使用解析到的参数调用主搜索函数
+    with profile_from_args(args, 'search_engine'):  # 指定--profile时记录各阶段耗时并写出trace文件
+        search(args.query, args.max_results, args.max_retries)  # 使用解析到的参数调用主搜索函数
 
 if __name__ == "__main__":
     # 这是一个标准的Python入口点检查。
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+请求合并(single-flight)：多个调用方同时发起相同的请求时，只有第一个（leader）真正请求上游，
+其余调用方等待并共享它的结果（或异常）。这里只合并同时在进行中的请求，结果不会被缓存。
+
+- 进程内：线程通过 SingleFlight.do()，asyncio任务通过 SingleFlight.do_async()
+- 跨进程：设置环境变量 SINGLE_FLIGHT_DIR 后，不同进程中的相同请求通过该目录下的锁文件
+  （fcntl.flock）合并：持锁的进程请求上游并把结果写入结果文件，等锁的进程拿到锁后直接读取。
+  不支持fcntl的平台（Windows）上只做进程内合并。
+
+llm_api.query_llm 和 search_engine.search_with_retry 默认经过这一层，
+合并计数可以用 flight_stats() 查看（AgentRuntime.get_stats() 中也会包含）。
+"""
+
+import asyncio  # 导入异步I/O库，用于合并并发的协程调用
+import hashlib  # 导入哈希库，用于生成请求键
+import json  # 导入JSON库，用于生成请求键和跨进程传递结果
+import os  # 导入操作系统相关功能库
+import threading  # 导入线程库，用于合并并发的线程调用
+import time  # 导入时间库，用于判断结果文件是否属于当前这次请求
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple  # 从typing库导入类型提示
+
+try:
+    import fcntl  # 用于跨进程的文件锁（仅Unix）
+except ImportError:
+    fcntl = None
+
+# 跨进程合并使用的目录，未设置时只做进程内合并
+LOCK_DIR_ENV = 'SINGLE_FLIGHT_DIR'
+# 结果文件和锁文件保留的秒数，超过后在清理时删除
+RESULT_TTL = 300
+# 每执行多少次上游请求清理一次过期文件
+PRUNE_EVERY = 100
+
+
+class _Call:
+    """一次进行中的同步请求，等待者在event上阻塞。"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    按请求键合并并发的相同调用。
+
+        flight = SingleFlight('query_llm')
+        value, shared = flight.do(flight.key(provider, model, prompt), lambda: call_upstream())
+
+    shared为True表示这次调用没有请求上游，而是共享了其他调用方（本进程或其他进程）的结果。
+
+    Args:
+        name: 名称，用于统计和锁文件名前缀
+        lock_dir: 跨进程合并使用的目录，为None时只做进程内合并
+    """
+
+    def __init__(self, name: str, lock_dir: Optional[str] = None):
+        self.name = name
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.stats = {'calls': 0, 'executions': 0, 'shared': 0, 'shared_cross_process': 0}
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}  # 请求键 -> 进行中的同步请求
+        self._tasks: Dict[Tuple[int, str], asyncio.Future] = {}  # (事件循环, 请求键) -> 进行中的异步请求
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """由请求的各个参数生成请求键。"""
+        data = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _count(self, field: str):
+        with self._lock:
+            self.stats[field] += 1
+
+    # ---- 同步调用 ----
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """执行fn()，或者等待进行中的相同请求并共享其结果。返回 (结果, 是否共享)。"""
+        with self._lock:
+            self.stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            self._count('shared')
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value, shared = self._run(key, fn)
+            return call.value, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """真正执行请求；配置了lock_dir时先与其他进程合并。"""
+        if not self.lock_dir:
+            self._count('executions')
+            return fn(), False
+
+        base = os.path.join(self.lock_dir, f"{self.name}-{key[:40]}")
+        started = time.time()
+        with open(base + '.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except BlockingIOError:  # 另一个进程正在请求，等它完成
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                waited = True
+            try:
+                if waited:
+                    result = self._read_result(base + '.json', started)
+                    if result is not None:
+                        self._count('shared_cross_process')
+                        return result['value'], True
+                    # 对方失败了，没有写出结果：由本进程重新请求
+                self._count('executions')
+                value = fn()
+                self._write_result(base + '.json', value)
+                return value, False
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_result(path: str, since: float) -> Optional[Dict]:
+        """读取在since之后写出的结果文件，不存在或更早的结果（不属于这次请求）返回None。"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return result if result.get('time', 0) >= since else None
+
+    def _write_result(self, path: str, value: Any):
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'time': time.time(), 'value': value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)  # 原子替换，等待者不会读到写了一半的文件
+        except (OSError, TypeError, ValueError):  # 结果不能序列化时等待者会自己重新请求
+            return
+        if self.stats['executions'] % PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        """删除过期的结果文件和锁文件。删掉一个正被打开的锁文件最多导致一次没有合并的请求。"""
+        cutoff = time.time() - RESULT_TTL
+        for name in os.listdir(self.lock_dir):
+            if not name.startswith(self.name + '-'):
+                continue
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # ---- 异步调用 ----
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        do()的协程版本：同一事件循环中的相同请求共享一个任务。
+        请求在独立的任务中执行，某个调用方被取消不会影响其他等待者。
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            self.stats['calls'] += 1
+            task = self._tasks.get(task_key)
+            shared = task is not None
+            if shared:
+                self.stats['shared'] += 1
+            else:
+                task = self._tasks[task_key] = asyncio.ensure_future(self._run_async(key, fn))
+
+                def forget(done, task_key=task_key):
+                    with self._lock:
+                        if self._tasks.get(task_key) is done:
+                            del self._tasks[task_key]
+                task.add_done_callback(forget)
+        value, shared_cross_process = await asyncio.shield(task)
+        return value, shared or shared_cross_process
+
+    async def _run_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        if not self.lock_dir:
+            self._count('executions')
+            return await fn(), False
+        # 跨进程合并需要阻塞等锁，放到线程中进行；请求本身仍在事件循环中执行
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self._run, key, lambda: asyncio.run_coroutine_threadsafe(fn(), loop).result())
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, saved=self.stats['shared'] + self.stats['shared_cross_process'])
+
+
+_FLIGHTS: Dict[str, SingleFlight] = {}
+_FLIGHTS_LOCK = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """取得名为name的共享SingleFlight，跨进程目录取自环境变量SINGLE_FLIGHT_DIR。"""
+    with _FLIGHTS_LOCK:
+        if name not in _FLIGHTS:
+            _FLIGHTS[name] = SingleFlight(name, os.getenv(LOCK_DIR_ENV) or None)
+        return _FLIGHTS[name]
+
+
+def flight_stats() -> Dict[str, Dict]:
+    """所有SingleFlight的计数：calls、executions（实际请求上游）、saved（被合并省掉的请求）。"""
+    with _FLIGHTS_LOCK:
+        flights = list(_FLIGHTS.values())
+    return {flight.name: flight.get_stats() for flight in flights}
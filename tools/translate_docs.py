@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# 指定脚本使用python3解释器执行
+
+"""
+增量翻译Markdown文档：按块切分文档，用翻译记忆库（SQLite，以源文本块的哈希为键）
+记住每一块的译文，只把新增或修改过的块发送给模型，再按原文结构重新拼出译文文件。
+空行和不含文字的块（如分隔线）原样保留。代码块默认原样保留；翻译记忆库中有它的译文
+（例如从对照文档导入的、注释已翻译的代码块）时使用译文，指定--translate-code时
+新的代码块也会发送给模型，只翻译其中的注释和字符串。
+
+    # 第一次使用：用现有的中英文对照文档填充翻译记忆库，不调用模型
+    python tools/translate_docs.py knowledge_bank/cursrrulesCN.md -o knowledge_bank/cursrrulesEng.md --seed
+
+    # 修改中文文档后：只翻译改动过的段落
+    python tools/translate_docs.py knowledge_bank/cursrrulesCN.md -o knowledge_bank/cursrrulesEng.md
+
+    # 批量翻译多个笔记到另一个目录
+    python tools/translate_docs.py knowledge_bank/*笔记.md --output-dir temp/translated --provider anthropic
+"""
+
+import argparse  # 导入用于解析命令行参数的库
+import hashlib  # 导入哈希库，用于生成文本块的键
+import json  # 导入JSON库，用于构造提示和解析回复
+import os  # 导入操作系统相关功能库
+import re  # 导入正则表达式库，用于识别代码块和需要翻译的文字
+import sqlite3  # 导入SQLite，用于持久化翻译记忆库
+import sys  # 导入系统相关的参数和函数，如此处用于向标准错误流输出信息
+import time  # 导入时间库，用于统计耗时和重试等待
+from concurrent.futures import ThreadPoolExecutor, as_completed  # 导入线程池，用于并发请求
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple  # 从typing库导入类型提示
+
+from llm_api import create_llm_client, query_llm  # 复用LLM客户端和单次查询函数
+from long_document import count_tokens  # 复用token计数
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 默认的翻译记忆库，与运行时的当前目录无关
+DEFAULT_TM_DB = os.path.join(REPO_ROOT, 'temp', 'translation_memory.db')
+# 每个提示的默认token预算（只计算待翻译的文本块）
+DEFAULT_TOKEN_BUDGET = 2000
+# 每个提示最多包含的文本块数，避免单次回复过长被截断
+DEFAULT_MAX_PER_PROMPT = 20
+
+# 作为系统前缀发送的固定说明，每次请求都相同，提供商支持时会被缓存
+SYSTEM_PROMPT = """You are a professional technical translator. Translate each segment from {source_lang} to {target_lang}.
+
+Rules:
+- Keep the Markdown structure of each segment exactly: headings, list markers, numbering, indentation,
+  line breaks, emphasis, links and tables.
+- Do not translate inline code, URLs, file paths, command lines, option names or product names.
+- Keep terminology consistent across segments. Do not add, drop or summarize content.
+- Segments marked "code": true are fenced code blocks: return them unchanged except for translating
+  comments and human-readable string literals.
+
+The segments are given as a JSON array. Reply with ONLY a JSON array, one object per segment, in this exact form:
+[{{"id": <segment id>, "translation": "<translated segment>"}}]"""
+
+# 代码块的开始标记：3个以上的`或~
+_FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})')
+# 代码块的结束标记：整行只有`或~（字符与开始标记相同、长度不短于开始标记时才闭合）
+_CLOSING_FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})\s*$')
+# 块中包含任何文字（含中日韩文字）时才需要翻译
+_LETTER_RE = re.compile(r'[^\W\d_]')
+# 解析回复中的JSON（模型有时会用```json代码块包裹，或在数组前后附带说明文字）
+_JSON_DECODER = json.JSONDecoder()
+
+
+def split_blocks(text: str) -> List[Dict]:
+    """
+    把Markdown按块切分，返回 [{'kind': 'text'/'code'/'blank', 'text': ...}]。
+    代码块（```或~~~围起的部分）整体作为一块，只有同一字符、长度不短于开始标记的
+    结束标记才会闭合代码块（````围起的代码块中的```是内容）；连续空行作为一块；
+    各块的text按顺序拼接后与原文完全相同。
+    """
+    blocks: List[Dict] = []
+    current: List[str] = []
+    kind = None
+    fence = None
+
+    def flush():
+        if current:
+            blocks.append({'kind': kind, 'text': ''.join(current)})
+            current.clear()
+
+    for line in text.splitlines(keepends=True):
+        if fence:  # 代码块内部，直到遇到匹配的结束标记
+            current.append(line)
+            closing = _CLOSING_FENCE_RE.match(line)
+            if closing and closing.group(1)[0] == fence[0] and len(closing.group(1)) >= len(fence):
+                flush()
+                fence, kind = None, None
+            continue
+        match = _FENCE_RE.match(line)
+        if match:
+            flush()
+            fence, kind = match.group(1), 'code'
+            current.append(line)
+        elif not line.strip():
+            if kind != 'blank':
+                flush()
+                kind = 'blank'
+            current.append(line)
+        else:
+            if kind != 'text':
+                flush()
+                kind = 'text'
+            current.append(line)
+    flush()  # 未闭合的代码块一直延续到文件末尾
+    return blocks
+
+
+def is_translatable(block: Dict) -> bool:
+    """必须有译文的块：含文字的文本块。"""
+    return block['kind'] == 'text' and bool(_LETTER_RE.search(block['text']))
+
+
+def segment_source(block: Dict) -> str:
+    """块中需要翻译的部分（去掉行尾换行，拼接时再补回）。"""
+    return block['text'].rstrip('\n')
+
+
+def document_segments(blocks: List[Dict], translate_code: bool = False) -> Tuple[List[str], List[str]]:
+    """返回 (必须有译文的文本块, 可选译文的代码块)；translate_code为True时代码块也必须有译文。"""
+    required = [segment_source(block) for block in blocks
+                if is_translatable(block) or (translate_code and block['kind'] == 'code')]
+    optional = [] if translate_code else [segment_source(block) for block in blocks if block['kind'] == 'code']
+    return required, optional
+
+
+class TranslationMemory:
+    """
+    翻译记忆库：SQLite中保存 源文本块哈希 -> 译文，按语言对区分。
+    源文本块没有变化时直接复用译文，不再请求模型。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_TM_DB, source_lang: str = 'Chinese', target_lang: str = 'English'):
+        """
+        Args:
+            db_path (str): SQLite数据库路径，使用 ":memory:" 时不落盘
+            source_lang (str): 源语言
+            target_lang (str): 目标语言
+        """
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                source_hash TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                model TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (source_hash, source_lang, target_lang)
+            )""")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def key(source: str) -> str:
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def lookup(self, keys: Iterable[str]) -> Dict[str, str]:
+        """查询一组键，返回其中已有译文的 键 -> 译文。"""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), 500):  # 分批查询，避免超过SQLite的参数个数上限
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT source_hash, target FROM translations WHERE source_lang = ? AND target_lang = ? "
+                f"AND source_hash IN ({','.join('?' * len(chunk))})", [self.source_lang, self.target_lang, *chunk])
+            found.update(rows)
+        return found
+
+    def store(self, pairs: Iterable[Tuple[str, str]], model: Optional[str] = None) -> int:
+        """在一个事务中写入 (源文本, 译文) 对，返回写入的条数。"""
+        now = time.time()
+        rows = [(self.key(source), self.source_lang, self.target_lang, source, target, model, now)
+                for source, target in pairs]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM translations WHERE source_lang = ? AND target_lang = ?",
+                                 (self.source_lang, self.target_lang)).fetchone()[0]
+
+
+def seed_memory(tm: TranslationMemory, source_text: str, target_text: str) -> int:
+    """
+    用一对已经同步的原文/译文文档填充翻译记忆库，返回写入的条数。
+    两份文档的块结构（去掉空行后各块的类型）必须一一对应，否则不写入并返回0。
+    代码块只在译文中有改动（如注释已翻译）时写入。
+    """
+    source_blocks = [block for block in split_blocks(source_text) if block['kind'] != 'blank']
+    target_blocks = [block for block in split_blocks(target_text) if block['kind'] != 'blank']
+    if [block['kind'] for block in source_blocks] != [block['kind'] for block in target_blocks]:
+        print(f"ERROR: Cannot align documents: {len(source_blocks)} source blocks vs {len(target_blocks)} "
+              f"target blocks", file=sys.stderr)
+        return 0
+    pairs = [(segment_source(source), segment_source(target)) for source, target in zip(source_blocks, target_blocks)
+             if is_translatable(source) or (source['kind'] == 'code' and source['text'] != target['text'])]
+    return tm.store(pairs, model='seed')
+
+
+def pack_batches(segments: List[str], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 max_per_prompt: int = DEFAULT_MAX_PER_PROMPT) -> Iterator[List[str]]:
+    """按顺序把待翻译的文本块打包成批次，单个文本块超过预算时单独成批。"""
+    batch: List[str] = []
+    used = 0
+    for segment in segments:
+        cost = count_tokens(segment)
+        if batch and (used + cost > token_budget or len(batch) >= max_per_prompt):
+            yield batch
+            batch, used = [], 0
+        batch.append(segment)
+        used += cost
+    if batch:
+        yield batch
+
+
+def build_prompt(batch: List[str]) -> str:
+    items = []
+    for i, segment in enumerate(batch):
+        item = {'id': i, 'text': segment}
+        if _FENCE_RE.match(segment):
+            item['code'] = True
+        items.append(item)
+    return json.dumps(items, ensure_ascii=False, indent=1)
+
+
+def extract_json_array(text: str) -> Optional[list]:
+    """
+    返回文本中第一个能完整解析的JSON数组，没有时返回None。
+    从每个"["开始尝试raw_decode，数组前后说明文字中的方括号不会影响解析。
+    """
+    start = text.find('[')
+    while start != -1:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            value = None
+        if isinstance(value, list):
+            return value
+        start = text.find('[', start + 1)
+    return None
+
+
+def parse_response(response: Optional[str], batch: List[str]) -> Dict[str, str]:
+    """从模型回复中解析出 源文本 -> 译文，忽略编号不对或为空的条目。"""
+    if not response:
+        return {}
+    items = extract_json_array(response)
+    if items is None:
+        return {}
+    results = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('translation'), str):
+            continue
+        try:
+            index = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < len(batch) and item['translation'].strip() and batch[index] not in results:
+            results[batch[index]] = item['translation'].strip('\n')
+    return results
+
+
+def translate_batch(batch: List[str], system: str, client, provider: str, model: Optional[str],
+                    retries: int = 2) -> Tuple[Dict[str, str], Dict]:
+    """
+    翻译一个批次；回复无法解析或缺少部分文本块时，对缺少的文本块重试。
+
+    Returns:
+        (源文本 -> 译文, 累计的token用量)，译文可能少于批次中的文本块数
+    """
+    results: Dict[str, str] = {}
+    totals = {'input_tokens': 0, 'cached_tokens': 0, 'output_tokens': 0}
+    pending = batch
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(2 ** (attempt - 1))  # 简单的指数退避
+        usage = {}
+        response = query_llm(build_prompt(pending), client, model=model, provider=provider, system=system, usage=usage)
+        for field in totals:
+            totals[field] += usage.get(field, 0)
+        results.update(parse_response(response, pending))
+        pending = [segment for segment in pending if segment not in results]
+        if not pending:
+            break
+    return results, totals
+
+
+def assemble(blocks: List[Dict], translations: Dict[str, str]) -> Optional[str]:
+    """按原文的块结构拼出译文；有文本块缺少译文时返回None。"""
+    parts = []
+    for block in blocks:
+        if not is_translatable(block) and block['kind'] != 'code':
+            parts.append(block['text'])  # 空行、分隔线等原样保留
+            continue
+        source = segment_source(block)
+        target = translations.get(TranslationMemory.key(source))
+        if target is None:
+            if block['kind'] == 'code':  # 没有译文的代码块原样保留
+                parts.append(block['text'])
+                continue
+            return None
+        parts.append(target + block['text'][len(source):])  # 补回原文块末尾的换行
+    return ''.join(parts)
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """内容有变化时原子地写入文件，返回是否写入。"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+
+def translate_documents(pairs: List[Tuple[str, str]], tm: TranslationMemory, provider: str = 'openai',
+                        model: Optional[str] = None, workers: int = 4, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                        max_per_prompt: int = DEFAULT_MAX_PER_PROMPT, retries: int = 2,
+                        translate_code: bool = False, dry_run: bool = False) -> Dict:
+    """
+    增量翻译一组文档。
+
+    所有文档中不在翻译记忆库里的文本块去重后打包成批次并发翻译，每个批次完成后立即写入记忆库，
+    因此中途失败后重新运行只会翻译剩余的文本块。所有文本块都有译文的文档才会写出。
+
+    Args:
+        pairs (List[Tuple[str, str]]): (源文件, 译文文件) 列表
+        tm (TranslationMemory): 翻译记忆库
+        provider (str): LLM提供商
+        model (str, optional): 模型名称
+        workers (int): 并发请求数
+        token_budget (int): 每个提示的token预算
+        max_per_prompt (int): 每个提示最多包含的文本块数
+        retries (int): 每个批次的重试次数
+        translate_code (bool): 翻译记忆库中没有的代码块也发送给模型（只翻译注释和字符串）
+        dry_run (bool): 只统计需要翻译的文本块，不请求模型也不写文件
+
+    Returns:
+        Dict: 统计信息
+    """
+    start_time = time.perf_counter()
+    documents = []
+    for source_path, output_path in pairs:
+        with open(source_path, 'r', encoding='utf-8') as f:
+            documents.append((source_path, output_path, split_blocks(f.read())))
+
+    segments, optional = [], []
+    for _, _, blocks in documents:
+        required, code = document_segments(blocks, translate_code)
+        segments += required
+        optional += code
+    unique = list(dict.fromkeys(segments))  # 去重并保持顺序
+    translations = tm.lookup(TranslationMemory.key(segment) for segment in unique + optional)
+    todo = [segment for segment in unique if TranslationMemory.key(segment) not in translations]
+    batches = list(pack_batches(todo, token_budget, max_per_prompt))
+    print(f"DEBUG: {len(segments)} segments in {len(documents)} documents, {len(unique) - len(todo)} in translation "
+          f"memory, {len(todo)} to translate in {len(batches)} prompts", file=sys.stderr)
+
+    stats = {'documents': len(documents), 'segments': len(segments), 'reused': len(unique) - len(todo),
+             'translated': 0, 'failed': 0, 'prompts': len(batches), 'source_tokens': sum(map(count_tokens, todo)),
+             'input_tokens': 0, 'cached_tokens': 0, 'output_tokens': 0, 'written': []}
+    if dry_run:
+        stats['pending'] = len(todo)
+        return stats
+
+    if batches:
+        client = create_llm_client(provider)  # 所有线程共用一个客户端
+        system = SYSTEM_PROMPT.format(source_lang=tm.source_lang, target_lang=tm.target_lang)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(translate_batch, batch, system, client, provider, model, retries): batch
+                       for batch in batches}
+            # 只在主线程中写记忆库，无需加锁
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results, usage = future.result()
+                except Exception as e:
+                    print(f"ERROR: Batch of {len(batch)} segments failed: {e}", file=sys.stderr)
+                    results, usage = {}, {}
+                tm.store(results.items(), model=model or provider)
+                translations.update((TranslationMemory.key(source), target) for source, target in results.items())
+                for field in ('input_tokens', 'cached_tokens', 'output_tokens'):
+                    stats[field] += usage.get(field, 0)
+                stats['translated'] += len(results)
+                stats['failed'] += len(batch) - len(results)
+                print(f"DEBUG: Progress {stats['translated'] + stats['failed']}/{len(todo)}", file=sys.stderr)
+
+    for source_path, output_path, blocks in documents:
+        text = assemble(blocks, translations)
+        if text is None:
+            print(f"ERROR: Not writing {output_path}: some segments of {source_path} have no translation; "
+                  f"rerun to retry them", file=sys.stderr)
+        elif write_if_changed(output_path, text):
+            stats['written'].append(output_path)
+    stats['seconds'] = round(time.perf_counter() - start_time, 2)
+    return stats
+
+
+def main():
+    """脚本的主入口函数，负责处理命令行参数。"""
+    parser = argparse.ArgumentParser(description='用翻译记忆库增量翻译Markdown文档，只翻译新增或修改过的段落')
+    parser.add_argument('sources', nargs='+', help='要翻译的Markdown文件')
+    parser.add_argument('-o', '--output', help='译文文件（只有一个源文件时使用）')
+    parser.add_argument('--output-dir', help='译文目录，译文文件与源文件同名')
+    parser.add_argument('--source-lang', default='Chinese', help='源语言 (默认: Chinese)')
+    parser.add_argument('--target-lang', default='English', help='目标语言 (默认: English)')
+    parser.add_argument('--tm', default=DEFAULT_TM_DB, help=f'翻译记忆库路径 (默认: {DEFAULT_TM_DB})')
+    parser.add_argument('--seed', action='store_true',
+                        help='不调用模型，用已有的、与源文件同步的译文文件填充翻译记忆库')
+    parser.add_argument('--translate-code', action='store_true',
+                        help='翻译记忆库中没有的代码块也发送给模型翻译注释和字符串 (默认原样保留)')
+    parser.add_argument('--dry-run', action='store_true', help='只统计需要翻译的段落，不请求模型也不写文件')
+    parser.add_argument('--provider', choices=['openai', 'anthropic', 'gemini', 'local', 'deepseek', 'azure', 'siliconflow'],
+                        default='openai', help='要使用的API提供商')
+    parser.add_argument('--model', type=str, help='要使用的模型 (默认值取决于提供商)')
+    parser.add_argument('--workers', type=int, default=4, help='并发请求数 (默认: 4)')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f'每个提示的待翻译文本token预算 (默认: {DEFAULT_TOKEN_BUDGET})')
+    parser.add_argument('--max-per-prompt', type=int, default=DEFAULT_MAX_PER_PROMPT,
+                        help=f'每个提示最多包含的段落数 (默认: {DEFAULT_MAX_PER_PROMPT})')
+    parser.add_argument('--retries', type=int, default=2, help='每个批次的重试次数 (默认: 2)')
+    args = parser.parse_args()
+
+    if args.output:
+        if len(args.sources) != 1:
+            parser.error('-o/--output can only be used with a single source file; use --output-dir')
+        pairs = [(args.sources[0], args.output)]
+    elif args.output_dir:
+        pairs = [(source, os.path.join(args.output_dir, os.path.basename(source))) for source in args.sources]
+    else:
+        parser.error('one of -o/--output or --output-dir is required')
+
+    with TranslationMemory(args.tm, args.source_lang, args.target_lang) as tm:
+        if args.seed:
+            for source_path, output_path in pairs:
+                with open(source_path, 'r', encoding='utf-8') as f, open(output_path, 'r', encoding='utf-8') as g:
+                    count = seed_memory(tm, f.read(), g.read())
+                print(f"Seeded {count} segments from {source_path} -> {output_path}", file=sys.stderr)
+            return
+        stats = translate_documents(pairs, tm, provider=args.provider, model=args.model, workers=args.workers,
+                                    token_budget=args.token_budget, max_per_prompt=args.max_per_prompt,
+                                    retries=args.retries, translate_code=args.translate_code,
+                                    dry_run=args.dry_run)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if stats['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,16 @@ import asyncio  # 导入异步I/O库，用于处理并发操作
 import argparse # 导入命令行参数解析库
 import sys # 导入系统相关功能库
 import os # 导入操作系统相关功能库
-from typing import List, Optional # 从typing库导入类型提示，用于代码可读性和静态分析
+from typing import Awaitable, Callable, Dict, List, Optional # 从typing库导入类型提示，用于代码可读性和静态分析
 from playwright.async_api import async_playwright # 从playwright库导入异步API，用于浏览器自动化
 import html5lib # 导入HTML解析库
-from multiprocessing import Pool # 从多进程库导入Pool，用于并行处理
+from concurrent.futures import ProcessPoolExecutor # 导入进程池，用于在子进程中并行解析HTML
+from collections import OrderedDict, deque # 导入有序字典和双端队列，用于按主机排队待抓取的URL
 import time # 导入时间库，用于计时
 from urllib.parse import urlparse # 从URL处理库导入urlparse，用于解析URL
 import logging # 导入日志记录库
+from corpus_store import CorpusStore, DEFAULT_CORPUS_DIR # 导入语料库，用于保存抓取结果以免重复抓取
+from instrumentation import span, add_profile_arguments, profile_from_args # 导入共用的性能埋点（未启用--profile时几乎没有开销）
 
 # 配置日志记录
 logging.basicConfig(
@@ -21,14 +24,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)  # 创建一个名为当前模块名的日志记录器
 
+DEFAULT_PER_HOST = 4  # 同一主机(host:port)同时打开的页面数上限
+DEFAULT_PAGES_PER_CONTEXT = 50  # 每个浏览器上下文处理多少个页面后关闭重建，限制缓存和内存的增长
+
 async def fetch_page(url: str, context) -> Optional[str]:
     """异步获取网页内容。"""
     page = await context.new_page()  # 在给定的浏览器上下文中创建一个新页面
     try:
         logger.info(f"Fetching {url}")  # 记录正在获取的URL
-        await page.goto(url)  # 异步导航到指定的URL
-        await page.wait_for_load_state('networkidle')  # 等待网络连接变为空闲状态，确保动态内容加载完成
-        content = await page.content()  # 获取页面的完整HTML内容
+        with span('fetch', url=url):  # 记录页面加载耗时（每个并发任务单独一行）
+            await page.goto(url)  # 异步导航到指定的URL
+            await page.wait_for_load_state('networkidle')  # 等待网络连接变为空闲状态，确保动态内容加载完成
+            content = await page.content()  # 获取页面的完整HTML内容
         logger.info(f"Successfully fetched {url}")  # 记录成功获取URL
         return content  # 返回页面内容
     except Exception as e:
@@ -124,35 +131,249 @@ def parse_html(html_content: Optional[str]) -> str:
         logger.error(f"Error parsing HTML: {str(e)}")  # 如果解析过程中发生异常，记录错误
         return ""  # 返回空字符串
 
-async def process_urls(urls: List[str], max_concurrent: int = 5) -> List[str]:
-    """使用并发机制处理多个URL。"""
+class AdaptiveLimiter:
+    """
+    按AIMD（加性增、乘性减）调整的并发上限，与TCP拥塞控制的思路相同。
+
+    每个页面成功且延迟正常时上限增加 1/上限（即每轮大约加1）；最近窗口内的失败率
+    超过error_threshold，或延迟的移动平均超过基线的latency_factor倍时上限减半，
+    每个平均延迟周期内最多减一次，避免同一波慢请求把上限连续砍到底。
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, initial: Optional[int] = None,
+                 latency_factor: float = 2.0, error_threshold: float = 0.1, window: int = 20):
+        self.maximum = max(1, maximum)  # 上限的最大值（即--max-concurrent）
+        self.minimum = max(1, min(minimum, self.maximum))  # 上限的最小值，至少保留1个页面在抓取
+        self.limit = float(initial or self.maximum)  # 当前上限，默认从最大值开始，少量URL时与原来的行为相同
+        self.latency_factor = latency_factor  # 延迟超过基线多少倍视为过载
+        self.error_threshold = error_threshold  # 失败率超过多少视为过载
+        self.outcomes = deque(maxlen=window)  # 最近若干个页面的成败记录
+        self.latency = None  # 成功页面延迟的指数移动平均（秒）
+        self.baseline = None  # 延迟基线：观察到的最低移动平均
+        self.in_flight = 0  # 当前正在抓取的页面数
+        self.peak_in_flight = 0  # 抓取过程中同时打开页面数的最大值
+        self.decreases = 0  # 上限被减半的次数
+        self._last_decrease = 0.0  # 上一次减半的时间
+        self._condition = asyncio.Condition()  # 用于等待空闲名额
+
+    @property
+    def current(self) -> int:
+        return max(self.minimum, int(self.limit))  # 允许同时抓取的页面数
+
+    async def acquire(self):
+        """等待直到正在抓取的页面数低于当前上限。"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.current)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    async def release(self, latency: Optional[float] = None, ok: bool = True):
+        """归还名额；latency为None表示没有实际抓取（例如已经没有待处理的URL），不计入统计。"""
+        async with self._condition:
+            self.in_flight -= 1
+            if latency is not None:
+                self._record(latency, ok)
+            self._condition.notify_all()  # 上限可能变大，唤醒所有等待者重新检查
+
+    def _record(self, latency: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            # 基线取最低的移动平均，并让它缓慢上浮，网站整体变慢后不会一直被判为过载
+            self.baseline = self.latency if self.baseline is None else min(self.latency, self.baseline * 1.005)
+        error_rate = self.outcomes.count(False) / len(self.outcomes)
+        overloaded = error_rate > self.error_threshold or (
+            self.latency is not None and self.latency > self.latency_factor * self.baseline)
+        now = time.monotonic()
+        if overloaded:
+            if now - self._last_decrease >= (self.latency or 0):  # 每个延迟周期内最多减半一次
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._last_decrease = now
+                self.decreases += 1
+                logger.debug(f"Concurrency limit decreased to {self.current} "
+                             f"(error rate {error_rate:.0%}, latency {self.latency or 0:.2f}s)")
+        elif ok:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+
+class ContextPool:
+    """
+    按需创建、轮流使用的浏览器上下文。
+
+    每个上下文分配满pages_per_context个页面后不再接收新页面，等其上打开的页面全部关闭后
+    关闭并由新的上下文替代，这样长时间抓取时缓存、Cookie等积累的内存不会无限增长。
+    """
+
+    def __init__(self, browser, size: int, pages_per_context: int = DEFAULT_PAGES_PER_CONTEXT):
+        self.browser = browser  # 用于创建上下文的浏览器实例
+        self.size = max(1, size)  # 同时接收新页面的上下文数量
+        self.pages_per_context = max(1, pages_per_context)  # 每个上下文最多分配的页面数
+        self.slots = []  # 每项为 [上下文, 已分配页面数, 当前打开页面数]
+        self.recycled = 0  # 已回收重建的上下文数量
+        self._lock = asyncio.Lock()  # 防止并发创建出超过size个上下文
+
+    async def acquire(self):
+        """取一个上下文用于打开新页面：优先选打开页面最少的，不够size个时新建。"""
+        async with self._lock:
+            open_slots = [slot for slot in self.slots if slot[1] < self.pages_per_context]
+            if len(open_slots) < self.size:
+                slot = [await self.browser.new_context(), 0, 0]  # 创建一个新的浏览器上下文（类似无痕窗口）
+                self.slots.append(slot)
+            else:
+                slot = min(open_slots, key=lambda item: item[2])
+            slot[1] += 1
+            slot[2] += 1
+            return slot[0]
+
+    async def release(self, context):
+        """页面关闭后调用；已分配满且没有打开页面的上下文会被关闭。"""
+        for slot in self.slots:
+            if slot[0] is context:
+                slot[2] -= 1
+                if slot[1] >= self.pages_per_context and slot[2] == 0:
+                    self.slots.remove(slot)  # 先移出列表，关闭期间不会再被选中
+                    self.recycled += 1
+                    await context.close()
+                return
+
+    async def close(self):
+        """关闭所有上下文。"""
+        slots, self.slots = self.slots, []
+        for context, _, _ in slots:
+            await context.close()
+
+
+class PageScheduler:
+    """
+    抓取大量URL时的调度器：同时打开的页面数同时受全局AIMD上限和每个主机的上限约束，
+    页面在ContextPool的上下文中打开。
+
+    只启动与全局上限最大值相同数量的工作协程，而不是每个URL一个任务，
+    因此等待中的URL只占一个队列项，不会提前打开页面。
+    """
+
+    def __init__(self, browser, max_concurrent: int = 5, per_host: int = DEFAULT_PER_HOST,
+                 pages_per_context: int = DEFAULT_PAGES_PER_CONTEXT, contexts: Optional[int] = None,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self.limiter = limiter or AdaptiveLimiter(max_concurrent)  # 全局并发上限
+        self.per_host = max(1, per_host)  # 每个主机的并发上限
+        self.contexts = ContextPool(browser, contexts or self.limiter.maximum, pages_per_context)
+        self.pending: 'OrderedDict[str, deque]' = OrderedDict()  # 主机 -> 待抓取的(序号, URL)队列
+        self.host_active: Dict[str, int] = {}  # 主机 -> 正在抓取的页面数
+        self.pages = 0  # 已抓取的页面数
+        self.errors = 0  # 抓取失败的页面数
+        self._condition = asyncio.Condition()  # 用于等待某个主机空出名额
+
+    async def _take(self):
+        """按主机轮转取出下一个可以抓取的URL，所有主机都已满时等待；没有剩余URL时返回None。"""
+        async with self._condition:
+            while self.pending:
+                for host, queue in self.pending.items():
+                    if self.host_active.get(host, 0) < self.per_host:
+                        item = queue.popleft()
+                        if queue:
+                            self.pending.move_to_end(host)  # 轮到下一个主机，避免一个主机的长队列饿死其他主机
+                        else:
+                            del self.pending[host]
+                        self.host_active[host] = self.host_active.get(host, 0) + 1
+                        return item + (host,)
+                await self._condition.wait()
+            return None
+
+    async def _done(self, host: str):
+        async with self._condition:
+            self.host_active[host] -= 1
+            self._condition.notify_all()
+
+    async def _worker(self, results: List, process: Callable[[str, Optional[str]], Awaitable]):
+        while True:
+            await self.limiter.acquire()  # 先取得全局名额，再取URL
+            item = await self._take()
+            if item is None:
+                await self.limiter.release()
+                return
+            index, url, host = item
+            ok = False
+            started = time.perf_counter()
+            try:
+                context = await self.contexts.acquire()
+                try:
+                    html = await fetch_page(url, context)  # 抓取页面，失败时返回None
+                finally:
+                    await self.contexts.release(context)
+                ok = html is not None
+            finally:
+                self.pages += 1
+                self.errors += not ok
+                await self.limiter.release(time.perf_counter() - started, ok)  # 用本页的延迟和成败调整上限
+                await self._done(host)
+            # 在释放名额之后处理页面，处理完之前本协程不会取下一个URL，HTML不会在内存中堆积
+            results[index] = await process(url, html)
+
+    async def run(self, urls: List[str], process: Callable[[str, Optional[str]], Awaitable]) -> List:
+        """抓取所有URL，每个页面的HTML交给 process(url, html) 处理，按URL顺序返回处理结果。"""
+        for index, url in enumerate(urls):
+            self.pending.setdefault(urlparse(url).netloc, deque()).append((index, url))
+        results = [None] * len(urls)
+        workers = min(len(urls), self.limiter.maximum)
+        await asyncio.gather(*(self._worker(results, process) for _ in range(workers)))
+        return results
+
+    def get_stats(self) -> Dict:
+        return {
+            'pages': self.pages,
+            'errors': self.errors,
+            'limit': self.limiter.current,
+            'peak_in_flight': self.limiter.peak_in_flight,
+            'limit_decreases': self.limiter.decreases,
+            'contexts_recycled': self.contexts.recycled,
+        }
+
+    async def close(self):
+        await self.contexts.close()
+
+
+async def process_urls(urls: List[str], max_concurrent: int = 5, per_host: int = DEFAULT_PER_HOST,
+                       pages_per_context: int = DEFAULT_PAGES_PER_CONTEXT, stats: Optional[Dict] = None,
+                       store: Optional[CorpusStore] = None) -> List[str]:
+    """
+    使用并发机制处理多个URL。
+
+    同时打开的页面数不超过max_concurrent（并按延迟和失败率自适应下调），同一主机不超过per_host；
+    每个页面抓取后立即在进程池中解析，结果按URL顺序返回。传入stats字典时写入调度统计；
+    传入store时把抓取成功的页面（URL、抓取时间、HTML哈希、文本）追加到语料库。
+    """
+    if not urls:
+        return []
+    loop = asyncio.get_running_loop()
     async with async_playwright() as p:  # 启动并管理playwright的生命周期
-        browser = await p.chromium.launch()  # 启动一个Chromium浏览器实例
+        with span('launch_browser'):  # 记录浏览器启动耗时
+            browser = await p.chromium.launch()  # 启动一个Chromium浏览器实例
+        # 上下文数量不超过URL总数和最大并发数
+        scheduler = PageScheduler(browser, max_concurrent, per_host, pages_per_context,
+                                  contexts=min(len(urls), max_concurrent))
         try:
-            # 创建多个浏览器上下文（类似无痕窗口）以实现并发
-            n_contexts = min(len(urls), max_concurrent)  # 计算要创建的上下文数量，不超过URL总数和最大并发数
-            contexts = [await browser.new_context() for _ in range(n_contexts)]  # 创建指定数量的浏览器上下文
-            
-            # 为每个URL创建一个异步获取任务
-            tasks = []  # 初始化任务列表
-            for i, url in enumerate(urls):  # 遍历所有待处理的URL
-                context = contexts[i % len(contexts)]  # 通过取模运算，将URL轮流分配给不同的上下文
-                task = fetch_page(url, context)  # 为当前URL和分配的上下文创建一个获取页面的任务
-                tasks.append(task)  # 将任务添加到任务列表
-            
-            # 并发执行所有获取任务并等待结果
-            html_contents = await asyncio.gather(*tasks)  # 'gather'会并发运行所有任务并按顺序返回结果
-            
-            # 使用多进程并行解析HTML内容，以提高CPU密集型任务的效率
-            with Pool() as pool:  # 创建一个进程池
-                results = pool.map(parse_html, html_contents)  # 将'parse_html'函数应用到每个HTML内容上，并行执行
-                
+            # 使用多进程解析HTML内容，以提高CPU密集型任务的效率；解析与其他页面的抓取重叠进行
+            with ProcessPoolExecutor() as pool:  # 创建一个进程池
+                async def parse(url: str, html: Optional[str]) -> str:
+                    if html is None:
+                        return ""  # 抓取失败的页面与parse_html(None)一样返回空字符串
+                    fetched_at = time.time()  # 抓取完成的时间
+                    with span('parse', url=url):  # 子进程不记录span，这里记录等待解析结果的耗时
+                        text = await loop.run_in_executor(pool, parse_html, html)
+                    if store is not None:
+                        store.add(url, text, html=html, fetched_at=fetched_at)  # 保存到语料库
+                    return text
+
+                results = await scheduler.run(urls, parse)
+            logger.info(f"Scheduler stats: {scheduler.get_stats()}")  # 记录调度统计
+            if stats is not None:
+                stats.update(scheduler.get_stats())
             return results  # 返回所有URL解析后的文本结果列表
-            
+
         finally:
             # 清理所有资源，确保浏览器和上下文被正确关闭
-            for context in contexts:  # 遍历所有创建的上下文
-                await context.close()  # 关闭上下文
+            await scheduler.close()  # 关闭所有上下文
             await browser.close()  # 关闭浏览器实例
 
 def validate_url(url: str) -> bool:
@@ -170,10 +391,21 @@ def main():
     parser.add_argument('urls', nargs='+', help='需要处理的URL列表')
     # 添加一个可选参数'--max-concurrent'，用于指定最大并发数
     parser.add_argument('--max-concurrent', type=int, default=5,
-                       help='最大并发浏览器实例数 (默认: 5)')
+                       help='同时打开的页面数上限，会按延迟和失败率自适应下调 (默认: 5)')
+    # 添加每个主机的并发上限和上下文回收周期
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST,
+                       help=f'同一主机同时打开的页面数上限 (默认: {DEFAULT_PER_HOST})')
+    parser.add_argument('--pages-per-context', type=int, default=DEFAULT_PAGES_PER_CONTEXT,
+                       help=f'每个浏览器上下文处理多少个页面后重建 (默认: {DEFAULT_PAGES_PER_CONTEXT})')
     # 添加一个可选标志'--debug'，用于开启调试模式
     parser.add_argument('--debug', action='store_true',
                        help='启用调试级别日志')
+    # 添加语料库参数：保存抓取结果，并可跳过已经抓取过的URL
+    parser.add_argument('--store', nargs='?', const=DEFAULT_CORPUS_DIR, metavar='DIR',
+                       help=f'把抓取结果追加到语料库 (默认目录: {DEFAULT_CORPUS_DIR})')
+    parser.add_argument('--skip-stored', action='store_true',
+                       help='配合--store，语料库中已有的URL直接读取，不再抓取')
+    add_profile_arguments(parser)  # 添加--profile等性能分析参数
     
     args = parser.parse_args()  # 解析命令行传入的参数
     
@@ -192,15 +424,27 @@ def main():
         logger.error("No valid URLs provided")  # 记录错误
         sys.exit(1)  # 退出程序，返回状态码1表示错误
     
+    store = CorpusStore(args.store) if args.store else None  # 打开语料库（如果指定了--store）
     start_time = time.time()  # 记录开始处理的时间
     try:
-        # 运行异步函数'process_urls'来处理所有有效URL
-        results = asyncio.run(process_urls(valid_urls, args.max_concurrent))
+        # 语料库中已有的URL直接读取文本，其余的URL才需要抓取
+        texts = {}  # URL -> 提取的文本
+        if store is not None and args.skip_stored:
+            texts = {url: store.get(url)['text'] for url in valid_urls if url in store}
+            if texts:
+                logger.info(f"Skipping {len(texts)} URLs already in the corpus")
+        to_fetch = [url for url in valid_urls if url not in texts]
+
+        # 运行异步函数'process_urls'来处理所有需要抓取的URL，指定--profile时记录各阶段耗时并写出trace文件
+        with profile_from_args(args, 'web_scraper'):
+            fetched = asyncio.run(process_urls(to_fetch, args.max_concurrent, args.per_host,
+                                               args.pages_per_context, store=store))
+        texts.update(zip(to_fetch, fetched))
         
-        # 将结果打印到标准输出
-        for url, text in zip(valid_urls, results):  # 将URL和其对应的结果配对遍历
+        # 将结果按输入顺序打印到标准输出
+        for url in valid_urls:  # 遍历所有有效URL
             print(f"\n=== Content from {url} ===")  # 打印URL来源标题
-            print(text)  # 打印提取的文本内容
+            print(texts[url])  # 打印提取的文本内容
             print("=" * 80)  # 打印分隔线
         
         logger.info(f"Total processing time: {time.time() - start_time:.2f}s")  # 记录并打印总处理时间
@@ -208,6 +452,9 @@ def main():
     except Exception as e:
         logger.error(f"Error during execution: {str(e)}")  # 如果在执行过程中发生任何未捕获的异常
         sys.exit(1)  # 记录错误并退出程序
+    finally:
+        if store is not None:
+            store.close()  # 关闭语料库文件
 
 if __name__ == '__main__':
     # 这是一个标准的Python入口点检查。